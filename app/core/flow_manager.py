@@ -1,8 +1,9 @@
 """
 Gerenciador de Fluxos de Atendimento
 """
-from typing import Dict, Tuple, Optional
+from typing import Dict, Tuple, Optional, Iterable
 import re
+from app.core.intent_classifier import get_intent_classifier, INTENT_LABELS
 
 
 class FlowManager:
@@ -127,6 +128,39 @@ class FlowManager:
             
         return None
     
+    def classify_intent(
+        self,
+        message: str,
+        allowed: Optional[Iterable[str]] = None,
+        threshold: Optional[float] = None
+    ) -> Optional[str]:
+        """
+        Resolve a intenção com o classificador local (sem chamar a IA)
+        
+        Usado quando as regras de número/palavra-chave não reconhecem a mensagem.
+        Abaixo do limiar de confiança retorna None e a IA continua tratando.
+        
+        Args:
+            message: Mensagem do usuário
+            allowed: Fluxos aceitos nesta etapa (padrão: todos)
+            threshold: Confiança mínima (padrão: settings.INTENT_CONFIDENCE_THRESHOLD)
+            
+        Returns:
+            flow_type identificado ou None
+        """
+        classifier = get_intent_classifier()
+        if classifier is None:
+            return None
+        
+        if threshold is None:
+            from config.settings import settings
+            threshold = settings.INTENT_CONFIDENCE_THRESHOLD
+        
+        label, confidence = classifier.predict(message, allowed=allowed)
+        if label is None or label not in INTENT_LABELS or confidence < threshold:
+            return None
+        return label
+    
     def detect_consortium_type(self, message: str) -> Optional[str]:
         """
         Detecta o tipo de consórcio escolhido
@@ -0,0 +1,373 @@
+"""
+Classificador local de intenção para o menu e a escolha de produto
+
+Modelo linear (regressão logística multinomial) sobre n-gramas com hashing,
+treinado offline com a mensagem de `chat_messages` que escolheu o fluxo,
+rotulada pelo `flow_type` em que a conversa terminou. A inferência é feita em NumPy puro
+e leva bem menos de 1 ms, então pode rodar direto no caminho do webhook.
+"""
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from app.core.text_features import HashingVectorizer
+from app.core.utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Rótulo usado para saudações e pedidos de menu (não resolve nenhum fluxo)
+NO_INTENT = "menu_principal"
+
+# Fluxos que o classificador pode resolver
+INTENT_LABELS = [
+    "seguro_auto",
+    "seguro_residencial",
+    "seguro_vida",
+    "seguro_empresarial",
+    "consorcio",
+    "segunda_via",
+    "sinistro",
+    "falar_humano",
+    "outros_assuntos",
+]
+
+# Exemplos iniciais, usados junto com o histórico para o modelo não depender
+# só do volume de conversas já registradas
+SEED_EXAMPLES = {
+    "seguro_auto": [
+        "quero fazer seguro do meu carro",
+        "cotação de seguro auto",
+        "quanto fica o seguro da minha moto",
+        "preciso segurar meu veículo",
+        "seguro pro carro novo que comprei",
+        "queria um orçamento de seguro automóvel",
+    ],
+    "seguro_residencial": [
+        "queria fazer seguro pro meu apartamento",
+        "seguro da minha casa",
+        "preciso de seguro residencial",
+        "quero proteger meu imóvel",
+        "seguro para apartamento alugado",
+        "cotação de seguro para residência",
+    ],
+    "seguro_vida": [
+        "quero fazer um seguro de vida",
+        "seguro de vida para minha família",
+        "quanto custa seguro de vida",
+        "preciso de um seguro de vida individual",
+    ],
+    "seguro_empresarial": [
+        "seguro para minha empresa",
+        "preciso de seguro empresarial",
+        "seguro para o meu comércio",
+        "seguro para loja e escritório",
+    ],
+    "consorcio": [
+        "quero entrar num consórcio",
+        "tenho interesse em consórcio de imóvel",
+        "consórcio de carro",
+        "como funciona a carta de crédito",
+        "queria fazer um consorcio",
+    ],
+    "segunda_via": [
+        "preciso da segunda via do boleto",
+        "perdi meu boleto",
+        "boleto venceu, como pago",
+        "me manda o boleto de novo",
+        "quero pagar minha parcela atrasada",
+    ],
+    "sinistro": [
+        "bati o carro",
+        "roubaram minha moto",
+        "tive um acidente",
+        "meu carro foi furtado",
+        "alagou minha casa",
+        "quero abrir um sinistro",
+    ],
+    "falar_humano": [
+        "quero falar com um atendente",
+        "me passa pra uma pessoa",
+        "posso falar com alguém",
+        "quero falar com o corretor",
+        "atendimento humano por favor",
+    ],
+    "outros_assuntos": [
+        "tenho outra dúvida",
+        "é sobre outro assunto",
+        "quero cancelar minha apólice",
+        "vocês trabalham com previdência",
+        "queria tirar uma dúvida",
+    ],
+    NO_INTENT: [
+        "oi",
+        "olá",
+        "bom dia",
+        "boa tarde tudo bem",
+        "boa noite",
+        "menu",
+        "ok obrigado",
+    ],
+}
+
+# Palavras de saudação, cortesia e pedido genérico; uma mensagem só com elas
+# não indica fluxo e fica fora do treino (ver is_no_intent)
+NO_INTENT_WORDS = {
+    "oi", "oie", "ola", "opa", "eai", "e", "ai", "hello", "alo",
+    "bom", "boa", "dia", "tarde", "noite", "tudo", "bem", "blz", "beleza",
+    "ok", "obrigado", "obrigada", "valeu", "tchau", "menu", "inicio",
+    "quero", "queria", "gostaria", "preciso", "de", "da", "do", "uma", "um", "mais",
+    "informacao", "informacoes", "info", "ajuda", "saber",
+    "por", "favor", "pf", "pfv", "sim", "nao",
+}
+
+
+class IntentClassifier:
+    """Regressão logística multinomial sobre vetores com hashing"""
+
+    def __init__(self, vectorizer: Optional[HashingVectorizer] = None):
+        self.vectorizer = vectorizer or HashingVectorizer()
+        self.labels: List[str] = []
+        self.weights: Optional[np.ndarray] = None  # (n_features, n_labels)
+        self.bias: Optional[np.ndarray] = None  # (n_labels,)
+
+    @property
+    def is_trained(self) -> bool:
+        return self.weights is not None
+
+    def fit(
+        self,
+        texts: List[str],
+        labels: List[str],
+        epochs: int = 300,
+        learning_rate: float = 2.0,
+        l2: float = 1e-4
+    ) -> "IntentClassifier":
+        """
+        Treina o modelo com gradiente descendente em lote completo
+
+        Args:
+            texts: Mensagens de treino
+            labels: Rótulo (flow_type) de cada mensagem
+            epochs: Número de iterações
+            learning_rate: Passo do gradiente
+            l2: Regularização L2
+
+        Returns:
+            O próprio classificador treinado
+        """
+        if len(texts) != len(labels) or not texts:
+            raise ValueError("texts e labels devem ter o mesmo tamanho (> 0)")
+
+        self.labels = sorted(set(labels))
+        label_index = {label: i for i, label in enumerate(self.labels)}
+        y = np.array([label_index[label] for label in labels], dtype=np.int64)
+
+        indptr, indices, values = self.vectorizer.transform(texts)
+        n_samples = len(texts)
+        n_labels = len(self.labels)
+        rows = np.repeat(np.arange(n_samples), np.diff(indptr))
+        non_empty = np.diff(indptr) > 0
+
+        weights = np.zeros((self.vectorizer.n_features, n_labels), dtype=np.float32)
+        bias = np.zeros(n_labels, dtype=np.float32)
+        targets = np.zeros((n_samples, n_labels), dtype=np.float32)
+        targets[np.arange(n_samples), y] = 1.0
+
+        for _ in range(epochs):
+            logits = self._sparse_logits(weights, bias, indptr, indices, values, non_empty)
+            probs = _softmax(logits)
+            grad_logits = (probs - targets) / n_samples
+
+            grad_weights = l2 * weights
+            np.add.at(grad_weights, indices, values[:, None] * grad_logits[rows])
+            weights -= learning_rate * grad_weights
+            bias -= learning_rate * grad_logits.sum(axis=0)
+
+        self.weights = weights
+        self.bias = bias
+        return self
+
+    @staticmethod
+    def _sparse_logits(weights, bias, indptr, indices, values, non_empty) -> np.ndarray:
+        """Calcula X @ W + b para X no formato CSR"""
+        logits = np.tile(bias, (len(indptr) - 1, 1))
+        if len(indices):
+            contributions = weights[indices] * values[:, None]
+            starts = indptr[:-1][non_empty]
+            logits[non_empty] += np.add.reduceat(contributions, starts, axis=0)
+        return logits
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        """
+        Retorna a probabilidade de cada rótulo
+
+        Args:
+            text: Mensagem do usuário
+
+        Returns:
+            Dicionário rótulo -> probabilidade
+        """
+        if not self.is_trained:
+            return {}
+        indices, values = self.vectorizer.transform_one(text)
+        logits = self.bias + values @ self.weights[indices]
+        probs = _softmax(logits[None, :])[0]
+        return dict(zip(self.labels, probs.tolist()))
+
+    def predict(
+        self,
+        text: str,
+        allowed: Optional[Iterable[str]] = None
+    ) -> Tuple[Optional[str], float]:
+        """
+        Prediz o rótulo mais provável
+
+        Args:
+            text: Mensagem do usuário
+            allowed: Restringe a predição a estes rótulos; a confiança continua
+                sendo a probabilidade sobre todos os rótulos (sem renormalizar),
+                para que uma mensagem de outra intenção não passe do limiar
+
+        Returns:
+            Tupla (rótulo ou None, confiança)
+        """
+        probs = self.predict_proba(text)
+        if allowed is not None:
+            allowed = set(allowed)
+            probs = {label: p for label, p in probs.items() if label in allowed}
+        if not probs:
+            return None, 0.0
+        label = max(probs, key=probs.get)
+        return label, probs[label]
+
+    def save(self, path: str):
+        """Salva pesos e configuração em um arquivo .npz"""
+        if not self.is_trained:
+            raise ValueError("Modelo não treinado")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            weights=self.weights,
+            bias=self.bias,
+            labels=np.array(self.labels),
+            config=np.array(json.dumps(self.vectorizer.get_config()))
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IntentClassifier":
+        """Carrega um modelo salvo por `save`"""
+        with np.load(path, allow_pickle=False) as data:
+            vectorizer = HashingVectorizer.from_config(json.loads(str(data["config"])))
+            classifier = cls(vectorizer)
+            classifier.weights = data["weights"].astype(np.float32)
+            classifier.bias = data["bias"].astype(np.float32)
+            classifier.labels = [str(label) for label in data["labels"]]
+        return classifier
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def is_no_intent(text: str) -> bool:
+    """
+    Se a mensagem é só saudação, cortesia ou pedido genérico ("oi", "bom dia",
+    "quero informação"): não escolhe fluxo nenhum
+    """
+    words = normalize_text(text).split()
+    return all(word in NO_INTENT_WORDS for word in words)
+
+
+def build_training_set(db, scan_messages: int = 10) -> Tuple[List[str], List[str]]:
+    """
+    Monta o conjunto de treino a partir do histórico
+
+    Cada lead com `flow_type` conhecido contribui só com a mensagem que
+    escolheu o fluxo: a primeira mensagem do usuário com texto que não seja
+    saudação ou pedido genérico (ver is_no_intent). Se antes dela o cliente
+    escolheu uma opção numérica do menu, o lead não contribui, porque as
+    mensagens seguintes já são respostas da coleta de dados.
+
+    Args:
+        db: Sessão do banco de dados
+        scan_messages: Quantas mensagens iniciais examinar por lead
+
+    Returns:
+        Tupla (textos, rótulos)
+    """
+    from app.database.models import Lead, ChatMessage
+
+    texts, labels = [], []
+    for label, examples in SEED_EXAMPLES.items():
+        texts.extend(examples)
+        labels.extend([label] * len(examples))
+
+    leads = db.query(Lead.id, Lead.flow_type).filter(
+        Lead.flow_type.in_(INTENT_LABELS)
+    ).all()
+
+    for lead_id, flow_type in leads:
+        messages = db.query(ChatMessage.message).filter(
+            ChatMessage.lead_id == lead_id,
+            ChatMessage.sender == "user"
+        ).order_by(ChatMessage.created_at.asc(), ChatMessage.id.asc()).limit(scan_messages).all()
+
+        for (message,) in messages:
+            text = (message or "").strip()
+            if text.isdigit():
+                break
+            if not text or len(text) > 300 or is_no_intent(text):
+                continue
+            texts.append(text)
+            labels.append(flow_type)
+            break
+
+    return texts, labels
+
+
+_classifier: Optional[IntentClassifier] = None
+_classifier_mtime: Optional[float] = None
+_classifier_lock = threading.Lock()
+
+
+def get_intent_classifier(path: Optional[str] = None) -> Optional[IntentClassifier]:
+    """
+    Retorna o classificador carregado do disco (recarrega se o arquivo mudar)
+
+    Args:
+        path: Caminho do modelo (padrão: settings.INTENT_MODEL_PATH)
+
+    Returns:
+        IntentClassifier ou None se não houver modelo treinado
+    """
+    global _classifier, _classifier_mtime
+    if path is None:
+        from config.settings import settings
+        path = settings.INTENT_MODEL_PATH
+
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    if _classifier is not None and _classifier_mtime == mtime:
+        return _classifier
+
+    with _classifier_lock:
+        if _classifier is None or _classifier_mtime != mtime:
+            try:
+                _classifier = IntentClassifier.load(path)
+                _classifier_mtime = mtime
+                logger.info(f"Classificador de intenção carregado: {path}")
+            except Exception as e:
+                logger.error(f"Erro ao carregar classificador de intenção: {str(e)}")
+                return None
+    return _classifier
@@ -0,0 +1,291 @@
+"""
+Coleta determinística de campos (slot filling) sem uso de IA
+
+Para fluxos que só fazem perguntas fixas em ordem fixa, pergunta o próximo
+campo com um texto pronto, valida a resposta localmente (CPF/CNPJ, CEP,
+telefone, e-mail), pergunta de novo se for inválida e confirma tudo no final.
+Ativado por fluxo via settings.SLOT_FILLING_FLOWS.
+"""
+import json
+from typing import Dict, Optional
+from app.core.flow_manager import FlowManager
+from app.core.utils import (
+    sanitize_whatsapp_number, is_valid_cpf, is_valid_cnpj, is_valid_cep,
+    is_valid_phone, is_valid_email, normalize_text
+)
+
+# Respostas que usam o próprio número da conversa como WhatsApp de contato
+SAME_NUMBER_ANSWERS = {"este", "esse", "este mesmo", "esse mesmo", "mesmo", "sim", "s"}
+
+YES_ANSWERS = {"sim", "s", "isso", "correto", "certo", "ok", "confirmo", "pode", "yes"}
+NO_ANSWERS = {"nao", "n", "errado", "corrigir", "no"}
+
+# Preposições mantidas em minúsculas ao formatar nomes
+NAME_CONNECTORS = {"da", "das", "de", "do", "dos", "e"}
+
+MAX_RETRIES = 3
+
+# Definição dos fluxos: campos na ordem em que são perguntados
+SLOT_FLOWS = {
+    "segunda_via": {
+        "intro": "Certo! Vou te ajudar com a segunda via do boleto 👍",
+        "slots": [
+            {"field": "name", "validator": "name",
+             "question": "Qual é o seu nome completo?"},
+            {"field": "whatsapp_contact", "validator": "phone",
+             "question": "Qual WhatsApp podemos usar para contato? (responda *este* para usar este número)"},
+            {"field": "cpf_cnpj", "validator": "cpf_cnpj",
+             "question": "Qual é o seu CPF ou CNPJ?"},
+            {"field": "interest", "validator": "choice", "label": "Produto",
+             "question": "Esse boleto é de qual produto?\n1️⃣ 🛡️ Seguro\n2️⃣ 💼 Consórcio",
+             "choices": {"1": "seguro", "seguro": "seguro", "2": "consorcio", "consorcio": "consorcio"}},
+        ],
+        "done": (
+            "Certo 👍\n"
+            "Já estou encaminhando sua solicitação para nosso time.\n"
+            "Em breve você receberá a segunda via do boleto."
+        ),
+    },
+    "falar_humano": {
+        "intro": "Claro! Antes de te transferir, preciso de alguns dados 😊",
+        "slots": [
+            {"field": "name", "validator": "name",
+             "question": "Qual é o seu nome completo?"},
+            {"field": "cpf_cnpj", "validator": "cpf_cnpj",
+             "question": "Qual é o seu CPF ou CNPJ?"},
+            {"field": "whatsapp_contact", "validator": "phone",
+             "question": "Qual WhatsApp podemos usar para contato? (responda *este* para usar este número)"},
+        ],
+        "done": (
+            "Perfeito! 👍\n"
+            "Já estou conectando você com um especialista.\n"
+            "Em poucos instantes, um atendente da Seguro Já vai te atender."
+        ),
+    },
+    "outros_assuntos": {
+        "intro": "Claro! Vou anotar sua solicitação 😊",
+        "slots": [
+            {"field": "name", "validator": "name",
+             "question": "Qual é o seu nome completo?"},
+            {"field": "whatsapp_contact", "validator": "phone",
+             "question": "Qual WhatsApp podemos usar para contato? (responda *este* para usar este número)"},
+            {"field": "interest", "validator": "text", "label": "Assunto",
+             "question": "Me conte em poucas palavras sobre o que você precisa."},
+        ],
+        "done": (
+            "Perfeito! 👍\n"
+            "Recebi suas informações e vou encaminhar para nossa equipe.\n"
+            "Em breve entraremos em contato pelo WhatsApp {whatsapp_contact}.\n\n"
+            "Obrigado pelo contato! 😊"
+        ),
+    },
+}
+
+INVALID_MESSAGES = {
+    "name": "Não consegui entender o nome 🤔",
+    "phone": "Esse número não parece válido 🤔 Informe com DDD, por exemplo: 11 91234-5678.",
+    "cpf_cnpj": "Esse CPF/CNPJ não é válido 🤔 Confira os números e envie novamente.",
+    "cep": "Esse CEP não é válido 🤔 Ele deve ter 8 números, por exemplo: 01310-100.",
+    "email": "Esse e-mail não parece válido 🤔 Confira e envie novamente.",
+    "choice": "Não entendi a opção 🤔 Responda com o número ou o nome.",
+    "text": "Pode me dar um pouco mais de detalhes?",
+}
+
+
+class SlotFillingEngine:
+    """Motor de coleta determinística guiado pela definição do fluxo"""
+
+    def __init__(self, enabled_flows: Optional[list] = None):
+        if enabled_flows is None:
+            from config.settings import settings
+            enabled_flows = settings.SLOT_FILLING_FLOWS
+        self.enabled_flows = set(enabled_flows)
+        self.flow_manager = FlowManager()
+
+    def is_enabled(self, flow_type: Optional[str]) -> bool:
+        """Verifica se o fluxo deve usar a coleta determinística"""
+        return bool(flow_type) and flow_type in self.enabled_flows and flow_type in SLOT_FLOWS
+
+    @staticmethod
+    def load_state(raw: Optional[str]) -> Dict:
+        """Lê o estado salvo em Lead.qualification_data"""
+        if not raw:
+            return {}
+        try:
+            data = json.loads(raw)
+        except (TypeError, ValueError):
+            return {}
+        state = data.get("slot_filling") if isinstance(data, dict) else None
+        return state if isinstance(state, dict) else {}
+
+    @staticmethod
+    def dump_state(state: Dict, raw: Optional[str] = None) -> str:
+        """Grava o estado em Lead.qualification_data preservando outras chaves"""
+        data = {}
+        if raw:
+            try:
+                loaded = json.loads(raw)
+                if isinstance(loaded, dict):
+                    data = loaded
+            except (TypeError, ValueError):
+                pass
+        data["slot_filling"] = state
+        return json.dumps(data, ensure_ascii=False)
+
+    def validate(self, slot: Dict, message: str, sender_number: str) -> Optional[str]:
+        """
+        Valida e normaliza a resposta de um campo
+
+        Args:
+            slot: Definição do campo
+            message: Resposta do usuário
+            sender_number: Número da conversa (para "este número")
+
+        Returns:
+            Valor normalizado ou None se inválido
+        """
+        text = message.strip()
+        normalized = normalize_text(text)
+        validator = slot["validator"]
+
+        if validator == "name":
+            words = [w for w in text.split() if any(c.isalpha() for c in w)]
+            if len(words) >= 1 and len(text) >= 3 and not any(c.isdigit() for c in text):
+                return " ".join(
+                    w.lower() if w.lower() in NAME_CONNECTORS else w.capitalize()
+                    for w in text.split()
+                )
+            return None
+
+        if validator == "phone":
+            if normalized in SAME_NUMBER_ANSWERS:
+                return sanitize_whatsapp_number(sender_number)
+            return sanitize_whatsapp_number(text) if is_valid_phone(text) else None
+
+        if validator == "cpf_cnpj":
+            if is_valid_cpf(text) or is_valid_cnpj(text):
+                return sanitize_whatsapp_number(text)
+            return None
+
+        if validator == "cpf":
+            return sanitize_whatsapp_number(text) if is_valid_cpf(text) else None
+
+        if validator == "cep":
+            return sanitize_whatsapp_number(text) if is_valid_cep(text) else None
+
+        if validator == "email":
+            return text.lower() if is_valid_email(text) else None
+
+        if validator == "choice":
+            choices = slot.get("choices", {})
+            if normalized in choices:
+                return choices[normalized]
+            for word in normalized.split():
+                if word in choices and not word.isdigit():
+                    return choices[word]
+            return None
+
+        if validator == "text":
+            return text if len(text) >= 3 else None
+
+        raise ValueError(f"Validador desconhecido: {validator}")
+
+    def handle(
+        self,
+        flow_type: str,
+        message: str,
+        state: Dict,
+        sender_number: str,
+        entered: bool = False
+    ) -> Dict:
+        """
+        Processa uma mensagem do usuário no fluxo
+
+        Args:
+            flow_type: Fluxo atual (precisa estar em SLOT_FLOWS)
+            message: Mensagem do usuário
+            state: Estado salvo (load_state)
+            sender_number: Número WhatsApp da conversa
+            entered: True se o usuário acabou de entrar no fluxo nesta mensagem
+
+        Returns:
+            Dicionário com reply (texto), state (novo estado), completed (bool)
+            e values (campos coletados, só preenchido quando confirmado)
+        """
+        definition = SLOT_FLOWS[flow_type]
+        slots = definition["slots"]
+
+        if entered or state.get("flow") != flow_type:
+            state = {"flow": flow_type, "values": {}, "awaiting": None,
+                     "confirming": False, "completed": False, "retries": 0}
+            return self._ask_next(definition, state, prefix=definition["intro"])
+
+        state = dict(state)
+        state["values"] = dict(state.get("values", {}))
+
+        if state.get("completed"):
+            return self._result(
+                "Sua solicitação já foi encaminhada 👍 Em breve nossa equipe entra em contato.\n"
+                "Se precisar de algo mais, digite 0️⃣ para voltar ao menu.",
+                state
+            )
+
+        if state.get("confirming"):
+            answer = normalize_text(message)
+            if answer in YES_ANSWERS or answer.startswith("sim"):
+                state["confirming"] = False
+                state["completed"] = True
+                reply = definition["done"].format(**state["values"])
+                return self._result(reply, state, completed=True, values=state["values"])
+            if answer in NO_ANSWERS or answer.startswith("nao"):
+                state.update({"values": {}, "awaiting": None, "confirming": False, "retries": 0})
+                return self._ask_next(definition, state, prefix="Sem problemas, vamos corrigir 👍")
+            return self._result("Por favor, responda *sim* para confirmar ou *não* para corrigir.", state)
+
+        awaiting = state.get("awaiting")
+        slot = next((s for s in slots if s["field"] == awaiting), None)
+        if slot is not None:
+            value = self.validate(slot, message, sender_number)
+            if value is None:
+                state["retries"] = state.get("retries", 0) + 1
+                reply = f"{INVALID_MESSAGES[slot['validator']]}\n{slot['question']}"
+                if state["retries"] >= MAX_RETRIES:
+                    reply += "\n\n💡 Se preferir, digite 0️⃣ para voltar ao menu."
+                return self._result(reply, state)
+            state["values"][slot["field"]] = value
+            state["retries"] = 0
+
+        return self._ask_next(definition, state)
+
+    def _ask_next(self, definition: Dict, state: Dict, prefix: Optional[str] = None) -> Dict:
+        """Pergunta o próximo campo faltante ou pede a confirmação final"""
+        next_slot = next(
+            (s for s in definition["slots"] if not state["values"].get(s["field"])),
+            None
+        )
+
+        if next_slot is not None:
+            state["awaiting"] = next_slot["field"]
+            reply = next_slot["question"]
+        else:
+            state["awaiting"] = None
+            state["confirming"] = True
+            summary = "\n".join(
+                f"• {s.get('label') or self.flow_manager.get_field_label(s['field'])}: {state['values'][s['field']]}"
+                for s in definition["slots"]
+            )
+            reply = f"Confere se está tudo certo:\n\n{summary}\n\nResponda *sim* para confirmar ou *não* para corrigir."
+
+        if prefix:
+            reply = f"{prefix}\n\n{reply}"
+        return self._result(reply, state)
+
+    @staticmethod
+    def _result(reply: str, state: Dict, completed: bool = False, values: Optional[Dict] = None) -> Dict:
+        return {
+            "reply": reply,
+            "state": state,
+            "completed": completed,
+            "values": dict(values or {})
+        }
+
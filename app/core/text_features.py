@@ -0,0 +1,129 @@
+"""
+Vetorização de texto por hashing de n-gramas (sem vocabulário, sem rede)
+"""
+import zlib
+from typing import List, Tuple
+import numpy as np
+from app.core.utils import normalize_text
+
+
+class HashingVectorizer:
+    """
+    Converte textos curtos em vetores esparsos normalizados (L2)
+
+    Usa n-gramas de palavras e de caracteres mapeados por CRC32 para um
+    espaço de dimensão fixa, então não precisa de vocabulário salvo e o
+    mesmo texto gera sempre o mesmo vetor em qualquer processo.
+    """
+
+    def __init__(
+        self,
+        n_features: int = 2 ** 14,
+        word_ngrams: Tuple[int, int] = (1, 2),
+        char_ngrams: Tuple[int, int] = (3, 4)
+    ):
+        if n_features & (n_features - 1):
+            raise ValueError("n_features deve ser potência de 2")
+        self.n_features = n_features
+        self.word_ngrams = word_ngrams
+        self.char_ngrams = char_ngrams
+        self._mask = n_features - 1
+
+    def tokens(self, text: str) -> List[str]:
+        """
+        Gera os n-gramas de palavras e caracteres do texto
+
+        Args:
+            text: Texto original
+
+        Returns:
+            Lista de tokens (com prefixo w: ou c:)
+        """
+        words = normalize_text(text).split()
+        result = []
+
+        min_w, max_w = self.word_ngrams
+        for n in range(min_w, max_w + 1):
+            for i in range(len(words) - n + 1):
+                result.append("w:" + " ".join(words[i:i + n]))
+
+        min_c, max_c = self.char_ngrams
+        for word in words:
+            padded = f" {word} "
+            for n in range(min_c, max_c + 1):
+                for i in range(len(padded) - n + 1):
+                    result.append("c:" + padded[i:i + n])
+
+        return result
+
+    def transform_one(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vetoriza um texto em formato esparso
+
+        Args:
+            text: Texto original
+
+        Returns:
+            Tupla (indices, valores) com norma L2 igual a 1 (vazia se não houver tokens)
+        """
+        counts = {}
+        for token in self.tokens(text):
+            index = zlib.crc32(token.encode("utf-8")) & self._mask
+            counts[index] = counts.get(index, 0) + 1
+
+        if not counts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        values /= np.linalg.norm(values)
+        return indices, values.astype(np.float32)
+
+    def transform(self, texts: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Vetoriza vários textos em formato CSR
+
+        Args:
+            texts: Lista de textos
+
+        Returns:
+            Tupla (indptr, indices, values) no formato CSR
+        """
+        indptr = [0]
+        all_indices = []
+        all_values = []
+        for text in texts:
+            indices, values = self.transform_one(text)
+            all_indices.append(indices)
+            all_values.append(values)
+            indptr.append(indptr[-1] + len(indices))
+
+        return (
+            np.asarray(indptr, dtype=np.int64),
+            np.concatenate(all_indices) if all_indices else np.zeros(0, dtype=np.int64),
+            np.concatenate(all_values) if all_values else np.zeros(0, dtype=np.float32)
+        )
+
+    def to_dense(self, text: str) -> np.ndarray:
+        """Vetoriza um texto em formato denso (usado em índices pequenos)"""
+        vector = np.zeros(self.n_features, dtype=np.float32)
+        indices, values = self.transform_one(text)
+        np.add.at(vector, indices, values)
+        return vector
+
+    def get_config(self) -> dict:
+        """Retorna a configuração para persistir junto com o modelo"""
+        return {
+            "n_features": self.n_features,
+            "word_ngrams": list(self.word_ngrams),
+            "char_ngrams": list(self.char_ngrams)
+        }
+
+    @classmethod
+    def from_config(cls, config: dict) -> "HashingVectorizer":
+        """Recria o vetorizador a partir da configuração salva"""
+        return cls(
+            n_features=int(config["n_features"]),
+            word_ngrams=tuple(config["word_ngrams"]),
+            char_ngrams=tuple(config["char_ngrams"])
+        )
@@ -2,6 +2,7 @@
 Utilitários do Sistema
 """
 import re
+import unicodedata
 from typing import Optional
 
 
@@ -42,12 +43,145 @@ def format_whatsapp_number(number: str, country_code: str = "55") -> str:
     return country_code + clean
 
 
+_PHONE_CHARS = re.compile(r"[\d\s+().-]+")
+
+
+def canonical_whatsapp_number(number: str) -> str:
+    """
+    Forma canônica do número, usada para achar o lead
+
+    O mesmo cliente chega como 55 + DDD + 8 dígitos (contas antigas do
+    WhatsApp) ou com o nono dígito; os dois viram 55 + DDD + 9 + 8 dígitos.
+    Os JIDs do WhatsApp sempre trazem o código do país, então só números que
+    começam com 55 são alterados: qualquer outro (de outro país, mesmo com o
+    tamanho de um número brasileiro sem DDI) volta só com os dígitos.
+    Identificadores que não são telefone (ex.: "email_...") voltam sem mudança.
+    
+    Args:
+        number: Número bruto (com ou sem formatação)
+    
+    Returns:
+        Número canônico
+    """
+    if not number or not _PHONE_CHARS.fullmatch(number):
+        return number
+    digits = sanitize_whatsapp_number(number).lstrip("0")
+    # Celular brasileiro (começa com 6 a 9) sem o nono dígito
+    if len(digits) == 12 and digits.startswith("55") and digits[4] in "6789":
+        digits = digits[:4] + "9" + digits[4:]
+    return digits
+
+
 def is_valid_email(email: str) -> bool:
     """Valida formato de email"""
     pattern = r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$"
     return re.match(pattern, email) is not None
 
 
+def is_valid_cpf(cpf: str) -> bool:
+    """Valida CPF (11 dígitos e dígitos verificadores)"""
+    digits = sanitize_whatsapp_number(cpf or "")
+    if len(digits) != 11 or digits == digits[0] * 11:
+        return False
+    for size in (9, 10):
+        total = sum(int(digits[i]) * (size + 1 - i) for i in range(size))
+        check = (total * 10) % 11 % 10
+        if check != int(digits[size]):
+            return False
+    return True
+
+
+def is_valid_cnpj(cnpj: str) -> bool:
+    """Valida CNPJ (14 dígitos e dígitos verificadores)"""
+    digits = sanitize_whatsapp_number(cnpj or "")
+    if len(digits) != 14 or digits == digits[0] * 14:
+        return False
+    weights_first = [5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
+    weights_second = [6] + weights_first
+    for weights, position in ((weights_first, 12), (weights_second, 13)):
+        total = sum(int(d) * w for d, w in zip(digits[:position], weights))
+        check = 11 - total % 11
+        check = 0 if check >= 10 else check
+        if check != int(digits[position]):
+            return False
+    return True
+
+
+# Placa no padrão antigo (ABC1234) ou Mercosul (ABC1D23)
+_PLATE = re.compile(r"[A-Z]{3}[0-9][A-Z0-9][0-9]{2}")
+
+# Candidatos a CPF/CNPJ, e-mail e placa dentro de uma mensagem
+_DOCUMENT_IN_TEXT = re.compile(r"(?<![\d./-])(?:\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}|\d{3}\.?\d{3}\.?\d{3}-?\d{2})(?![\d/-])")
+_EMAIL_IN_TEXT = re.compile(r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}")
+_PLATE_IN_TEXT = re.compile(r"\b[A-Za-z]{3}-?[0-9][A-Za-z0-9][0-9]{2}\b")
+
+
+def normalize_cpf_cnpj(document: Optional[str]) -> Optional[str]:
+    """
+    Chave de busca do CPF/CNPJ: só dígitos, e só se os dígitos verificadores conferem
+
+    Returns:
+        11 ou 14 dígitos, ou None se não é um CPF/CNPJ válido
+    """
+    digits = sanitize_whatsapp_number(str(document or ""))
+    if is_valid_cpf(digits) or is_valid_cnpj(digits):
+        return digits
+    return None
+
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    """Chave de busca do e-mail: minúsculo e sem espaços, ou None se inválido"""
+    email = str(email or "").strip().lower()
+    return email if is_valid_email(email) else None
+
+
+def normalize_plate(plate: Optional[str]) -> Optional[str]:
+    """Chave de busca da placa: maiúscula, sem hífen e espaços, ou None se inválida"""
+    plate = re.sub(r"[^A-Z0-9]", "", str(plate or "").upper())
+    return plate if _PLATE.fullmatch(plate) else None
+
+
+def extract_identity_keys(text: str) -> dict:
+    """
+    Procura na mensagem um CPF/CNPJ, e-mail ou placa (sem IA)
+
+    Args:
+        text: Mensagem do cliente
+
+    Returns:
+        Chaves normalizadas encontradas: {"cpf_cnpj", "email", "vehicle_plate"}
+    """
+    keys = {}
+    for match in _DOCUMENT_IN_TEXT.findall(text or ""):
+        document = normalize_cpf_cnpj(match)
+        if document:
+            keys["cpf_cnpj"] = document
+            break
+    email = _EMAIL_IN_TEXT.search(text or "")
+    if email:
+        keys["email"] = normalize_email(email.group())
+    for match in _PLATE_IN_TEXT.findall(text or ""):
+        plate = normalize_plate(match)
+        if plate:
+            keys["vehicle_plate"] = plate
+            break
+    return keys
+
+
+def is_valid_cep(cep: str) -> bool:
+    """Valida CEP (8 dígitos)"""
+    digits = sanitize_whatsapp_number(cep or "")
+    return len(digits) == 8 and digits != "00000000"
+
+
+def is_valid_phone(phone: str) -> bool:
+    """Valida telefone brasileiro (DDD + número, com ou sem código do país)"""
+    digits = sanitize_whatsapp_number(phone or "")
+    if digits.startswith("55") and len(digits) in (12, 13):
+        digits = digits[2:]
+    return len(digits) in (10, 11) and digits[0] != "0"
+
+
 def extract_first_name(full_name: str) -> str:
     """
     Extrai primeiro nome
@@ -77,3 +211,20 @@ def truncate_text(text: str, max_length: int = 100) -> str:
     if len(text) > max_length:
         return text[:max_length] + "..."
     return text
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normaliza texto para comparação (minúsculas, sem acentos e pontuação)
+    
+    Args:
+        text: Texto original
+    
+    Returns:
+        Texto normalizado com palavras separadas por um espaço
+    """
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    without_accents = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(re.findall(r"[a-z0-9]+", without_accents))
@@ -0,0 +1,539 @@
+"""
+Conexão com o banco de dados
+
+Um único engine por processo (por URL), com pool de conexões configurado
+explicitamente e ajustado por dialeto, uma única fábrica de sessões, a
+dependência do FastAPI e context managers síncrono e assíncrono. O pool
+registra métricas de checkout e de espera por conexão.
+
+Para o código assíncrono (webhook e rotas da API) há um AsyncEngine
+equivalente por URL, com aiosqlite no SQLite e asyncpg no Postgres, e
+sessões AsyncSession com as mesmas regras das síncronas.
+
+No SQLite em arquivo, cada conexão nova recebe o perfil de PRAGMAs de
+produção (WAL, synchronous=NORMAL, busy_timeout, cache, mmap, temp_store).
+Escritas que leem antes de gravar devem usar write_session_scope: a
+transação começa com BEGIN IMMEDIATE (o lock de escrita é pego no início,
+respeitando o busy_timeout, em vez de falhar no meio com "database is
+locked") e as escritas do mesmo processo passam por um lock local.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager, asynccontextmanager
+from typing import AsyncIterator, Dict, Iterator, Optional
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool, StaticPool
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PoolMetrics:
+    """Contadores de uso do pool de conexões"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def record_wait(self, wait_ms: float):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total_ms += wait_ms
+            self.wait_max_ms = max(self.wait_max_ms, wait_ms)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_avg_ms": round(self.wait_total_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_max_ms": round(self.wait_max_ms, 3),
+            }
+
+
+class _TimedPoolMixin:
+    """Mede quanto tempo cada checkout esperou por uma conexão"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record_timeout()
+            raise
+        self.metrics.record_wait((time.perf_counter() - start) * 1000)
+        return connection
+
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    """QueuePool que mede quanto tempo cada checkout esperou por uma conexão"""
+
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    """Pool do AsyncEngine com as mesmas métricas de espera do TimedQueuePool"""
+
+
+def sqlite_pragmas(profile: Optional[str] = None) -> Dict[str, str]:
+    """
+    PRAGMAs aplicados a cada conexão SQLite nova
+
+    Args:
+        profile: "production" ou "off" (padrão: settings.SQLITE_PRAGMA_PROFILE)
+
+    Returns:
+        Dicionário nome -> valor (vazio no perfil "off")
+    """
+    profile = profile or settings.SQLITE_PRAGMA_PROFILE
+    if profile == "off":
+        return {}
+    if profile != "production":
+        raise ValueError(f"Perfil de PRAGMAs desconhecido: {profile}")
+    return {
+        # Em bancos novos (antes da primeira tabela): espaço de linhas apagadas
+        # devolvido aos poucos com PRAGMA incremental_vacuum
+        "auto_vacuum": "INCREMENTAL",
+        # Leitores não bloqueiam o escritor e vice-versa
+        "journal_mode": "WAL",
+        # Seguro com WAL: só perde transações em queda de energia, não em crash do processo
+        "synchronous": "NORMAL",
+        "busy_timeout": str(settings.SQLITE_BUSY_TIMEOUT_MS),
+        # Valor negativo = tamanho em KiB
+        "cache_size": str(-settings.SQLITE_CACHE_SIZE_KB),
+        "mmap_size": str(settings.SQLITE_MMAP_SIZE),
+        "temp_store": "MEMORY",
+    }
+
+
+def install_sqlite_profile(engine: Engine, pragmas: Dict[str, str]):
+    """
+    Aplica os PRAGMAs em cada conexão e passa o BEGIN para o SQLAlchemy
+
+    O driver sqlite3 abre transações sozinho (sempre DEFERRED); com
+    isolation_level=None quem emite o BEGIN é o evento "begin", que usa
+    BEGIN IMMEDIATE quando a conexão tem a opção sqlite_begin="IMMEDIATE".
+    """
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _on_begin(conn):
+        mode = conn.get_execution_options().get("sqlite_begin")
+        conn.exec_driver_sql(f"BEGIN {mode}" if mode else "BEGIN")
+
+
+def _is_memory_sqlite(url) -> bool:
+    return url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:")
+
+
+def engine_options(database_url: str) -> Dict:
+    """
+    Opções do create_engine conforme o dialeto
+
+    SQLite em arquivo: pool pequeno, sem pre-ping (arquivo local) e conexões
+    compartilhadas entre threads. SQLite em memória: uma conexão só
+    (StaticPool), senão cada conexão veria um banco vazio. Postgres: pool
+    com pre-ping e reciclagem para sobreviver a conexões derrubadas pelo
+    provedor.
+    """
+    url = make_url(database_url)
+
+    if url.get_backend_name() == "sqlite":
+        connect_args = {"check_same_thread": False}
+        if _is_memory_sqlite(url):
+            return {"poolclass": StaticPool, "connect_args": connect_args}
+        return {
+            "poolclass": TimedQueuePool,
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_pre_ping": False,
+            "connect_args": connect_args,
+        }
+
+    options = {
+        "poolclass": TimedQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+    if url.get_backend_name() == "postgresql":
+        options["connect_args"] = {"connect_timeout": 10, "application_name": "crmseguroja"}
+    return options
+
+
+def build_engine(database_url: str, sqlite_profile: Optional[str] = None) -> Engine:
+    """
+    Cria um engine novo com as opções do dialeto (use get_engine na aplicação)
+
+    Args:
+        database_url: URL do banco
+        sqlite_profile: Perfil de PRAGMAs para SQLite em arquivo
+            (padrão: settings.SQLITE_PRAGMA_PROFILE)
+    """
+    engine = create_engine(database_url, **engine_options(database_url))
+    url = engine.url
+    if url.get_backend_name() == "sqlite" and not _is_memory_sqlite(url):
+        pragmas = sqlite_pragmas(sqlite_profile)
+        if pragmas:
+            install_sqlite_profile(engine, pragmas)
+    return engine
+
+
+_engines: Dict[str, Engine] = {}
+_session_factories: Dict[int, sessionmaker] = {}
+_writer_locks: Dict[int, threading.Lock] = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(database_url: Optional[str] = None) -> Engine:
+    """
+    Retorna o engine do processo para a URL (cria na primeira chamada)
+
+    Args:
+        database_url: URL do banco (padrão: settings.DATABASE_URL)
+
+    Returns:
+        Engine compartilhado
+    """
+    database_url = database_url or settings.DATABASE_URL
+    engine = _engines.get(database_url)
+    if engine is not None:
+        return engine
+
+    with _engines_lock:
+        engine = _engines.get(database_url)
+        if engine is None:
+            engine = build_engine(database_url)
+            _engines[database_url] = engine
+            logger.info(f"Engine criado para {engine.url.get_backend_name()} ({type(engine.pool).__name__})")
+    return engine
+
+
+def get_session_factory(engine: Optional[Engine] = None) -> sessionmaker:
+    """Retorna a fábrica de sessões do engine (uma por engine)"""
+    engine = engine or get_engine()
+    factory = _session_factories.get(id(engine))
+    if factory is None:
+        with _engines_lock:
+            factory = _session_factories.get(id(engine))
+            if factory is None:
+                # expire_on_commit=False: objetos continuam utilizáveis após o
+                # commit sem um SELECT de recarga a cada acesso
+                factory = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+                _session_factories[id(engine)] = factory
+    return factory
+
+
+def get_session(engine: Optional[Engine] = None) -> Session:
+    """Retorna uma nova sessão do banco de dados"""
+    return get_session_factory(engine)()
+
+
+def get_db() -> Iterator[Session]:
+    """
+    Dependência do FastAPI: uma sessão por requisição
+
+    Uso:
+        @app.get("/rota")
+        async def rota(db: Session = Depends(get_db)): ...
+    """
+    db = get_session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+@contextmanager
+def session_scope(engine: Optional[Engine] = None) -> Iterator[Session]:
+    """
+    Sessão com commit ao final, rollback em caso de erro e fechamento garantido
+
+    Uso:
+        with session_scope() as db:
+            db.add(obj)
+    """
+    db = get_session(engine)
+    try:
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _writer_lock(engine: Engine) -> threading.Lock:
+    lock = _writer_locks.get(id(engine))
+    if lock is None:
+        with _engines_lock:
+            lock = _writer_locks.setdefault(id(engine), threading.Lock())
+    return lock
+
+
+@contextmanager
+def write_session_scope(engine: Optional[Engine] = None) -> Iterator[Session]:
+    """
+    Sessão para transações de escrita curtas
+
+    No SQLite, serializa as escritas do processo num lock local e abre a
+    transação com BEGIN IMMEDIATE; nos outros bancos é igual a session_scope.
+    Não faça chamadas de rede dentro do bloco: o lock de escrita do arquivo
+    fica preso até o commit.
+
+    Uso:
+        with write_session_scope() as db:
+            lead = db.get(Lead, lead_id)
+            lead.status = "finalizado"
+    """
+    engine = engine or get_engine()
+    if engine.url.get_backend_name() != "sqlite":
+        with session_scope(engine) as db:
+            yield db
+        return
+
+    immediate = engine.execution_options(sqlite_begin="IMMEDIATE")
+    with _writer_lock(engine):
+        db = get_session_factory(engine)(bind=immediate)
+        try:
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+def get_pool_status(engine: Optional[Engine] = None) -> Dict:
+    """
+    Estado e métricas do pool de conexões
+
+    Returns:
+        Dicionário com tamanho, conexões em uso, overflow e métricas de espera
+    """
+    engine = engine or get_engine()
+    pool = engine.pool
+    status = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "checked_in": pool.checkedin(),
+        })
+    metrics = getattr(pool, "metrics", None)
+    if metrics is not None:
+        status.update(metrics.snapshot())
+    return status
+
+
+def dispose_engines():
+    """Fecha todos os engines do processo (encerramento e testes)"""
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _session_factories.clear()
+        _writer_locks.clear()
+
+
+# ==================== CAMADA ASSÍNCRONA ====================
+
+# Driver assíncrono de cada dialeto
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def async_database_url(database_url: str) -> str:
+    """
+    Converte a URL do banco para o driver assíncrono do dialeto
+
+    Args:
+        database_url: URL síncrona (sqlite:///..., postgresql://...)
+
+    Returns:
+        URL com aiosqlite ou asyncpg (inalterada se já for assíncrona)
+    """
+    url = make_url(database_url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None or url.drivername == driver:
+        return url.render_as_string(hide_password=False)
+    return url.set(drivername=driver).render_as_string(hide_password=False)
+
+
+def async_engine_options(database_url: str) -> Dict:
+    """Opções do create_async_engine, equivalentes às de engine_options"""
+    url = make_url(database_url)
+
+    if url.get_backend_name() == "sqlite":
+        if _is_memory_sqlite(url):
+            return {"poolclass": StaticPool}
+        return {
+            "poolclass": TimedAsyncQueuePool,
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_pre_ping": False,
+        }
+
+    options = {
+        "poolclass": TimedAsyncQueuePool,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+    if url.get_backend_name() == "postgresql":
+        options["connect_args"] = {"timeout": 10, "server_settings": {"application_name": "crmseguroja"}}
+    return options
+
+
+def build_async_engine(database_url: str, sqlite_profile: Optional[str] = None) -> AsyncEngine:
+    """
+    Cria um AsyncEngine novo (use get_async_engine na aplicação)
+
+    Args:
+        database_url: URL do banco (síncrona ou já assíncrona)
+        sqlite_profile: Perfil de PRAGMAs para SQLite em arquivo
+    """
+    database_url = async_database_url(database_url)
+    engine = create_async_engine(database_url, **async_engine_options(database_url))
+    url = engine.url
+    if url.get_backend_name() == "sqlite" and not _is_memory_sqlite(url):
+        pragmas = sqlite_pragmas(sqlite_profile)
+        if pragmas:
+            # Os eventos ficam no engine síncrono por baixo do AsyncEngine
+            install_sqlite_profile(engine.sync_engine, pragmas)
+    return engine
+
+
+_async_engines: Dict[str, AsyncEngine] = {}
+_async_session_factories: Dict[int, async_sessionmaker] = {}
+
+
+def get_async_engine(database_url: Optional[str] = None) -> AsyncEngine:
+    """
+    Retorna o AsyncEngine do processo para a URL (cria na primeira chamada)
+
+    Args:
+        database_url: URL do banco (padrão: settings.DATABASE_URL)
+    """
+    database_url = database_url or settings.DATABASE_URL
+    engine = _async_engines.get(database_url)
+    if engine is not None:
+        return engine
+
+    with _engines_lock:
+        engine = _async_engines.get(database_url)
+        if engine is None:
+            engine = build_async_engine(database_url)
+            _async_engines[database_url] = engine
+            logger.info(f"AsyncEngine criado para {engine.url.get_backend_name()} ({engine.url.drivername})")
+    return engine
+
+
+def get_async_session_factory(engine: Optional[AsyncEngine] = None) -> async_sessionmaker:
+    """Retorna a fábrica de AsyncSession do engine (uma por engine)"""
+    engine = engine or get_async_engine()
+    factory = _async_session_factories.get(id(engine))
+    if factory is None:
+        with _engines_lock:
+            factory = _async_session_factories.get(id(engine))
+            if factory is None:
+                factory = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+                _async_session_factories[id(engine)] = factory
+    return factory
+
+
+def get_async_session(engine: Optional[AsyncEngine] = None, write: bool = False) -> AsyncSession:
+    """
+    Retorna uma nova AsyncSession
+
+    Args:
+        engine: AsyncEngine (padrão: o do processo)
+        write: No SQLite, abre cada transação com BEGIN IMMEDIATE, para que
+            duas corrotinas que leem e depois gravam não falhem com
+            "database is locked" no meio; a espera pelo lock (busy_timeout)
+            acontece na thread do driver, sem travar o event loop
+    """
+    engine = engine or get_async_engine()
+    factory = get_async_session_factory(engine)
+    if write and engine.url.get_backend_name() == "sqlite":
+        return factory(bind=engine.execution_options(sqlite_begin="IMMEDIATE"))
+    return factory()
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """
+    Dependência do FastAPI: uma AsyncSession por requisição
+
+    Uso:
+        @app.get("/rota")
+        async def rota(db: AsyncSession = Depends(get_async_db)): ...
+    """
+    async with get_async_session() as db:
+        yield db
+
+
+async def get_async_write_db() -> AsyncIterator[AsyncSession]:
+    """Dependência do FastAPI para rotas que leem e gravam (write=True)"""
+    async with get_async_session(write=True) as db:
+        yield db
+
+
+@asynccontextmanager
+async def async_session_scope(engine: Optional[AsyncEngine] = None, write: bool = False) -> AsyncIterator[AsyncSession]:
+    """
+    Mesmo comportamento de session_scope com AsyncSession
+
+    Uso:
+        async with async_session_scope(write=True) as db:
+            db.add(obj)
+    """
+    db = get_async_session(engine, write=write)
+    try:
+        yield db
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
+
+
+async def dispose_async_engines():
+    """Fecha todos os AsyncEngines do processo (encerramento e testes)"""
+    engines = list(_async_engines.values())
+    with _engines_lock:
+        _async_engines.clear()
+        _async_session_factories.clear()
+    for engine in engines:
+        await engine.dispose()
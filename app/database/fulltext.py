@@ -0,0 +1,177 @@
+"""
+Índices de busca textual em mensagens e leads
+
+SQLite: tabelas FTS5 com tokenizador unicode61 sem acentos, mantidas por
+triggers — qualquer processo que grave (webhook, dashboard, retenção) mantém
+o índice em dia. chat_messages_fts é de conteúdo externo; leads_fts guarda o
+próprio texto, juntando as colunas do lead e os valores de lead_attributes
+(uma linha por lead, rowid = leads.id).
+
+Postgres: índices GIN sobre to_tsvector('simple', ...) de leads, de
+lead_attributes e de chat_messages, atualizados pelo banco. A função
+crm_search_text normaliza o texto (minúsculas e, com a extensão unaccent,
+sem acentos).
+"""
+import logging
+from typing import List
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# Campos dos leads que entram na busca (além dos valores de lead_attributes)
+LEAD_SEARCH_COLUMNS = ("whatsapp_number", "name", "email", "cpf_cnpj", "interest", "necessity")
+
+SQLITE_TOKENIZER = "unicode61 remove_diacritics 2"
+
+
+def _sqlite_fts_ddl(table: str, columns) -> List[str]:
+    fts = f"{table}_fts"
+    cols = ", ".join(columns)
+    new = ", ".join(f"new.{column}" for column in columns)
+    old = ", ".join(f"old.{column}" for column in columns)
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{cols}, content='{table}', content_rowid='id', tokenize='{SQLITE_TOKENIZER}')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END",
+    ]
+
+
+def _attribute_text_sql(lead_id: str) -> str:
+    """Valores de texto dos atributos de fluxo do lead, separados por espaço (sem as chaves do JSON)"""
+    return (
+        "(SELECT group_concat(item.value, ' ') FROM lead_attributes attrs, json_each(attrs.data) item "
+        f"WHERE attrs.lead_id = {lead_id} AND item.type = 'text')"
+    )
+
+
+# Colunas de leads_fts, na ordem da tabela
+LEAD_FTS_COLUMNS = LEAD_SEARCH_COLUMNS + ("attributes",)
+
+
+def _sqlite_lead_fts_ddl() -> List[str]:
+    cols = ", ".join(LEAD_FTS_COLUMNS)
+    new = ", ".join(f"new.{column}" for column in LEAD_SEARCH_COLUMNS)
+    assignments = ", ".join(f"{column} = new.{column}" for column in LEAD_SEARCH_COLUMNS)
+    attributes_text = "(SELECT group_concat(value, ' ') FROM json_each(new.data) WHERE type = 'text')"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS leads_fts USING fts5({cols}, tokenize='{SQLITE_TOKENIZER}')",
+        f"CREATE TRIGGER IF NOT EXISTS leads_fts_ai AFTER INSERT ON leads BEGIN "
+        f"INSERT INTO leads_fts(rowid, {cols}) VALUES (new.id, {new}, {_attribute_text_sql('new.id')}); END",
+        "CREATE TRIGGER IF NOT EXISTS leads_fts_ad AFTER DELETE ON leads BEGIN "
+        "DELETE FROM leads_fts WHERE rowid = old.id; END",
+        # Só reindexa quando um campo da busca muda (o fluxo atualiza o lead a cada mensagem)
+        f"CREATE TRIGGER IF NOT EXISTS leads_fts_au AFTER UPDATE OF {', '.join(LEAD_SEARCH_COLUMNS)} ON leads BEGIN "
+        f"UPDATE leads_fts SET {assignments} WHERE rowid = new.id; END",
+        f"CREATE TRIGGER IF NOT EXISTS lead_attributes_fts_ai AFTER INSERT ON lead_attributes BEGIN "
+        f"UPDATE leads_fts SET attributes = {attributes_text} WHERE rowid = new.lead_id; END",
+        f"CREATE TRIGGER IF NOT EXISTS lead_attributes_fts_au AFTER UPDATE OF data ON lead_attributes BEGIN "
+        f"UPDATE leads_fts SET attributes = {attributes_text} WHERE rowid = new.lead_id; END",
+        "CREATE TRIGGER IF NOT EXISTS lead_attributes_fts_ad AFTER DELETE ON lead_attributes BEGIN "
+        "UPDATE leads_fts SET attributes = NULL WHERE rowid = old.lead_id; END",
+    ]
+
+
+def _sqlite_lead_fts_rebuild() -> List[str]:
+    cols = ", ".join(LEAD_FTS_COLUMNS)
+    values = ", ".join(f"l.{column}" for column in LEAD_SEARCH_COLUMNS)
+    return [
+        "DELETE FROM leads_fts",
+        f"INSERT INTO leads_fts(rowid, {cols}) SELECT l.id, {values}, {_attribute_text_sql('l.id')} FROM leads l",
+    ]
+
+
+def lead_document_sql(prefix: str = "") -> str:
+    """Texto de busca do lead no Postgres (expressão imutável, usada no índice e nas consultas)"""
+    return " || ' ' || ".join(f"coalesce({prefix}{column}, '')" for column in LEAD_SEARCH_COLUMNS)
+
+
+def attribute_document_sql(prefix: str = "") -> str:
+    """Texto de busca dos atributos de fluxo no Postgres (o JSON inteiro de lead_attributes.data)"""
+    return f"coalesce({prefix}data::text, '')"
+
+
+def _sqlite_columns(conn, name: str) -> tuple:
+    return tuple(row[1] for row in conn.execute(text(f"PRAGMA table_info({name})")))
+
+
+def _ensure_sqlite(conn) -> List[str]:
+    created = []
+    fts_tables = (
+        ("chat_messages_fts", ("message",), _sqlite_fts_ddl("chat_messages", ("message",)),
+         ["INSERT INTO chat_messages_fts(chat_messages_fts) VALUES ('rebuild')"]),
+        ("leads_fts", LEAD_FTS_COLUMNS, _sqlite_lead_fts_ddl(), _sqlite_lead_fts_rebuild()),
+    )
+    for fts, columns, ddl, rebuild in fts_tables:
+        existing = _sqlite_columns(conn, fts)
+        if existing and existing != columns:
+            # Definição anterior (ex.: leads_fts com as colunas de fluxo em leads)
+            triggers = conn.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'trigger' AND sql LIKE :pattern"),
+                {"pattern": f"%{fts}%"}
+            ).scalars().all()
+            for trigger in triggers:
+                conn.execute(text(f"DROP TRIGGER {trigger}"))
+            conn.execute(text(f"DROP TABLE {fts}"))
+            existing = ()
+        for statement in ddl:
+            conn.execute(text(statement))
+        if not existing:
+            # Banco existente: indexa o que já está na tabela (uma vez)
+            for statement in rebuild:
+                conn.execute(text(statement))
+            created.append(fts)
+    return created
+
+
+def _ensure_postgres(conn) -> List[str]:
+    has_unaccent = conn.execute(
+        text("SELECT 1 FROM pg_available_extensions WHERE name = 'unaccent'")
+    ).first() is not None
+    if has_unaccent:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS unaccent"))
+        body = "SELECT lower(public.unaccent('public.unaccent', $1))"
+    else:
+        body = "SELECT lower($1)"
+    conn.execute(text(
+        f"CREATE OR REPLACE FUNCTION crm_search_text(text) RETURNS text "
+        f"LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$ {body} $$"
+    ))
+    # Índice anterior de leads, que incluía as colunas de fluxo
+    conn.execute(text("DROP INDEX IF EXISTS ix_leads_fts"))
+    created = []
+    for name, table, document in (
+        ("ix_chat_messages_fts", "chat_messages", "coalesce(message, '')"),
+        ("ix_leads_search", "leads", lead_document_sql()),
+        ("ix_lead_attributes_search", "lead_attributes", attribute_document_sql()),
+    ):
+        exists = conn.execute(text("SELECT 1 FROM pg_indexes WHERE indexname = :name"), {"name": name}).first()
+        if exists:
+            continue
+        conn.execute(text(
+            f"CREATE INDEX {name} ON {table} USING GIN (to_tsvector('simple', crm_search_text({document})))"
+        ))
+        created.append(name)
+    return created
+
+
+def ensure_search_index(engine) -> List[str]:
+    """
+    Cria os índices de busca que ainda não existem (e indexa os dados já gravados)
+
+    Returns:
+        Nomes dos índices criados
+    """
+    dialect = engine.url.get_backend_name()
+    if dialect not in ("sqlite", "postgresql"):
+        return []
+    with engine.begin() as conn:
+        created = _ensure_sqlite(conn) if dialect == "sqlite" else _ensure_postgres(conn)
+    if created:
+        logger.info(f"🔎 Índices de busca criados: {', '.join(created)}")
+    return created
@@ -2,20 +2,34 @@
 Modelos de Banco de Dados para o Sistema CRM
 """
 from datetime import datetime
-from typing import Optional
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, Float
+from typing import Any, List, Optional
+from sqlalchemy import (
+    JSON, Column, Integer, String, Text, DateTime, Boolean, Float, Index, bindparam, column, event, inspect, or_, select,
+    table, text,
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import relationship
+from app.core.utils import canonical_whatsapp_number, normalize_cpf_cnpj, normalize_email, normalize_plate
+from app.database import connection
+from app.database.fulltext import ensure_search_index
 
 Base = declarative_base()
 
 
+def _canonical_number_default(context) -> Optional[str]:
+    number = context.get_current_parameters().get("whatsapp_number")
+    return canonical_whatsapp_number(number) if number else None
+
+
 class Lead(Base):
     """Modelo para armazenar dados de leads"""
     __tablename__ = "leads"
 
     id = Column(Integer, primary_key=True, index=True)
     whatsapp_number = Column(String(20), unique=True, index=True)
+    # Número canônico (com 55 e nono dígito), usado nas buscas por número;
+    # ver canonical_whatsapp_number
+    canonical_number = Column(String(20), nullable=True, default=_canonical_number_default)
     name = Column(String(150), nullable=True)
     email = Column(String(150), nullable=True)
     second_email = Column(String(150), nullable=True)
@@ -29,25 +43,20 @@ class Lead(Base):
     phone = Column(String(20), nullable=True)
     whatsapp_contact = Column(String(20), nullable=True)
     
-    # Dados Seguro Auto
-    vehicle_plate = Column(String(10), nullable=True)
-    cep_pernoite = Column(String(10), nullable=True)
-    profession = Column(String(150), nullable=True)
-    marital_status = Column(String(50), nullable=True)
-    vehicle_usage = Column(String(50), nullable=True)  # particular, trabalho
-    has_young_driver = Column(Boolean, nullable=True)  # condutor < 26 anos
-    
-    # Dados Seguro Residencial
-    property_cep = Column(String(10), nullable=True)
-    property_type = Column(String(100), nullable=True)
-    property_value = Column(String(100), nullable=True)
-    property_ownership = Column(String(50), nullable=True)  # proprio, alugado
+    # Identificação do cliente: chaves normalizadas de cpf_cnpj e email
+    # (mantidas em _set_identity_keys) e o lead mais antigo da mesma pessoa
+    cpf_cnpj_key = Column(String(14), nullable=True)
+    email_key = Column(String(150), nullable=True)
+    linked_lead_id = Column(Integer, nullable=True)
     
-    # Dados Consórcio
-    consortium_type = Column(String(50), nullable=True)  # auto, imovel, servico
-    consortium_value = Column(String(100), nullable=True)
-    consortium_term = Column(String(50), nullable=True)  # prazo em meses
-    has_previous_consortium = Column(Boolean, nullable=True)
+    # Dados específicos de cada fluxo (auto, residencial, consórcio) ficam em
+    # lead_attributes e são lidos sob demanda; ver LEAD_ATTRIBUTES
+    attribute_record = relationship(
+        "LeadAttributes",
+        primaryjoin="Lead.id == foreign(LeadAttributes.lead_id)",
+        uselist=False,
+        cascade="all, delete-orphan",
+    )
     
     # Campos legados (manter compatibilidade)
     interest = Column(Text, nullable=True)
@@ -61,6 +70,139 @@ class Lead(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     qualified_at = Column(DateTime, nullable=True)
     attended_by = Column(String(150), nullable=True)  # Nome do atendente que assumiu
+    # Controle de concorrência otimista: todo UPDATE confere e incrementa a
+    # versão (StaleDataError se outro processo gravou antes); também invalida
+    # o cache de estado do lead
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __table_args__ = (
+        # Listagens do dashboard e da API por status, ordenadas por data
+        Index("ix_leads_status_created_at", "status", "created_at"),
+        Index("ix_leads_status_qualified_at", "status", "qualified_at"),
+        # Paginação por cursor (created_at, id) da listagem sem filtro
+        Index("ix_leads_created_at_id", "created_at", "id"),
+        # Cliente já conhecido: busca por documento e e-mail (inclusive leads
+        # vindos por e-mail) e leads ligados à mesma pessoa
+        Index("ix_leads_cpf_cnpj_key", "cpf_cnpj_key"),
+        Index("ix_leads_email_key", "email_key"),
+        Index("ix_leads_linked_lead_id", "linked_lead_id"),
+        # Filtro por tipo de cliente no dashboard
+        Index("ix_leads_customer_type_created_at", "customer_type", "created_at"),
+        # Busca pelo número canônico e conferência da versão do lead em
+        # cache só pelo índice
+        Index("ix_leads_canonical_number_version", "canonical_number", "version"),
+    )
+
+    __mapper_args__ = {"version_id_col": version}
+
+
+# Atributos de cada fluxo, guardados em lead_attributes.data (nome -> tipo)
+LEAD_ATTRIBUTES = {
+    # Seguro Auto
+    "vehicle_plate": str,
+    "cep_pernoite": str,
+    "profession": str,
+    "marital_status": str,
+    "vehicle_usage": str,  # particular, trabalho
+    "has_young_driver": bool,  # condutor < 26 anos
+    # Seguro Residencial
+    "property_cep": str,
+    "property_type": str,
+    "property_value": str,
+    "property_ownership": str,  # proprio, alugado
+    # Consórcio
+    "consortium_type": str,  # auto, imovel, servico
+    "consortium_value": str,
+    "consortium_term": str,  # prazo em meses
+    "has_previous_consortium": bool,
+}
+
+_TRUE_VALUES = ("true", "sim", "s", "yes", "1")
+_FALSE_VALUES = ("false", "nao", "não", "n", "no", "0")
+
+
+def coerce_attribute(name: str, value: Any) -> Any:
+    """
+    Converte o valor para o tipo declarado do atributo
+
+    Raises:
+        KeyError: Atributo não declarado em LEAD_ATTRIBUTES
+        ValueError: Valor que não representa o tipo (ex.: "talvez" num booleano)
+    """
+    kind = LEAD_ATTRIBUTES[name]
+    if value is None:
+        return None
+    if kind is bool:
+        if isinstance(value, (bool, int)):
+            return bool(value)
+        normalized = str(value).strip().lower()
+        if normalized in _TRUE_VALUES:
+            return True
+        if normalized in _FALSE_VALUES:
+            return False
+        raise ValueError(f"Valor inválido para {name}: {value!r}")
+    return str(value)
+
+
+class LeadAttributes(Base):
+    """Modelo para os dados específicos de fluxo de um lead (um registro por lead)"""
+    __tablename__ = "lead_attributes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    lead_id = Column(Integer, unique=True, index=True)
+    data = Column(JSON, nullable=False, default=dict)  # {atributo: valor}, ver LEAD_ATTRIBUTES
+    # Placa normalizada (data["vehicle_plate"]), para achar o cliente pela placa
+    plate_key = Column(String(10), nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_lead_attributes_plate_key", "plate_key"),
+    )
+
+
+def _attribute_property(name: str) -> property:
+    """Acesso a um atributo de fluxo como se fosse coluna do lead"""
+
+    def getter(lead):
+        record = lead.attribute_record
+        return record.data.get(name) if record is not None else None
+
+    def setter(lead, value):
+        value = coerce_attribute(name, value)
+        record = lead.attribute_record
+        data = dict(record.data) if record is not None else {}
+        if data.get(name) == value:
+            return
+        if value is None:
+            data.pop(name, None)
+        else:
+            data[name] = value
+        if record is None:
+            lead.attribute_record = LeadAttributes(data=data)
+        else:
+            record.data = data
+        # Grava também a linha do lead: a versão sobe junto (cache e concorrência)
+        lead.updated_at = datetime.utcnow()
+
+    return property(getter, setter, doc=f"Atributo de fluxo {name} (lead_attributes)")
+
+
+for _name in LEAD_ATTRIBUTES:
+    setattr(Lead, _name, _attribute_property(_name))
+
+
+@event.listens_for(Lead, "before_insert")
+@event.listens_for(Lead, "before_update")
+def _set_identity_keys(mapper, connection, lead):
+    """Recalcula as chaves de busca do lead a cada INSERT/UPDATE pelo ORM"""
+    lead.cpf_cnpj_key = normalize_cpf_cnpj(lead.cpf_cnpj)
+    lead.email_key = normalize_email(lead.email)
+
+
+@event.listens_for(LeadAttributes, "before_insert")
+@event.listens_for(LeadAttributes, "before_update")
+def _set_plate_key(mapper, connection, record):
+    record.plate_key = normalize_plate((record.data or {}).get("vehicle_plate"))
 
 
 class ChatMessage(Base):
@@ -68,13 +210,40 @@ class ChatMessage(Base):
     __tablename__ = "chat_messages"
 
     id = Column(Integer, primary_key=True, index=True)
-    lead_id = Column(Integer, index=True)
-    whatsapp_number = Column(String(20), index=True)
+    lead_id = Column(Integer)
+    whatsapp_number = Column(String(20))
     sender = Column(String(20))  # "user" ou "ai"
     message = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow, index=True)
     role = Column(String(20), default="assistant")  # Para integração com Claude
 
+    __table_args__ = (
+        # Histórico da conversa (últimas N mensagens do número) e mensagens do
+        # lead em ordem; também atendem os filtros só por número ou por lead
+        Index("ix_chat_messages_number_created_at", "whatsapp_number", "created_at"),
+        Index("ix_chat_messages_lead_created_at", "lead_id", "created_at"),
+    )
+
+
+class MessageArchiveSegment(Base):
+    """Índice das mensagens arquivadas: onde ficam as de cada lead nos arquivos de segmento"""
+    __tablename__ = "message_archive_segments"
+
+    id = Column(Integer, primary_key=True, index=True)
+    lead_id = Column(Integer)
+    whatsapp_number = Column(String(20))
+    segment = Column(String(50))  # arquivo do mês, ex.: "2024-05.jsonl.gz"
+    byte_offset = Column(Integer)  # início do trecho gzip do lead no arquivo
+    byte_length = Column(Integer)
+    message_count = Column(Integer)
+    first_message_at = Column(DateTime)
+    last_message_at = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_message_archive_segments_lead_first", "lead_id", "first_message_at"),
+    )
+
 
 class QualificationField(Base):
     """Modelo para rastrear quais campos foram coletados"""
@@ -104,17 +273,331 @@ class NotificationLog(Base):
     error_message = Column(Text, nullable=True)
 
 
-def init_db(database_url: str = "sqlite:///./crm_system.db"):
-    """Inicializa o banco de dados"""
-    engine = create_engine(
-        database_url,
-        connect_args={"check_same_thread": False} if "sqlite" in database_url else {}
+class LeadEvent(Base):
+    """
+    Modelo do registro de eventos dos leads (só inserção)
+
+    O id é a sequência lida pelos consumidores ("eventos depois de N"); com
+    AUTOINCREMENT no SQLite um id nunca é reaproveitado, mesmo depois de
+    apagar os últimos eventos.
+    """
+    __tablename__ = "lead_events"
+
+    id = Column(Integer, primary_key=True)
+    lead_id = Column(Integer)
+    whatsapp_number = Column(String(20), nullable=True)
+    event_type = Column(String(30))  # created, flow_step, status, merged, deleted
+    from_value = Column(String(50), nullable=True)
+    to_value = Column(String(50), nullable=True)
+    data = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # Eventos de um lead em ordem
+        Index("ix_lead_events_lead_id_id", "lead_id", "id"),
+        {"sqlite_autoincrement": True},
     )
+
+
+def lead_event_insert(
+    lead_id: int,
+    whatsapp_number: Optional[str],
+    event_type: str,
+    from_value: Any = None,
+    to_value: Any = None,
+    data: Optional[dict] = None
+):
+    """INSERT de um evento do lead, para rodar na mesma transação da mudança"""
+    return LeadEvent.__table__.insert().values(
+        lead_id=lead_id,
+        whatsapp_number=whatsapp_number,
+        event_type=event_type,
+        from_value=None if from_value is None else str(from_value),
+        to_value=None if to_value is None else str(to_value),
+        data=data,
+        created_at=datetime.utcnow(),
+    )
+
+
+# Colunas do lead cujas mudanças viram eventos (coluna -> tipo do evento)
+LEAD_EVENT_COLUMNS = {"flow_step": "flow_step", "status": "status"}
+
+
+@event.listens_for(Lead, "after_insert")
+def _record_lead_created(mapper, connection, lead):
+    connection.execute(lead_event_insert(
+        lead.id, lead.whatsapp_number, "created", to_value=lead.status,
+        data={"customer_type": lead.customer_type, "flow_step": lead.flow_step},
+    ))
+
+
+@event.listens_for(Lead, "after_update")
+def _record_lead_changes(mapper, connection, lead):
+    """Grava um evento por coluna de LEAD_EVENT_COLUMNS alterada neste UPDATE"""
+    state = inspect(lead)
+    for name, event_type in LEAD_EVENT_COLUMNS.items():
+        history = state.attrs[name].history
+        if not history.added or history.added[0] == (history.deleted[0] if history.deleted else None):
+            continue
+        data = {"attended_by": lead.attended_by} if name == "status" and lead.attended_by else None
+        connection.execute(lead_event_insert(
+            lead.id, lead.whatsapp_number, event_type,
+            from_value=history.deleted[0] if history.deleted else None,
+            to_value=history.added[0], data=data,
+        ))
+
+
+@event.listens_for(Lead, "after_delete")
+def _record_lead_deleted(mapper, connection, lead):
+    connection.execute(lead_event_insert(lead.id, None, "deleted"))
+
+
+class FaqEntry(Base):
+    """Modelo para respostas aprovadas de perguntas frequentes"""
+    __tablename__ = "faq_entries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    question = Column(Text)  # uma variação de pergunta por linha
+    answer = Column(Text)
+    active = Column(Boolean, default=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+def ensure_columns(engine) -> List[str]:
+    """
+    Adiciona às tabelas existentes as colunas declaradas que ainda não existem
+
+    Só colunas que aceitam nulo ou têm server_default podem ser adicionadas
+    assim; as demais precisam de migração manual.
+
+    Returns:
+        Colunas adicionadas ("tabela.coluna")
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                if not column.nullable and column.server_default is None:
+                    raise RuntimeError(f"Coluna {table.name}.{column.name} exige migração manual")
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+                if column.server_default is not None:
+                    ddl += f" DEFAULT {column.server_default.arg}"
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                conn.execute(text(ddl))
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+
+def _index_names(engine, inspector, table_name: str) -> set:
+    """Índices da tabela; no SQLite lidos do sqlite_master (a reflexão ignora índices por expressão)"""
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            return set(conn.execute(
+                text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table"),
+                {"table": table_name}
+            ).scalars())
+    return {index["name"] for index in inspector.get_indexes(table_name)}
+
+
+# Índices substituídos por outros (apagados de bancos já existentes)
+OBSOLETE_INDEXES = ("ix_leads_email", "ix_leads_number_version", "ix_lead_attributes_vehicle_plate")
+
+
+def ensure_indexes(engine) -> List[str]:
+    """
+    Cria os índices declarados nos modelos que ainda não existem no banco
+
+    O create_all só cria índices junto com tabelas novas; bancos já
+    existentes recebem os índices novos por aqui e perdem os de
+    OBSOLETE_INDEXES.
+
+    Returns:
+        Nomes dos índices criados
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = _index_names(engine, inspector, table.name)
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+                created.append(index.name)
+        obsolete = existing & set(OBSOLETE_INDEXES)
+        if obsolete:
+            with engine.begin() as conn:
+                for name in sorted(obsolete):
+                    conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    return created
+
+
+def legacy_attribute_columns(engine) -> List[str]:
+    """Atributos de fluxo que ainda existem como colunas em leads (bancos anteriores a lead_attributes)"""
+    existing = {column["name"] for column in inspect(engine).get_columns("leads")}
+    return [name for name in LEAD_ATTRIBUTES if name in existing]
+
+
+def migrate_lead_attributes(engine, chunk_size: int = 1000) -> int:
+    """
+    Copia para lead_attributes os atributos guardados nas colunas antigas de leads
+
+    Só copia leads que ainda não têm registro em lead_attributes, então pode
+    rodar a cada inicialização; as colunas antigas ficam no banco até
+    `python migrate_database.py --drop-legacy-columns`.
+
+    Returns:
+        Quantidade de leads copiados
+    """
+    legacy = legacy_attribute_columns(engine)
+    if not legacy:
+        return 0
+    leads = table("leads", column("id"), *[column(name) for name in legacy])
+    attributes = LeadAttributes.__table__
+    copied = 0
+    after_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(leads)
+                .where(leads.c.id > after_id)
+                .where(or_(*[leads.c[name].isnot(None) for name in legacy]))
+                .where(leads.c.id.notin_(select(attributes.c.lead_id)))
+                .order_by(leads.c.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                return copied
+            conn.execute(attributes.insert(), [
+                {
+                    "lead_id": row.id,
+                    "data": {
+                        name: coerce_attribute(name, getattr(row, name))
+                        for name in legacy if getattr(row, name) is not None
+                    },
+                    "updated_at": datetime.utcnow(),
+                }
+                for row in rows
+            ])
+        copied += len(rows)
+        after_id = rows[-1].id
+
+
+def backfill_canonical_numbers(engine, chunk_size: int = 1000) -> int:
+    """
+    Preenche leads.canonical_number onde ainda está vazio (bancos anteriores à
+    coluna) e recalcula os que receberam o 55 sem o número começar com 55
+    (regra antiga, que transformava números de outros países em brasileiros),
+    em lotes por id
+
+    Returns:
+        Quantidade de leads atualizados
+    """
+    leads = Lead.__table__
+    pending = or_(
+        leads.c.canonical_number.is_(None),
+        leads.c.canonical_number.like("55%")
+        & ~leads.c.whatsapp_number.like("55%") & ~leads.c.whatsapp_number.like("+55%"),
+    )
+    updated = 0
+    after_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(leads.c.id, leads.c.whatsapp_number, leads.c.canonical_number)
+                .where(leads.c.id > after_id, leads.c.whatsapp_number.isnot(None), pending)
+                .order_by(leads.c.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                return updated
+            values = []
+            for row in rows:
+                canonical = canonical_whatsapp_number(row.whatsapp_number)
+                if canonical != row.canonical_number:
+                    values.append({"lead_id": row.id, "canonical": canonical})
+            if values:
+                conn.execute(
+                    leads.update().where(leads.c.id == bindparam("lead_id"))
+                    .values(canonical_number=bindparam("canonical")),
+                    values
+                )
+        updated += len(values)
+        after_id = rows[-1].id
+
+
+def backfill_identity_keys(engine, chunk_size: int = 1000) -> int:
+    """
+    Preenche as chaves de CPF/CNPJ, e-mail e placa onde ainda estão vazias
+    (bancos anteriores às colunas), em lotes por id
+
+    Valores que não normalizam (CPF inválido, por exemplo) continuam sem
+    chave e são relidos na próxima inicialização.
+
+    Returns:
+        Quantidade de linhas atualizadas
+    """
+    leads = Lead.__table__
+    attributes = LeadAttributes.__table__
+    plate = attributes.c.data["vehicle_plate"].as_string()
+    passes = (
+        (leads, (leads.c.cpf_cnpj, leads.c.email),
+         or_(leads.c.cpf_cnpj_key.is_(None) & leads.c.cpf_cnpj.isnot(None),
+             leads.c.email_key.is_(None) & leads.c.email.isnot(None)),
+         lambda row: {"cpf_cnpj_key": normalize_cpf_cnpj(row[1]), "email_key": normalize_email(row[2])}),
+        (attributes, (plate,),
+         attributes.c.plate_key.is_(None) & plate.isnot(None),
+         lambda row: {"plate_key": normalize_plate(row[1])}),
+    )
+    updated = 0
+    for source, columns, pending, keys in passes:
+        after_id = 0
+        while True:
+            with engine.begin() as conn:
+                rows = conn.execute(
+                    select(source.c.id, *columns)
+                    .where(source.c.id > after_id, pending)
+                    .order_by(source.c.id)
+                    .limit(chunk_size)
+                ).all()
+                if not rows:
+                    break
+                values = [{"row_id": row[0], **keys(row)} for row in rows]
+                values = [value for value in values if any(value[key] for key in value if key != "row_id")]
+                if values:
+                    conn.execute(
+                        source.update().where(source.c.id == bindparam("row_id"))
+                        .values({key: bindparam(key) for key in values[0] if key != "row_id"}),
+                        values
+                    )
+            updated += len(values)
+            after_id = rows[-1][0]
+    return updated
+
+
+def init_db(database_url: str = "sqlite:///./crm_system.db"):
+    """Inicializa o banco de dados (engine compartilhado do processo + tabelas, colunas, índices, dados migrados e busca)"""
+    engine = connection.get_engine(database_url)
     Base.metadata.create_all(bind=engine)
+    ensure_columns(engine)
+    ensure_indexes(engine)
+    migrate_lead_attributes(engine)
+    backfill_canonical_numbers(engine)
+    backfill_identity_keys(engine)
+    ensure_search_index(engine)
     return engine
 
 
-def get_session(engine):
+def get_session(engine=None):
     """Retorna uma sessão do banco de dados"""
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    return SessionLocal()
+    return connection.get_session(engine)
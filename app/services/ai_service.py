@@ -2,10 +2,15 @@
 Serviço de integração com OpenAI API
 """
 import json
-from typing import List, Dict
+from typing import List, Dict, Optional
 from openai import OpenAI
 from config.settings import settings
 from app.core.prompts import get_system_prompt
+from app.services.faq_service import get_faq_index
+from app.services.llm_cassette import get_cassette
+
+# Etapas em que o índice de perguntas frequentes pode responder no lugar da IA
+FAQ_FLOW_STEPS = ("menu_principal", "outros_assuntos")
 
 
 class AIService:
@@ -13,11 +18,21 @@ class AIService:
     
     def __init__(self):
         try:
-            self.client = OpenAI(
-                api_key=settings.OPENAI_API_KEY,
-                timeout=15.0,  # Reduzido de 30s para 15s
-                max_retries=1  # Reduzido de 2 para 1
-            )
+            if settings.LLM_CASSETTE_MODE == "replay":
+                # Reprodução offline: não precisa de chave nem de rede
+                client = None
+            else:
+                client = OpenAI(
+                    api_key=settings.OPENAI_API_KEY,
+                    base_url=settings.OPENAI_BASE_URL,
+                    timeout=15.0,  # Reduzido de 30s para 15s
+                    max_retries=1  # Reduzido de 2 para 1
+                )
+            
+            if settings.LLM_CASSETTE_MODE:
+                client = get_cassette(client, settings.LLM_CASSETTE_PATH, settings.LLM_CASSETTE_MODE)
+            
+            self.client = client
             self.model = settings.OPENAI_MODEL
         except Exception as e:
             raise Exception(f"Erro ao inicializar OpenAI: {str(e)}")
@@ -41,6 +56,14 @@ class AIService:
         Returns:
             Resposta da IA
         """
+        # Perguntas frequentes com resposta aprovada não precisam da IA; só no
+        # menu e em outros assuntos, sem campos a coletar (no meio de um fluxo a
+        # resposta do FAQ tomaria o lugar da pergunta pelo próximo campo)
+        if flow_step in FAQ_FLOW_STEPS and not missing_fields:
+            cached_answer = self.get_faq_answer(user_message)
+            if cached_answer:
+                return cached_answer
+        
         try:
             # Formata o histórico para OpenAI
             messages = [
@@ -73,6 +96,31 @@ class AIService:
             print(f"Erro ao chamar OpenAI API: {str(e)}")
             return "Desculpe, houve um erro ao processar sua mensagem. Por favor, tente novamente."
     
+    def get_faq_answer(self, user_message: str) -> Optional[str]:
+        """
+        Busca resposta aprovada no índice de perguntas frequentes
+        
+        Args:
+            user_message: Mensagem do usuário
+        
+        Returns:
+            Resposta aprovada ou None se não houver pergunta parecida o suficiente
+        """
+        if not settings.FAQ_CACHE_ENABLED:
+            return None
+        
+        index = get_faq_index()
+        if index is None:
+            return None
+        
+        match = index.lookup(user_message, settings.FAQ_SIMILARITY_THRESHOLD)
+        if not match:
+            return None
+        
+        answer, score, entry_id = match
+        print(f"[FAQ] Resposta do cache (entrada {entry_id}, similaridade {score:.2f})")
+        return answer
+    
     def extract_qualification_data(
         self,
         conversation_history: List[Dict]
@@ -0,0 +1,548 @@
+"""
+Serviço de banco de dados assíncrono - CRUD operations com AsyncSession
+
+Mesma interface de database_service, com métodos `async` para uso no
+webhook e nas rotas da API sem travar o event loop durante as consultas.
+"""
+import asyncio
+from typing import Optional, List, Sequence, Tuple
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, selectinload
+from app.database.models import Lead, ChatMessage, QualificationField
+from app.services.database_service import (
+    LeadService, identity_keys, identity_statements, lead_number_filter, link_customer, merge_lead_changes,
+    transition_event, transition_statement,
+)
+from app.services.lead_cache import lead_cache
+from app.services.conversation_buffer import conversation_buffer, record_message
+from app.services.lead_stats import lead_stats_cache, status_counts_query, summarize
+from app.services.pagination import decode_cursor, keyset_page, next_cursor
+from app.services.message_archive import read_segments, segments_query
+from app.services.search import format_hits, search_params, search_statements
+from app.services.lead_events import events_page, events_statement
+
+# Campos das mensagens retornadas por get_lead_messages_page
+MESSAGE_PAGE_FIELDS = ("id", "lead_id", "sender", "message", "created_at")
+
+
+class AsyncLeadService:
+    """Serviço assíncrono para operações com leads"""
+
+    build_lead_dict = staticmethod(LeadService.build_lead_dict)
+
+    @staticmethod
+    async def get_lead_by_number(
+        db: AsyncSession,
+        whatsapp_number: str,
+        with_attributes: bool = False
+    ) -> Optional[Lead]:
+        """
+        Busca lead por número WhatsApp
+
+        Args:
+            db: Sessão assíncrona do banco de dados
+            whatsapp_number: Número WhatsApp
+            with_attributes: Carrega junto os atributos de fluxo (numa sessão
+                assíncrona não há carga sob demanda)
+        """
+        query = (
+            select(Lead).where(lead_number_filter(whatsapp_number))
+            .order_by(Lead.updated_at.desc()).limit(1)
+        )
+        if with_attributes:
+            query = query.options(joinedload(Lead.attribute_record))
+        result = await db.execute(query)
+        return result.scalars().first()
+
+    @staticmethod
+    async def find_existing_customer(
+        db: AsyncSession,
+        exclude_id: Optional[int] = None,
+        **keys
+    ) -> Optional[Lead]:
+        """
+        Busca o cliente já conhecido pelo CPF/CNPJ, e-mail ou placa
+
+        Args:
+            db: Sessão assíncrona do banco de dados
+            exclude_id: Lead a ignorar (o da conversa atual)
+            **keys: cpf_cnpj, email e/ou vehicle_plate (com ou sem formatação)
+
+        Returns:
+            Lead mais antigo com a primeira chave encontrada, ou None
+        """
+        for statement in identity_statements(exclude_id=exclude_id, **keys):
+            customer = (await db.scalars(statement)).first()
+            if customer is not None:
+                return customer
+        return None
+
+    @staticmethod
+    async def resolve_customer(db: AsyncSession, lead: Lead, **keys) -> Optional[Lead]:
+        """
+        Liga o lead ao cliente já conhecido com o mesmo CPF/CNPJ, e-mail ou placa
+
+        Sem chaves, usa as do próprio lead (atributos de fluxo já carregados).
+        Só altera o objeto em memória.
+
+        Returns:
+            Cliente encontrado (lead ao qual foi ligado), ou None
+        """
+        customer = await AsyncLeadService.find_existing_customer(
+            db, exclude_id=lead.id, **identity_keys(lead, **keys)
+        )
+        if customer is None or link_customer(lead, customer) is None:
+            return None
+        return customer
+
+    @staticmethod
+    async def get_cached_lead(
+        db: AsyncSession,
+        whatsapp_number: str
+    ) -> Optional[Lead]:
+        """
+        Busca o lead no cache de estado, conferindo a versão no banco
+
+        A conferência lê só leads.id e leads.version pelo índice
+        (canonical_number, version); o lead é montado a partir do cache e
+        anexado à sessão sem carregar a linha.
+
+        Returns:
+            Lead anexado à sessão, ou None se não estiver no cache ou estiver
+            desatualizado
+        """
+        if not lead_cache.enabled:
+            return None
+        state = lead_cache.lookup(whatsapp_number)
+        if state is None:
+            return None
+        row = (await db.execute(
+            select(Lead.id, Lead.version).where(lead_number_filter(whatsapp_number))
+            .order_by(Lead.updated_at.desc()).limit(1)
+        )).first()
+        version = row.version if row is not None and row.id == state.id else None
+        if not lead_cache.validate(state, version):
+            return None
+        lead = state.to_lead()
+        db.add(lead)
+        return lead
+
+    @staticmethod
+    async def get_lead_by_id(
+        db: AsyncSession,
+        lead_id: int
+    ) -> Optional[Lead]:
+        """Busca lead por ID"""
+        return await db.get(Lead, lead_id)
+
+    @staticmethod
+    async def create_or_get_lead(
+        db: AsyncSession,
+        whatsapp_number: str,
+        customer_type: str = "novo",
+        commit: bool = True
+    ) -> Lead:
+        """
+        Cria ou retorna lead existente
+
+        Args:
+            db: Sessão assíncrona do banco de dados
+            whatsapp_number: Número WhatsApp
+            customer_type: "novo" ou "existente"
+            commit: Se False, só faz flush (para obter o id) e deixa o
+                commit para quem controla a transação
+
+        Returns:
+            Objeto Lead
+        """
+        lead = await AsyncLeadService.get_cached_lead(db, whatsapp_number)
+        if lead is None:
+            lead = await AsyncLeadService.get_lead_by_number(db, whatsapp_number, with_attributes=True)
+
+        if not lead:
+            lead = Lead(
+                whatsapp_number=whatsapp_number,
+                customer_type=customer_type,
+                status="novo",
+                attribute_record=None
+            )
+            db.add(lead)
+            if commit:
+                await db.commit()
+                lead_cache.store(lead)
+            else:
+                await db.flush()
+
+        return lead
+
+    @staticmethod
+    async def update_lead(
+        db: AsyncSession,
+        lead: Lead,
+        commit: bool = True,
+        **kwargs
+    ) -> Lead:
+        """
+        Atualiza dados do lead
+
+        Args:
+            db: Sessão assíncrona do banco de dados
+            lead: Objeto Lead
+            commit: Se False, só altera o objeto em memória
+            **kwargs: Campos a atualizar (name, status, etc)
+
+        Returns:
+            Lead atualizado
+        """
+        for key, value in kwargs.items():
+            if hasattr(lead, key):
+                setattr(lead, key, value)
+
+        lead.updated_at = datetime.utcnow()
+        if commit:
+            await db.commit()
+            lead_cache.store(lead)
+        return lead
+
+    @staticmethod
+    async def transition(db: AsyncSession, lead_id: int, transition: Optional[str], **values) -> Optional[dict]:
+        """Muda o status do lead com um UPDATE condicional (ver LeadService.transition)"""
+        row = (await db.execute(transition_statement(lead_id, transition, **values))).first()
+        if row is not None and transition is not None:
+            await db.execute(transition_event(lead_id, row, transition, values))
+        await db.commit()
+        if row is None:
+            return None
+        lead_cache.invalidate(row.whatsapp_number)
+        lead_stats_cache.invalidate()
+        return dict(row._mapping)
+
+    @staticmethod
+    async def reload_and_merge(db: AsyncSession, lead_id: int, changes: dict) -> Lead:
+        """
+        Recarrega o lead do banco e reaplica as alterações pendentes
+
+        Usado depois de um StaleDataError (outro processo gravou o lead
+        entre a leitura e o commit); ver merge_lead_changes.
+
+        Returns:
+            Lead atualizado em memória, pronto para um novo commit
+        """
+        lead = await db.get(
+            Lead, lead_id, populate_existing=True, options=[selectinload(Lead.attribute_record)]
+        )
+        if lead is not None:
+            merge_lead_changes(lead, changes)
+        return lead
+
+    @staticmethod
+    async def mark_qualified(
+        db: AsyncSession,
+        lead: Lead,
+        qualification_score: int = 100,
+        attended_by: str = "IA",
+        commit: bool = True
+    ) -> Lead:
+        """
+        Marca lead como qualificado e desativa IA
+
+        Args:
+            db: Sessão assíncrona do banco de dados
+            lead: Objeto Lead
+            qualification_score: Pontuação de qualificação (padrão: 100)
+            attended_by: Quem qualificou (padrão: "IA")
+            commit: Se False, só altera o objeto em memória
+
+        Returns:
+            Lead atualizado
+        """
+        return await AsyncLeadService.update_lead(
+            db,
+            lead,
+            commit=commit,
+            status="qualificado",
+            status_ia=0,  # Desativa IA
+            qualification_score=qualification_score,
+            qualified_at=datetime.utcnow(),
+            attended_by=attended_by
+        )
+
+    @staticmethod
+    async def list_leads(
+        db: AsyncSession,
+        fields: Sequence[str],
+        status: Optional[str] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None
+    ) -> Tuple[list, Optional[str]]:
+        """
+        Lista leads (mais recentes primeiro), uma página por vez
+
+        Seleciona só as colunas pedidas (além de created_at e id, usadas
+        no cursor), sem montar objetos Lead.
+
+        Args:
+            db: Sessão assíncrona do banco de dados
+            fields: Nomes das colunas de leads a retornar
+            status: Filtra por status (opcional)
+            limit: Tamanho da página
+            cursor: Cursor retornado pela página anterior
+
+        Returns:
+            Tupla (linhas, cursor da próxima página ou None)
+
+        Raises:
+            InvalidCursorError: Se o cursor é inválido
+        """
+        columns = Lead.__table__.c
+        selected = dict.fromkeys(["id", "created_at", *fields])
+        query = select(*(columns[name] for name in selected))
+        if status:
+            query = query.where(columns.status == status)
+
+        result = await db.execute(keyset_page(query, columns.created_at, columns.id, cursor, limit))
+        rows = list(result.all())
+        return rows, next_cursor(rows, limit)
+
+    @staticmethod
+    async def deactivate_ia(
+        db: AsyncSession,
+        whatsapp_number: str
+    ) -> bool:
+        """Desativa IA para um número"""
+        lead = await AsyncLeadService.get_lead_by_number(db, whatsapp_number)
+        if lead:
+            await AsyncLeadService.update_lead(db, lead, status_ia=0)
+            return True
+        return False
+
+    @staticmethod
+    async def is_ia_active(
+        db: AsyncSession,
+        whatsapp_number: str
+    ) -> bool:
+        """Verifica se IA está ativa para um número"""
+        lead = await AsyncLeadService.get_lead_by_number(db, whatsapp_number)
+        if lead:
+            return lead.status_ia == 1
+        return True  # Por padrão, IA ativa para novos números
+
+    @staticmethod
+    async def get_statistics(db: AsyncSession) -> dict:
+        """Contagem de leads por status e criados hoje (ver LeadService.get_statistics)"""
+        today = datetime.now().date()
+        stats = lead_stats_cache.get(today)
+        if stats is None:
+            generation = lead_stats_cache.generation
+            result = await db.execute(status_counts_query(today))
+            stats = summarize(result.all(), today)
+            lead_stats_cache.store(stats, generation)
+        return stats
+
+    @staticmethod
+    async def search(db: AsyncSession, query: str, limit: int = 20) -> dict:
+        """Busca textual em leads e mensagens (ver LeadService.search)"""
+        dialect = db.bind.dialect.name
+        params = search_params(query, dialect, limit)
+        if params is None:
+            return {"leads": [], "messages": []}
+        results = {}
+        for kind, statement in search_statements(dialect).items():
+            results[kind] = format_hits(await db.execute(statement, params))
+        return results
+
+    @staticmethod
+    async def get_events(
+        db: AsyncSession,
+        since: int = 0,
+        limit: int = 100,
+        lead_id: Optional[int] = None,
+        event_types: Optional[Sequence[str]] = None
+    ) -> dict:
+        """Eventos dos leads depois da sequência `since` (ver LeadEventService.events_since)"""
+        result = await db.execute(events_statement(since, limit, lead_id, event_types))
+        return events_page(result.all(), since)
+
+
+class AsyncMessageService:
+    """Serviço assíncrono para operações com mensagens"""
+
+    @staticmethod
+    async def save_message(
+        db: AsyncSession,
+        whatsapp_number: str,
+        sender: str,
+        message: str,
+        role: str = "user",
+        lead_id: int = None,
+        commit: bool = True
+    ) -> ChatMessage:
+        """
+        Salva mensagem no histórico
+
+        Args:
+            db: Sessão assíncrona do banco de dados
+            whatsapp_number: Número WhatsApp
+            sender: "user", "ai" ou "human"
+            message: Conteúdo da mensagem
+            role: Role para o modelo (user/assistant)
+            lead_id: ID do lead (opcional, será buscado se não fornecido)
+            commit: Se False, só adiciona à sessão (gravado no próximo commit)
+
+        Returns:
+            Objeto ChatMessage criado
+        """
+        if lead_id is None:
+            lead = await AsyncLeadService.get_lead_by_number(db, whatsapp_number)
+            if lead:
+                lead_id = lead.id
+
+        chat = ChatMessage(
+            lead_id=lead_id,
+            whatsapp_number=whatsapp_number,
+            sender=sender,
+            message=message,
+            role=role
+        )
+        db.add(chat)
+        # Entra no buffer de conversa quando a transação fizer commit
+        record_message(db, whatsapp_number, role, message)
+        if commit:
+            await db.commit()
+        return chat
+
+    @staticmethod
+    async def get_conversation_history(
+        db: AsyncSession,
+        whatsapp_number: str,
+        limit: int = 50
+    ) -> List[dict]:
+        """
+        Retorna histórico de conversas
+
+        Args:
+            db: Sessão assíncrona do banco de dados
+            whatsapp_number: Número WhatsApp
+            limit: Número máximo de mensagens
+
+        Returns:
+            Lista de mensagens formatadas para o modelo, em ordem cronológica
+        """
+        cached = conversation_buffer.get(whatsapp_number, limit)
+        if cached is not None:
+            return cached
+
+        # Fora do buffer: lê do banco o suficiente para aquecê-lo
+        result = await db.execute(
+            select(ChatMessage.role, ChatMessage.message)
+            .where(ChatMessage.whatsapp_number == whatsapp_number)
+            .order_by(ChatMessage.created_at.desc())
+            .limit(max(limit, conversation_buffer.capacity))
+        )
+        rows = [(role, message) for role, message in result.all()]
+        rows.reverse()
+        conversation_buffer.warm(whatsapp_number, rows)
+        return [{"role": role, "content": message} for role, message in rows[-limit:]]
+
+    @staticmethod
+    async def get_lead_messages(
+        db: AsyncSession,
+        lead_id: int
+    ) -> List[ChatMessage]:
+        """Retorna as mensagens de um lead em ordem cronológica"""
+        result = await db.execute(
+            select(ChatMessage)
+            .where(ChatMessage.lead_id == lead_id)
+            .order_by(ChatMessage.created_at.asc())
+        )
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def get_lead_messages_page(
+        db: AsyncSession,
+        lead_id: int,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        Retorna uma página das mensagens de um lead, em ordem cronológica
+
+        Junta as mensagens da tabela com as arquivadas em segmentos, na
+        mesma ordem (created_at, id) usada pelo cursor.
+
+        Returns:
+            Tupla (mensagens com id, lead_id, sender, message e created_at,
+            cursor da próxima página ou None)
+
+        Raises:
+            InvalidCursorError: Se o cursor é inválido
+        """
+        columns = ChatMessage.__table__.c
+        query = select(*(columns[field] for field in MESSAGE_PAGE_FIELDS)).where(columns.lead_id == lead_id)
+
+        result = await db.execute(
+            keyset_page(query, columns.created_at, columns.id, cursor, limit, descending=False)
+        )
+        messages = [dict(row._mapping) for row in result.all()]
+
+        segments = (await db.execute(segments_query(lead_id))).all()
+        if segments:
+            archived = await asyncio.to_thread(read_segments, segments)
+            if cursor:
+                after = decode_cursor(cursor)
+                archived = [record for record in archived if (record["created_at"], record["id"]) > after]
+            archived = [{field: record[field] for field in MESSAGE_PAGE_FIELDS} for record in archived[:limit + 1]]
+            messages = sorted(archived + messages, key=lambda message: (message["created_at"], message["id"]))
+
+        return messages, next_cursor(messages, limit)
+
+
+class AsyncQualificationFieldService:
+    """Serviço assíncrono para rastrear campos de qualificação"""
+
+    @staticmethod
+    async def create_or_get_fields(
+        db: AsyncSession,
+        whatsapp_number: str
+    ) -> QualificationField:
+        """Cria ou retorna registro de campos"""
+        result = await db.execute(
+            select(QualificationField)
+            .where(QualificationField.whatsapp_number == whatsapp_number)
+            .limit(1)
+        )
+        fields = result.scalars().first()
+
+        if not fields:
+            fields = QualificationField(whatsapp_number=whatsapp_number)
+            db.add(fields)
+            await db.commit()
+
+        return fields
+
+    @staticmethod
+    async def update_fields(
+        db: AsyncSession,
+        whatsapp_number: str,
+        has_name: bool = None,
+        has_interest: bool = None,
+        has_necessity: bool = None
+    ) -> QualificationField:
+        """Atualiza status dos campos coletados"""
+        fields = await AsyncQualificationFieldService.create_or_get_fields(
+            db, whatsapp_number
+        )
+
+        if has_name is not None:
+            fields.has_name = has_name
+        if has_interest is not None:
+            fields.has_interest = has_interest
+        if has_necessity is not None:
+            fields.has_necessity = has_necessity
+
+        fields.updated_at = datetime.utcnow()
+        await db.commit()
+
+        return fields
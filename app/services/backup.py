@@ -0,0 +1,310 @@
+"""
+Backup online do banco SQLite (snapshots comprimidos, com checksum e rotação)
+
+O snapshot é feito com a API de backup do SQLite (sqlite3.Connection.backup),
+não copiando o arquivo: o resultado é sempre um banco consistente, mesmo com
+o webhook gravando. A cópia anda em passos de BACKUP_PAGES_PER_STEP páginas
+com uma pausa entre eles; se o banco mudar no meio, o SQLite recomeça a cópia.
+Depois de BACKUP_MAX_RESTARTS recomeços, a cópia é feita num passo só — em
+WAL isso é uma transação de leitura, que não bloqueia quem grava.
+
+Cada snapshot vira BACKUP_DIR/crm-AAAAMMDD-HHMMSS.db.gz, com o SHA-256 do
+arquivo comprimido ao lado (.sha256, formato do `sha256sum -c`). Só os
+BACKUP_KEEP mais recentes são mantidos.
+
+Enquanto o backup roda, uma thread tenta abrir transações de escrita
+(BEGIN IMMEDIATE + ROLLBACK) no banco e mede a espera: é o impacto que o
+webhook sentiria.
+"""
+import asyncio
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from config.settings import settings
+from app.database.connection import get_engine
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PREFIX = "crm-"
+SNAPSHOT_SUFFIX = ".db.gz"
+
+
+def sqlite_path(engine=None) -> Path:
+    """
+    Caminho do arquivo do banco SQLite
+
+    Raises:
+        ValueError: Se o banco não é SQLite em arquivo
+    """
+    engine = engine or get_engine()
+    url = engine.url
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        raise ValueError("Backup online só para SQLite em arquivo (PostgreSQL: use pg_dump)")
+    return Path(url.database)
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class WriteLockProbe(threading.Thread):
+    """Mede quanto uma transação de escrita espera enquanto o backup roda"""
+
+    def __init__(self, path: Path, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.path = path
+        self.interval = interval
+        self.waits_ms: List[float] = []
+        self.failures = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        conn = sqlite3.connect(self.path, timeout=settings.SQLITE_BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+        try:
+            while not self._stop_event.is_set():
+                start = time.perf_counter()
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    conn.execute("ROLLBACK")
+                    self.waits_ms.append((time.perf_counter() - start) * 1000)
+                except sqlite3.OperationalError:
+                    self.failures += 1
+                self._stop_event.wait(self.interval)
+        finally:
+            conn.close()
+
+    def stop(self) -> Dict:
+        self._stop_event.set()
+        self.join()
+        waits = self.waits_ms
+        return {
+            "probes": len(waits),
+            "failures": self.failures,
+            "wait_avg_ms": round(sum(waits) / len(waits), 3) if waits else 0.0,
+            "wait_max_ms": round(max(waits), 3) if waits else 0.0,
+        }
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def online_copy(source_path: Path, target_path: Path, pages_per_step: int, step_sleep: float, max_restarts: int) -> Dict:
+    """
+    Copia o banco com a API de backup, em passos de páginas
+
+    Returns:
+        Dict com páginas copiadas, passos, recomeços e se caiu para um passo só
+    """
+    progress = {"steps": 0, "restarts": 0, "pages": 0, "single_step": False}
+    last_remaining = [None]
+
+    def on_progress(status, remaining, total):
+        progress["steps"] += 1
+        progress["pages"] = total
+        if last_remaining[0] is not None and remaining > last_remaining[0]:
+            progress["restarts"] += 1
+            if progress["restarts"] > max_restarts:
+                raise _TooManyRestarts()
+        last_remaining[0] = remaining
+        # O `sleep` do backup() só vale quando o banco está ocupado; a pausa entre passos fica aqui
+        if remaining and step_sleep:
+            time.sleep(step_sleep)
+
+    source = sqlite3.connect(source_path)
+    try:
+        target = sqlite3.connect(target_path)
+        try:
+            try:
+                source.backup(target, pages=pages_per_step, progress=on_progress, sleep=step_sleep)
+            except _TooManyRestarts:
+                # Em WAL, um passo só é uma transação de leitura: não trava quem grava
+                logger.warning(f"⚠️ Backup recomeçou {progress['restarts']} vezes; copiando em um passo")
+                progress["single_step"] = True
+                source.backup(target, pages=-1)
+            # O snapshot é um arquivo avulso: sem WAL ao lado
+            target.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            target.close()
+    finally:
+        source.close()
+    return progress
+
+
+class BackupService:
+    """Serviço de snapshots do banco SQLite"""
+
+    @staticmethod
+    def list_snapshots(directory: Optional[Path] = None) -> List[Path]:
+        """Snapshots existentes, do mais antigo para o mais recente"""
+        directory = Path(directory or settings.BACKUP_DIR)
+        if not directory.exists():
+            return []
+        return sorted(directory.glob(f"{SNAPSHOT_PREFIX}*{SNAPSHOT_SUFFIX}"))
+
+    @staticmethod
+    def create_snapshot(
+        engine=None,
+        directory: Optional[Path] = None,
+        keep: Optional[int] = None,
+        pages_per_step: Optional[int] = None
+    ) -> Dict:
+        """
+        Gera um snapshot comprimido e com checksum, e aplica a rotação
+
+        Args:
+            engine: Engine do banco (padrão: engine compartilhado)
+            directory: Pasta dos snapshots (padrão: BACKUP_DIR)
+            keep: Quantos snapshots manter (padrão: BACKUP_KEEP)
+            pages_per_step: Páginas por passo da cópia (padrão: BACKUP_PAGES_PER_STEP;
+                -1 copia tudo em um passo)
+
+        Returns:
+            Relatório com arquivo, tamanhos, duração e impacto nas escritas
+        """
+        source_path = sqlite_path(engine)
+        directory = Path(directory or settings.BACKUP_DIR)
+        keep = settings.BACKUP_KEEP if keep is None else keep
+        pages_per_step = pages_per_step or settings.BACKUP_PAGES_PER_STEP
+        directory.mkdir(parents=True, exist_ok=True)
+
+        name = f"{SNAPSHOT_PREFIX}{datetime.now():%Y%m%d-%H%M%S}{SNAPSHOT_SUFFIX}"
+        snapshot = directory / name
+        started = time.perf_counter()
+        probe = WriteLockProbe(source_path)
+        probe.start()
+
+        with tempfile.TemporaryDirectory(dir=directory) as tmp:
+            copy_path = Path(tmp) / "snapshot.db"
+            try:
+                progress = online_copy(
+                    source_path, copy_path, pages_per_step,
+                    settings.BACKUP_STEP_SLEEP_MS / 1000, settings.BACKUP_MAX_RESTARTS
+                )
+            finally:
+                write_lock = probe.stop()
+            copy_seconds = time.perf_counter() - started
+
+            partial = snapshot.with_name(name + ".partial")
+            with open(copy_path, "rb") as raw, gzip.open(partial, "wb", compresslevel=6) as compressed:
+                shutil.copyfileobj(raw, compressed, 1024 * 1024)
+            raw_size = copy_path.stat().st_size
+        os.replace(partial, snapshot)
+
+        checksum = file_sha256(snapshot)
+        snapshot.with_name(name + ".sha256").write_text(f"{checksum}  {name}\n")
+        removed = BackupService.rotate(directory, keep)
+
+        report = {
+            "file": str(snapshot),
+            "sha256": checksum,
+            "db_bytes": raw_size,
+            "compressed_bytes": snapshot.stat().st_size,
+            "pages": progress["pages"],
+            "steps": progress["steps"],
+            "restarts": progress["restarts"],
+            "single_step": progress["single_step"],
+            "copy_seconds": round(copy_seconds, 3),
+            "total_seconds": round(time.perf_counter() - started, 3),
+            "write_lock": write_lock,
+            "rotated": [path.name for path in removed],
+        }
+        logger.info(f"💾 Backup {name}: {report['compressed_bytes']} bytes em {report['total_seconds']}s, "
+                    f"espera máx. de escrita {write_lock['wait_max_ms']} ms")
+        return report
+
+    @staticmethod
+    def rotate(directory: Path, keep: int) -> List[Path]:
+        """Apaga os snapshots mais antigos além dos `keep` mais recentes"""
+        snapshots = BackupService.list_snapshots(directory)
+        removed = snapshots[:-keep] if keep > 0 else []
+        for path in removed:
+            path.unlink()
+            path.with_name(path.name.replace(SNAPSHOT_SUFFIX, ".db.gz.sha256")).unlink(missing_ok=True)
+        return removed
+
+    @staticmethod
+    def verify_snapshot(snapshot: Path) -> Dict:
+        """
+        Confere o checksum e a integridade do banco dentro do snapshot
+
+        Returns:
+            Dict com ok, checksum_ok, integrity e tabelas encontradas
+        """
+        snapshot = Path(snapshot)
+        sidecar = snapshot.with_name(snapshot.name + ".sha256")
+        expected = sidecar.read_text().split()[0] if sidecar.exists() else None
+        checksum_ok = expected is not None and expected == file_sha256(snapshot)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            copy_path = Path(tmp) / "verify.db"
+            with gzip.open(snapshot, "rb") as compressed, open(copy_path, "wb") as raw:
+                shutil.copyfileobj(compressed, raw, 1024 * 1024)
+            conn = sqlite3.connect(copy_path)
+            try:
+                integrity = conn.execute("PRAGMA integrity_check").fetchone()[0]
+                tables = [row[0] for row in conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name"
+                )]
+            finally:
+                conn.close()
+
+        return {
+            "ok": checksum_ok and integrity == "ok",
+            "checksum_ok": checksum_ok,
+            "integrity": integrity,
+            "tables": tables,
+        }
+
+    @staticmethod
+    def restore_snapshot(snapshot: Path, target: Optional[Path] = None) -> Dict:
+        """
+        Restaura um snapshot verificado sobre o banco
+
+        A restauração usa a API de backup no sentido inverso, então o banco
+        de destino (e seu WAL) fica consistente. Pare a API e o dashboard
+        antes: conexões abertas passariam a ver o banco trocado.
+
+        Raises:
+            ValueError: Se o snapshot não passa na verificação
+        """
+        verification = BackupService.verify_snapshot(snapshot)
+        if not verification["ok"]:
+            raise ValueError(f"Snapshot inválido: {verification}")
+        target = Path(target) if target else sqlite_path()
+        started = time.perf_counter()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            copy_path = Path(tmp) / "restore.db"
+            with gzip.open(snapshot, "rb") as compressed, open(copy_path, "wb") as raw:
+                shutil.copyfileobj(compressed, raw, 1024 * 1024)
+            source = sqlite3.connect(copy_path)
+            destination = sqlite3.connect(target)
+            try:
+                source.backup(destination)
+            finally:
+                destination.close()
+                source.close()
+
+        return {"target": str(target), "seconds": round(time.perf_counter() - started, 3), **verification}
+
+
+async def backup_job():
+    """Job periódico de backup (roda fora do event loop)"""
+    try:
+        await asyncio.to_thread(BackupService.create_snapshot)
+    except Exception as e:
+        logger.error(f"❌ Erro no backup do banco: {str(e)}")
@@ -0,0 +1,195 @@
+"""
+Buffer em memória das últimas mensagens de cada conversa
+
+Para cada número WhatsApp guarda um ring buffer (deque com tamanho máximo)
+de tuplas (role, content), na ordem cronológica. O buffer é aquecido a
+partir do banco no primeiro acesso (ex.: depois de reiniciar o processo) e
+recebe as mensagens novas quando a transação que as gravou faz commit —
+mensagens de transações desfeitas nunca entram. Conversas paradas há mais
+de CONVERSATION_BUFFER_IDLE_SECONDS e as menos usadas além do orçamento de
+memória são descartadas (voltam do banco no próximo acesso).
+"""
+import threading
+import time
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from config.settings import settings
+
+# Custo fixo aproximado de cada mensagem no buffer (tupla + strings), em bytes
+MESSAGE_OVERHEAD_BYTES = 120
+
+_PENDING_KEY = "conversation_buffer_pending"
+
+
+class _Conversation:
+    __slots__ = ("messages", "size_bytes", "last_access")
+
+    def __init__(self, capacity: int):
+        self.messages: deque = deque(maxlen=capacity)
+        self.size_bytes = 0
+        self.last_access = time.monotonic()
+
+
+def _message_size(role: str, content: str) -> int:
+    return MESSAGE_OVERHEAD_BYTES + len(role) + len(content)
+
+
+class ConversationBuffer:
+    """Ring buffers por número, com descarte por inatividade e por memória"""
+
+    def __init__(self, capacity: int = 50, idle_seconds: float = 1800, max_bytes: int = 32 * 1024 * 1024):
+        self.capacity = capacity
+        self.idle_seconds = idle_seconds
+        self.max_bytes = max_bytes
+        self._conversations: "OrderedDict[str, _Conversation]" = OrderedDict()
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def get(self, whatsapp_number: str, limit: int) -> Optional[List[dict]]:
+        """
+        Retorna as últimas `limit` mensagens no formato do histórico
+
+        Returns:
+            Lista de {"role", "content"} ou None se a conversa não está no buffer
+            (ou se `limit` passa da capacidade do buffer)
+        """
+        if not self.enabled or limit > self.capacity:
+            return None
+        with self._lock:
+            self._evict_idle()
+            conversation = self._conversations.get(whatsapp_number)
+            if conversation is None:
+                self.misses += 1
+                return None
+            conversation.last_access = time.monotonic()
+            self._conversations.move_to_end(whatsapp_number)
+            self.hits += 1
+            # Lê de trás para frente só as `limit` mensagens pedidas
+            recent = list(islice(reversed(conversation.messages), limit))
+        recent.reverse()
+        return [{"role": role, "content": content} for role, content in recent]
+
+    def warm(self, whatsapp_number: str, messages: List[Tuple[str, str]]):
+        """Carrega a conversa lida do banco (ordem cronológica), se ainda não estiver no buffer"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if whatsapp_number in self._conversations:
+                return
+            conversation = _Conversation(self.capacity)
+            self._conversations[whatsapp_number] = conversation
+            for role, content in messages[-self.capacity:]:
+                self._push(conversation, role, content)
+            self._evict_over_budget()
+
+    def append(self, whatsapp_number: str, role: str, content: str):
+        """
+        Acrescenta uma mensagem já gravada no banco
+
+        Conversas fora do buffer são ignoradas: o próximo acesso as aquece
+        do banco, já com esta mensagem.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            conversation = self._conversations.get(whatsapp_number)
+            if conversation is None:
+                return
+            self._push(conversation, role or "", content or "")
+            conversation.last_access = time.monotonic()
+            self._evict_over_budget()
+
+    def invalidate(self, whatsapp_number: str):
+        with self._lock:
+            conversation = self._conversations.pop(whatsapp_number, None)
+            if conversation is not None:
+                self._size_bytes -= conversation.size_bytes
+
+    def clear(self):
+        with self._lock:
+            self._conversations.clear()
+            self._size_bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "conversations": len(self._conversations),
+                "size_bytes": self._size_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _push(self, conversation: _Conversation, role: str, content: str):
+        messages = conversation.messages
+        if len(messages) == messages.maxlen:
+            old_role, old_content = messages[0]
+            freed = _message_size(old_role, old_content)
+            conversation.size_bytes -= freed
+            self._size_bytes -= freed
+        messages.append((role, content))
+        size = _message_size(role, content)
+        conversation.size_bytes += size
+        self._size_bytes += size
+
+    def _drop_oldest(self):
+        _, conversation = self._conversations.popitem(last=False)
+        self._size_bytes -= conversation.size_bytes
+        self.evictions += 1
+
+    def _evict_idle(self):
+        # Em ordem de uso: as conversas paradas há mais tempo ficam no início
+        deadline = time.monotonic() - self.idle_seconds
+        while self._conversations:
+            oldest = next(iter(self._conversations.values()))
+            if oldest.last_access >= deadline:
+                break
+            self._drop_oldest()
+
+    def _evict_over_budget(self):
+        while self._size_bytes > self.max_bytes and len(self._conversations) > 1:
+            self._drop_oldest()
+
+
+def record_message(session: Session, whatsapp_number: str, role: str, content: str):
+    """
+    Registra uma mensagem adicionada à sessão para entrar no buffer no commit
+
+    Args:
+        session: Sessão (ou AsyncSession) em que a mensagem foi adicionada
+    """
+    if conversation_buffer.enabled:
+        session.info.setdefault(_PENDING_KEY, []).append((whatsapp_number, role, content))
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        for whatsapp_number, role, content in pending:
+            conversation_buffer.append(whatsapp_number, role, content)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+# Buffer do processo
+conversation_buffer = ConversationBuffer(
+    capacity=settings.CONVERSATION_BUFFER_MESSAGES,
+    idle_seconds=settings.CONVERSATION_BUFFER_IDLE_SECONDS,
+    max_bytes=int(settings.CONVERSATION_BUFFER_MAX_MB * 1024 * 1024),
+)
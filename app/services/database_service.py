@@ -3,18 +3,225 @@ Serviço de banco de dados - CRUD operations
 """
 from typing import Optional, List
 from datetime import datetime
+from sqlalchemy import inspect, select, update
 from sqlalchemy.orm import Session
-from app.database.models import Lead, ChatMessage, QualificationField
+from app.core.utils import canonical_whatsapp_number, normalize_cpf_cnpj, normalize_email, normalize_plate
+from app.database.models import Lead, LeadAttributes, ChatMessage, QualificationField, lead_event_insert
+from app.services.lead_cache import lead_cache
+from app.services.conversation_buffer import conversation_buffer, record_message
+from app.services.lead_stats import lead_stats_cache, status_counts_query, summarize
+from app.services.message_archive import MessageArchiveService
+from app.services.search import format_hits, search_params, search_statements
+
+# Campos do lead usados pelos fluxos (extração, campos faltantes e notificações)
+LEAD_FLOW_FIELDS = (
+    "name", "email", "second_email", "cpf_cnpj", "phone", "whatsapp_contact",
+    "vehicle_plate", "cep_pernoite", "profession", "marital_status", "vehicle_usage",
+    "has_young_driver", "property_cep", "property_type", "property_value",
+    "property_ownership", "consortium_type", "consortium_value", "consortium_term",
+    "has_previous_consortium"
+)
+
+# Colunas da tabela leads (os atributos de fluxo ficam em lead_attributes)
+LEAD_COLUMN_KEYS = frozenset(column.key for column in Lead.__table__.columns)
+
+# Dados cadastrais copiados do cliente já conhecido para o lead novo
+CUSTOMER_PROFILE_FIELDS = ("name", "email", "cpf_cnpj", "phone")
+
+# Status em que o lead ainda está em andamento
+OPEN_LEAD_STATUSES = ("novo", "qualificado", "em_atendimento", "em_negociacao")
+
+# Transições de status: nome -> (status de destino, status de origem aceitos)
+LEAD_TRANSITIONS = {
+    "qualify": ("qualificado", ("novo", "qualificado")),
+    "claim": ("em_atendimento", ("qualificado",)),
+    "negotiate": ("em_negociacao", ("qualificado",)),
+    "convert": ("convertido", OPEN_LEAD_STATUSES),
+    "lose": ("perdido", OPEN_LEAD_STATUSES),
+    "finish": ("finalizado", OPEN_LEAD_STATUSES),
+}
+
+# Campos gravados junto com uma transição; numa fusão, só seguem se a transição ainda vale
+TRANSITION_FIELDS = ("status", "status_ia", "qualification_score", "qualified_at", "attended_by")
+
+
+def lead_number_filter(whatsapp_number: str):
+    """Condição de busca do lead pelo número: compara o número canônico (com e sem o nono dígito)"""
+    return Lead.canonical_number == canonical_whatsapp_number(whatsapp_number)
+
+
+def identity_statements(
+    cpf_cnpj: Optional[str] = None,
+    email: Optional[str] = None,
+    vehicle_plate: Optional[str] = None,
+    exclude_id: Optional[int] = None
+) -> list:
+    """
+    Consultas do cliente já conhecido, uma por chave (CPF/CNPJ, e-mail e
+    placa, nesta ordem), cada uma respondida por índice
+
+    Cada consulta traz o lead mais antigo com a chave; valores inválidos
+    (que não normalizam) não geram consulta.
+    """
+    statements = []
+    for key, value in (
+        (Lead.cpf_cnpj_key, normalize_cpf_cnpj(cpf_cnpj)),
+        (Lead.email_key, normalize_email(email)),
+        (LeadAttributes.plate_key, normalize_plate(vehicle_plate)),
+    ):
+        if value is None:
+            continue
+        statement = select(Lead).where(key == value)
+        if key is LeadAttributes.plate_key:
+            statement = statement.join(LeadAttributes, LeadAttributes.lead_id == Lead.id)
+        if exclude_id is not None:
+            statement = statement.where(Lead.id != exclude_id)
+        statements.append(statement.order_by(Lead.id).limit(1))
+    return statements
+
+
+def identity_keys(lead: Lead, **keys) -> dict:
+    """Chaves informadas, completadas com o CPF/CNPJ, e-mail e placa do próprio lead"""
+    for name in ("cpf_cnpj", "email", "vehicle_plate"):
+        if not keys.get(name):
+            keys[name] = getattr(lead, name)
+    return keys
+
+
+def link_customer(lead: Lead, customer: Lead) -> Optional[List[str]]:
+    """
+    Marca o lead como cliente existente, ligado ao primeiro lead da mesma pessoa
+
+    Os dados cadastrais vazios do lead vêm do cliente; nada é gravado aqui.
+
+    Returns:
+        Campos preenchidos, ou None se o lead já é o primeiro da pessoa
+    """
+    primary_id = customer.linked_lead_id or customer.id
+    if primary_id == lead.id:
+        return None
+    lead.linked_lead_id = primary_id
+    lead.customer_type = "existente"
+    filled = []
+    for field in CUSTOMER_PROFILE_FIELDS:
+        value = getattr(customer, field)
+        if not getattr(lead, field) and value:
+            setattr(lead, field, value)
+            filled.append(field)
+    return filled
+
+
+def can_transition(lead: Lead, transition: str) -> bool:
+    """Se o status atual do lead permite a transição"""
+    return lead.status in LEAD_TRANSITIONS[transition][1]
+
+
+def transition_statement(lead_id: int, transition: Optional[str], **values):
+    """
+    UPDATE condicional do lead: só altera se o status ainda permitir a transição
+
+    Incrementa a versão (quem tiver o lead carregado recebe StaleDataError
+    ao gravar) e retorna o número WhatsApp e o status da linha alterada.
+    """
+    statement = update(Lead).where(Lead.id == lead_id)
+    if transition is not None:
+        status, allowed = LEAD_TRANSITIONS[transition]
+        statement = statement.where(Lead.status.in_(allowed))
+        values["status"] = status
+    return (
+        statement.values(version=Lead.version + 1, updated_at=datetime.utcnow(), **values)
+        .returning(Lead.whatsapp_number, Lead.status)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def transition_event(lead_id: int, row, transition: str, values: dict):
+    """
+    INSERT do evento de status de uma transição feita com transition_statement
+
+    O status anterior não volta no RETURNING; o evento leva o nome da
+    transição e os campos simples gravados junto (attended_by, status_ia).
+    """
+    data = {"transition": transition}
+    data.update({key: value for key, value in values.items() if isinstance(value, (str, int, float, bool))})
+    return lead_event_insert(lead_id, row.whatsapp_number, "status", to_value=row.status, data=data)
+
+
+def pending_lead_changes(lead: Lead) -> dict:
+    """Colunas e atributos de fluxo alterados no lead e ainda não gravados"""
+    state = inspect(lead)
+    changes = {
+        attr.key: attr.value
+        for attr in state.attrs
+        if attr.key in LEAD_COLUMN_KEYS and attr.key != "version" and attr.history.added
+    }
+    record = state.attrs.attribute_record.loaded_value
+    if isinstance(record, LeadAttributes):
+        history = inspect(record).attrs.data.history
+        if history.added:
+            before = history.deleted[0] if history.deleted else {}
+            after = history.added[0] or {}
+            changes.update({
+                name: after.get(name)
+                for name in set(before) | set(after)
+                if before.get(name) != after.get(name)
+            })
+    return changes
+
+
+def merge_lead_changes(lead: Lead, changes: dict) -> dict:
+    """
+    Reaplica alterações sobre o lead recarregado do banco
+
+    Campos comuns sempre seguem (última escrita do webhook vale); os campos
+    de transição só seguem se a mudança de status ainda for permitida a
+    partir do status atual — a decisão do atendente prevalece.
+
+    Returns:
+        Alterações de fato aplicadas
+    """
+    applied = dict(changes)
+    target = changes.get("status")
+    if target is not None:
+        allowed = [name for name, (status, _) in LEAD_TRANSITIONS.items() if status == target]
+        if not any(can_transition(lead, name) for name in allowed):
+            applied = {key: value for key, value in changes.items() if key not in TRANSITION_FIELDS}
+    for key, value in applied.items():
+        setattr(lead, key, value)
+    return applied
 
 
 class LeadService:
     """Serviço para operações com leads"""
     
+    @staticmethod
+    def build_lead_dict(
+        lead: Lead,
+        flow_type: Optional[str] = None,
+        flow_step: Optional[str] = None
+    ) -> dict:
+        """
+        Monta o dicionário de dados do lead usado pelos fluxos
+        
+        Args:
+            lead: Objeto Lead
+            flow_type: Fluxo atual (pode ainda não estar salvo no lead)
+            flow_step: Etapa atual do fluxo
+        
+        Returns:
+            Dicionário com os campos de LEAD_FLOW_FIELDS, flow_type e flow_step
+        """
+        lead_dict = {field: getattr(lead, field) for field in LEAD_FLOW_FIELDS}
+        lead_dict["flow_type"] = flow_type
+        lead_dict["flow_step"] = flow_step
+        return lead_dict
+    
     @staticmethod
     def create_or_get_lead(
         db: Session,
         whatsapp_number: str,
-        customer_type: str = "novo"
+        customer_type: str = "novo",
+        commit: bool = True
     ) -> Lead:
         """
         Cria ou retorna lead existente
@@ -23,23 +230,27 @@ class LeadService:
             db: Sessão do banco de dados
             whatsapp_number: Número WhatsApp
             customer_type: "novo" ou "existente"
+            commit: Se False, só faz flush (para obter o id) e deixa o
+                commit para quem controla a transação
         
         Returns:
             Objeto Lead
         """
-        lead = db.query(Lead).filter(
-            Lead.whatsapp_number == whatsapp_number
-        ).first()
+        lead = LeadService.get_lead_by_number(db, whatsapp_number)
         
         if not lead:
             lead = Lead(
                 whatsapp_number=whatsapp_number,
                 customer_type=customer_type,
-                status="novo"
+                status="novo",
+                attribute_record=None
             )
             db.add(lead)
-            db.commit()
-            db.refresh(lead)
+            if commit:
+                db.commit()
+                lead_cache.store(lead)
+            else:
+                db.flush()
         
         return lead
     
@@ -48,15 +259,54 @@ class LeadService:
         db: Session,
         whatsapp_number: str
     ) -> Optional[Lead]:
-        """Busca lead por número WhatsApp"""
+        """Busca lead por número WhatsApp (com ou sem o nono dígito; o mais recente, se houver duplicados)"""
         return db.query(Lead).filter(
-            Lead.whatsapp_number == whatsapp_number
-        ).first()
+            lead_number_filter(whatsapp_number)
+        ).order_by(Lead.updated_at.desc()).first()
+    
+    @staticmethod
+    def find_existing_customer(
+        db: Session,
+        exclude_id: Optional[int] = None,
+        **keys
+    ) -> Optional[Lead]:
+        """
+        Busca o cliente já conhecido pelo CPF/CNPJ, e-mail ou placa
+
+        Args:
+            db: Sessão do banco de dados
+            exclude_id: Lead a ignorar (o da conversa atual)
+            **keys: cpf_cnpj, email e/ou vehicle_plate (com ou sem formatação)
+
+        Returns:
+            Lead mais antigo com a primeira chave encontrada, ou None
+        """
+        for statement in identity_statements(exclude_id=exclude_id, **keys):
+            customer = db.scalars(statement).first()
+            if customer is not None:
+                return customer
+        return None
+    
+    @staticmethod
+    def resolve_customer(db: Session, lead: Lead, **keys) -> Optional[Lead]:
+        """
+        Liga o lead ao cliente já conhecido com o mesmo CPF/CNPJ, e-mail ou placa
+
+        Sem chaves, usa as do próprio lead. Só altera o objeto em memória.
+
+        Returns:
+            Cliente encontrado (lead ao qual foi ligado), ou None
+        """
+        customer = LeadService.find_existing_customer(db, exclude_id=lead.id, **identity_keys(lead, **keys))
+        if customer is None or link_customer(lead, customer) is None:
+            return None
+        return customer
     
     @staticmethod
     def update_lead(
         db: Session,
         lead: Lead,
+        commit: bool = True,
         **kwargs
     ) -> Lead:
         """
@@ -65,6 +315,7 @@ class LeadService:
         Args:
             db: Sessão do banco de dados
             lead: Objeto Lead
+            commit: Se False, só altera o objeto em memória
             **kwargs: Campos a atualizar (name, status, etc)
         
         Returns:
@@ -75,16 +326,47 @@ class LeadService:
                 setattr(lead, key, value)
         
         lead.updated_at = datetime.utcnow()
-        db.commit()
-        db.refresh(lead)
+        if commit:
+            db.commit()
+            # Write-through: o cache passa a ter a versão recém-gravada
+            lead_cache.store(lead)
         return lead
     
+    @staticmethod
+    def transition(db: Session, lead_id: int, transition: Optional[str], **values) -> Optional[dict]:
+        """
+        Muda o status do lead com um UPDATE condicional (sem ler antes)
+        
+        Dois atendentes clicando em "Assumir" ao mesmo tempo: só um UPDATE
+        encontra o lead ainda "qualificado"; o outro recebe None.
+        
+        Args:
+            db: Sessão do banco de dados
+            lead_id: ID do lead
+            transition: Nome em LEAD_TRANSITIONS (None altera só os campos)
+            **values: Demais campos a gravar (attended_by, status_ia, ...)
+        
+        Returns:
+            Dict com whatsapp_number e status, ou None se o lead não existe
+            ou o status atual não permite a transição
+        """
+        row = db.execute(transition_statement(lead_id, transition, **values)).first()
+        if row is not None and transition is not None:
+            db.execute(transition_event(lead_id, row, transition, values))
+        db.commit()
+        if row is None:
+            return None
+        lead_cache.invalidate(row.whatsapp_number)
+        lead_stats_cache.invalidate()
+        return dict(row._mapping)
+    
     @staticmethod
     def mark_qualified(
         db: Session,
         lead: Lead,
         qualification_score: int = 100,
-        attended_by: str = "IA"
+        attended_by: str = "IA",
+        commit: bool = True
     ) -> Lead:
         """
         Marca lead como qualificado e desativa IA
@@ -94,6 +376,7 @@ class LeadService:
             lead: Objeto Lead
             qualification_score: Pontuação de qualificação (padrão: 100)
             attended_by: Quem qualificou (padrão: "IA")
+            commit: Se False, só altera o objeto em memória
         
         Returns:
             Lead atualizado
@@ -101,6 +384,7 @@ class LeadService:
         return LeadService.update_lead(
             db,
             lead,
+            commit=commit,
             status="qualificado",
             status_ia=0,  # Desativa IA
             qualification_score=qualification_score,
@@ -130,6 +414,45 @@ class LeadService:
         if lead:
             return lead.status_ia == 1
         return True  # Por padrão, IA ativa para novos números
+    
+    @staticmethod
+    def get_statistics(db: Session) -> dict:
+        """
+        Retorna a contagem de leads por status e os criados hoje
+        
+        Uma consulta GROUP BY status, servida do cache enquanto nenhum lead
+        for criado ou mudar de status.
+        
+        Returns:
+            Dict com total, created_today e by_status ({status: quantidade})
+        """
+        today = datetime.now().date()
+        stats = lead_stats_cache.get(today)
+        if stats is None:
+            generation = lead_stats_cache.generation
+            stats = summarize(db.execute(status_counts_query(today)).all(), today)
+            lead_stats_cache.store(stats, generation)
+        return stats
+    
+    @staticmethod
+    def search(db: Session, query: str, limit: int = 20) -> dict:
+        """
+        Busca textual em leads e mensagens, por relevância
+        
+        Args:
+            db: Sessão do banco de dados
+            query: Texto digitado (ex.: "placa ABC", um bairro, parte do nome)
+            limit: Máximo de resultados de cada tipo
+        
+        Returns:
+            Dict com leads e messages (cada item com snippet e score)
+        """
+        dialect = db.get_bind().dialect.name
+        params = search_params(query, dialect, limit)
+        if params is None:
+            return {"leads": [], "messages": []}
+        statements = search_statements(dialect)
+        return {kind: format_hits(db.execute(statement, params)) for kind, statement in statements.items()}
 
 
 class MessageService:
@@ -142,7 +465,8 @@ class MessageService:
         sender: str,
         message: str,
         role: str = "user",
-        lead_id: int = None
+        lead_id: int = None,
+        commit: bool = True
     ) -> ChatMessage:
         """
         Salva mensagem no histórico
@@ -154,13 +478,14 @@ class MessageService:
             message: Conteúdo da mensagem
             role: Role para Claude (user/assistant)
             lead_id: ID do lead (opcional, será buscado se não fornecido)
+            commit: Se False, só adiciona à sessão (gravado no próximo commit)
         
         Returns:
             Objeto ChatMessage criado
         """
         # Se não forneceu lead_id, busca o lead pelo número
         if lead_id is None:
-            lead = db.query(Lead).filter(Lead.whatsapp_number == whatsapp_number).first()
+            lead = LeadService.get_lead_by_number(db, whatsapp_number)
             if lead:
                 lead_id = lead.id
         
@@ -172,8 +497,10 @@ class MessageService:
             role=role
         )
         db.add(chat)
-        db.commit()
-        db.refresh(chat)
+        # Entra no buffer de conversa quando a transação fizer commit
+        record_message(db, whatsapp_number, role, message)
+        if commit:
+            db.commit()
         return chat
     
     @staticmethod
@@ -193,21 +520,58 @@ class MessageService:
         Returns:
             Lista de mensagens formatadas para Claude
         """
-        messages = db.query(ChatMessage).filter(
+        cached = conversation_buffer.get(whatsapp_number, limit)
+        if cached is not None:
+            return cached
+        
+        # Fora do buffer: lê do banco o suficiente para aquecê-lo
+        rows = db.query(ChatMessage.role, ChatMessage.message).filter(
             ChatMessage.whatsapp_number == whatsapp_number
-        ).order_by(ChatMessage.created_at.desc()).limit(limit).all()
+        ).order_by(ChatMessage.created_at.desc()).limit(max(limit, conversation_buffer.capacity)).all()
         
         # Inverte para ordem cronológica
-        messages.reverse()
+        rows.reverse()
+        conversation_buffer.warm(whatsapp_number, [(role, message) for role, message in rows])
         
         return [
             {
-                "role": msg.role,
-                "content": msg.message
+                "role": role,
+                "content": message
             }
-            for msg in messages
+            for role, message in rows[-limit:]
         ]
 
+    
+    @staticmethod
+    def get_recent_messages(
+        db: Session,
+        lead: Lead,
+        limit: int = 100
+    ) -> List[ChatMessage]:
+        """
+        Retorna as últimas mensagens do lead, incluindo as arquivadas
+        
+        Args:
+            db: Sessão do banco de dados
+            lead: Objeto Lead
+            limit: Número máximo de mensagens
+        
+        Returns:
+            Lista de ChatMessage em ordem cronológica (as arquivadas vêm como
+            objetos fora da sessão)
+        """
+        messages = db.query(ChatMessage).filter(
+            ChatMessage.whatsapp_number == lead.whatsapp_number
+        ).order_by(ChatMessage.created_at.desc()).limit(limit).all()
+        messages.reverse()
+        
+        if len(messages) < limit:
+            archived = MessageArchiveService.get_archived_messages(db, lead.id)
+            missing = limit - len(messages)
+            messages = [ChatMessage(**record) for record in archived[-missing:]] + messages
+        
+        return messages
+
 
 class QualificationFieldService:
     """Serviço para rastrear campos de qualificação"""
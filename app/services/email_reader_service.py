@@ -1,6 +1,7 @@
 """
 Serviço de Leitura e Processamento de E-mails
 """
+import hashlib
 import imaplib
 import email
 from email.header import decode_header
@@ -13,6 +14,7 @@ from app.database.models import Lead
 from app.services.database_service import LeadService, MessageService
 from app.services.evolution_service import EvolutionService
 from app.services.ai_service import AIService
+from app.core.utils import normalize_email
 from config.settings import settings
 
 logger = logging.getLogger(__name__)
@@ -242,12 +244,12 @@ Resposta (SIM ou NÃO):"""
             logger.info(f"📧 Processando e-mail de {sender_email}: {subject[:50]}...")
             
             # Usa e-mail como identificador único (ao invés de WhatsApp)
-            # Gera um "phone number" fictício baseado no hash do e-mail
-            phone_hash = str(abs(hash(sender_email)) % 10000000000).zfill(10)
-            whatsapp_number = f"email_{phone_hash}"
+            # Gera um "phone number" fictício, sempre o mesmo para o e-mail
+            email_key = normalize_email(sender_email) or sender_email.strip().lower()
+            whatsapp_number = f"email_{hashlib.sha1(email_key.encode()).hexdigest()[:14]}"
             
-            # Verifica se já existe lead com este e-mail
-            existing_lead = self.db.query(Lead).filter(Lead.email == sender_email).first()
+            # Verifica se já existe lead com este e-mail (WhatsApp ou e-mail, pelo índice)
+            existing_lead = LeadService.find_existing_customer(self.db, email=sender_email)
             
             if existing_lead:
                 logger.info(f"Lead já existe para {sender_email}")
@@ -275,7 +277,11 @@ Resposta (SIM ou NÃO):"""
             # Atualiza lead com dados extraídos
             for key, value in extracted_data.items():
                 if value and value != "null" and hasattr(lead, key):
-                    setattr(lead, key, value)
+                    try:
+                        setattr(lead, key, value)
+                    except ValueError as e:
+                        # Atributo de fluxo com valor inválido (ex: "não informado" num booleano)
+                        logger.warning(f"Valor ignorado no e-mail de {sender_email}: {e}")
             
             # Força alguns campos
             if not lead.name and sender_name:
@@ -283,12 +289,16 @@ Resposta (SIM ou NÃO):"""
             if not lead.email:
                 lead.email = sender_email
             
+            # Mesmo CPF/CNPJ ou placa de um lead do WhatsApp: liga os dois
+            if not lead.linked_lead_id and LeadService.resolve_customer(self.db, lead):
+                logger.info(f"🔗 Lead de {sender_email} ligado ao cliente {lead.linked_lead_id}")
+            
             self.db.commit()
             
             # Salva o e-mail como mensagem no histórico
             MessageService.save_message(
                 self.db,
-                whatsapp_number,
+                lead.whatsapp_number,
                 "user",
                 f"📧 E-mail recebido\nAssunto: {subject}\n\n{body[:500]}...",
                 role="user",
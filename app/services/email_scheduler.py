@@ -6,7 +6,7 @@ import logging
 from datetime import datetime
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-from app.database.models import init_db, get_session
+from app.database.connection import get_session
 from app.services.email_reader_service import EmailReaderService
 from config.settings import settings
 
@@ -26,9 +26,8 @@ class EmailScheduler:
         logger.info(f"🔍 VERIFICAÇÃO AUTOMÁTICA DE E-MAILS - {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}")
         logger.info("=" * 60)
         
-        # Inicializa banco de dados
-        engine = init_db(settings.DATABASE_URL)
-        db = get_session(engine)
+        # Sessão do engine compartilhado (tabelas já criadas na inicialização)
+        db = get_session()
         
         try:
             # Cria serviço de leitura
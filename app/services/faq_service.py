@@ -0,0 +1,200 @@
+"""
+Cache semântico de perguntas frequentes
+
+Índice local (similaridade de cosseno em NumPy sobre vetores de n-gramas)
+com as respostas aprovadas em `faq_entries`. Perguntas muito parecidas com
+uma entrada aprovada são respondidas na hora, sem chamar a OpenAI.
+"""
+import json
+import logging
+import os
+import threading
+from typing import List, Optional, Tuple
+import numpy as np
+from sqlalchemy.orm import Session
+from app.core.text_features import HashingVectorizer
+from app.database.models import FaqEntry
+
+logger = logging.getLogger(__name__)
+
+# Dimensão menor que a do classificador: o índice é denso e fica em memória
+FAQ_N_FEATURES = 2 ** 12
+
+
+class FaqIndex:
+    """Índice de respostas aprovadas com busca por similaridade de cosseno"""
+
+    def __init__(self, vectorizer: Optional[HashingVectorizer] = None):
+        self.vectorizer = vectorizer or HashingVectorizer(n_features=FAQ_N_FEATURES)
+        self.matrix = np.zeros((0, self.vectorizer.n_features), dtype=np.float32)
+        self.entry_ids: List[int] = []  # uma posição por variação de pergunta
+        self.questions: List[str] = []
+        self.answers: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.entry_ids)
+
+    def build(self, entries: List[Tuple[int, str, str]]) -> "FaqIndex":
+        """
+        Monta o índice
+
+        Args:
+            entries: Lista de (id, pergunta, resposta); a pergunta pode ter
+                várias variações, uma por linha
+
+        Returns:
+            O próprio índice
+        """
+        rows, entry_ids, questions, answers = [], [], [], []
+        for entry_id, question, answer in entries:
+            for variant in (question or "").splitlines():
+                variant = variant.strip()
+                if not variant or not answer:
+                    continue
+                rows.append(self.vectorizer.to_dense(variant))
+                entry_ids.append(entry_id)
+                questions.append(variant)
+                answers.append(answer)
+
+        if rows:
+            self.matrix = np.vstack(rows).astype(np.float32)
+        else:
+            self.matrix = np.zeros((0, self.vectorizer.n_features), dtype=np.float32)
+        self.entry_ids = entry_ids
+        self.questions = questions
+        self.answers = answers
+        return self
+
+    def search(self, text: str) -> Optional[Tuple[int, float]]:
+        """
+        Busca a variação de pergunta mais parecida
+
+        Args:
+            text: Pergunta do usuário
+
+        Returns:
+            Tupla (posição no índice, similaridade) ou None se o índice estiver vazio
+        """
+        if not len(self):
+            return None
+        indices, values = self.vectorizer.transform_one(text)
+        if not len(indices):
+            return None
+        # Vetores têm norma 1, então o produto escalar é o cosseno
+        scores = self.matrix[:, indices] @ values
+        best = int(np.argmax(scores))
+        return best, float(scores[best])
+
+    def lookup(self, text: str, threshold: float) -> Optional[Tuple[str, float, int]]:
+        """
+        Retorna a resposta aprovada se a similaridade passar do limiar
+
+        Args:
+            text: Pergunta do usuário
+            threshold: Similaridade mínima (0 a 1)
+
+        Returns:
+            Tupla (resposta, similaridade, id da entrada) ou None
+        """
+        result = self.search(text)
+        if result is None:
+            return None
+        position, score = result
+        if score < threshold:
+            return None
+        return self.answers[position], score, self.entry_ids[position]
+
+    def save(self, path: str):
+        """Salva o índice em um arquivo .npz (troca atômica)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            matrix=self.matrix,
+            entry_ids=np.array(self.entry_ids, dtype=np.int64),
+            questions=np.array(json.dumps(self.questions, ensure_ascii=False)),
+            answers=np.array(json.dumps(self.answers, ensure_ascii=False)),
+            config=np.array(json.dumps(self.vectorizer.get_config()))
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "FaqIndex":
+        """Carrega um índice salvo por `save`"""
+        with np.load(path, allow_pickle=False) as data:
+            index = cls(HashingVectorizer.from_config(json.loads(str(data["config"]))))
+            index.matrix = data["matrix"].astype(np.float32)
+            index.entry_ids = [int(i) for i in data["entry_ids"]]
+            index.questions = json.loads(str(data["questions"]))
+            index.answers = json.loads(str(data["answers"]))
+        return index
+
+
+def rebuild_faq_index(db: Session, path: Optional[str] = None) -> int:
+    """
+    Reconstrói o índice a partir das entradas ativas e salva em disco
+
+    O webhook percebe o arquivo novo pela data de modificação e recarrega
+    sozinho, então pode ser chamado pelo dashboard (outro processo).
+
+    Args:
+        db: Sessão do banco de dados
+        path: Caminho do índice (padrão: settings.FAQ_INDEX_PATH)
+
+    Returns:
+        Número de variações de pergunta indexadas
+    """
+    if path is None:
+        from config.settings import settings
+        path = settings.FAQ_INDEX_PATH
+
+    entries = db.query(FaqEntry.id, FaqEntry.question, FaqEntry.answer).filter(
+        FaqEntry.active == True  # noqa: E712
+    ).order_by(FaqEntry.id.asc()).all()
+
+    index = FaqIndex().build([(e.id, e.question, e.answer) for e in entries])
+    index.save(path)
+    logger.info(f"Índice de FAQ reconstruído: {len(index)} perguntas ({path})")
+    return len(index)
+
+
+_index: Optional[FaqIndex] = None
+_index_mtime: Optional[float] = None
+_index_lock = threading.Lock()
+
+
+def get_faq_index(path: Optional[str] = None) -> Optional[FaqIndex]:
+    """
+    Retorna o índice carregado do disco (recarrega se o arquivo mudar)
+
+    Args:
+        path: Caminho do índice (padrão: settings.FAQ_INDEX_PATH)
+
+    Returns:
+        FaqIndex ou None se ainda não foi construído
+    """
+    global _index, _index_mtime
+    if path is None:
+        from config.settings import settings
+        path = settings.FAQ_INDEX_PATH
+
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    if _index is not None and _index_mtime == mtime:
+        return _index
+
+    with _index_lock:
+        if _index is None or _index_mtime != mtime:
+            try:
+                _index = FaqIndex.load(path)
+                _index_mtime = mtime
+                logger.info(f"Índice de FAQ carregado: {len(_index)} perguntas")
+            except Exception as e:
+                logger.error(f"Erro ao carregar índice de FAQ: {str(e)}")
+                return None
+    return _index
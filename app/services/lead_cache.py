@@ -0,0 +1,168 @@
+"""
+Cache em memória do estado dos leads, por número WhatsApp
+
+Guarda um registro compacto (com __slots__) de cada lead em conversa ativa,
+num LRU limitado, pelo número canônico (com e sem o nono dígito caem na
+mesma entrada). A escrita é write-through: quem grava o lead atualiza o
+cache logo após o commit. Escritas de outros processos (dashboard) são
+detectadas pela coluna leads.version, conferida só pelo índice
+(canonical_number, version) antes de usar a entrada do cache. Os atributos
+de fluxo (lead_attributes) vão junto, quando já carregados; alterá-los
+também sobe a versão do lead.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import NO_VALUE, set_committed_value
+from config.settings import settings
+from app.core.utils import canonical_whatsapp_number
+from app.database.models import LEAD_ATTRIBUTES, Lead, LeadAttributes
+
+LEAD_COLUMNS = tuple(column.key for column in Lead.__table__.columns)
+ATTRIBUTE_COLUMNS = tuple(column.key for column in LeadAttributes.__table__.columns)
+
+
+class LeadState:
+    """Cópia imutável das colunas de um lead (uma por slot) e dos seus atributos de fluxo"""
+
+    __slots__ = LEAD_COLUMNS + ("attributes",)
+
+    @classmethod
+    def from_lead(cls, lead: Lead) -> Optional["LeadState"]:
+        """Estado do lead, ou None se os atributos de fluxo não foram carregados"""
+        lead_state = inspect(lead)
+        record = lead_state.attrs.attribute_record.loaded_value
+        if record is NO_VALUE:
+            if lead_state.has_identity:
+                return None
+            record = None  # lead ainda não gravado: não há o que carregar
+        state = cls()
+        for column in LEAD_COLUMNS:
+            object.__setattr__(state, column, getattr(lead, column))
+        if record is not None:
+            record = {column: getattr(record, column) for column in ATTRIBUTE_COLUMNS}
+            record["data"] = dict(record["data"])
+        object.__setattr__(state, "attributes", record)
+        return state
+
+    def __setattr__(self, name, value):
+        raise AttributeError("LeadState é somente leitura")
+
+    def to_lead(self) -> Lead:
+        """
+        Recria o Lead como objeto destacado (detached), pronto para db.add()
+
+        Todas as colunas e os atributos de fluxo vêm preenchidos, então usar
+        o objeto numa sessão não dispara SELECT; só as colunas alteradas
+        entram no UPDATE.
+        """
+        lead = Lead(**{column: getattr(self, column) for column in LEAD_COLUMNS})
+        record = None
+        if self.attributes is not None:
+            record = LeadAttributes(**{**self.attributes, "data": dict(self.attributes["data"])})
+            make_transient_to_detached(record)
+        set_committed_value(lead, "attribute_record", record)
+        make_transient_to_detached(lead)
+        return lead
+
+    def lead_dict(self, flow_type: Optional[str] = None, flow_step: Optional[str] = None) -> dict:
+        """Mesmo formato de LeadService.build_lead_dict, sem passar pelo ORM"""
+        from app.services.database_service import LEAD_FLOW_FIELDS
+        attributes = self.attributes["data"] if self.attributes is not None else {}
+        data = {
+            field: attributes.get(field) if field in LEAD_ATTRIBUTES else getattr(self, field)
+            for field in LEAD_FLOW_FIELDS
+        }
+        data["flow_type"] = flow_type
+        data["flow_step"] = flow_step
+        return data
+
+
+class LeadStateCache:
+    """LRU limitado de LeadState por número WhatsApp (seguro entre threads)"""
+
+    def __init__(self, max_entries: int = 5000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, LeadState]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def lookup(self, whatsapp_number: str) -> Optional[LeadState]:
+        """Retorna o estado em cache, ainda sem conferir a versão"""
+        with self._lock:
+            state = self._entries.get(canonical_whatsapp_number(whatsapp_number))
+            if state is None:
+                self.misses += 1
+            return state
+
+    def validate(self, state: LeadState, version: Optional[int]) -> bool:
+        """
+        Confere a versão do estado com a do banco
+
+        Args:
+            state: Estado retornado por lookup()
+            version: Versão atual no banco (None se o lead não existe mais)
+
+        Returns:
+            True se o estado pode ser usado; se não, a entrada é descartada
+        """
+        key = canonical_whatsapp_number(state.whatsapp_number)
+        with self._lock:
+            if version is not None and state.version == version:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                self.hits += 1
+                return True
+            if self._entries.get(key) is state:
+                del self._entries[key]
+            self.stale += 1
+            return False
+
+    def store(self, lead: Lead) -> Optional[LeadState]:
+        """Grava (ou substitui) o estado do lead; chamar depois do commit"""
+        if not self.enabled or lead is None or lead.id is None:
+            return None
+        state = LeadState.from_lead(lead)
+        if state is None:
+            self.invalidate(lead.whatsapp_number)
+            return None
+        key = canonical_whatsapp_number(state.whatsapp_number)
+        with self._lock:
+            self._entries[key] = state
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return state
+
+    def invalidate(self, whatsapp_number: str):
+        with self._lock:
+            self._entries.pop(canonical_whatsapp_number(whatsapp_number), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.stale = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses + self.stale
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+# Cache do processo
+lead_cache = LeadStateCache(settings.LEAD_CACHE_SIZE)
@@ -0,0 +1,75 @@
+"""
+Leitura incremental do registro de eventos dos leads (tabela lead_events)
+
+Cada mudança de estado do lead (criação, etapa do fluxo, status, fusão e
+exclusão) grava um evento na mesma transação da mudança; ver os listeners
+de Lead em app/database/models.py e LeadService.transition. O id do evento
+é uma sequência crescente: o consumidor guarda o último id lido
+(`last_seq`) e pede só os eventos depois dele, em vez de reler as tabelas.
+
+No SQLite as escritas são serializadas, então um id menor nunca aparece
+depois de um maior. No Postgres duas transações simultâneas podem gravar
+fora de ordem; consumidores de lá devem reler uma pequena janela antes do
+`last_seq`.
+"""
+from typing import Dict, Optional, Sequence
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.database.models import LeadEvent
+
+# Campos retornados de cada evento
+EVENT_FIELDS = ("id", "lead_id", "whatsapp_number", "event_type", "from_value", "to_value", "data", "created_at")
+
+
+def events_statement(
+    since: int = 0,
+    limit: int = 100,
+    lead_id: Optional[int] = None,
+    event_types: Optional[Sequence[str]] = None
+):
+    """Eventos com id maior que `since`, em ordem (pela chave primária ou por (lead_id, id))"""
+    statement = select(*[LeadEvent.__table__.c[name] for name in EVENT_FIELDS]).where(LeadEvent.id > since)
+    if lead_id is not None:
+        statement = statement.where(LeadEvent.lead_id == lead_id)
+    if event_types:
+        statement = statement.where(LeadEvent.event_type.in_(list(event_types)))
+    return statement.order_by(LeadEvent.id).limit(limit)
+
+
+def events_page(rows: Sequence, since: int) -> Dict:
+    """
+    Página de eventos no formato da API
+
+    Returns:
+        {"events": [...], "last_seq": id do último evento (ou `since` se não há novos)}
+    """
+    events = [dict(row._mapping) for row in rows]
+    return {"events": events, "last_seq": events[-1]["id"] if events else since}
+
+
+class LeadEventService:
+    """Serviço de leitura dos eventos dos leads"""
+
+    @staticmethod
+    def events_since(
+        db: Session,
+        since: int = 0,
+        limit: int = 100,
+        lead_id: Optional[int] = None,
+        event_types: Optional[Sequence[str]] = None
+    ) -> Dict:
+        """
+        Eventos gravados depois da sequência `since`
+
+        Args:
+            db: Sessão do banco de dados
+            since: Último id já processado pelo consumidor (0 = desde o início)
+            limit: Máximo de eventos
+            lead_id: Só os eventos deste lead
+            event_types: Só estes tipos (created, flow_step, status, merged, deleted)
+
+        Returns:
+            {"events": [...], "last_seq": ...}; ver events_page
+        """
+        rows = db.execute(events_statement(since, limit, lead_id, event_types)).all()
+        return events_page(rows, since)
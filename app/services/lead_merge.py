@@ -0,0 +1,205 @@
+"""
+Fusão de leads duplicados pelo número canônico
+
+Antes de leads.canonical_number, o mesmo cliente virava dois leads quando
+escrevia com e sem o nono dígito (cada um com seu histórico e seu contexto
+para a IA). A fusão agrupa os leads pelo número canônico e, em cada grupo:
+
+- mantém o lead atualizado mais recentemente (a conversa em andamento);
+- completa os campos vazios dele (e os atributos de fluxo) com os valores
+  dos duplicados, do mais recente para o mais antigo;
+- repassa para ele, com um UPDATE em lote por tabela, as mensagens, campos
+  de qualificação, logs de notificação e segmentos arquivados;
+- apaga os duplicados; leads ligados a eles (linked_lead_id) passam a
+  apontar para o lead mantido;
+- registra em lead_events a fusão (no lead mantido) e a exclusão de cada
+  duplicado, na mesma transação.
+
+Cada grupo é uma transação curta de escrita; um grupo alterado no meio da
+fusão (StaleDataError) fica para a próxima execução.
+"""
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.exc import StaleDataError
+from app.database.connection import get_engine, get_session, write_session_scope
+from app.database.models import (
+    LEAD_ATTRIBUTES, ChatMessage, Lead, MessageArchiveSegment, NotificationLog, QualificationField,
+    backfill_canonical_numbers, lead_event_insert,
+)
+from app.services.conversation_buffer import conversation_buffer
+from app.services.lead_cache import lead_cache
+from app.services.lead_stats import lead_stats_cache
+
+logger = logging.getLogger(__name__)
+
+# Tabelas que apontam para o lead por lead_id e whatsapp_number
+LEAD_CHILD_MODELS = (ChatMessage, QualificationField, NotificationLog, MessageArchiveSegment)
+
+# Colunas do lead mantido que nunca vêm dos duplicados
+_OWN_COLUMNS = (
+    "id", "whatsapp_number", "canonical_number", "created_at", "updated_at", "version", "linked_lead_id",
+)
+
+
+def _is_empty(value) -> bool:
+    return value is None or value == ""
+
+
+def fill_empty_fields(survivor: Lead, duplicate: Lead) -> List[str]:
+    """
+    Completa os campos vazios do lead mantido com os do duplicado
+
+    Returns:
+        Campos preenchidos
+    """
+    filled = []
+    names = [column.key for column in Lead.__table__.columns if column.key not in _OWN_COLUMNS]
+    for name in names + list(LEAD_ATTRIBUTES):
+        value = getattr(duplicate, name)
+        if _is_empty(getattr(survivor, name)) and not _is_empty(value):
+            setattr(survivor, name, value)
+            filled.append(name)
+    return filled
+
+
+class LeadMergeService:
+    """Serviço de fusão de leads duplicados"""
+
+    @staticmethod
+    def find_duplicates(engine=None, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Grupos de leads com o mesmo número canônico
+
+        Returns:
+            Lista de {"canonical_number", "lead_ids"}, o lead mantido primeiro
+        """
+        engine = engine or get_engine()
+        db = get_session(engine)
+        try:
+            numbers = select(Lead.canonical_number).where(Lead.canonical_number.isnot(None)) \
+                .group_by(Lead.canonical_number).having(func.count() > 1) \
+                .order_by(Lead.canonical_number)
+            if limit:
+                numbers = numbers.limit(limit)
+            rows = db.execute(
+                select(Lead.canonical_number, Lead.id)
+                .where(Lead.canonical_number.in_(numbers.scalar_subquery()))
+                .order_by(Lead.canonical_number, Lead.updated_at.desc(), Lead.id.desc())
+            ).all()
+        finally:
+            db.close()
+        groups: Dict[str, List[int]] = {}
+        for canonical_number, lead_id in rows:
+            groups.setdefault(canonical_number, []).append(lead_id)
+        return [{"canonical_number": number, "lead_ids": ids} for number, ids in groups.items()]
+
+    @staticmethod
+    def merge_group(canonical_number: str, engine=None) -> Optional[Dict]:
+        """
+        Funde os leads de um número canônico no atualizado mais recentemente
+
+        Returns:
+            Relatório do grupo, ou None se não há mais duplicados
+        """
+        engine = engine or get_engine()
+        with write_session_scope(engine) as db:
+            leads = (
+                db.query(Lead).options(selectinload(Lead.attribute_record))
+                .filter(Lead.canonical_number == canonical_number)
+                .order_by(Lead.updated_at.desc(), Lead.id.desc())
+                .all()
+            )
+            if len(leads) < 2:
+                return None
+            survivor, duplicates = leads[0], leads[1:]
+            filled = []
+            for duplicate in duplicates:
+                filled += fill_empty_fields(survivor, duplicate)
+            created = [lead.created_at for lead in leads if lead.created_at is not None]
+            if created:
+                survivor.created_at = min(created)
+            survivor.updated_at = datetime.utcnow()
+
+            ids = [lead.id for lead in duplicates]
+            numbers = [lead.whatsapp_number for lead in duplicates]
+            # Ligação com outra pessoa/lead fora do grupo: vale a do lead mais antigo
+            group_ids = {lead.id for lead in leads}
+            links = sorted({lead.linked_lead_id for lead in leads} - group_ids - {None})
+            survivor.linked_lead_id = links[0] if links else None
+            moved = {}
+            for model in LEAD_CHILD_MODELS:
+                table = model.__table__
+                result = db.execute(
+                    update(table)
+                    .where(or_(table.c.lead_id.in_(ids), table.c.whatsapp_number.in_(numbers)))
+                    .values(lead_id=survivor.id, whatsapp_number=survivor.whatsapp_number)
+                    .execution_options(synchronize_session=False)
+                )
+                moved[table.name] = result.rowcount
+            leads_table = Lead.__table__
+            db.execute(
+                update(leads_table)
+                .where(leads_table.c.linked_lead_id.in_(ids), leads_table.c.id.notin_(group_ids))
+                .values(linked_lead_id=survivor.id, version=leads_table.c.version + 1)
+                .execution_options(synchronize_session=False)
+            )
+            for duplicate in duplicates:
+                db.delete(duplicate)
+            db.execute(lead_event_insert(survivor.id, survivor.whatsapp_number, "merged", data={"merged": ids}))
+            report = {
+                "canonical_number": canonical_number,
+                "kept": survivor.id,
+                "merged": ids,
+                "filled": sorted(set(filled)),
+                "moved": moved,
+            }
+
+        for number in numbers + [survivor.whatsapp_number]:
+            lead_cache.invalidate(number)
+            conversation_buffer.invalidate(number)
+        lead_stats_cache.invalidate()
+        logger.info(f"🔗 Leads {ids} fundidos no lead {survivor.id} ({canonical_number})")
+        return report
+
+    @staticmethod
+    def merge_duplicates(engine=None, limit: Optional[int] = None, dry_run: bool = False) -> Dict:
+        """
+        Funde todos os grupos de duplicados (ou os `limit` primeiros)
+
+        Args:
+            engine: Engine do banco (padrão: o da aplicação)
+            limit: Máximo de grupos nesta execução
+            dry_run: Só lista os grupos, sem alterar nada
+
+        Returns:
+            Resumo com grupos, leads fundidos, linhas repassadas por tabela e tempo
+        """
+        engine = engine or get_engine()
+        started = time.perf_counter()
+        backfill_canonical_numbers(engine)
+        groups = LeadMergeService.find_duplicates(engine, limit=limit)
+        summary = {"groups": len(groups), "merged_leads": 0, "skipped": 0, "moved": {}, "reports": []}
+        if dry_run:
+            summary["reports"] = groups
+            summary["merged_leads"] = sum(len(group["lead_ids"]) - 1 for group in groups)
+            return summary
+        for group in groups:
+            try:
+                report = LeadMergeService.merge_group(group["canonical_number"], engine)
+            except StaleDataError:
+                # Lead alterado pelo webhook durante a fusão: fica para a próxima execução
+                logger.warning(f"⚠️ Grupo {group['canonical_number']} alterado durante a fusão; pulando")
+                summary["skipped"] += 1
+                continue
+            if report is None:
+                continue
+            summary["reports"].append(report)
+            summary["merged_leads"] += len(report["merged"])
+            for table, count in report["moved"].items():
+                summary["moved"][table] = summary["moved"].get(table, 0) + count
+        summary["seconds"] = round(time.perf_counter() - started, 3)
+        return summary
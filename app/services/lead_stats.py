@@ -0,0 +1,145 @@
+"""
+Estatísticas agregadas dos leads, calculadas no banco e mantidas em cache
+
+Uma única consulta `GROUP BY status` devolve o total por status e, na
+mesma passada, quantos leads foram criados no dia (soma condicional no
+intervalo [hoje, amanhã)). Ela é resolvida só pelo índice
+(status, created_at), sem carregar linhas no Python.
+
+O resultado fica em cache até a próxima gravação de lead que mude a
+contagem (lead novo, removido ou com status alterado), feita neste
+processo, ou até LEAD_STATS_CACHE_SECONDS — o limite cobre gravações de
+outros processos, como o dashboard.
+"""
+import threading
+import time
+from datetime import date, datetime, time as day_time, timedelta
+from typing import Dict, Optional, Tuple
+from sqlalchemy import case, event, func, inspect, select
+from sqlalchemy.orm import Session
+from config.settings import settings
+from app.database.models import Lead
+
+_DIRTY_KEY = "lead_stats_dirty"
+
+
+def day_range(day: date) -> Tuple[datetime, datetime]:
+    """Retorna o intervalo [início do dia, início do dia seguinte)"""
+    start = datetime.combine(day, day_time.min)
+    return start, start + timedelta(days=1)
+
+
+def status_counts_query(day: date):
+    """
+    Monta a consulta de contagem por status
+
+    Returns:
+        SELECT com as colunas (status, total, criados no dia)
+    """
+    start, end = day_range(day)
+    created_today = func.sum(
+        case(((Lead.created_at >= start) & (Lead.created_at < end), 1), else_=0)
+    )
+    return select(Lead.status, func.count(), created_today).group_by(Lead.status)
+
+
+def summarize(rows, day: date) -> Dict:
+    """
+    Converte as linhas de status_counts_query em estatísticas
+
+    Returns:
+        Dict com total, created_today e by_status ({status: quantidade})
+    """
+    by_status = {}
+    total = created_today = 0
+    for status, count, today in rows:
+        by_status[status] = count
+        total += count
+        created_today += today or 0
+    return {
+        "day": day.isoformat(),
+        "total": total,
+        "created_today": created_today,
+        "by_status": by_status,
+    }
+
+
+class LeadStatsCache:
+    """Cache do último resultado de estatísticas (seguro entre threads)"""
+
+    def __init__(self, ttl_seconds: float = 30):
+        self.ttl_seconds = ttl_seconds
+        self._stats: Optional[Dict] = None
+        self._stored_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self) -> int:
+        """Contador de invalidações; passar para store() ao guardar um resultado"""
+        return self._generation
+
+    def get(self, day: date) -> Optional[Dict]:
+        """Retorna as estatísticas em cache do dia, se ainda válidas"""
+        with self._lock:
+            stats = self._stats
+            if stats is None or stats["day"] != day.isoformat():
+                return None
+            if time.monotonic() - self._stored_at > self.ttl_seconds:
+                return None
+            return stats
+
+    def store(self, stats: Dict, generation: int):
+        """
+        Guarda o resultado calculado
+
+        Args:
+            stats: Resultado de summarize()
+            generation: Valor de `generation` lido antes da consulta; se houve
+                gravação de lead no meio, o resultado não é guardado
+        """
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            if generation == self._generation:
+                self._stats = stats
+                self._stored_at = time.monotonic()
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._stats = None
+
+    def clear(self):
+        self.invalidate()
+
+
+def _changes_counts(lead: Lead) -> bool:
+    state = inspect(lead)
+    return state.attrs.status.history.has_changes() or state.attrs.created_at.history.has_changes()
+
+
+@event.listens_for(Session, "before_flush")
+def _track_lead_writes(session, flush_context, instances):
+    if session.info.get(_DIRTY_KEY):
+        return
+    leads_added = any(isinstance(obj, Lead) for obj in session.new)
+    leads_removed = any(isinstance(obj, Lead) for obj in session.deleted)
+    leads_changed = any(isinstance(obj, Lead) and _changes_counts(obj) for obj in session.dirty)
+    if leads_added or leads_removed or leads_changed:
+        session.info[_DIRTY_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop(_DIRTY_KEY, False):
+        lead_stats_cache.invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop(_DIRTY_KEY, None)
+
+
+# Cache do processo
+lead_stats_cache = LeadStatsCache(settings.LEAD_STATS_CACHE_SECONDS)
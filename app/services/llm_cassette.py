@@ -0,0 +1,208 @@
+"""
+Gravação e reprodução (cassete) das chamadas à OpenAI
+
+Envolve o cliente usado pelo AIService: no modo "record" chama a API de
+verdade e grava cada par requisição/resposta; no modo "replay" devolve a
+resposta gravada sem rede e sem custo. Em ambos os modos contabiliza
+chamadas, tokens de entrada/saída e latência (real ou simulada).
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from types import SimpleNamespace
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CASSETTE_VERSION = 1
+
+# Modelo de latência usado para respostas sintéticas (sem gravação real)
+SIMULATED_BASE_LATENCY_MS = 350.0
+SIMULATED_MS_PER_OUTPUT_TOKEN = 12.0
+SIMULATED_MS_PER_INPUT_TOKEN = 0.05
+
+
+class CassetteMissError(Exception):
+    """Requisição sem resposta gravada no modo replay"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa determinística de tokens (~4 caracteres por token)"""
+    return max(1, (len(text or "") + 3) // 4)
+
+
+def request_key(kwargs: Dict) -> str:
+    """Chave estável da requisição (modelo, parâmetros e mensagens)"""
+    payload = json.dumps(kwargs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CassetteStats:
+    """Contadores acumulados das chamadas à IA"""
+
+    def __init__(self):
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latency_ms = 0.0
+        self.misses = 0
+        self.synthetic = 0
+
+    def snapshot(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "latency_ms": round(self.latency_ms, 1),
+            "misses": self.misses,
+            "synthetic": self.synthetic,
+        }
+
+
+class CassetteClient:
+    """
+    Substituto do cliente OpenAI com a mesma interface chat.completions.create
+
+    Args:
+        inner: Cliente OpenAI real (pode ser None no modo replay)
+        path: Arquivo JSON do cassete
+        mode: "record" ou "replay"
+        synthesizer: Função opcional (kwargs -> conteúdo) usada no replay quando
+            não há gravação; sem ela, uma requisição não gravada gera CassetteMissError
+    """
+
+    def __init__(
+        self,
+        inner,
+        path: str,
+        mode: str = "replay",
+        synthesizer: Optional[Callable[[Dict], str]] = None
+    ):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Modo de cassete inválido: {mode}")
+        self.inner = inner
+        self.path = path
+        self.mode = mode
+        self.synthesizer = synthesizer
+        self.stats = CassetteStats()
+        self._lock = threading.Lock()
+        self._interactions = self._load()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _load(self) -> Dict:
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"Versão de cassete incompatível: {data.get('version')}")
+        return data.get("interactions", {})
+
+    def save(self):
+        """Grava o cassete em disco (troca atômica)"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            data = {"version": CASSETTE_VERSION, "interactions": self._interactions}
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def _create(self, **kwargs):
+        key = request_key(kwargs)
+
+        if self.mode == "record":
+            start = time.perf_counter()
+            response = self.inner.chat.completions.create(**kwargs)
+            latency_ms = (time.perf_counter() - start) * 1000
+            usage = getattr(response, "usage", None)
+            interaction = {
+                "request": kwargs,
+                "content": response.choices[0].message.content,
+                "input_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+                "output_tokens": getattr(usage, "completion_tokens", 0) or 0,
+                "latency_ms": round(latency_ms, 1),
+                "synthetic": False,
+            }
+            with self._lock:
+                self._interactions[key] = interaction
+            self.save()
+        else:
+            interaction = self._interactions.get(key)
+            if interaction is None:
+                self.stats.misses += 1
+                if self.synthesizer is None:
+                    raise CassetteMissError(f"Requisição não gravada no cassete ({key[:12]})")
+                interaction = self._synthesize(kwargs)
+                with self._lock:
+                    self._interactions[key] = interaction
+
+        self._account(interaction)
+        return _build_response(interaction)
+
+    def _synthesize(self, kwargs: Dict) -> Dict:
+        """Gera resposta determinística com tokens e latência estimados"""
+        content = self.synthesizer(kwargs)
+        input_tokens = sum(
+            estimate_tokens(m.get("content", "")) + 4 for m in kwargs.get("messages", [])
+        )
+        output_tokens = estimate_tokens(content)
+        latency_ms = (
+            SIMULATED_BASE_LATENCY_MS
+            + output_tokens * SIMULATED_MS_PER_OUTPUT_TOKEN
+            + input_tokens * SIMULATED_MS_PER_INPUT_TOKEN
+        )
+        return {
+            "request": kwargs,
+            "content": content,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "latency_ms": round(latency_ms, 1),
+            "synthetic": True,
+        }
+
+    def _account(self, interaction: Dict):
+        with self._lock:
+            self.stats.calls += 1
+            self.stats.input_tokens += interaction["input_tokens"]
+            self.stats.output_tokens += interaction["output_tokens"]
+            self.stats.latency_ms += interaction["latency_ms"]
+            if interaction.get("synthetic"):
+                self.stats.synthetic += 1
+
+
+def _build_response(interaction: Dict):
+    """Monta objeto com a mesma forma da resposta do SDK da OpenAI"""
+    usage = SimpleNamespace(
+        prompt_tokens=interaction["input_tokens"],
+        completion_tokens=interaction["output_tokens"],
+        total_tokens=interaction["input_tokens"] + interaction["output_tokens"],
+    )
+    message = SimpleNamespace(role="assistant", content=interaction["content"])
+    return SimpleNamespace(choices=[SimpleNamespace(message=message, index=0)], usage=usage)
+
+
+_cassettes: Dict[str, CassetteClient] = {}
+_cassettes_lock = threading.Lock()
+
+
+def get_cassette(inner, path: str, mode: str) -> CassetteClient:
+    """
+    Retorna o cassete compartilhado do processo para o arquivo informado
+
+    O AIService é criado a cada mensagem, então o cassete precisa ser único
+    por processo para acumular gravações e estatísticas.
+    """
+    with _cassettes_lock:
+        cassette = _cassettes.get(path)
+        if cassette is None or cassette.mode != mode:
+            cassette = CassetteClient(inner, path, mode)
+            _cassettes[path] = cassette
+        elif cassette.inner is None and inner is not None:
+            cassette.inner = inner
+        return cassette
@@ -0,0 +1,79 @@
+"""
+Scheduler das tarefas de manutenção do banco (arquivamento, retenção e backup)
+"""
+import logging
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.interval import IntervalTrigger
+from app.services.backup import backup_job
+from app.services.message_archive import archive_job
+from app.services.retention import retention_job
+from config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MaintenanceScheduler:
+    """Scheduler das tarefas periódicas de manutenção"""
+
+    def __init__(self):
+        self.scheduler = AsyncIOScheduler()
+        self.is_running = False
+
+    def start(self):
+        """Agenda as tarefas com intervalo configurado (intervalo 0 desativa a tarefa)"""
+        if self.is_running:
+            logger.warning("⚠️  Scheduler de manutenção já está rodando")
+            return
+
+        if settings.ARCHIVE_INTERVAL_HOURS > 0:
+            self.scheduler.add_job(
+                archive_job,
+                trigger=IntervalTrigger(hours=settings.ARCHIVE_INTERVAL_HOURS),
+                id='message_archive_job',
+                name='Arquivamento de Mensagens',
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+            logger.info(f"📦 Arquivamento de mensagens a cada {settings.ARCHIVE_INTERVAL_HOURS:g}h")
+
+        if settings.RETENTION_INTERVAL_HOURS > 0:
+            self.scheduler.add_job(
+                retention_job,
+                trigger=IntervalTrigger(hours=settings.RETENTION_INTERVAL_HOURS),
+                id='retention_job',
+                name='Retenção de Dados',
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+            logger.info(f"🧹 Retenção de dados a cada {settings.RETENTION_INTERVAL_HOURS:g}h")
+
+        if settings.BACKUP_INTERVAL_HOURS > 0 and settings.DATABASE_URL.startswith("sqlite"):
+            self.scheduler.add_job(
+                backup_job,
+                trigger=IntervalTrigger(hours=settings.BACKUP_INTERVAL_HOURS),
+                id='backup_job',
+                name='Backup do Banco',
+                replace_existing=True,
+                max_instances=1,
+                coalesce=True
+            )
+            logger.info(f"💾 Backup do banco a cada {settings.BACKUP_INTERVAL_HOURS:g}h")
+
+        if not self.scheduler.get_jobs():
+            return
+
+        self.scheduler.start()
+        self.is_running = True
+
+    def stop(self):
+        """Para o scheduler"""
+        if not self.is_running:
+            return
+        self.scheduler.shutdown()
+        self.is_running = False
+
+
+# Instância global do scheduler
+maintenance_scheduler = MaintenanceScheduler()
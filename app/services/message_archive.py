@@ -0,0 +1,364 @@
+"""
+Arquivamento de mensagens antigas (chat_messages) em segmentos comprimidos
+
+As mensagens de leads encerrados (ARCHIVE_STATUSES) ou parados há mais de
+ARCHIVE_INACTIVE_DAYS saem da tabela chat_messages e vão para arquivos
+JSONL comprimidos com gzip, um por mês (ARCHIVE_DIR/2024-05.jsonl.gz).
+
+Os arquivos só recebem acréscimos: cada lead arquivado vira um trecho gzip
+próprio no fim do arquivo do mês (gzip aceita trechos concatenados). A tabela
+message_archive_segments guarda onde fica cada trecho, então ler as mensagens
+arquivadas de um lead é um seek e a descompressão só do que é dele.
+
+Ordem de gravação: o trecho é gravado (e sincronizado em disco) antes da
+transação que cria o índice e apaga as mensagens da tabela. Se o processo
+cair no meio, sobra no arquivo um trecho sem índice, que é ignorado; as
+mensagens continuam na tabela e são arquivadas na próxima execução.
+"""
+import asyncio
+import gzip
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import orjson
+from sqlalchemy import delete, exists, func, or_, select
+from sqlalchemy.orm import Session
+from config.settings import settings
+from app.database.connection import get_engine, get_session, write_session_scope
+from app.database.models import ChatMessage, Lead, MessageArchiveSegment
+from app.services.conversation_buffer import conversation_buffer
+
+logger = logging.getLogger(__name__)
+
+# Colunas de chat_messages guardadas em cada linha do segmento
+ARCHIVE_FIELDS = ("id", "lead_id", "whatsapp_number", "sender", "message", "role", "created_at")
+
+
+def segment_name(moment: datetime) -> str:
+    """Nome do arquivo de segmento do mês da mensagem"""
+    return f"{moment:%Y-%m}.jsonl.gz"
+
+
+def write_member(directory: Path, segment: str, records: Sequence[dict]) -> Tuple[int, int]:
+    """
+    Acrescenta um trecho gzip com as linhas ao fim do arquivo de segmento
+
+    Returns:
+        Tupla (posição inicial, tamanho em bytes) do trecho no arquivo
+    """
+    payload = b"".join(orjson.dumps(record) + b"\n" for record in records)
+    member = gzip.compress(payload)
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / segment, "ab") as file:
+        offset = file.seek(0, os.SEEK_END)
+        file.write(member)
+        file.flush()
+        os.fsync(file.fileno())
+    return offset, len(member)
+
+
+def read_member(directory: Path, segment: str, offset: int, length: int) -> List[dict]:
+    """Lê um trecho gravado por write_member"""
+    with open(directory / segment, "rb") as file:
+        file.seek(offset)
+        member = file.read(length)
+    records = []
+    for line in gzip.decompress(member).splitlines():
+        record = orjson.loads(line)
+        record["created_at"] = datetime.fromisoformat(record["created_at"]) if record["created_at"] else None
+        records.append(record)
+    return records
+
+
+def rewrite_segment(directory: Path, segment: str, entries: Sequence[MessageArchiveSegment]) -> str:
+    """
+    Copia só os trechos indicados para um arquivo novo do mesmo mês
+
+    Atualiza segment e byte_offset das entradas (o commit fica com quem
+    chamou). O arquivo antigo não é alterado: leitores com o índice antigo
+    continuam lendo certo até ele ser removido.
+
+    Returns:
+        Nome do arquivo novo
+    """
+    month = segment.split(".")[0]
+    new_segment = f"{month}.{datetime.utcnow():%Y%m%d%H%M%S%f}.jsonl.gz"
+    with open(directory / segment, "rb") as source, open(directory / new_segment, "wb") as target:
+        for entry in sorted(entries, key=lambda item: item.byte_offset):
+            source.seek(entry.byte_offset)
+            offset = target.tell()
+            target.write(source.read(entry.byte_length))
+            entry.segment = new_segment
+            entry.byte_offset = offset
+        target.flush()
+        os.fsync(target.fileno())
+    return new_segment
+
+
+def remove_unreferenced(db: Session, directory: Path, segments: Iterable[str]) -> List[str]:
+    """Apaga os arquivos de segmento que não têm mais nenhuma entrada no índice"""
+    removed = []
+    for segment in segments:
+        referenced = db.scalar(
+            select(MessageArchiveSegment.id).where(MessageArchiveSegment.segment == segment).limit(1)
+        )
+        if referenced is None and (directory / segment).exists():
+            (directory / segment).unlink()
+            removed.append(segment)
+    return removed
+
+
+def read_segments(segments: Iterable, directory: Optional[Path] = None) -> List[dict]:
+    """
+    Lê as mensagens dos trechos indicados, em ordem (created_at, id)
+
+    Args:
+        segments: Linhas de message_archive_segments (segment, byte_offset, byte_length)
+        directory: Pasta dos arquivos (padrão: ARCHIVE_DIR)
+    """
+    directory = Path(directory or settings.ARCHIVE_DIR)
+    records = []
+    for entry in segments:
+        records.extend(read_member(directory, entry.segment, entry.byte_offset, entry.byte_length))
+    records.sort(key=lambda record: (record["created_at"] or datetime.min, record["id"]))
+    return records
+
+
+def segments_query(lead_id: int):
+    """SELECT dos trechos arquivados de um lead"""
+    return select(
+        MessageArchiveSegment.segment,
+        MessageArchiveSegment.byte_offset,
+        MessageArchiveSegment.byte_length,
+    ).where(MessageArchiveSegment.lead_id == lead_id).order_by(MessageArchiveSegment.first_message_at)
+
+
+class MessageArchiveService:
+    """Serviço de arquivamento e leitura de mensagens arquivadas"""
+
+    @staticmethod
+    def find_archivable_leads(
+        db: Session,
+        statuses: Sequence[str],
+        inactive_before: datetime,
+        limit: Optional[int] = None
+    ) -> List[Tuple[int, str]]:
+        """
+        Lista leads encerrados ou inativos que ainda têm mensagens na tabela
+
+        Returns:
+            Lista de (lead_id, whatsapp_number)
+        """
+        last_activity = func.coalesce(Lead.updated_at, Lead.created_at)
+        has_messages = exists().where(ChatMessage.lead_id == Lead.id)
+        query = (
+            select(Lead.id, Lead.whatsapp_number)
+            .where(or_(Lead.status.in_(statuses), last_activity < inactive_before))
+            .where(has_messages)
+            .order_by(Lead.id)
+        )
+        if limit:
+            query = query.limit(limit)
+        return [(lead_id, number) for lead_id, number in db.execute(query)]
+
+    @staticmethod
+    def archive_lead(
+        lead_id: int,
+        engine=None,
+        directory: Optional[Path] = None
+    ) -> int:
+        """
+        Move as mensagens de um lead para os segmentos do mês
+
+        Returns:
+            Quantidade de mensagens arquivadas
+        """
+        directory = Path(directory or settings.ARCHIVE_DIR)
+        columns = [getattr(ChatMessage, field) for field in ARCHIVE_FIELDS]
+
+        # Leitura e gravação dos trechos fora da transação de escrita: compressão
+        # e fsync não seguram o lock de escrita do SQLite (nem o do processo)
+        db = get_session(engine)
+        try:
+            rows = db.execute(
+                select(*columns)
+                .where(ChatMessage.lead_id == lead_id)
+                .order_by(ChatMessage.created_at, ChatMessage.id)
+            ).all()
+        finally:
+            db.close()
+        if not rows:
+            return 0
+
+        by_month: Dict[str, List[dict]] = defaultdict(list)
+        for row in rows:
+            record = dict(row._mapping)
+            by_month[segment_name(record["created_at"] or datetime.utcnow())].append(record)
+
+        entries = []
+        for segment, records in by_month.items():
+            offset, length = write_member(directory, segment, records)
+            entries.append(MessageArchiveSegment(
+                lead_id=lead_id,
+                whatsapp_number=records[0]["whatsapp_number"],
+                segment=segment,
+                byte_offset=offset,
+                byte_length=length,
+                message_count=len(records),
+                first_message_at=records[0]["created_at"],
+                last_message_at=records[-1]["created_at"],
+            ))
+
+        # Transação curta: índice dos trechos e remoção das mensagens da tabela
+        with write_session_scope(engine) as db:
+            deleted = db.execute(
+                delete(ChatMessage).where(ChatMessage.id.in_([row.id for row in rows])),
+                execution_options={"synchronize_session": False}
+            ).rowcount
+            if deleted != len(rows):
+                # Mensagens apagadas no meio (ex.: exclusão do lead): desfaz; os
+                # trechos já gravados ficam sem índice e são ignorados
+                raise RuntimeError(
+                    f"Mensagens do lead {lead_id} mudaram durante o arquivamento ({deleted}/{len(rows)})"
+                )
+            db.add_all(entries)
+        return len(rows)
+
+    @staticmethod
+    def archive_messages(
+        engine=None,
+        directory: Optional[Path] = None,
+        statuses: Optional[Sequence[str]] = None,
+        inactive_days: Optional[int] = None,
+        max_leads: Optional[int] = None,
+        dry_run: bool = False
+    ) -> Dict:
+        """
+        Arquiva as mensagens de todos os leads elegíveis, um lead por transação
+
+        Args:
+            engine: Engine do banco (padrão: engine compartilhado)
+            directory: Pasta dos segmentos (padrão: ARCHIVE_DIR)
+            statuses: Status de leads encerrados (padrão: ARCHIVE_STATUSES)
+            inactive_days: Dias sem atividade para arquivar (padrão: ARCHIVE_INACTIVE_DAYS)
+            max_leads: Limite de leads por execução (opcional)
+            dry_run: Só conta os leads elegíveis, sem arquivar
+
+        Returns:
+            Dict com leads e mensagens arquivadas
+        """
+        engine = engine or get_engine()
+        statuses = list(statuses or settings.ARCHIVE_STATUSES)
+        inactive_days = settings.ARCHIVE_INACTIVE_DAYS if inactive_days is None else inactive_days
+        inactive_before = datetime.utcnow() - timedelta(days=inactive_days)
+
+        db = get_session(engine)
+        try:
+            leads = MessageArchiveService.find_archivable_leads(db, statuses, inactive_before, max_leads)
+        finally:
+            db.close()
+
+        stats = {"leads": 0, "messages": 0, "eligible_leads": len(leads)}
+        if dry_run:
+            return stats
+
+        for lead_id, whatsapp_number in leads:
+            try:
+                archived = MessageArchiveService.archive_lead(lead_id, engine=engine, directory=directory)
+            except Exception as e:
+                logger.error(f"Erro ao arquivar mensagens do lead {lead_id}: {str(e)}")
+                continue
+            if archived:
+                # O buffer espelha a tabela; a conversa volta dela se o lead escrever de novo
+                conversation_buffer.invalidate(whatsapp_number)
+                stats["leads"] += 1
+                stats["messages"] += archived
+
+        logger.info(f"📦 Arquivamento: {stats['messages']} mensagens de {stats['leads']} leads")
+        return stats
+
+    @staticmethod
+    def purge_lead(
+        lead_id: int,
+        engine=None,
+        directory: Optional[Path] = None
+    ) -> int:
+        """
+        Remove dos segmentos todas as mensagens arquivadas de um lead
+
+        Cada arquivo com trechos do lead é reescrito sem eles (os trechos
+        dos outros leads são copiados byte a byte, sem descomprimir).
+
+        Returns:
+            Quantidade de mensagens removidas
+        """
+        directory = Path(directory or settings.ARCHIVE_DIR)
+        with write_session_scope(engine) as db:
+            own = db.query(MessageArchiveSegment).filter(MessageArchiveSegment.lead_id == lead_id).all()
+            if not own:
+                return 0
+            touched = {entry.segment for entry in own}
+            for segment in touched:
+                others = db.query(MessageArchiveSegment).filter(
+                    MessageArchiveSegment.segment == segment,
+                    MessageArchiveSegment.lead_id != lead_id
+                ).all()
+                if others and (directory / segment).exists():
+                    rewrite_segment(directory, segment, others)
+            for entry in own:
+                db.delete(entry)
+            db.flush()
+            removed = sum(entry.message_count or 0 for entry in own)
+        # Depois do commit: os arquivos antigos não têm mais referências
+        db = get_session(engine)
+        try:
+            remove_unreferenced(db, directory, touched)
+        finally:
+            db.close()
+        return removed
+
+    @staticmethod
+    def expire(
+        before: datetime,
+        engine=None,
+        directory: Optional[Path] = None
+    ) -> int:
+        """
+        Remove as mensagens arquivadas cuja última mensagem é anterior a `before`
+
+        Apaga as entradas do índice e os arquivos de segmento que ficarem
+        sem entradas (como os segmentos são mensais, meses antigos saem
+        inteiros).
+
+        Returns:
+            Quantidade de mensagens removidas
+        """
+        directory = Path(directory or settings.ARCHIVE_DIR)
+        with write_session_scope(engine) as db:
+            expired = db.query(MessageArchiveSegment).filter(MessageArchiveSegment.last_message_at < before).all()
+            touched = {entry.segment for entry in expired}
+            removed = sum(entry.message_count or 0 for entry in expired)
+            for entry in expired:
+                db.delete(entry)
+        db = get_session(engine)
+        try:
+            remove_unreferenced(db, directory, touched)
+        finally:
+            db.close()
+        return removed
+
+    @staticmethod
+    def get_archived_messages(db: Session, lead_id: int) -> List[dict]:
+        """Retorna as mensagens arquivadas de um lead, em ordem cronológica"""
+        return read_segments(db.execute(segments_query(lead_id)).all())
+
+
+async def archive_job():
+    """Job periódico de arquivamento (roda fora do event loop)"""
+    try:
+        await asyncio.to_thread(MessageArchiveService.archive_messages)
+    except Exception as e:
+        logger.error(f"❌ Erro no arquivamento de mensagens: {str(e)}")
@@ -6,8 +6,10 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import Optional, Dict
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
 from config.settings import settings
+from app.database.connection import write_session_scope
 from app.database.models import NotificationLog
 from app.services.evolution_service import EvolutionService
 
@@ -15,8 +17,15 @@ from app.services.evolution_service import EvolutionService
 class NotificationService:
     """Serviço centralizado de notificações"""
     
-    def __init__(self, db: Optional[Session] = None):
+    def __init__(self, db: Optional[Session] = None, engine: Optional[Engine] = None):
+        """
+        Args:
+            db: Sessão usada para gravar os logs de notificação
+            engine: Alternativa a `db` para quem roda em background: cada log
+                abre a própria transação curta (seguro fora da thread de origem)
+        """
         self.db = db
+        self.engine = engine
         self.evolution = EvolutionService()
     
     def send_email(
@@ -58,7 +67,7 @@ class NotificationService:
                 server.send_message(msg)
             
             # Log no banco de dados
-            if self.db:
+            if self.db or self.engine:
                 self._log_notification(
                     recipient=recipient_email,
                     notification_type="email",
@@ -70,7 +79,7 @@ class NotificationService:
         except (OSError, ConnectionError) as e:
             # Erro de rede (esperado no Railway - SMTP bloqueado)
             # Não loga como erro, apenas aviso silencioso
-            if self.db:
+            if self.db or self.engine:
                 self._log_notification(
                     recipient=recipient_email,
                     notification_type="email",
@@ -82,7 +91,7 @@ class NotificationService:
         except Exception as e:
             # Outros erros (credenciais, etc)
             print(f"Erro ao enviar email: {str(e)}")
-            if self.db:
+            if self.db or self.engine:
                 self._log_notification(
                     recipient=recipient_email,
                     notification_type="email",
@@ -117,8 +126,10 @@ class NotificationService:
             else:
                 print(f"[NOTIFICATION] ❌ Falha ao enviar WhatsApp para {whatsapp_number}")
             
-            if self.db:
-                self._log_notification(
+            if self.db or self.engine:
+                # Gravação síncrona fora do event loop
+                await asyncio.to_thread(
+                    self._log_notification,
                     recipient=whatsapp_number,
                     notification_type="whatsapp",
                     status="enviado" if success else "falha"
@@ -128,8 +139,10 @@ class NotificationService:
         
         except Exception as e:
             print(f"[NOTIFICATION] ❌ ERRO ao enviar notificação WhatsApp para {whatsapp_number}: {str(e)}")
-            if self.db:
-                self._log_notification(
+            if self.db or self.engine:
+                # Gravação síncrona fora do event loop
+                await asyncio.to_thread(
+                    self._log_notification,
                     recipient=whatsapp_number,
                     notification_type="whatsapp",
                     status="falha",
@@ -137,191 +150,187 @@ class NotificationService:
                 )
             return False
     
-    async def notify_admin_lead_qualified(
-        self,
-        lead_data: dict,
-        whatsapp_number: str
-    ) -> bool:
+    @staticmethod
+    def build_lead_qualified_message(lead_data: dict, whatsapp_number: str) -> str:
         """
-        Notifica admin quando um lead é qualificado
+        Monta a mensagem de WhatsApp enviada ao admin quando um lead é qualificado
         
         Args:
             lead_data: Dados do lead completos
             whatsapp_number: Número WhatsApp do lead
         
         Returns:
-            True se notificações foram enviadas com sucesso
+            Texto da mensagem conforme o tipo de fluxo
         """
-        try:
-            flow_type = lead_data.get('flow_type', 'desconhecido')
+        flow_type = lead_data.get('flow_type', 'desconhecido')
+        
+        # Monta mensagem baseada no tipo de fluxo
+        if flow_type == 'seguro_auto':
+            # Coleta TODOS os dados disponíveis
+            dados_principais = []
+            if lead_data.get('name'):
+                dados_principais.append(f"👤 Nome: {lead_data.get('name')}")
+            dados_principais.append(f"📱 WhatsApp: {whatsapp_number}")
+            if lead_data.get('cpf_cnpj'):
+                dados_principais.append(f"🔢 CPF/CNPJ: {lead_data.get('cpf_cnpj')}")
+            if lead_data.get('vehicle_plate'):
+                dados_principais.append(f"🚙 Placa: {lead_data.get('vehicle_plate')}")
+            
+            contato = []
+            if lead_data.get('phone'):
+                contato.append(f"📞 Telefone: {lead_data.get('phone')}")
+            if lead_data.get('email'):
+                contato.append(f"📧 Email: {lead_data.get('email')}")
+            if lead_data.get('second_email'):
+                contato.append(f"📧 Email 2: {lead_data.get('second_email')}")
+            
+            dados_complementares = []
+            if lead_data.get('cep_pernoite'):
+                dados_complementares.append(f"📍 CEP Pernoite: {lead_data.get('cep_pernoite')}")
+            if lead_data.get('profession'):
+                dados_complementares.append(f"🏢 Profissão: {lead_data.get('profession')}")
+            if lead_data.get('marital_status'):
+                dados_complementares.append(f"💍 Estado Civil: {lead_data.get('marital_status')}")
+            if lead_data.get('vehicle_usage'):
+                dados_complementares.append(f"🎯 Uso: {lead_data.get('vehicle_usage')}")
+            if lead_data.get('has_young_driver') is not None:
+                dados_complementares.append(f"👨‍👦 Condutor < 26 anos: {lead_data.get('has_young_driver')}")
+            
+            extras = []
+            if lead_data.get('interest'):
+                extras.append(f"📝 Observações: {lead_data.get('interest')}")
+            if lead_data.get('necessity'):
+                extras.append(f"📝 Necessidade: {lead_data.get('necessity')}")
+            
+            # Monta mensagem apenas com dados disponíveis
+            msg_parts = [f"🔔 *NOVO LEAD - SEGURO AUTO*\n"]
+            
+            if dados_principais:
+                msg_parts.append("📋 *DADOS PRINCIPAIS:*")
+                msg_parts.extend(dados_principais)
+                msg_parts.append("")
             
-            # Monta mensagem baseada no tipo de fluxo
-            if flow_type == 'seguro_auto':
-                # Coleta TODOS os dados disponíveis
-                dados_principais = []
-                if lead_data.get('name'):
-                    dados_principais.append(f"👤 Nome: {lead_data.get('name')}")
-                dados_principais.append(f"📱 WhatsApp: {whatsapp_number}")
-                if lead_data.get('cpf_cnpj'):
-                    dados_principais.append(f"🔢 CPF/CNPJ: {lead_data.get('cpf_cnpj')}")
-                if lead_data.get('vehicle_plate'):
-                    dados_principais.append(f"🚙 Placa: {lead_data.get('vehicle_plate')}")
-                
-                contato = []
-                if lead_data.get('phone'):
-                    contato.append(f"📞 Telefone: {lead_data.get('phone')}")
-                if lead_data.get('email'):
-                    contato.append(f"📧 Email: {lead_data.get('email')}")
-                if lead_data.get('second_email'):
-                    contato.append(f"📧 Email 2: {lead_data.get('second_email')}")
-                
-                dados_complementares = []
-                if lead_data.get('cep_pernoite'):
-                    dados_complementares.append(f"📍 CEP Pernoite: {lead_data.get('cep_pernoite')}")
-                if lead_data.get('profession'):
-                    dados_complementares.append(f"🏢 Profissão: {lead_data.get('profession')}")
-                if lead_data.get('marital_status'):
-                    dados_complementares.append(f"💍 Estado Civil: {lead_data.get('marital_status')}")
-                if lead_data.get('vehicle_usage'):
-                    dados_complementares.append(f"🎯 Uso: {lead_data.get('vehicle_usage')}")
-                if lead_data.get('has_young_driver') is not None:
-                    dados_complementares.append(f"👨‍👦 Condutor < 26 anos: {lead_data.get('has_young_driver')}")
-                
-                extras = []
-                if lead_data.get('interest'):
-                    extras.append(f"📝 Observações: {lead_data.get('interest')}")
-                if lead_data.get('necessity'):
-                    extras.append(f"📝 Necessidade: {lead_data.get('necessity')}")
-                
-                # Monta mensagem apenas com dados disponíveis
-                msg_parts = [f"🔔 *NOVO LEAD - SEGURO AUTO*\n"]
-                
-                if dados_principais:
-                    msg_parts.append("📋 *DADOS PRINCIPAIS:*")
-                    msg_parts.extend(dados_principais)
-                    msg_parts.append("")
-                
-                if contato:
-                    msg_parts.append("📧 *CONTATO:*")
-                    msg_parts.extend(contato)
-                    msg_parts.append("")
-                
-                if dados_complementares:
-                    msg_parts.append("🚗 *DADOS COMPLEMENTARES:*")
-                    msg_parts.extend(dados_complementares)
-                    msg_parts.append("")
-                
-                if extras:
-                    msg_parts.append("💬 *INFORMAÇÕES EXTRAS:*")
-                    msg_parts.extend(extras)
-                    msg_parts.append("")
-                
-                msg_parts.append("---")
-                msg_parts.append("💡 *Entre em contato imediatamente!*")
-                
-                whatsapp_msg = "\n".join(msg_parts)
+            if contato:
+                msg_parts.append("📧 *CONTATO:*")
+                msg_parts.extend(contato)
+                msg_parts.append("")
+            
+            if dados_complementares:
+                msg_parts.append("🚗 *DADOS COMPLEMENTARES:*")
+                msg_parts.extend(dados_complementares)
+                msg_parts.append("")
+            
+            if extras:
+                msg_parts.append("💬 *INFORMAÇÕES EXTRAS:*")
+                msg_parts.extend(extras)
+                msg_parts.append("")
+            
+            msg_parts.append("---")
+            msg_parts.append("💡 *Entre em contato imediatamente!*")
+            
+            whatsapp_msg = "\n".join(msg_parts)
 
-            elif flow_type == 'seguro_residencial':
-                dados_cliente = []
-                if lead_data.get('name'):
-                    dados_cliente.append(f"👤 Nome: {lead_data.get('name')}")
-                dados_cliente.append(f"📱 WhatsApp: {whatsapp_number}")
-                if lead_data.get('cpf_cnpj'):
-                    dados_cliente.append(f"🔢 CPF/CNPJ: {lead_data.get('cpf_cnpj')}")
-                if lead_data.get('email'):
-                    dados_cliente.append(f"📧 Email: {lead_data.get('email')}")
-                if lead_data.get('phone'):
-                    dados_cliente.append(f"📞 Telefone: {lead_data.get('phone')}")
-                
-                dados_imovel = []
-                if lead_data.get('property_cep'):
-                    dados_imovel.append(f"📍 CEP: {lead_data.get('property_cep')}")
-                if lead_data.get('property_type'):
-                    dados_imovel.append(f"🏢 Tipo: {lead_data.get('property_type')}")
-                if lead_data.get('property_value'):
-                    dados_imovel.append(f"💰 Valor: {lead_data.get('property_value')}")
-                if lead_data.get('property_ownership'):
-                    dados_imovel.append(f"🔑 Situação: {lead_data.get('property_ownership')}")
-                
-                extras = []
-                if lead_data.get('interest'):
-                    extras.append(f"📝 Observações: {lead_data.get('interest')}")
-                
-                msg_parts = [f"🔔 *NOVO LEAD - SEGURO RESIDENCIAL*\n"]
-                if dados_cliente:
-                    msg_parts.append("📋 *DADOS DO CLIENTE:*")
-                    msg_parts.extend(dados_cliente)
-                    msg_parts.append("")
-                if dados_imovel:
-                    msg_parts.append("🏠 *DADOS DO IMÓVEL:*")
-                    msg_parts.extend(dados_imovel)
-                    msg_parts.append("")
-                if extras:
-                    msg_parts.append("💬 *INFORMAÇÕES EXTRAS:*")
-                    msg_parts.extend(extras)
-                    msg_parts.append("")
-                msg_parts.append("---")
-                msg_parts.append("💡 *Entre em contato imediatamente!*")
-                whatsapp_msg = "\n".join(msg_parts)
+        elif flow_type == 'seguro_residencial':
+            dados_cliente = []
+            if lead_data.get('name'):
+                dados_cliente.append(f"👤 Nome: {lead_data.get('name')}")
+            dados_cliente.append(f"📱 WhatsApp: {whatsapp_number}")
+            if lead_data.get('cpf_cnpj'):
+                dados_cliente.append(f"🔢 CPF/CNPJ: {lead_data.get('cpf_cnpj')}")
+            if lead_data.get('email'):
+                dados_cliente.append(f"📧 Email: {lead_data.get('email')}")
+            if lead_data.get('phone'):
+                dados_cliente.append(f"📞 Telefone: {lead_data.get('phone')}")
+            
+            dados_imovel = []
+            if lead_data.get('property_cep'):
+                dados_imovel.append(f"📍 CEP: {lead_data.get('property_cep')}")
+            if lead_data.get('property_type'):
+                dados_imovel.append(f"🏢 Tipo: {lead_data.get('property_type')}")
+            if lead_data.get('property_value'):
+                dados_imovel.append(f"💰 Valor: {lead_data.get('property_value')}")
+            if lead_data.get('property_ownership'):
+                dados_imovel.append(f"🔑 Situação: {lead_data.get('property_ownership')}")
+            
+            extras = []
+            if lead_data.get('interest'):
+                extras.append(f"📝 Observações: {lead_data.get('interest')}")
+            
+            msg_parts = [f"🔔 *NOVO LEAD - SEGURO RESIDENCIAL*\n"]
+            if dados_cliente:
+                msg_parts.append("📋 *DADOS DO CLIENTE:*")
+                msg_parts.extend(dados_cliente)
+                msg_parts.append("")
+            if dados_imovel:
+                msg_parts.append("🏠 *DADOS DO IMÓVEL:*")
+                msg_parts.extend(dados_imovel)
+                msg_parts.append("")
+            if extras:
+                msg_parts.append("💬 *INFORMAÇÕES EXTRAS:*")
+                msg_parts.extend(extras)
+                msg_parts.append("")
+            msg_parts.append("---")
+            msg_parts.append("💡 *Entre em contato imediatamente!*")
+            whatsapp_msg = "\n".join(msg_parts)
 
-            elif flow_type == 'consorcio':
-                dados_cliente = []
-                if lead_data.get('name'):
-                    dados_cliente.append(f"👤 Nome: {lead_data.get('name')}")
-                if lead_data.get('cpf_cnpj'):
-                    dados_cliente.append(f"🔢 CPF/CNPJ: {lead_data.get('cpf_cnpj')}")
-                dados_cliente.append(f"📱 WhatsApp: {whatsapp_number}")
-                if lead_data.get('email'):
-                    dados_cliente.append(f"📧 Email: {lead_data.get('email')}")
-                if lead_data.get('second_email'):
-                    dados_cliente.append(f"📧 Email 2: {lead_data.get('second_email')}")
-                if lead_data.get('phone'):
-                    dados_cliente.append(f"📞 Telefone: {lead_data.get('phone')}")
-                
-                dados_consorcio = []
-                if lead_data.get('consortium_type'):
-                    dados_consorcio.append(f"📝 Tipo: {lead_data.get('consortium_type')}")
-                if lead_data.get('consortium_value'):
-                    dados_consorcio.append(f"💰 Valor da Carta: {lead_data.get('consortium_value')}")
-                if lead_data.get('consortium_term'):
-                    dados_consorcio.append(f"📅 Prazo: {lead_data.get('consortium_term')} meses")
-                if lead_data.get('has_previous_consortium') is not None:
-                    dados_consorcio.append(f"🔄 Já participou antes: {lead_data.get('has_previous_consortium')}")
-                
-                extras = []
-                if lead_data.get('interest'):
-                    extras.append(f"📝 Observações: {lead_data.get('interest')}")
-                
-                msg_parts = [f"🔔 *NOVO LEAD - CONSÓRCIO*\n"]
-                if dados_cliente:
-                    msg_parts.append("📋 *DADOS DO CLIENTE:*")
-                    msg_parts.extend(dados_cliente)
-                    msg_parts.append("")
-                if dados_consorcio:
-                    msg_parts.append("💼 *DADOS DO CONSÓRCIO:*")
-                    msg_parts.extend(dados_consorcio)
-                    msg_parts.append("")
-                if extras:
-                    msg_parts.append("💬 *INFORMAÇÕES EXTRAS:*")
-                    msg_parts.extend(extras)
-                    msg_parts.append("")
-                msg_parts.append("---")
-                msg_parts.append("💡 *Entre em contato imediatamente!*")
-                whatsapp_msg = "\n".join(msg_parts)
+        elif flow_type == 'consorcio':
+            dados_cliente = []
+            if lead_data.get('name'):
+                dados_cliente.append(f"👤 Nome: {lead_data.get('name')}")
+            if lead_data.get('cpf_cnpj'):
+                dados_cliente.append(f"🔢 CPF/CNPJ: {lead_data.get('cpf_cnpj')}")
+            dados_cliente.append(f"📱 WhatsApp: {whatsapp_number}")
+            if lead_data.get('email'):
+                dados_cliente.append(f"📧 Email: {lead_data.get('email')}")
+            if lead_data.get('second_email'):
+                dados_cliente.append(f"📧 Email 2: {lead_data.get('second_email')}")
+            if lead_data.get('phone'):
+                dados_cliente.append(f"📞 Telefone: {lead_data.get('phone')}")
+            
+            dados_consorcio = []
+            if lead_data.get('consortium_type'):
+                dados_consorcio.append(f"📝 Tipo: {lead_data.get('consortium_type')}")
+            if lead_data.get('consortium_value'):
+                dados_consorcio.append(f"💰 Valor da Carta: {lead_data.get('consortium_value')}")
+            if lead_data.get('consortium_term'):
+                dados_consorcio.append(f"📅 Prazo: {lead_data.get('consortium_term')} meses")
+            if lead_data.get('has_previous_consortium') is not None:
+                dados_consorcio.append(f"🔄 Já participou antes: {lead_data.get('has_previous_consortium')}")
+            
+            extras = []
+            if lead_data.get('interest'):
+                extras.append(f"📝 Observações: {lead_data.get('interest')}")
+            
+            msg_parts = [f"🔔 *NOVO LEAD - CONSÓRCIO*\n"]
+            if dados_cliente:
+                msg_parts.append("📋 *DADOS DO CLIENTE:*")
+                msg_parts.extend(dados_cliente)
+                msg_parts.append("")
+            if dados_consorcio:
+                msg_parts.append("💼 *DADOS DO CONSÓRCIO:*")
+                msg_parts.extend(dados_consorcio)
+                msg_parts.append("")
+            if extras:
+                msg_parts.append("💬 *INFORMAÇÕES EXTRAS:*")
+                msg_parts.extend(extras)
+                msg_parts.append("")
+            msg_parts.append("---")
+            msg_parts.append("💡 *Entre em contato imediatamente!*")
+            whatsapp_msg = "\n".join(msg_parts)
 
-            elif flow_type == 'seguro_vida':
-                # Informações extras
-                extras = []
-                if lead_data.get('interest'):
-                    extras.append(f"📝 Observações: {lead_data.get('interest')}")
-                if lead_data.get('necessity'):
-                    extras.append(f"📝 Necessidade: {lead_data.get('necessity')}")
-                if lead_data.get('phone'):
-                    extras.append(f"📞 Telefone: {lead_data.get('phone')}")
-                
-                extras_text = "\n".join(extras) if extras else ""
-                
-                whatsapp_msg = f"""🔔 *NOVO LEAD QUALIFICADO - SEGURO DE VIDA*
+        elif flow_type == 'seguro_vida':
+            # Informações extras
+            extras = []
+            if lead_data.get('interest'):
+                extras.append(f"📝 Observações: {lead_data.get('interest')}")
+            if lead_data.get('necessity'):
+                extras.append(f"📝 Necessidade: {lead_data.get('necessity')}")
+            if lead_data.get('phone'):
+                extras.append(f"📞 Telefone: {lead_data.get('phone')}")
+            
+            extras_text = "\n".join(extras) if extras else ""
+            
+            whatsapp_msg = f"""🔔 *NOVO LEAD QUALIFICADO - SEGURO DE VIDA*
 
 📋 *DADOS DO CLIENTE:*
 👤 Nome: {lead_data.get('name', 'N/A')}
@@ -333,19 +342,19 @@ class NotificationService:
 ---
 💡 *Entre em contato imediatamente!*"""
 
-            elif flow_type == 'seguro_empresarial':
-                # Informações extras
-                extras = []
-                if lead_data.get('interest'):
-                    extras.append(f"📝 Observações: {lead_data.get('interest')}")
-                if lead_data.get('necessity'):
-                    extras.append(f"📝 Necessidade: {lead_data.get('necessity')}")
-                if lead_data.get('phone'):
-                    extras.append(f"📞 Telefone: {lead_data.get('phone')}")
-                
-                extras_text = "\n".join(extras) if extras else ""
-                
-                whatsapp_msg = f"""🔔 *NOVO LEAD QUALIFICADO - SEGURO EMPRESARIAL*
+        elif flow_type == 'seguro_empresarial':
+            # Informações extras
+            extras = []
+            if lead_data.get('interest'):
+                extras.append(f"📝 Observações: {lead_data.get('interest')}")
+            if lead_data.get('necessity'):
+                extras.append(f"📝 Necessidade: {lead_data.get('necessity')}")
+            if lead_data.get('phone'):
+                extras.append(f"📞 Telefone: {lead_data.get('phone')}")
+            
+            extras_text = "\n".join(extras) if extras else ""
+            
+            whatsapp_msg = f"""🔔 *NOVO LEAD QUALIFICADO - SEGURO EMPRESARIAL*
 
 📋 *DADOS DO CLIENTE:*
 👤 Nome: {lead_data.get('name', 'N/A')}
@@ -357,9 +366,9 @@ class NotificationService:
 ---
 💡 *Entre em contato imediatamente!*"""
 
-            elif flow_type == 'segunda_via':
-                # Inclui o produto desejado (interest)
-                whatsapp_msg = f"""🔔 *SOLICITAÇÃO - SEGUNDA VIA*
+        elif flow_type == 'segunda_via':
+            # Inclui o produto desejado (interest)
+            whatsapp_msg = f"""🔔 *SOLICITAÇÃO - SEGUNDA VIA*
 
 📋 *DADOS:*
 👤 Nome: {lead_data.get('name', 'N/A')}
@@ -370,19 +379,19 @@ class NotificationService:
 ---
 💡 *Enviar segunda via do boleto*"""
 
-            elif flow_type == 'sinistro':
-                # Informações extras sobre o sinistro
-                extras = []
-                if lead_data.get('interest'):
-                    extras.append(f"📝 Detalhes: {lead_data.get('interest')}")
-                if lead_data.get('necessity'):
-                    extras.append(f"📝 Situação: {lead_data.get('necessity')}")
-                if lead_data.get('email'):
-                    extras.append(f"📧 Email: {lead_data.get('email')}")
-                
-                extras_text = "\n".join(extras) if extras else ""
-                
-                whatsapp_msg = f"""🔔 *URGENTE - SINISTRO*
+        elif flow_type == 'sinistro':
+            # Informações extras sobre o sinistro
+            extras = []
+            if lead_data.get('interest'):
+                extras.append(f"📝 Detalhes: {lead_data.get('interest')}")
+            if lead_data.get('necessity'):
+                extras.append(f"📝 Situação: {lead_data.get('necessity')}")
+            if lead_data.get('email'):
+                extras.append(f"📧 Email: {lead_data.get('email')}")
+            
+            extras_text = "\n".join(extras) if extras else ""
+            
+            whatsapp_msg = f"""🔔 *URGENTE - SINISTRO*
 
 📋 *DADOS DO CLIENTE:*
 👤 Nome: {lead_data.get('name', 'N/A')}
@@ -394,19 +403,19 @@ class NotificationService:
 ---
 ⚠️ *PRIORIDADE: Entrar em contato IMEDIATAMENTE!*"""
 
-            elif flow_type == 'falar_humano':
-                # Informações extras sobre o motivo do contato
-                extras = []
-                if lead_data.get('email'):
-                    extras.append(f"📧 Email: {lead_data.get('email')}")
-                if lead_data.get('interest'):
-                    extras.append(f"📝 Motivo: {lead_data.get('interest')}")
-                if lead_data.get('necessity'):
-                    extras.append(f"📝 Observações: {lead_data.get('necessity')}")
-                
-                extras_text = "\n".join(extras) if extras else ""
-                
-                whatsapp_msg = f"""🔔 *CLIENTE SOLICITOU ATENDIMENTO HUMANO*
+        elif flow_type == 'falar_humano':
+            # Informações extras sobre o motivo do contato
+            extras = []
+            if lead_data.get('email'):
+                extras.append(f"📧 Email: {lead_data.get('email')}")
+            if lead_data.get('interest'):
+                extras.append(f"📝 Motivo: {lead_data.get('interest')}")
+            if lead_data.get('necessity'):
+                extras.append(f"📝 Observações: {lead_data.get('necessity')}")
+            
+            extras_text = "\n".join(extras) if extras else ""
+            
+            whatsapp_msg = f"""🔔 *CLIENTE SOLICITOU ATENDIMENTO HUMANO*
 
 📋 *DADOS DO CLIENTE:*
 👤 Nome: {lead_data.get('name', 'N/A')}
@@ -417,9 +426,9 @@ class NotificationService:
 ---
 💡 *Cliente pediu para falar com atendente - Entre em contato!*"""
 
-            else:
-                # Fluxo genérico
-                whatsapp_msg = f"""🔔 *NOVO LEAD QUALIFICADO*
+        else:
+            # Fluxo genérico
+            whatsapp_msg = f"""🔔 *NOVO LEAD QUALIFICADO*
 
 👤 Nome: {lead_data.get('name', 'N/A')}
 📱 WhatsApp: {whatsapp_number}
@@ -428,6 +437,27 @@ class NotificationService:
 
 ---
 💡 *Entre em contato!*"""
+        
+        return whatsapp_msg
+    
+    async def notify_admin_lead_qualified(
+        self,
+        lead_data: dict,
+        whatsapp_number: str
+    ) -> bool:
+        """
+        Notifica admin quando um lead é qualificado
+        
+        Args:
+            lead_data: Dados do lead completos
+            whatsapp_number: Número WhatsApp do lead
+        
+        Returns:
+            True se notificações foram enviadas com sucesso
+        """
+        try:
+            flow_type = lead_data.get('flow_type', 'desconhecido')
+            whatsapp_msg = self.build_lead_qualified_message(lead_data, whatsapp_number)
             
             # Envia WhatsApp - valida número do admin
             whatsapp_sent = False
@@ -451,7 +481,9 @@ class NotificationService:
             email_sent = False
             if settings.ADMIN_EMAIL:
                 email_body = whatsapp_msg.replace('*', '').replace('_', '')
-                email_sent = self.send_email(
+                # SMTP e log são bloqueantes: rodam numa thread
+                email_sent = await asyncio.to_thread(
+                    self.send_email,
                     recipient_email=settings.ADMIN_EMAIL,
                     subject=f"🎯 Novo Lead - {flow_type.replace('_', ' ').title()}",
                     body=email_body
@@ -515,7 +547,9 @@ class NotificationService:
             email_sent = False
             if settings.ADMIN_EMAIL:
                 email_body = whatsapp_msg.replace('*', '').replace('_', '')
-                email_sent = self.send_email(
+                # SMTP e log são bloqueantes: rodam numa thread
+                email_sent = await asyncio.to_thread(
+                    self.send_email,
                     recipient_email=settings.ADMIN_EMAIL,
                     subject="📋 Notificação - Outros Assuntos",
                     body=email_body
@@ -537,7 +571,7 @@ class NotificationService:
     ):
         """Log de notificação no banco de dados"""
         try:
-            if not self.db:
+            if not self.db and not self.engine:
                 return
             log = NotificationLog(
                 lead_id=lead_id,
@@ -547,7 +581,11 @@ class NotificationService:
                 status=status,
                 error_message=error_message
             )
-            self.db.add(log)
-            self.db.commit()
+            if self.db:
+                self.db.add(log)
+                self.db.commit()
+            else:
+                with write_session_scope(self.engine) as db:
+                    db.add(log)
         except Exception as e:
             print(f"Erro ao logar notificação: {str(e)}")
@@ -0,0 +1,87 @@
+"""
+Paginação por cursor (keyset) sobre (created_at, id)
+
+Em vez de OFFSET, cada página continua a partir da última linha da anterior:
+`WHERE (created_at, id) < (:created_at, :id)` (ou `>` em ordem crescente).
+Com o índice certo o banco vai direto ao ponto de continuação, então o custo
+de cada página não cresce com a posição na tabela.
+
+O cursor enviado ao cliente é opaco: base64 de "created_at|id".
+"""
+import base64
+import binascii
+from datetime import datetime
+from typing import Optional, Tuple
+from sqlalchemy import tuple_
+
+# Tamanho máximo de página aceito pelas rotas
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursorError(ValueError):
+    """Cursor de paginação malformado"""
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Gera o cursor que aponta para depois da linha (created_at, id)"""
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Lê um cursor gerado por encode_cursor
+
+    Raises:
+        InvalidCursorError: Se o cursor não foi gerado por encode_cursor
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursorError(f"Cursor inválido: {cursor!r}") from e
+
+
+def keyset_page(query, created_at_column, id_column, cursor: Optional[str], limit: int, descending: bool = True):
+    """
+    Aplica ordenação, continuação do cursor e limite a um SELECT
+
+    Busca uma linha a mais que `limit` para saber se há próxima página
+    (ver next_cursor).
+
+    Args:
+        query: SELECT que inclui as colunas created_at e id
+        created_at_column: Coluna de data de criação
+        id_column: Coluna de id (desempate entre linhas do mesmo instante)
+        cursor: Cursor da página anterior (None para a primeira página)
+        limit: Tamanho da página
+        descending: True para as mais recentes primeiro
+    """
+    key = tuple_(created_at_column, id_column)
+    if cursor:
+        after = tuple_(*decode_cursor(cursor))
+        query = query.where(key < after if descending else key > after)
+    if descending:
+        query = query.order_by(created_at_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(created_at_column.asc(), id_column.asc())
+    return query.limit(limit + 1)
+
+
+def next_cursor(rows: list, limit: int) -> Optional[str]:
+    """
+    Remove a linha extra buscada por keyset_page e gera o próximo cursor
+
+    As linhas precisam ter created_at e id (como atributos ou chaves de dict).
+
+    Returns:
+        Cursor da próxima página, ou None se esta é a última
+    """
+    if len(rows) <= limit:
+        return None
+    del rows[limit:]
+    last = rows[-1]
+    if isinstance(last, dict):
+        return encode_cursor(last["created_at"], last["id"])
+    return encode_cursor(last.created_at, last.id)
@@ -0,0 +1,380 @@
+"""
+Migração do banco SQLite para o PostgreSQL, em passadas retomáveis
+
+Cada tabela é lida do SQLite em blocos por chave primária (id > último
+copiado) e gravada no Postgres com COPY FROM STDIN. O bloco e o progresso
+(tabela migration_progress, no Postgres) são gravados na mesma
+transação: se a cópia cair, a próxima execução continua do último bloco.
+
+Uma nova passada sobre um destino já copiado é a "recuperação" da virada:
+- copia as linhas novas (id acima do último copiado);
+- recopia as linhas com updated_at posterior ao início da passada anterior
+  (tabelas que têm essa coluna);
+- apaga do destino os ids que sumiram da origem (retenção, exclusão de lead).
+
+Com a aplicação no ar, a primeira passada copia o grosso; com a API e o
+dashboard parados, uma segunda passada só aplica o que mudou nesse meio
+tempo e termina em segundos. A conferência compara contagens e checksums
+por faixa de ids; faixas divergentes podem ser recopiadas.
+"""
+import hashlib
+import io
+import json
+import logging
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select, text
+from app.database.connection import build_engine
+from app.database.models import Base
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 5000
+# Folga sobre o início da passada anterior (relógios de processos diferentes)
+CATCH_UP_MARGIN = timedelta(seconds=60)
+# Ordem de cópia; as tabelas pedidas primeiro, as auxiliares depois
+MIGRATION_TABLES = (
+    "leads", "lead_attributes", "chat_messages", "qualification_fields", "notification_logs",
+    "message_archive_segments", "faq_entries", "lead_events",
+)
+
+migration_state = Table(
+    "migration_progress", MetaData(),
+    Column("table_name", String(100), primary_key=True),
+    Column("last_id", Integer, nullable=False),
+    Column("copied_rows", Integer, nullable=False),
+    # Mudanças anteriores a este instante já estão no destino
+    Column("synced_since", DateTime, nullable=False),
+    Column("updated_at", DateTime, nullable=False),
+)
+
+
+def copy_value(value) -> str:
+    """Valor no formato texto do COPY (também usado no checksum)"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (datetime, date)):
+        return value.isoformat(sep=" ") if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+def copy_line(row: Sequence) -> str:
+    return "\t".join(copy_value(value) for value in row) + "\n"
+
+
+def migration_columns(source, table: Table) -> List[str]:
+    """Colunas do modelo que existem na origem (bancos antigos podem não ter todas)"""
+    existing = {column["name"] for column in inspect(source).get_columns(table.name)}
+    return [column.name for column in table.columns if column.name in existing]
+
+
+def read_rows(conn, table: Table, columns: List[str], after_id: Optional[int] = None,
+              upper_id: Optional[int] = None, limit: Optional[int] = None, ids: Optional[List[int]] = None):
+    """Linhas da tabela em ordem de id, por faixa (after_id, upper_id] ou lista de ids"""
+    query = select(*[table.c[name] for name in columns]).order_by(table.c.id)
+    if after_id is not None:
+        query = query.where(table.c.id > after_id)
+    if upper_id is not None:
+        query = query.where(table.c.id <= upper_id)
+    if ids is not None:
+        query = query.where(table.c.id.in_(ids))
+    if limit is not None:
+        query = query.limit(limit)
+    return conn.execute(query).all()
+
+
+def write_rows(conn, table: Table, columns: List[str], rows) -> int:
+    """
+    Grava as linhas no destino: COPY FROM STDIN no Postgres, INSERT nos demais
+
+    Returns:
+        Quantidade de linhas gravadas
+    """
+    if not rows:
+        return 0
+    if conn.dialect.name == "postgresql":
+        buffer = io.StringIO("".join(copy_line(row) for row in rows))
+        cursor = conn.connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {table.name} ({', '.join(columns)}) FROM STDIN", buffer)
+        finally:
+            cursor.close()
+    else:
+        conn.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
+    return len(rows)
+
+
+def reset_sequence(conn, table: Table):
+    """Acerta a sequência do id no Postgres depois de gravar ids explícitos"""
+    if conn.dialect.name != "postgresql":
+        return
+    conn.execute(text(
+        f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+        f"COALESCE(MAX(id), 1), MAX(id) IS NOT NULL) FROM {table.name}"
+    ))
+
+
+def range_checksum(conn, table: Table, columns: List[str], after_id: Optional[int], upper_id: Optional[int]) -> Tuple[int, str]:
+    """Quantidade e SHA-256 das linhas da faixa (after_id, upper_id]"""
+    digest = hashlib.sha256()
+    count = 0
+    for row in read_rows(conn, table, columns, after_id=after_id, upper_id=upper_id):
+        digest.update(copy_line(row).encode("utf-8"))
+        count += 1
+    return count, digest.hexdigest()
+
+
+def _chunks(values: List, size: int):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class PostgresMigrationService:
+    """Serviço de migração SQLite → PostgreSQL"""
+
+    @staticmethod
+    def connect(source_url: str, target_url: str):
+        """Engines de origem e destino (fora do engine compartilhado da aplicação)"""
+        return build_engine(source_url), build_engine(target_url)
+
+    @staticmethod
+    def resolve_tables(names: Optional[Sequence[str]] = None) -> List[Table]:
+        names = list(names or MIGRATION_TABLES)
+        unknown = [name for name in names if name not in Base.metadata.tables]
+        if unknown:
+            raise ValueError(f"Tabelas desconhecidas: {', '.join(unknown)}")
+        return [Base.metadata.tables[name] for name in names]
+
+    @staticmethod
+    def preflight(source, tables: List[Table]) -> List[str]:
+        """
+        Problemas que fariam o COPY falhar no Postgres
+
+        O SQLite não impõe o tamanho de VARCHAR; o Postgres recusa o bloco
+        inteiro se um valor passar do limite.
+
+        Returns:
+            Descrição de cada coluna com valores longos demais
+        """
+        problems = []
+        with source.connect() as conn:
+            for table in tables:
+                for name in migration_columns(source, table):
+                    length = getattr(table.c[name].type, "length", None)
+                    if not length:
+                        continue
+                    column = table.c[name]
+                    too_long = conn.scalar(
+                        select(func.count()).select_from(table).where(func.length(column) > length)
+                    )
+                    if too_long:
+                        problems.append(f"{table.name}.{name}: {too_long} valor(es) com mais de {length} caracteres")
+        return problems
+
+    @staticmethod
+    def prepare_target(target):
+        """Cria no destino as tabelas, os índices e a tabela de progresso"""
+        Base.metadata.create_all(bind=target)
+        migration_state.create(bind=target, checkfirst=True)
+
+    @staticmethod
+    def get_state(target, table: Table) -> Optional[Dict]:
+        with target.connect() as conn:
+            row = conn.execute(
+                select(migration_state).where(migration_state.c.table_name == table.name)
+            ).mappings().first()
+        return dict(row) if row else None
+
+    @staticmethod
+    def run_pass(
+        source,
+        target,
+        table: Table,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        on_chunk: Optional[Callable[[str, int], None]] = None
+    ) -> Dict:
+        """
+        Uma passada de cópia/recuperação de uma tabela
+
+        Args:
+            source: Engine do SQLite
+            target: Engine do Postgres
+            table: Tabela do modelo
+            chunk_size: Linhas por bloco (uma transação no destino por bloco)
+            on_chunk: Chamado com (tabela, linhas copiadas até agora)
+
+        Returns:
+            Dict com linhas inseridas, atualizadas, apagadas, tempo e vazão
+        """
+        started_at = datetime.utcnow()
+        started = time.perf_counter()
+        columns = migration_columns(source, table)
+        state = PostgresMigrationService.get_state(target, table)
+        if state is None:
+            state = {"table_name": table.name, "last_id": 0, "copied_rows": 0,
+                     "synced_since": started_at, "updated_at": started_at}
+            with target.begin() as conn:
+                conn.execute(migration_state.insert().values(**state))
+
+        updated = PostgresMigrationService._recopy_updated(
+            source, target, table, columns, state, chunk_size
+        )
+        deleted = PostgresMigrationService._remove_deleted(source, target, table, state["last_id"], chunk_size)
+
+        inserted = 0
+        last_id = state["last_id"]
+        copied = state["copied_rows"]
+        while True:
+            with source.connect() as conn:
+                rows = read_rows(conn, table, columns, after_id=last_id, limit=chunk_size)
+            if not rows:
+                break
+            last_id = rows[-1][columns.index("id")]
+            copied += len(rows)
+            with target.begin() as conn:
+                inserted += write_rows(conn, table, columns, rows)
+                conn.execute(migration_state.update()
+                             .where(migration_state.c.table_name == table.name)
+                             .values(last_id=last_id, copied_rows=copied, updated_at=datetime.utcnow()))
+            if on_chunk:
+                on_chunk(table.name, copied)
+
+        with target.begin() as conn:
+            reset_sequence(conn, table)
+            conn.execute(migration_state.update()
+                         .where(migration_state.c.table_name == table.name)
+                         .values(synced_since=started_at, updated_at=datetime.utcnow()))
+
+        elapsed = time.perf_counter() - started
+        total = inserted + updated
+        return {
+            "table": table.name,
+            "inserted": inserted,
+            "updated": updated,
+            "deleted": deleted,
+            "seconds": round(elapsed, 3),
+            "rows_per_second": round(total / elapsed, 1) if elapsed else 0.0,
+        }
+
+    @staticmethod
+    def _recopy_updated(source, target, table: Table, columns: List[str], state: Dict, chunk_size: int) -> int:
+        """Recopia as linhas já copiadas que mudaram desde a passada anterior"""
+        if "updated_at" not in columns or not state["last_id"]:
+            return 0
+        since = state["synced_since"] - CATCH_UP_MARGIN
+        with source.connect() as conn:
+            ids = conn.scalars(
+                select(table.c.id).where(table.c.updated_at >= since, table.c.id <= state["last_id"])
+                .order_by(table.c.id)
+            ).all()
+        recopied = 0
+        for batch in _chunks(ids, chunk_size):
+            with source.connect() as conn:
+                rows = read_rows(conn, table, columns, ids=batch)
+            with target.begin() as conn:
+                conn.execute(table.delete().where(table.c.id.in_(batch)))
+                recopied += write_rows(conn, table, columns, rows)
+        return recopied
+
+    @staticmethod
+    def _remove_deleted(source, target, table: Table, last_id: int, chunk_size: int) -> int:
+        """Apaga do destino os ids (até last_id) que não existem mais na origem"""
+        removed = 0
+        after = 0
+        while after < last_id:
+            with target.connect() as conn:
+                target_ids = conn.scalars(
+                    select(table.c.id).where(table.c.id > after, table.c.id <= last_id)
+                    .order_by(table.c.id).limit(chunk_size)
+                ).all()
+            if not target_ids:
+                break
+            with source.connect() as conn:
+                source_ids = set(conn.scalars(
+                    select(table.c.id).where(table.c.id >= target_ids[0], table.c.id <= target_ids[-1])
+                ).all())
+            missing = [row_id for row_id in target_ids if row_id not in source_ids]
+            if missing:
+                with target.begin() as conn:
+                    removed += conn.execute(table.delete().where(table.c.id.in_(missing))).rowcount
+            after = target_ids[-1]
+        return removed
+
+    @staticmethod
+    def verify(source, target, table: Table, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+        """
+        Compara contagem e checksum da tabela na origem e no destino
+
+        As faixas de ids seguem os blocos da origem; a última faixa é aberta
+        para pegar ids que só existem no destino.
+
+        Returns:
+            Dict com contagens, checksums, ok e faixas divergentes [(após_id, até_id)]
+        """
+        columns = migration_columns(source, table)
+        with source.connect() as conn:
+            ids = conn.scalars(select(table.c.id).order_by(table.c.id)).all()
+        bounds = [ids[position] for position in range(chunk_size - 1, len(ids), chunk_size)]
+        ranges = list(zip([None] + bounds, bounds + [None]))
+
+        source_digest, target_digest = hashlib.sha256(), hashlib.sha256()
+        source_rows = target_rows = 0
+        mismatched = []
+        for after_id, upper_id in ranges:
+            with source.connect() as conn:
+                source_count, source_sum = range_checksum(conn, table, columns, after_id, upper_id)
+            with target.connect() as conn:
+                target_count, target_sum = range_checksum(conn, table, columns, after_id, upper_id)
+            source_rows += source_count
+            target_rows += target_count
+            source_digest.update(source_sum.encode())
+            target_digest.update(target_sum.encode())
+            if source_sum != target_sum:
+                mismatched.append((after_id, upper_id))
+
+        return {
+            "table": table.name,
+            "source_rows": source_rows,
+            "target_rows": target_rows,
+            "source_checksum": source_digest.hexdigest(),
+            "target_checksum": target_digest.hexdigest(),
+            "ok": not mismatched,
+            "mismatched_ranges": mismatched,
+        }
+
+    @staticmethod
+    def repair(source, target, table: Table, ranges: List[Tuple[Optional[int], Optional[int]]]) -> int:
+        """
+        Recopia faixas divergentes (apaga a faixa no destino e copia da origem)
+
+        Returns:
+            Linhas gravadas
+        """
+        columns = migration_columns(source, table)
+        written = 0
+        for after_id, upper_id in ranges:
+            with source.connect() as conn:
+                rows = read_rows(conn, table, columns, after_id=after_id, upper_id=upper_id)
+            with target.begin() as conn:
+                condition = table.delete()
+                if after_id is not None:
+                    condition = condition.where(table.c.id > after_id)
+                if upper_id is not None:
+                    condition = condition.where(table.c.id <= upper_id)
+                conn.execute(condition)
+                written += write_rows(conn, table, columns, rows)
+                reset_sequence(conn, table)
+                if rows:
+                    # A próxima passada continua depois do que a faixa já copiou
+                    last_copied = rows[-1][columns.index("id")]
+                    conn.execute(migration_state.update()
+                                 .where(migration_state.c.table_name == table.name,
+                                        migration_state.c.last_id < last_copied)
+                                 .values(last_id=last_copied, updated_at=datetime.utcnow()))
+        return written
@@ -0,0 +1,299 @@
+"""
+Retenção de dados e exclusão de dados pessoais (LGPD)
+
+Duas operações, ambas feitas em lotes para não travar o webhook:
+
+- Expiração por tabela: cada RetentionPolicy apaga as linhas mais antigas que
+  o prazo configurado (0 dias desativa a política).
+- Esquecer um lead ("forget me"): apaga o lead e tudo ligado a ele em
+  chat_messages, qualification_fields, notification_logs, lead_events e
+  nos segmentos de mensagens arquivadas; fica só um evento "deleted" sem
+  dados pessoais, para os consumidores do registro de eventos.
+
+Cada lote é uma transação curta que apaga até RETENTION_BATCH_SIZE linhas por
+faixa de chave primária, seguida de uma pausa de RETENTION_BATCH_SLEEP_MS
+para o webhook pegar o lock de escrita entre um lote e outro. No fim, o
+espaço liberado volta ao sistema com PRAGMA incremental_vacuum (SQLite).
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from sqlalchemy import func, or_, select, update, Table
+from config.settings import settings
+from app.core.utils import canonical_whatsapp_number
+from app.database.connection import get_engine, get_session, write_session_scope
+from app.database.models import (
+    ChatMessage, Lead, LeadAttributes, LeadEvent, NotificationLog, QualificationField, lead_event_insert,
+)
+from app.services.conversation_buffer import conversation_buffer
+from app.services.lead_cache import lead_cache
+from app.services.lead_stats import lead_stats_cache
+from app.services.message_archive import MessageArchiveService
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionPolicy:
+    """Prazo de retenção de uma tabela, pela coluna de data"""
+
+    def __init__(self, name: str, table: Table, column: str, days: int):
+        self.name = name
+        self.table = table
+        self.column = column
+        self.days = days
+
+    @property
+    def enabled(self) -> bool:
+        return self.days > 0
+
+    def cutoff(self, now: Optional[datetime] = None) -> datetime:
+        return (now or datetime.utcnow()) - timedelta(days=self.days)
+
+
+def default_policies() -> List[RetentionPolicy]:
+    """Políticas configuradas no .env"""
+    return [
+        RetentionPolicy("notification_logs", NotificationLog.__table__, "created_at",
+                        settings.RETENTION_NOTIFICATION_LOGS_DAYS),
+        RetentionPolicy("chat_messages", ChatMessage.__table__, "created_at",
+                        settings.RETENTION_CHAT_MESSAGES_DAYS),
+    ]
+
+
+def delete_in_batches(
+    table: Table,
+    condition,
+    engine=None,
+    batch_size: Optional[int] = None,
+    sleep_seconds: Optional[float] = None
+) -> int:
+    """
+    Apaga as linhas da tabela que atendem a condição, em lotes por faixa de id
+
+    Cada lote acha o id que fecha a faixa (o `batch_size`-ésimo a partir do
+    último apagado), apaga `id <= limite` com a condição numa transação
+    curta e dorme antes do próximo.
+
+    Returns:
+        Quantidade de linhas apagadas
+    """
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    sleep_seconds = settings.RETENTION_BATCH_SLEEP_MS / 1000 if sleep_seconds is None else sleep_seconds
+    id_column = table.c.id
+    deleted = 0
+    last_id = None
+
+    while True:
+        with write_session_scope(engine) as db:
+            pending = select(id_column).where(condition)
+            if last_id is not None:
+                pending = pending.where(id_column > last_id)
+            upper = db.scalar(pending.order_by(id_column).offset(batch_size - 1).limit(1))
+            if upper is None:
+                upper = db.scalar(select(func.max(id_column)).where(pending.whereclause))
+            if upper is None:
+                break
+            batch = table.delete().where(condition).where(id_column <= upper)
+            if last_id is not None:
+                batch = batch.where(id_column > last_id)
+            deleted += db.execute(batch).rowcount
+        last_id = upper
+        if sleep_seconds:
+            time.sleep(sleep_seconds)
+
+    return deleted
+
+
+def incremental_vacuum(engine=None, pages_per_step: int = 1000) -> int:
+    """
+    Devolve ao sistema as páginas livres do arquivo SQLite, aos poucos
+
+    Só tem efeito com auto_vacuum=INCREMENTAL (ver enable_incremental_vacuum).
+
+    Returns:
+        Quantidade de páginas liberadas
+    """
+    engine = engine or get_engine()
+    if engine.url.get_backend_name() != "sqlite":
+        return 0
+    # Conexão DBAPI em modo autocommit: cada PRAGMA é sua própria transação curta
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:  # 2 = INCREMENTAL
+            return 0
+        start = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        remaining = start
+        while remaining:
+            cursor.execute(f"PRAGMA incremental_vacuum({pages_per_step})").fetchall()
+            left = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+            if left >= remaining:
+                break
+            remaining = left
+        cursor.close()
+        return start - remaining
+    finally:
+        raw.close()
+
+
+def enable_incremental_vacuum(engine=None) -> bool:
+    """
+    Ativa auto_vacuum=INCREMENTAL em um banco SQLite já existente
+
+    Exige um VACUUM completo (reescreve o arquivo inteiro e bloqueia o banco
+    enquanto roda); bancos novos já são criados com o modo INCREMENTAL.
+
+    Returns:
+        True se o modo foi alterado
+    """
+    engine = engine or get_engine()
+    if engine.url.get_backend_name() != "sqlite":
+        return False
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return False
+        cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        cursor.execute("VACUUM")
+        cursor.close()
+    finally:
+        raw.close()
+    return True
+
+
+def _report(counts: Dict[str, int], started: float, freed_pages: int) -> Dict:
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    return {
+        "deleted": counts,
+        "total_rows": total,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(total / elapsed, 1) if elapsed else 0.0,
+        "freed_pages": freed_pages,
+    }
+
+
+class RetentionService:
+    """Serviço de expiração de dados antigos e exclusão de leads"""
+
+    @staticmethod
+    def run_policies(
+        engine=None,
+        policies: Optional[List[RetentionPolicy]] = None,
+        dry_run: bool = False
+    ) -> Dict:
+        """
+        Aplica as políticas de retenção
+
+        Mensagens arquivadas seguem o prazo de chat_messages pela data da
+        última mensagem de cada trecho.
+
+        Returns:
+            Relatório com linhas apagadas por tabela, tempo e vazão
+        """
+        engine = engine or get_engine()
+        policies = default_policies() if policies is None else policies
+        started = time.perf_counter()
+        counts = {}
+
+        for policy in policies:
+            if not policy.enabled:
+                continue
+            condition = policy.table.c[policy.column] < policy.cutoff()
+            if dry_run:
+                db = get_session(engine)
+                try:
+                    counts[policy.name] = db.scalar(select(func.count()).select_from(policy.table).where(condition))
+                finally:
+                    db.close()
+                continue
+            counts[policy.name] = delete_in_batches(policy.table, condition, engine=engine)
+            if policy.name == "chat_messages":
+                counts["message_archive"] = MessageArchiveService.expire(policy.cutoff(), engine=engine)
+                # O buffer pode ter mensagens que saíram da tabela
+                conversation_buffer.clear()
+
+        freed = 0 if dry_run else incremental_vacuum(engine)
+        report = _report(counts, started, freed)
+        logger.info(f"🧹 Retenção: {report['total_rows']} linhas em {report['seconds']}s "
+                    f"({report['rows_per_second']} linhas/s)")
+        return report
+
+    @staticmethod
+    def forget_lead(
+        engine=None,
+        lead_id: Optional[int] = None,
+        whatsapp_number: Optional[str] = None
+    ) -> Optional[Dict]:
+        """
+        Apaga um lead e todos os dados pessoais ligados a ele (pedido do titular)
+
+        As tabelas filhas são apagadas antes do lead: se a execução for
+        interrompida, basta repetir o pedido.
+
+        Args:
+            engine: Engine do banco (padrão: engine compartilhado)
+            lead_id: ID do lead
+            whatsapp_number: Número WhatsApp (alternativa ao ID)
+
+        Returns:
+            Relatório com linhas apagadas por tabela, ou None se o lead não existe
+        """
+        engine = engine or get_engine()
+        db = get_session(engine)
+        try:
+            query = select(Lead.id, Lead.whatsapp_number)
+            if lead_id is not None:
+                query = query.where(Lead.id == lead_id)
+            else:
+                query = query.where(Lead.canonical_number == canonical_whatsapp_number(whatsapp_number))
+            found = db.execute(query).first()
+        finally:
+            db.close()
+        if found is None:
+            return None
+        lead_id, whatsapp_number = found
+
+        started = time.perf_counter()
+        counts = {}
+        for name, model in (
+            ("chat_messages", ChatMessage),
+            ("qualification_fields", QualificationField),
+            ("notification_logs", NotificationLog),
+        ):
+            table = model.__table__
+            condition = or_(table.c.lead_id == lead_id, table.c.whatsapp_number == whatsapp_number)
+            counts[name] = delete_in_batches(table, condition, engine=engine)
+        attributes = LeadAttributes.__table__
+        counts["lead_attributes"] = delete_in_batches(attributes, attributes.c.lead_id == lead_id, engine=engine)
+        events = LeadEvent.__table__
+        counts["lead_events"] = delete_in_batches(events, events.c.lead_id == lead_id, engine=engine)
+        counts["message_archive"] = MessageArchiveService.purge_lead(lead_id, engine=engine)
+        counts["leads"] = delete_in_batches(Lead.__table__, Lead.__table__.c.id == lead_id, engine=engine)
+        # Leads da mesma pessoa deixam de apontar para o lead apagado
+        with write_session_scope(engine) as db:
+            db.execute(lead_event_insert(lead_id, None, "deleted"))
+            db.execute(
+                update(Lead).where(Lead.linked_lead_id == lead_id)
+                .values(linked_lead_id=None, version=Lead.version + 1)
+                .execution_options(synchronize_session=False)
+            )
+
+        lead_cache.invalidate(whatsapp_number)
+        conversation_buffer.invalidate(whatsapp_number)
+        lead_stats_cache.invalidate()
+
+        report = _report(counts, started, incremental_vacuum(engine))
+        logger.info(f"🗑️ Lead {lead_id} esquecido: {report['deleted']}")
+        return report
+
+
+async def retention_job():
+    """Job periódico de retenção (roda fora do event loop)"""
+    try:
+        await asyncio.to_thread(RetentionService.run_policies)
+    except Exception as e:
+        logger.error(f"❌ Erro na retenção de dados: {str(e)}")
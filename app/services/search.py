@@ -0,0 +1,94 @@
+"""
+Busca textual em mensagens e leads (ver app/database/fulltext.py)
+
+O texto digitado vira termos sem acento e em minúsculas; cada termo casa
+como prefixo ("placa ABC" acha "ABC1234") e todos precisam aparecer.
+Resultados vêm ordenados por relevância (bm25 no SQLite, ts_rank no
+Postgres), com um trecho destacado entre colchetes.
+"""
+import re
+import unicodedata
+from typing import Dict, List
+from sqlalchemy import DateTime, text
+from app.database.fulltext import attribute_document_sql, lead_document_sql
+
+MAX_SEARCH_TERMS = 8
+MAX_SEARCH_RESULTS = 100
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def search_terms(query: str) -> List[str]:
+    """Termos da busca, sem acentos e em minúsculas"""
+    normalized = unicodedata.normalize("NFKD", query or "")
+    normalized = "".join(char for char in normalized if not unicodedata.combining(char)).lower()
+    return list(dict.fromkeys(_WORD.findall(normalized)))[:MAX_SEARCH_TERMS]
+
+
+def match_expression(terms: List[str], dialect: str) -> str:
+    """Expressão de busca do dialeto: FTS5 MATCH no SQLite, to_tsquery no Postgres"""
+    if dialect == "postgresql":
+        return " & ".join(f"{term}:*" for term in terms)
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_statements(dialect: str) -> Dict:
+    """Consultas de leads e de mensagens (parâmetros :q e :limit)"""
+    if dialect == "postgresql":
+        message_vector = "to_tsvector('simple', crm_search_text(coalesce(m.message, '')))"
+        lead_vector = f"to_tsvector('simple', crm_search_text({lead_document_sql('l.')}))"
+        attribute_vector = f"to_tsvector('simple', crm_search_text({attribute_document_sql('a.')}))"
+        document = f"{lead_document_sql('l.')} || ' ' || {attribute_document_sql('a.')}"
+        return {
+            # Cada índice GIN atende um lado; os termos precisam casar todos no
+            # lead ou todos nos atributos de fluxo
+            "leads": text(
+                f"SELECT l.id, l.whatsapp_number, l.name, l.status, "
+                f"ts_headline('simple', {document}, query, 'StartSel=[, StopSel=], MaxWords=12, MinWords=3') AS snippet, "
+                f"ts_rank({lead_vector} || {attribute_vector}, query) AS score "
+                f"FROM leads l LEFT JOIN lead_attributes a ON a.lead_id = l.id, to_tsquery('simple', :q) query "
+                f"WHERE l.id IN (SELECT l.id FROM leads l WHERE {lead_vector} @@ query "
+                f"UNION SELECT a.lead_id FROM lead_attributes a WHERE {attribute_vector} @@ query) "
+                f"ORDER BY score DESC LIMIT :limit"
+            ),
+            "messages": text(
+                f"SELECT m.id, m.lead_id, m.whatsapp_number, m.sender, m.created_at, "
+                f"ts_headline('simple', m.message, query, 'StartSel=[, StopSel=], MaxWords=20, MinWords=5') AS snippet, "
+                f"ts_rank({message_vector}, query) AS score "
+                f"FROM chat_messages m, to_tsquery('simple', :q) query WHERE {message_vector} @@ query "
+                f"ORDER BY score DESC LIMIT :limit"
+            ).columns(created_at=DateTime),
+        }
+    if dialect != "sqlite":
+        raise ValueError(f"Busca textual não suportada no banco {dialect}")
+    return {
+        "leads": text(
+            "SELECT l.id, l.whatsapp_number, l.name, l.status, "
+            "snippet(leads_fts, -1, '[', ']', '…', 10) AS snippet, -leads_fts.rank AS score "
+            "FROM leads_fts JOIN leads l ON l.id = leads_fts.rowid "
+            "WHERE leads_fts MATCH :q ORDER BY leads_fts.rank LIMIT :limit"
+        ),
+        "messages": text(
+            "SELECT m.id, m.lead_id, m.whatsapp_number, m.sender, m.created_at, "
+            "snippet(chat_messages_fts, 0, '[', ']', '…', 16) AS snippet, -chat_messages_fts.rank AS score "
+            "FROM chat_messages_fts JOIN chat_messages m ON m.id = chat_messages_fts.rowid "
+            "WHERE chat_messages_fts MATCH :q ORDER BY chat_messages_fts.rank LIMIT :limit"
+        ).columns(created_at=DateTime),
+    }
+
+
+def search_params(query: str, dialect: str, limit: int):
+    """Parâmetros da busca, ou None se o texto não tem nenhum termo"""
+    terms = search_terms(query)
+    if not terms:
+        return None
+    return {"q": match_expression(terms, dialect), "limit": min(max(limit, 1), MAX_SEARCH_RESULTS)}
+
+
+def format_hits(rows) -> List[Dict]:
+    hits = []
+    for row in rows:
+        hit = dict(row._mapping)
+        hit["score"] = round(float(hit["score"]), 4)
+        hits.append(hit)
+    return hits
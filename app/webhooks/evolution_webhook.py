@@ -1,24 +1,37 @@
 """
 FastAPI Webhook para integração com Evolution API
 """
-from fastapi import FastAPI, HTTPException, Request, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Request, BackgroundTasks, Depends
+from fastapi.responses import JSONResponse, ORJSONResponse
 from typing import Optional
 from datetime import datetime
 import asyncio
 import logging
 from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
 from config.settings import settings
-from app.database.models import init_db, get_session, Lead, ChatMessage
+from app.database.models import init_db, Lead
+from app.database.connection import (
+    get_async_engine, get_async_session, get_async_db, get_async_write_db,
+    get_pool_status, dispose_engines, dispose_async_engines
+)
 from app.services.ai_service import AIService
 from app.services.evolution_service import EvolutionService
 from app.services.notification_service import NotificationService
 from app.services.email_scheduler import email_scheduler
-from app.services.database_service import (
-    LeadService, MessageService, QualificationFieldService
+from app.services.maintenance_scheduler import maintenance_scheduler
+from app.services.async_database_service import (
+    AsyncLeadService, AsyncMessageService, AsyncQualificationFieldService
 )
+from app.services.database_service import can_transition, pending_lead_changes
+from app.services.lead_cache import lead_cache
+from app.services.conversation_buffer import conversation_buffer
+from app.services.pagination import InvalidCursorError, MAX_PAGE_SIZE
 from app.core.qualification import QualificationEngine
 from app.core.flow_manager import FlowManager
+from app.core.slot_filling import SlotFillingEngine
+from app.core.utils import extract_identity_keys
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
@@ -31,9 +44,15 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Inicializa banco de dados
+# Inicializa banco de dados (tabelas e índices pelo engine síncrono)
 engine = init_db(settings.DATABASE_URL)
 
+# Consultas do webhook e da API pelo engine assíncrono
+async_engine = get_async_engine(settings.DATABASE_URL)
+
+# Coleta determinística por fluxo (settings.SLOT_FILLING_FLOWS)
+slot_engine = SlotFillingEngine()
+
 
 @app.on_event("startup")
 async def startup_event():
@@ -43,6 +62,9 @@ async def startup_event():
     # Inicia scheduler de e-mails (verifica a cada 24 horas)
     email_scheduler.start(interval_hours=24)
     
+    # Tarefas de manutenção do banco (arquivamento e retenção)
+    maintenance_scheduler.start()
+    
     logger.info("✅ Sistema CRM iniciado com sucesso")
 
 
@@ -53,6 +75,11 @@ async def shutdown_event():
     
     # Para scheduler de e-mails
     email_scheduler.stop()
+    maintenance_scheduler.stop()
+    
+    # Fecha as conexões do pool
+    dispose_engines()
+    await dispose_async_engines()
     
     logger.info("✅ Sistema CRM encerrado")
 
@@ -85,9 +112,8 @@ async def health():
     """Health check endpoint"""
     try:
         # Testa conexão com o banco
-        db = get_session(engine)
-        db.execute(text("SELECT 1"))
-        db.close()
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
         db_status = "connected"
     except Exception as e:
         logger.error(f"Health check DB error: {str(e)}")
@@ -98,6 +124,16 @@ async def health():
         "running": email_scheduler.is_running,
         "next_run": email_scheduler.get_next_run_time().isoformat() if email_scheduler.get_next_run_time() else None
     }
+    
+    return {
+        "status": "healthy" if db_status == "connected" else "degraded",
+        "database": db_status,
+        "database_pool": get_pool_status(async_engine.sync_engine),
+        "lead_cache": lead_cache.stats(),
+        "conversation_buffer": conversation_buffer.stats(),
+        "email_scheduler": email_scheduler_status,
+        "timestamp": datetime.now().isoformat()
+    }
 
 
 # Lista para armazenar últimos eventos recebidos (debug)
@@ -144,13 +180,6 @@ async def get_recent_events():
         "total_events": len(recent_events),
         "events": recent_events
     }, status_code=200)
-    
-    return {
-        "status": "healthy" if db_status == "connected" else "degraded",
-        "database": db_status,
-        "email_scheduler": email_scheduler_status,
-        "timestamp": datetime.now().isoformat()
-    }
 
 
 @app.post("/api/email/check-now")
@@ -324,6 +353,44 @@ async def webhook_handler(request: Request, background_tasks: BackgroundTasks, e
         )
 
 
+async def commit_with_merge(db: AsyncSession, lead: Lead, add_pending) -> Lead:
+    """
+    Grava a unidade de trabalho do webhook com controle de versão do lead
+    
+    Se o dashboard ou a API alteraram o lead desde a leitura, o commit falha
+    com StaleDataError: o lead é recarregado, as alterações do webhook são
+    reaplicadas por cima (merge_lead_changes) e o commit é repetido, até
+    LEAD_MERGE_RETRIES vezes.
+    
+    Args:
+        db: Sessão assíncrona de escrita
+        lead: Lead com as alterações pendentes
+        add_pending: Corrotina que adiciona à sessão o restante da unidade
+            (mensagens); chamada de novo a cada tentativa
+    
+    Returns:
+        O lead gravado
+    """
+    lead_id, whatsapp_number = lead.id, lead.whatsapp_number
+    changes = pending_lead_changes(lead)
+    for attempt in range(settings.LEAD_MERGE_RETRIES + 1):
+        await add_pending()
+        try:
+            await db.commit()
+            lead_cache.store(lead)
+            return lead
+        except StaleDataError:
+            await db.rollback()
+            lead_cache.invalidate(whatsapp_number)
+            if attempt == settings.LEAD_MERGE_RETRIES:
+                raise
+            logger.warning(f"[{whatsapp_number}] Lead alterado por outro processo; reaplicando {list(changes)}")
+            lead = await AsyncLeadService.reload_and_merge(db, lead_id, changes)
+            if lead is None:
+                raise
+    return lead
+
+
 async def process_message(whatsapp_number: str, message_text: str):
     """
     Processa uma mensagem recebida usando o novo sistema de fluxos
@@ -334,31 +401,44 @@ async def process_message(whatsapp_number: str, message_text: str):
     """
     import time
     start_time = time.time()
-    db = get_session(engine)
-    notification_service = NotificationService(db)
+    # Transações de escrita abrem com BEGIN IMMEDIATE no SQLite
+    db = get_async_session(async_engine, write=True)
+    # Logs de notificação: transação síncrona própria, gravada numa thread
+    notification_service = NotificationService(engine=engine)
     
     try:
         logger.info(f"[{whatsapp_number}] Iniciando processamento: '{message_text[:50]}'")
         
+        # Unidade de trabalho: o lead é carregado uma vez e alterado em memória;
+        # as escritas saem em duas transações (entrada do usuário antes das
+        # chamadas à IA, resultado da IA no final), sem refresh entre elas
+        
         # 1. Cria ou recupera lead
-        lead = LeadService.create_or_get_lead(db, whatsapp_number, "novo")
+        lead = await AsyncLeadService.create_or_get_lead(db, whatsapp_number, "novo", commit=False)
         logger.info(f"[{whatsapp_number}] Lead ID: {lead.id}, IA Ativa: {lead.status_ia}, Etapa: {lead.flow_step}")
         
-        # 2. SEMPRE salva mensagem do usuário
-        MessageService.save_message(
-            db, whatsapp_number, "user", message_text, role="user", lead_id=lead.id
-        )
-        db.commit()
-        logger.info(f"[{whatsapp_number}] Mensagem do usuário salva")
+        # Mensagens ficam no número do lead (o cliente pode escrever com e sem
+        # o nono dígito); a resposta vai para o número que enviou
+        lead_number = lead.whatsapp_number
+        
+        # Histórico já com a mensagem atual (ainda não gravada)
+        conversation = await AsyncMessageService.get_conversation_history(db, lead_number, limit=49)
+        conversation.append({"role": "user", "content": message_text})
+        
+        # 2. SEMPRE salva mensagem do usuário (commit junto com a navegação, em commit_with_merge)
+        async def add_user_message():
+            await AsyncMessageService.save_message(
+                db, lead_number, "user", message_text, role="user", lead_id=lead.id, commit=False
+            )
         
         # 3. Inicializa serviços (IA sempre responde)
         ai_service = get_ai_service()
         flow_manager = FlowManager()
         qualification_engine = get_qualification_engine()
-        conversation = MessageService.get_conversation_history(db, whatsapp_number)
         
         # 5. Gerencia navegação do fluxo
         current_step = lead.flow_step or "menu_principal"
+        previous_step = current_step
         flow_type = lead.flow_type
         
         # Detecta se é cliente existente baseado em palavras-chave
@@ -376,21 +456,32 @@ async def process_message(whatsapp_number: str, message_text: str):
         
         # Se detectar que é cliente existente, atualiza
         if is_existing_customer and lead.customer_type == "novo":
-            LeadService.update_lead(db, lead, customer_type="existente")
-            db.commit()
+            await AsyncLeadService.update_lead(db, lead, commit=False, customer_type="existente")
             logger.info(f"[{whatsapp_number}] Cliente identificado como EXISTENTE")
         
+        # CPF/CNPJ, e-mail ou placa na mensagem: procura o cliente pelos
+        # índices (sem IA) e traz os dados cadastrais que ele já informou
+        identity = extract_identity_keys(message_text)
+        if identity and not lead.linked_lead_id:
+            customer = await AsyncLeadService.resolve_customer(db, lead, **identity)
+            if customer:
+                logger.info(f"[{whatsapp_number}] Cliente EXISTENTE reconhecido: lead {lead.linked_lead_id}")
+        
         # Detecta se cliente quer voltar ao menu (a qualquer momento)
         if message_text.strip() in ["0", "menu", "voltar", "inicio", "Menu", "Voltar"]:
             current_step = "menu_principal"
             flow_type = None
-            LeadService.update_lead(db, lead, flow_step=current_step, flow_type=flow_type)
-            db.commit()
+            await AsyncLeadService.update_lead(db, lead, commit=False, flow_step=current_step, flow_type=flow_type)
             logger.info(f"[{whatsapp_number}] Cliente voltou ao menu principal")
         
         # Se está no menu principal, detecta escolha (incluindo sinistro automático)
         if current_step == "menu_principal":
             choice = flow_manager.detect_menu_choice(message_text)
+            if not choice:
+                # Texto livre: tenta o classificador local antes de deixar para a IA
+                choice = flow_manager.classify_intent(message_text)
+                if choice:
+                    logger.info(f"[{whatsapp_number}] Intenção resolvida localmente: {choice}")
             if choice:
                 if choice == "menu_principal":
                     # Já está no menu, apenas confirma
@@ -404,57 +495,67 @@ async def process_message(whatsapp_number: str, message_text: str):
                 elif choice in ["segunda_via", "sinistro", "falar_humano", "outros_assuntos"]:
                     current_step = choice
                     flow_type = choice
+                elif choice.startswith("seguro_"):
+                    # Classificador já identificou o tipo de seguro
+                    current_step = choice
+                    flow_type = choice
                 
                 # Atualiza lead
-                LeadService.update_lead(db, lead, flow_step=current_step, flow_type=flow_type)
-                db.commit()
+                await AsyncLeadService.update_lead(db, lead, commit=False, flow_step=current_step, flow_type=flow_type)
         
         # Se está escolhendo tipo de seguro
         elif current_step == "escolher_seguro":
             insurance_type = flow_manager.detect_insurance_type(message_text)
+            if not insurance_type:
+                insurance_type = flow_manager.classify_intent(
+                    message_text,
+                    allowed=["seguro_auto", "seguro_residencial", "seguro_vida", "seguro_empresarial"]
+                )
             if insurance_type:
                 current_step = insurance_type
                 flow_type = insurance_type
-                LeadService.update_lead(db, lead, flow_step=current_step, flow_type=flow_type)
-                db.commit()
+                await AsyncLeadService.update_lead(db, lead, commit=False, flow_step=current_step, flow_type=flow_type)
         
         # Se está em consórcio mas ainda não escolheu tipo
         elif current_step == "consorcio" and not lead.consortium_type:
             consortium_type = flow_manager.detect_consortium_type(message_text)
             if consortium_type:
-                LeadService.update_lead(db, lead, consortium_type=consortium_type)
-                db.commit()
+                await AsyncLeadService.update_lead(db, lead, commit=False, consortium_type=consortium_type)
         
         # 6. Extrai dados da mensagem atual
-        lead_dict = {
-            "name": lead.name,
-            "email": lead.email,
-            "second_email": lead.second_email,
-            "cpf_cnpj": lead.cpf_cnpj,
-            "phone": lead.phone,
-            "whatsapp_contact": lead.whatsapp_contact,
-            "vehicle_plate": lead.vehicle_plate,
-            "cep_pernoite": lead.cep_pernoite,
-            "profession": lead.profession,
-            "marital_status": lead.marital_status,
-            "vehicle_usage": lead.vehicle_usage,
-            "has_young_driver": lead.has_young_driver,
-            "property_cep": lead.property_cep,
-            "property_type": lead.property_type,
-            "property_value": lead.property_value,
-            "property_ownership": lead.property_ownership,
-            "consortium_type": lead.consortium_type,
-            "consortium_value": lead.consortium_value,
-            "consortium_term": lead.consortium_term,
-            "has_previous_consortium": lead.has_previous_consortium,
-            "flow_type": flow_type,
-            "flow_step": current_step
-        }
+        lead_dict = AsyncLeadService.build_lead_dict(lead, flow_type, current_step)
+        
+        # Coleta determinística (sem IA) para os fluxos configurados
+        slot_result = None
+        if slot_engine.is_enabled(flow_type):
+            slot_state = slot_engine.load_state(lead.qualification_data)
+            slot_result = slot_engine.handle(
+                flow_type,
+                message_text,
+                slot_state,
+                whatsapp_number,
+                entered=current_step != previous_step
+            )
+            slot_updates = {
+                "qualification_data": slot_engine.dump_state(slot_result["state"], lead.qualification_data)
+            }
+            if slot_result["completed"]:
+                slot_updates.update(slot_result["values"])
+                lead_dict.update(slot_result["values"])
+                logger.info(f"[{whatsapp_number}] Coleta determinística concluída: {list(slot_result['values'])}")
+            await AsyncLeadService.update_lead(db, lead, commit=False, **slot_updates)
+        
+        # Transação 1: lead novo, mensagem do usuário e navegação do fluxo
+        lead = await commit_with_merge(db, lead, add_user_message)
+        logger.info(f"[{whatsapp_number}] Mensagem do usuário salva")
         
         # Extrai dados específicos do fluxo atual DA CONVERSA COMPLETA
-        if flow_type:
+        if flow_type and slot_result is None:
             logger.info(f"[{whatsapp_number}] Extraindo dados do fluxo {flow_type} da conversa...")
-            extracted = ai_service.extract_lead_data_from_conversation(conversation, flow_type)
+            # Chamadas à OpenAI são síncronas: rodam numa thread para não travar o event loop
+            extracted = await asyncio.to_thread(
+                ai_service.extract_lead_data_from_conversation, conversation, flow_type
+            )
             logger.info(f"[{whatsapp_number}] Dados extraídos pela IA: {extracted}")
             
             # Atualiza lead com dados extraídos (substitui valores vazios/None)
@@ -465,13 +566,24 @@ async def process_message(whatsapp_number: str, message_text: str):
                     # Atualiza mesmo que já exista (para pegar atualizações)
                     old_value = lead_dict.get(key)
                     if old_value != value:
+                        try:
+                            setattr(lead, key, value)
+                        except ValueError as e:
+                            logger.warning(f"[{whatsapp_number}] Valor ignorado: {e}")
+                            continue
                         lead_dict[key] = value
-                        setattr(lead, key, value)
                         updated_fields.append(f"{key}={value}")
             
             if updated_fields:
                 logger.info(f"[{whatsapp_number}] Campos atualizados: {', '.join(updated_fields)}")
-                db.commit()
+                # Busca numa sessão de leitura própria: na sessão de escrita abriria
+                # BEGIN IMMEDIATE, segurando o lock do SQLite durante a chamada à IA
+                if not lead.linked_lead_id:
+                    async with get_async_session(async_engine) as lookup_db:
+                        customer = await AsyncLeadService.resolve_customer(lookup_db, lead)
+                    if customer:
+                        logger.info(f"[{whatsapp_number}] Cliente EXISTENTE reconhecido: lead {lead.linked_lead_id}")
+                        lead_dict = AsyncLeadService.build_lead_dict(lead, flow_type, current_step)
             else:
                 logger.info(f"[{whatsapp_number}] Nenhum campo novo extraído desta mensagem")
         
@@ -483,8 +595,11 @@ async def process_message(whatsapp_number: str, message_text: str):
         else:
             logger.info(f"[{whatsapp_number}] ✅ Todos os campos obrigatórios coletados")
         
+        # Na coleta determinística, só encaminha depois da confirmação do cliente
+        flow_ready = slot_result is None or slot_result["completed"]
+        
         # 8. Verifica se deve apenas notificar admin (outros_assuntos)
-        should_notify_only = flow_manager.should_notify_admin_only(flow_type, lead_dict)
+        should_notify_only = flow_ready and flow_manager.should_notify_admin_only(flow_type, lead_dict)
         
         if should_notify_only:
             logger.info(f"Notificando admin sobre outros assuntos de {whatsapp_number}")
@@ -506,17 +621,55 @@ async def process_message(whatsapp_number: str, message_text: str):
         
         # 9. Verifica se deve transferir para humano (qualificação de lead)
         # IMPORTANTE: Só transfere se NÃO houver campos faltantes
-        should_transfer = flow_manager.should_transfer_to_human(current_step, flow_type, lead_dict)
+        should_transfer = flow_ready and flow_manager.should_transfer_to_human(current_step, flow_type, lead_dict)
+        qualified_now = False
         
-        if should_transfer and not missing_fields:
+        if should_transfer and not missing_fields and not can_transition(lead, "qualify"):
+            # Atendente já assumiu ou encerrou: a decisão dele prevalece
+            logger.info(f"[{whatsapp_number}] Lead em '{lead.status}', não volta para qualificado")
+        elif should_transfer and not missing_fields:
             logger.info(f"✅ Lead {whatsapp_number} QUALIFICADO - Todos os campos coletados: {current_step}")
             
-            # Marca como qualificado
-            LeadService.mark_qualified(db, lead)
-            db.commit()
-            
-            # Mensagem de finalização já será enviada pela IA com o prompt correto
-            # Notifica admin em background
+            # Marca como qualificado; o admin é notificado depois do commit
+            await AsyncLeadService.mark_qualified(db, lead, commit=False)
+            qualified_now = True
+        elif should_transfer and missing_fields:
+            logger.warning(f"⚠️ Lead {whatsapp_number} não pode ser qualificado - {len(missing_fields)} campos faltantes: {', '.join(missing_fields)}")
+        
+        # 10. Gera resposta da IA com o prompt correto (inclui campos faltantes)
+        if slot_result is not None:
+            # Resposta pronta da coleta determinística
+            ai_response = slot_result["reply"]
+        else:
+            try:
+                ai_response = await asyncio.to_thread(
+                    ai_service.get_response,
+                    user_message=message_text,
+                    conversation_history=conversation,
+                    flow_step=current_step,
+                    missing_fields=missing_fields if missing_fields else None
+                )
+            except Exception as e:
+                logger.error(f"Erro ao gerar resposta IA: {str(e)}")
+                ai_response = "Desculpe, tive um problema técnico. Pode repetir sua mensagem?"
+        
+        # 11. Salva resposta da IA
+        # Transação 2: campos extraídos, qualificação e mensagem da IA
+        async def add_ai_message():
+            await AsyncMessageService.save_message(
+                db, lead_number, "ai", ai_response, role="assistant", lead_id=lead.id, commit=False
+            )
+        
+        try:
+            lead = await commit_with_merge(db, lead, add_ai_message)
+        except Exception as e:
+            await db.rollback()
+            lead_cache.invalidate(whatsapp_number)
+            qualified_now = False
+            logger.error(f"Erro ao salvar mensagem IA: {str(e)}")
+        
+        # Só notifica se a qualificação foi gravada (um atendente pode ter assumido no meio)
+        if qualified_now and lead.status == "qualificado":
             async def notify_admin_lead_background(service, data, number):
                 try:
                     await service.notify_admin_lead_qualified(data, number)
@@ -530,29 +683,6 @@ async def process_message(whatsapp_number: str, message_text: str):
                 )
             except Exception as e:
                 logger.error(f"Erro ao criar task de notificação: {str(e)}")
-        elif should_transfer and missing_fields:
-            logger.warning(f"⚠️ Lead {whatsapp_number} não pode ser qualificado - {len(missing_fields)} campos faltantes: {', '.join(missing_fields)}")
-        
-        # 10. Gera resposta da IA com o prompt correto (inclui campos faltantes)
-        try:
-            ai_response = ai_service.get_response(
-                user_message=message_text,
-                conversation_history=conversation,
-                flow_step=current_step,
-                missing_fields=missing_fields if missing_fields else None
-            )
-        except Exception as e:
-            logger.error(f"Erro ao gerar resposta IA: {str(e)}")
-            ai_response = "Desculpe, tive um problema técnico. Pode repetir sua mensagem?"
-        
-        # 11. Salva resposta da IA
-        try:
-            MessageService.save_message(
-                db, whatsapp_number, "ai", ai_response, role="assistant", lead_id=lead.id
-            )
-            db.commit()
-        except Exception as e:
-            logger.error(f"Erro ao salvar mensagem IA: {str(e)}")
         
         # 12. Envia resposta via WhatsApp
         try:
@@ -564,6 +694,7 @@ async def process_message(whatsapp_number: str, message_text: str):
             logger.error(f"[{whatsapp_number}] Erro ao enviar resposta: {str(e)}")
     
     except Exception as e:
+        lead_cache.invalidate(whatsapp_number)
         elapsed = time.time() - start_time
         logger.error(f"[{whatsapp_number}] ❌ Erro após {elapsed:.2f}s: {str(e)}")
         import traceback
@@ -578,162 +709,207 @@ async def process_message(whatsapp_number: str, message_text: str):
             pass
     
     finally:
-        db.close()
+        await db.close()
 
 
 # ==================== ROTAS DE API PARA DASHBOARD ====================
 
 @app.get("/api/leads/stats")
-async def get_leads_stats():
+async def get_leads_stats(db: AsyncSession = Depends(get_async_db)):
     """Retorna estatísticas de leads"""
-    db = None
     try:
-        db = get_session(engine)
-        
-        leads = db.query(Lead).all()
-        today = datetime.now().date()
+        counts = await AsyncLeadService.get_statistics(db)
+        total = counts["total"]
+        by_status = counts["by_status"]
         
         stats = {
-            "total_leads": len(leads),
-            "novos_hoje": len([l for l in leads if l.created_at.date() == today]),
-            "qualificados": len([l for l in leads if l.status == "qualificado"]),
-            "em_negociacao": len([l for l in leads if l.status == "em_negociacao"]),
-            "convertidos": len([l for l in leads if l.status == "convertido"]),
-            "perdidos": len([l for l in leads if l.status == "perdido"]),
-            "taxa_qualificacao": (len([l for l in leads if l.status == "qualificado"]) / len(leads) * 100) if leads else 0,
-            "taxa_conversao": (len([l for l in leads if l.status == "convertido"]) / len(leads) * 100) if leads else 0
+            "total_leads": total,
+            "novos_hoje": counts["created_today"],
+            "qualificados": by_status.get("qualificado", 0),
+            "em_negociacao": by_status.get("em_negociacao", 0),
+            "convertidos": by_status.get("convertido", 0),
+            "perdidos": by_status.get("perdido", 0),
+            "taxa_qualificacao": (by_status.get("qualificado", 0) / total * 100) if total else 0,
+            "taxa_conversao": (by_status.get("convertido", 0) / total * 100) if total else 0
         }
         
         return stats
     except Exception as e:
         logger.error(f"Erro ao buscar estatísticas: {str(e)}")
         return {"error": str(e)}
-    finally:
-        if db:
-            db.close()
 
 
-@app.get("/api/leads")
-async def get_leads(status: Optional[str] = None, limit: int = 50):
-    """Retorna lista de leads"""
-    db = None
+# Campos retornados por /api/leads quando `fields` não é informado
+LEAD_LIST_FIELDS = (
+    "id", "name", "whatsapp_number", "email", "status", "qualification_score",
+    "qualification_data", "created_at", "updated_at"
+)
+
+# Valores padrão na listagem de leads
+LEAD_FIELD_FORMATS = {
+    "name": lambda value: value or "Aguardando qualificação",
+    "qualification_score": lambda value: int(value) if value else 0,
+    "qualification_data": lambda value: value if value else {},
+}
+
+
+def parse_lead_fields(fields: Optional[str]) -> tuple:
+    """Valida o parâmetro `fields` (nomes de colunas de leads separados por vírgula)"""
+    if not fields:
+        return LEAD_LIST_FIELDS
+    requested = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in requested if name not in Lead.__table__.c]
+    if unknown or not requested:
+        raise HTTPException(status_code=400, detail=f"Campos inválidos: {', '.join(unknown) or fields}")
+    return requested
+
+
+def page_response(items: list, cursor: Optional[str]) -> ORJSONResponse:
+    """Resposta JSON de uma página, com o cursor da próxima no header X-Next-Cursor"""
+    headers = {"X-Next-Cursor": cursor} if cursor else None
+    return ORJSONResponse(items, headers=headers)
+
+
+@app.get("/api/leads", response_class=ORJSONResponse)
+async def get_leads(
+    status: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Retorna lista de leads, mais recentes primeiro
+    
+    Paginação por cursor: a próxima página é pedida com `cursor` igual ao
+    header X-Next-Cursor da resposta (ausente na última página). `fields`
+    escolhe as colunas retornadas (ex.: `fields=id,name,status`).
+    """
+    selected = parse_lead_fields(fields)
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
     try:
-        db = get_session(engine)
-        
-        query = db.query(Lead)
-        
-        if status:
-            query = query.filter(Lead.status == status)
-        
-        leads = query.order_by(Lead.created_at.desc()).limit(limit).all()
-        logger.info(f"Encontrados {len(leads)} leads no banco de dados")
-        
-        result = []
-        for lead in leads:
-            try:
-                lead_dict = {
-                    "id": lead.id,
-                    "name": lead.name or "Aguardando qualificação",
-                    "whatsapp_number": lead.whatsapp_number,
-                    "email": lead.email,
-                    "status": lead.status,
-                    "qualification_score": int(lead.qualification_score) if lead.qualification_score else 0,
-                    "qualification_data": lead.qualification_data if lead.qualification_data else {},
-                    "created_at": lead.created_at.isoformat() if lead.created_at else None,
-                    "updated_at": lead.updated_at.isoformat() if lead.updated_at else None
-                }
-                result.append(lead_dict)
-            except Exception as e:
-                logger.error(f"Erro ao serializar lead {lead.id}: {str(e)}")
-                continue
-        
-        logger.info(f"Retornando {len(result)} leads serializados")
-        return result
+        rows, next_page = await AsyncLeadService.list_leads(db, selected, status=status, limit=limit, cursor=cursor)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Erro ao buscar leads: {str(e)}")
         import traceback
         logger.error(traceback.format_exc())
-        return []
-    finally:
-        if db:
-            db.close()
+        return ORJSONResponse([])
+    
+    formats = [(name, format_value) for name, format_value in LEAD_FIELD_FORMATS.items() if name in selected]
+    result = []
+    for row in rows:
+        values = row._mapping
+        item = {name: values[name] for name in selected}
+        for name, format_value in formats:
+            item[name] = format_value(item[name])
+        result.append(item)
+    
+    logger.info(f"Retornando {len(result)} leads")
+    return page_response(result, next_page)
 
 
-@app.get("/api/leads/{lead_id}/messages")
-async def get_lead_messages(lead_id: int):
-    """Retorna mensagens de um lead"""
-    db = None
+@app.get("/api/leads/{lead_id}/messages", response_class=ORJSONResponse)
+async def get_lead_messages(
+    lead_id: int,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Retorna mensagens de um lead em ordem cronológica, paginadas por cursor
+    (X-Next-Cursor), incluindo as já arquivadas
+    """
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
     try:
-        db = get_session(engine)
-        
-        messages = db.query(ChatMessage).filter(
-            ChatMessage.lead_id == lead_id
-        ).order_by(ChatMessage.created_at.asc()).all()
-        
-        result = []
-        for msg in messages:
-            result.append({
-                "id": msg.id,
-                "lead_id": msg.lead_id,
-                "sender": msg.sender,
-                "message": msg.message,
-                "created_at": msg.created_at.isoformat() if msg.created_at else None
-            })
-        
-        return result
+        messages, next_page = await AsyncMessageService.get_lead_messages_page(db, lead_id, limit=limit, cursor=cursor)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Erro ao buscar mensagens: {str(e)}")
-        return []
-    finally:
-        if db:
-            db.close()
+        return ORJSONResponse([])
+    
+    return page_response(messages, next_page)
+
+
+@app.get("/api/search", response_class=ORJSONResponse)
+async def search(q: str = "", limit: int = 20, db: AsyncSession = Depends(get_async_db)):
+    """
+    Busca textual em leads e mensagens (ex.: `q=placa ABC`), ordenada por relevância
+    
+    Cada termo casa como prefixo e sem acentos; o trecho encontrado vem
+    destacado entre colchetes em `snippet`.
+    """
+    try:
+        return ORJSONResponse(await AsyncLeadService.search(db, q, limit=limit))
+    except Exception as e:
+        logger.error(f"Erro na busca: {str(e)}")
+        return ORJSONResponse({"leads": [], "messages": []})
+
+
+@app.get("/api/events", response_class=ORJSONResponse)
+async def get_events(
+    since: int = 0,
+    limit: int = 100,
+    lead_id: Optional[int] = None,
+    event_type: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Eventos dos leads (criação, etapa do fluxo, status, fusão, exclusão) depois da sequência `since`
+    
+    O consumidor guarda o `last_seq` da resposta e pede a próxima leva com
+    `since=last_seq`, sem reler as tabelas. `event_type` filtra por
+    tipos separados por vírgula (ex.: `event_type=status,flow_step`).
+    """
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    event_types = [name.strip() for name in event_type.split(",") if name.strip()] if event_type else None
+    try:
+        return ORJSONResponse(await AsyncLeadService.get_events(
+            db, since=max(since, 0), limit=limit, lead_id=lead_id, event_types=event_types
+        ))
+    except Exception as e:
+        logger.error(f"Erro ao buscar eventos: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.post("/api/leads/{lead_id}/send-message")
-async def send_message_to_lead(lead_id: int, request: Request):
+async def send_message_to_lead(lead_id: int, request: Request, db: AsyncSession = Depends(get_async_write_db)):
     """Envia mensagem do humano para o lead via WhatsApp"""
-    db = None
     try:
-        db = get_session(engine)
         data = await request.json()
         message_text = data.get("message", "").strip()
         
         if not message_text:
             raise HTTPException(status_code=400, detail="Mensagem vazia")
         
-        # Busca o lead
-        lead = db.query(Lead).filter(Lead.id == lead_id).first()
-        if not lead:
+        # Desativa IA e, se o lead estava qualificado, passa para em_negociacao
+        # (UPDATEs condicionais: não sobrescrevem o que o webhook gravou)
+        updated = await AsyncLeadService.transition(db, lead_id, "negotiate", status_ia=0)
+        if updated:
+            logger.info(f"[{updated['whatsapp_number']}] Status alterado: qualificado → em_negociacao")
+        else:
+            updated = await AsyncLeadService.transition(db, lead_id, None, status_ia=0)
+        if not updated:
             raise HTTPException(status_code=404, detail="Lead não encontrado")
+        whatsapp_number = updated["whatsapp_number"]
         
-        # Desativa IA e atualiza status para em_negociacao
-        lead.status_ia = 0
-        if lead.status == "qualificado":
-            lead.status = "em_negociacao"
-            logger.info(f"[{lead.whatsapp_number}] Status alterado: qualificado → em_negociacao")
-        db.commit()
-        
-        logger.info(f"[{lead.whatsapp_number}] Humano enviando mensagem: {message_text[:50]}...")
+        logger.info(f"[{whatsapp_number}] Humano enviando mensagem: {message_text[:50]}...")
         
         # Envia mensagem via Evolution API
         evolution = EvolutionService()
-        success = await evolution.send_message(lead.whatsapp_number, message_text)
+        success = await evolution.send_message(whatsapp_number, message_text)
         
         if not success:
             raise HTTPException(status_code=500, detail="Falha ao enviar mensagem")
         
         # Salva mensagem no histórico
-        chat_message = ChatMessage(
-            lead_id=lead.id,
-            whatsapp_number=lead.whatsapp_number,
-            sender="human",
-            message=message_text,
-            role="assistant"
+        await AsyncMessageService.save_message(
+            db, whatsapp_number, "human", message_text, role="assistant", lead_id=lead_id
         )
-        db.add(chat_message)
-        db.commit()
         
-        logger.info(f"[{lead.whatsapp_number}] Mensagem enviada pelo humano com sucesso")
+        logger.info(f"[{whatsapp_number}] Mensagem enviada pelo humano com sucesso")
         
         return {"success": True, "message": "Mensagem enviada com sucesso"}
     
@@ -742,41 +918,29 @@ async def send_message_to_lead(lead_id: int, request: Request):
     except Exception as e:
         logger.error(f"Erro ao enviar mensagem: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if db:
-            db.close()
 
 
 @app.post("/api/leads/{lead_id}/close")
-async def close_conversation(lead_id: int, request: Request):
+async def close_conversation(lead_id: int, request: Request, db: AsyncSession = Depends(get_async_write_db)):
     """Encerra conversa com o lead"""
-    db = None
     try:
-        db = get_session(engine)
         data = await request.json()
         success = data.get("success", False)  # True = convertido, False = perdido
         
-        # Busca o lead
-        lead = db.query(Lead).filter(Lead.id == lead_id).first()
-        if not lead:
-            raise HTTPException(status_code=404, detail="Lead não encontrado")
+        # UPDATE condicional: só encerra lead ainda em andamento; IA fica desativada
+        updated = await AsyncLeadService.transition(db, lead_id, "convert" if success else "lose", status_ia=0)
+        if not updated:
+            lead = await AsyncLeadService.get_lead_by_id(db, lead_id)
+            if not lead:
+                raise HTTPException(status_code=404, detail="Lead não encontrado")
+            raise HTTPException(status_code=409, detail=f"Lead já encerrado (status: {lead.status})")
         
-        # Atualiza status baseado no resultado
-        old_status = lead.status
-        if success:
-            lead.status = "convertido"
-            logger.info(f"[{lead.whatsapp_number}] Status: {old_status} → convertido ✅")
-        else:
-            lead.status = "perdido"
-            logger.info(f"[{lead.whatsapp_number}] Status: {old_status} → perdido ❌")
-        
-        # Mantém IA desativada
-        lead.status_ia = 0
-        db.commit()
+        mark = "✅" if success else "❌"
+        logger.info(f"[{updated['whatsapp_number']}] Status: → {updated['status']} {mark}")
         
         return {
             "success": True, 
-            "message": f"Conversa encerrada - Status: {lead.status}"
+            "message": f"Conversa encerrada - Status: {updated['status']}"
         }
     
     except HTTPException:
@@ -784,9 +948,6 @@ async def close_conversation(lead_id: int, request: Request):
     except Exception as e:
         logger.error(f"Erro ao encerrar conversa: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if db:
-            db.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,62 @@
+"""
+Script para arquivar mensagens de leads encerrados ou inativos
+
+Move as mensagens de chat_messages para segmentos JSONL comprimidos em
+ARCHIVE_DIR (um arquivo por mês). A API e o dashboard continuam exibindo
+essas mensagens, lidas dos segmentos.
+
+Uso:
+    python archive_messages.py                       # usa as configurações do .env
+    python archive_messages.py --inactive-days 30    # leads parados há mais de 30 dias
+    python archive_messages.py --dry-run             # só conta os leads elegíveis
+"""
+import argparse
+import sys
+from config.settings import settings
+from app.database.models import init_db
+from app.services.message_archive import MessageArchiveService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arquiva mensagens antigas em segmentos comprimidos")
+    parser.add_argument("--inactive-days", type=int, default=settings.ARCHIVE_INACTIVE_DAYS,
+                        help="Dias sem atividade para arquivar um lead")
+    parser.add_argument("--statuses", default=",".join(settings.ARCHIVE_STATUSES),
+                        help="Status de leads encerrados, separados por vírgula")
+    parser.add_argument("--max-leads", type=int, default=None, help="Limite de leads nesta execução")
+    parser.add_argument("--dry-run", action="store_true", help="Só conta os leads elegíveis")
+    args = parser.parse_args()
+
+    statuses = [status.strip() for status in args.statuses.split(",") if status.strip()]
+
+    print("📦 Arquivamento de mensagens")
+    print(f"   Pasta: {settings.ARCHIVE_DIR}")
+    print(f"   Status encerrados: {', '.join(statuses)}")
+    print(f"   Inativos há mais de {args.inactive_days} dias")
+
+    try:
+        engine = init_db(settings.DATABASE_URL)
+        stats = MessageArchiveService.archive_messages(
+            engine=engine,
+            statuses=statuses,
+            inactive_days=args.inactive_days,
+            max_leads=args.max_leads,
+            dry_run=args.dry_run
+        )
+    except Exception as e:
+        print(f"\n❌ Erro no arquivamento: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+    if args.dry_run:
+        print(f"\n🔎 Leads elegíveis: {stats['eligible_leads']}")
+        return
+
+    print(f"\n📊 Resumo:")
+    print(f"   ✅ Leads arquivados: {stats['leads']} de {stats['eligible_leads']}")
+    print(f"   ✅ Mensagens arquivadas: {stats['messages']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Script de backup online do banco SQLite
+
+Uso:
+    python backup_db.py                         # gera um snapshot em BACKUP_DIR (com rotação)
+    python backup_db.py --list                  # lista os snapshots
+    python backup_db.py --verify ARQUIVO        # confere checksum e integridade
+    python backup_db.py --restore ARQUIVO       # restaura sobre o banco (pare a API e o dashboard antes)
+"""
+import argparse
+import sys
+from pathlib import Path
+from config.settings import settings
+from app.services.backup import BackupService
+from check_volume import format_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backup online do banco SQLite")
+    parser.add_argument("--list", action="store_true", help="Lista os snapshots existentes")
+    parser.add_argument("--verify", metavar="ARQUIVO", help="Verifica um snapshot")
+    parser.add_argument("--restore", metavar="ARQUIVO", help="Restaura um snapshot sobre o banco")
+    parser.add_argument("--target", metavar="BANCO", help="Banco de destino da restauração (padrão: DATABASE_URL)")
+    parser.add_argument("--dir", metavar="PASTA", help=f"Pasta dos snapshots (padrão: {settings.BACKUP_DIR})")
+    args = parser.parse_args()
+
+    try:
+        if args.list:
+            snapshots = BackupService.list_snapshots(args.dir)
+            print(f"📂 {len(snapshots)} snapshot(s) em {args.dir or settings.BACKUP_DIR}")
+            for path in snapshots:
+                print(f"   - {path.name} ({format_size(path.stat().st_size)})")
+            return
+
+        if args.verify:
+            print(f"🔎 Verificando {args.verify}...")
+            result = BackupService.verify_snapshot(Path(args.verify))
+            print(f"   Checksum: {'✅' if result['checksum_ok'] else '❌'}")
+            print(f"   Integridade: {result['integrity']}")
+            print(f"   Tabelas: {', '.join(result['tables'])}")
+            if not result["ok"]:
+                sys.exit(1)
+            print("✅ Snapshot íntegro")
+            return
+
+        if args.restore:
+            print(f"♻️  Restaurando {args.restore}...")
+            result = BackupService.restore_snapshot(Path(args.restore), args.target)
+            print(f"✅ Banco {result['target']} restaurado em {result['seconds']}s")
+            return
+
+        print("💾 Gerando snapshot do banco...")
+        report = BackupService.create_snapshot(directory=args.dir)
+        write_lock = report["write_lock"]
+        print(f"✅ {report['file']}")
+        print(f"   📦 {format_size(report['db_bytes'])} → {format_size(report['compressed_bytes'])}")
+        print(f"   🔑 sha256 {report['sha256']}")
+        print(f"   ⏱️  Cópia em {report['copy_seconds']}s ({report['steps']} passos, {report['restarts']} recomeços), "
+              f"total {report['total_seconds']}s")
+        print(f"   ✍️  Espera por escrita durante a cópia: média {write_lock['wait_avg_ms']} ms, "
+              f"máx. {write_lock['wait_max_ms']} ms ({write_lock['probes']} amostras, {write_lock['failures']} falhas)")
+        for name in report["rotated"]:
+            print(f"   🗑️  Removido (rotação): {name}")
+
+    except Exception as e:
+        print(f"\n❌ Erro: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
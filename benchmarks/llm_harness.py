@@ -0,0 +1,331 @@
+"""
+Harness offline de custo de IA por conversa
+
+Reproduz o corpus de conversas roteirizadas (benchmarks/llm_corpus.json)
+através do process_message real, com o cliente da OpenAI no modo replay do
+cassete e o envio de WhatsApp desligado. Mede chamadas, tokens e latência
+simulada por conversa, por fluxo e por lead qualificado, e compara com a
+linha de base gravada: aumento de chamadas ou tokens acima da tolerância
+faz o comando terminar com código 1.
+
+Uso:
+    python -m benchmarks.llm_harness                  # relatório
+    python -m benchmarks.llm_harness --check          # falha se houver regressão
+    python -m benchmarks.llm_harness --save-baseline  # grava nova linha de base
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_CORPUS = BENCH_DIR / "llm_corpus.json"
+DEFAULT_BASELINE = BENCH_DIR / "llm_baseline.json"
+DEFAULT_CASSETTE = BENCH_DIR / "cassettes" / "llm_cassette.json"
+
+# Métricas comparadas com a linha de base (latência é simulada e não entra)
+CHECKED_METRICS = ("calls", "input_tokens", "output_tokens")
+
+# Orçamento de transações de escrita (commits) por mensagem recebida
+MAX_COMMITS_PER_TURN = 2
+
+SIMULATED_REPLY = "Perfeito, anotado! 👍 Pode me informar o próximo dado, por favor?"
+
+
+def configure_environment(workdir: str, cassette_path: str, slot_flows: str = ""):
+    """
+    Ajusta as variáveis de ambiente antes de importar a aplicação
+
+    Banco temporário, IA em replay, sem índice de FAQ nem classificador
+    treinado, para que o resultado dependa apenas do código e dos prompts.
+    """
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'harness.db')}"
+    os.environ["DATA_DIR"] = workdir
+    os.environ["LLM_CASSETTE_MODE"] = "replay"
+    os.environ["LLM_CASSETTE_PATH"] = cassette_path
+    os.environ["INTENT_MODEL_PATH"] = os.path.join(workdir, "intent_model.npz")
+    os.environ["FAQ_INDEX_PATH"] = os.path.join(workdir, "faq_index.npz")
+    os.environ["SLOT_FILLING_FLOWS"] = slot_flows
+    os.environ.setdefault("OPENAI_MODEL", "gpt-4o")
+
+
+def _matches(value: str, text: str) -> bool:
+    """Verifica se o valor do perfil aparece no texto do usuário"""
+    from app.core.utils import normalize_text
+    value = str(value)
+    if value.isdigit():
+        return value in "".join(c for c in text if c.isdigit())
+    return normalize_text(value) in normalize_text(text)
+
+
+def make_synthesizer(current: dict):
+    """
+    Cria o gerador de respostas sintéticas para requisições sem gravação
+
+    Extrações (json_object) devolvem os campos do perfil da conversa que o
+    usuário já digitou; respostas de chat devolvem um texto fixo.
+
+    Args:
+        current: Dicionário com o perfil da conversa em execução ("profile")
+    """
+    def synthesize(kwargs: dict) -> str:
+        messages = kwargs.get("messages", [])
+        if kwargs.get("response_format", {}).get("type") != "json_object":
+            return SIMULATED_REPLY
+
+        prompt = messages[-1]["content"] if messages else ""
+        if "Campos a extrair:\n" not in prompt:
+            return "{}"
+        fields_json = prompt.split("Campos a extrair:\n", 1)[1].split("\n\nRetorne", 1)[0]
+        fields = json.loads(fields_json)
+
+        user_texts = [m["content"] for m in messages[:-1] if m.get("role") == "user"]
+        profile = current.get("profile", {})
+        user_text = "\n".join(user_texts)
+
+        data = {}
+        for field in fields:
+            value = profile.get(field)
+            data[field] = value if value is not None and _matches(value, user_text) else None
+        return json.dumps(data, ensure_ascii=False)
+
+    return synthesize
+
+
+async def run_conversation(conversation: dict, number: str, cassette, current: dict) -> dict:
+    """Envia as mensagens da conversa pelo process_message e mede o custo"""
+    from sqlalchemy import event
+    from app.webhooks.evolution_webhook import process_message, engine, async_engine
+    from app.database.models import get_session, Lead
+
+    commits = {"process_message": 0, "max_per_turn": 0}
+
+    def count_commit(conn):
+        commits["turn"] += 1
+
+    current["profile"] = conversation.get("profile", {})
+    before = cassette.stats.snapshot()
+    event.listen(async_engine.sync_engine, "commit", count_commit)
+    try:
+        for message in conversation["messages"]:
+            commits["turn"] = 0
+            await process_message(number, message)
+            commits["process_message"] += commits["turn"]
+            commits["max_per_turn"] = max(commits["max_per_turn"], commits["turn"])
+            # Notificações rodam em tasks separadas; espera terminarem
+            pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+    finally:
+        event.remove(async_engine.sync_engine, "commit", count_commit)
+    after = cassette.stats.snapshot()
+
+    db = get_session(engine)
+    try:
+        lead = db.query(Lead).filter(Lead.whatsapp_number == number).first()
+        status = lead.status if lead else None
+        flow_type = lead.flow_type if lead else None
+    finally:
+        db.close()
+
+    result = {key: round(after[key] - before[key], 1) for key in after}
+    result.update({
+        "id": conversation["id"],
+        "flow": conversation["flow"],
+        "flow_reached": flow_type,
+        "turns": len(conversation["messages"]),
+        "qualified": status == "qualificado",
+        "commits": commits["process_message"],
+        "max_commits_per_turn": commits["max_per_turn"],
+    })
+    return result
+
+
+def summarize(results: list) -> dict:
+    """Agrega os resultados por fluxo e calcula o custo por lead qualificado"""
+    metrics = ("calls", "input_tokens", "output_tokens", "latency_ms")
+
+    def aggregate(items):
+        total = {m: round(sum(r[m] for r in items), 1) for m in metrics}
+        total["conversations"] = len(items)
+        total["qualified"] = sum(1 for r in items if r["qualified"])
+        total["per_qualified_lead"] = {
+            m: round(total[m] / total["qualified"], 1) for m in metrics
+        } if total["qualified"] else None
+        return total
+
+    flows = {}
+    for result in results:
+        flows.setdefault(result["flow"], []).append(result)
+
+    return {
+        "totals": aggregate(results),
+        "flows": {flow: aggregate(items) for flow, items in sorted(flows.items())},
+        "conversations": {r["id"]: r for r in results},
+    }
+
+
+async def run_corpus(corpus: dict, cassette, current: dict) -> list:
+    """Executa todas as conversas do corpus, cada uma com um número próprio"""
+    from app.database.connection import dispose_async_engines
+
+    results = []
+    try:
+        for position, conversation in enumerate(corpus["conversations"], start=1):
+            number = f"55119000{position:05d}"
+            results.append(await run_conversation(conversation, number, cassette, current))
+    finally:
+        # As conexões assíncronas pertencem a este event loop
+        await dispose_async_engines()
+    return results
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compara o relatório com a linha de base
+
+    Returns:
+        Lista de regressões encontradas (texto)
+    """
+    regressions = []
+    checks = [("total", report["totals"], baseline.get("totals", {}))]
+    for conv_id, current in report["conversations"].items():
+        reference = baseline.get("conversations", {}).get(conv_id)
+        if reference:
+            checks.append((conv_id, current, reference))
+            if reference.get("qualified") and not current["qualified"]:
+                regressions.append(f"{conv_id}: deixou de qualificar o lead")
+        if current.get("max_commits_per_turn", 0) > MAX_COMMITS_PER_TURN:
+            regressions.append(
+                f"{conv_id}: {current['max_commits_per_turn']} commits numa mensagem "
+                f"(máximo {MAX_COMMITS_PER_TURN})"
+            )
+
+    for name, current, reference in checks:
+        for metric in CHECKED_METRICS:
+            if metric not in reference:
+                continue
+            limit = reference[metric] * (1 + tolerance)
+            if current[metric] > limit:
+                regressions.append(
+                    f"{name}: {metric} {current[metric]} > {reference[metric]} "
+                    f"(+{(current[metric] / max(reference[metric], 1) - 1) * 100:.1f}%)"
+                )
+    return regressions
+
+
+def print_report(report: dict):
+    """Imprime o relatório no terminal"""
+    print("=" * 78)
+    print("📊 CUSTO DE IA POR CONVERSA (replay)")
+    print("=" * 78)
+    print(f"{'conversa':32s} {'turnos':>6s} {'chamadas':>8s} {'tok in':>8s} {'tok out':>8s} {'lat ms':>9s}  qualif.")
+    for result in report["conversations"].values():
+        print(
+            f"{result['id']:32s} {result['turns']:6d} {result['calls']:8d} "
+            f"{result['input_tokens']:8d} {result['output_tokens']:8d} "
+            f"{result['latency_ms']:9.0f}  {'✅' if result['qualified'] else '—'}"
+        )
+
+    print("-" * 78)
+    print("Por fluxo (custo por lead qualificado):")
+    for flow, total in report["flows"].items():
+        per_lead = total["per_qualified_lead"]
+        if per_lead:
+            print(
+                f"   {flow:22s} {per_lead['calls']:6.1f} chamadas  "
+                f"{per_lead['input_tokens']:8.0f} tok in  {per_lead['output_tokens']:6.0f} tok out  "
+                f"{per_lead['latency_ms'] / 1000:6.1f} s"
+            )
+        else:
+            print(f"   {flow:22s} nenhum lead qualificado")
+
+    totals = report["totals"]
+    print("-" * 78)
+    print(
+        f"TOTAL: {totals['calls']} chamadas, {totals['input_tokens']} tokens de entrada, "
+        f"{totals['output_tokens']} de saída, {totals['qualified']}/{totals['conversations']} leads qualificados"
+    )
+    if report["misses"]:
+        print(f"ℹ️ {report['misses']} requisições sem gravação foram sintetizadas")
+    print("=" * 78)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Mede o custo de IA do corpus de conversas")
+    parser.add_argument("--corpus", default=str(DEFAULT_CORPUS))
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--cassette", default=str(DEFAULT_CASSETTE),
+                        help="Cassete com respostas gravadas (modo replay)")
+    parser.add_argument("--tolerance", type=float, default=0.02,
+                        help="Aumento relativo aceito antes de acusar regressão")
+    parser.add_argument("--slot-flows", default="",
+                        help="Fluxos com coleta determinística (como SLOT_FILLING_FLOWS)")
+    parser.add_argument("--output", help="Grava o relatório completo em JSON")
+    parser.add_argument("--check", action="store_true", help="Sai com código 1 se houver regressão")
+    parser.add_argument("--save-baseline", action="store_true", help="Grava o resultado como linha de base")
+    args = parser.parse_args(argv)
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(workdir, args.cassette, args.slot_flows)
+
+        import logging
+        from app.services.evolution_service import EvolutionService
+        from app.services.llm_cassette import get_cassette
+
+        logging.disable(logging.WARNING)
+
+        async def no_send(self, *args, **kwargs):
+            return True
+
+        # Nada sai para o WhatsApp durante o harness
+        EvolutionService.send_message = no_send
+        EvolutionService.send_notification = no_send
+
+        cassette = get_cassette(None, args.cassette, "replay")
+        current = {}
+        cassette.synthesizer = make_synthesizer(current)
+
+        results = asyncio.run(run_corpus(corpus, cassette, current))
+
+    report = summarize(results)
+    report["misses"] = cassette.stats.misses
+    report["settings"] = {"slot_flows": args.slot_flows, "model": os.environ.get("OPENAI_MODEL")}
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 Relatório salvo em {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 Linha de base salva em {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("⚠️ Linha de base não encontrada; rode com --save-baseline")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(report, baseline, args.tolerance)
+    if regressions:
+        print("❌ Regressões em relação à linha de base:")
+        for regression in regressions:
+            print(f"   {regression}")
+        return 1 if args.check else 0
+
+    print("✅ Sem regressões em relação à linha de base")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
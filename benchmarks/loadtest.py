@@ -0,0 +1,534 @@
+"""
+Teste de carga do webhook com Evolution API e OpenAI falsas
+
+Sobe a aplicação FastAPI (uvicorn) numa thread, servidores HTTP falsos da
+Evolution API e da OpenAI em outra (latência e taxa de erro configuráveis)
+e dispara eventos messages.upsert nos dois formatos aceitos pelo
+webhook_handler a uma taxa fixa. Mede vazão, latência do ack do webhook,
+latência ponta a ponta até a resposta chegar na Evolution, tempo de
+execução no banco (inclusive erros "database is locked") e atraso do event
+loop da aplicação. O resultado é salvo em JSON com o commit atual para
+comparar versões.
+
+Uso:
+    python -m benchmarks.loadtest --rate 20 --duration 30
+    python -m benchmarks.loadtest --compare antes.json depois.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+RESULTS_DIR = BENCH_DIR / "results"
+DEFAULT_CORPUS = BENCH_DIR / "llm_corpus.json"
+
+LAG_INTERVAL_S = 0.05
+INSTANCE_NAME = "loadtest"
+
+
+def percentile(values: list, pct: float) -> float:
+    """Percentil por interpolação linear (0 se a lista estiver vazia)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def distribution(values: list) -> dict:
+    """Resumo de uma série de latências em milissegundos"""
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+        "max": round(max(values), 2) if values else 0.0,
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class LatencyModel:
+    """
+    Latência e falhas simuladas de um serviço externo
+
+    Args:
+        median_ms: Mediana da latência
+        sigma: Dispersão da distribuição log-normal (0 = constante)
+        error_rate: Fração de respostas com erro HTTP 500
+    """
+
+    def __init__(self, median_ms: float, sigma: float, error_rate: float, seed: int):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+    def sample(self):
+        delay = self.median_ms * self.random.lognormvariate(0, self.sigma) if self.sigma else self.median_ms
+        return delay / 1000, self.random.random() < self.error_rate
+
+
+class FakeServers:
+    """Evolution API e OpenAI falsas rodando num event loop próprio"""
+
+    def __init__(self, evolution: LatencyModel, openai: LatencyModel):
+        self.evolution = evolution
+        self.openai = openai
+        self.evolution_port = free_port()
+        self.openai_port = free_port()
+        self.replies = []  # (perf_counter, número)
+        self.counters = {"evolution_requests": 0, "evolution_errors": 0,
+                         "openai_requests": 0, "openai_errors": 0}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._loop = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait(10)
+
+    def stop(self):
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(5)
+
+    def _count(self, key: str):
+        with self._lock:
+            self.counters[key] += 1
+
+    async def _send_text(self, request):
+        payload = await request.json()
+        with self._lock:
+            self.replies.append((time.perf_counter(), payload.get("number")))
+        return await self._respond(self.evolution, "evolution", {"key": {"id": "fake"}, "status": "PENDING"})
+
+    async def _presence(self, request):
+        return await self._respond(self.evolution, "evolution", {"presence": "composing"})
+
+    async def _chat_completions(self, request):
+        payload = await request.json()
+        if payload.get("response_format", {}).get("type") == "json_object":
+            content = "{}"
+        else:
+            content = "Perfeito! 👍 Pode me informar o próximo dado, por favor?"
+        body = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "gpt-4o"),
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+        return await self._respond(self.openai, "openai", body)
+
+    async def _respond(self, model: LatencyModel, name: str, body: dict):
+        from aiohttp import web
+        self._count(f"{name}_requests")
+        delay, failed = model.sample()
+        await asyncio.sleep(delay)
+        if failed:
+            self._count(f"{name}_errors")
+            return web.json_response({"error": {"message": "falha simulada"}}, status=500)
+        return web.json_response(body)
+
+    def _run(self):
+        from aiohttp import web
+
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+
+        evolution_app = web.Application()
+        evolution_app.router.add_post("/message/sendText/{instance}", self._send_text)
+        evolution_app.router.add_post("/chat/togglePresence/{instance}", self._presence)
+
+        openai_app = web.Application()
+        openai_app.router.add_post("/v1/chat/completions", self._chat_completions)
+
+        runners = []
+        for web_app, port in ((evolution_app, self.evolution_port), (openai_app, self.openai_port)):
+            runner = web.AppRunner(web_app, access_log=None)
+            self._loop.run_until_complete(runner.setup())
+            self._loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", port).start())
+            runners.append(runner)
+
+        self._ready.set()
+        self._loop.run_forever()
+        for runner in runners:
+            self._loop.run_until_complete(runner.cleanup())
+        self._loop.close()
+
+
+class AppServer:
+    """Aplicação FastAPI no uvicorn, com medição do atraso do event loop"""
+
+    def __init__(self, port: int):
+        self.port = port
+        self.loop_lag_ms = []
+        self._server = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        import uvicorn
+        from app.webhooks.evolution_webhook import app
+
+        # lifespan desligado: o scheduler de e-mails não participa do teste
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port,
+                                log_level="warning", lifespan="off", access_log=False)
+        self._server = uvicorn.Server(config)
+        self._thread.start()
+        deadline = time.time() + 15
+        while not self._server.started and time.time() < deadline:
+            time.sleep(0.05)
+        if not self._server.started:
+            raise RuntimeError("uvicorn não iniciou")
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join(10)
+
+    async def _monitor_lag(self):
+        while True:
+            expected = time.perf_counter() + LAG_INTERVAL_S
+            await asyncio.sleep(LAG_INTERVAL_S)
+            self.loop_lag_ms.append(max(0.0, (time.perf_counter() - expected) * 1000))
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.create_task(self._monitor_lag())
+        loop.run_until_complete(self._server.serve())
+
+
+class DbMonitor:
+    """Tempo de execução das instruções SQL e erros de banco travado"""
+
+    def __init__(self, *engines):
+        self.execute_ms = []
+        self.write_ms = []
+        self.locked_errors = 0
+        self._lock = threading.Lock()
+        for engine in engines:
+            self._install(engine)
+
+    def _install(self, engine):
+        from sqlalchemy import event
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("loadtest_start", []).append(time.perf_counter())
+
+        @event.listens_for(engine, "after_cursor_execute")
+        def after(conn, cursor, statement, parameters, context, executemany):
+            elapsed = (time.perf_counter() - conn.info["loadtest_start"].pop()) * 1000
+            with self._lock:
+                self.execute_ms.append(elapsed)
+                if not statement.lstrip().upper().startswith("SELECT"):
+                    self.write_ms.append(elapsed)
+
+        @event.listens_for(engine, "handle_error")
+        def on_error(context):
+            if "locked" in str(context.original_exception).lower():
+                with self._lock:
+                    self.locked_errors += 1
+
+
+def build_payload(number: str, text: str, message_format: int, sequence: int) -> dict:
+    """Monta um evento messages.upsert no formato 1 (data.message.key) ou 2 (data.key)"""
+    message = {
+        "key": {"remoteJid": f"{number}@s.whatsapp.net", "fromMe": False, "id": f"LOAD{sequence:08d}"},
+        "pushName": "Teste de Carga",
+        "message": {"conversation": text},
+        "messageType": "conversation",
+        "messageTimestamp": int(time.time()),
+    }
+    data = {"instanceId": INSTANCE_NAME, "message": message} if message_format == 1 else message
+    return {"event": "messages.upsert", "instance": INSTANCE_NAME, "data": data}
+
+
+def build_schedule(corpus: dict, total: int, users: int, seed: int) -> list:
+    """
+    Gera a sequência de mensagens: cada usuário virtual segue uma conversa
+    do corpus, e os usuários são intercalados
+
+    Returns:
+        Lista de (número, texto, formato)
+    """
+    rng = random.Random(seed)
+    conversations = [c["messages"] for c in corpus["conversations"]]
+    cursors = []
+    for user in range(users):
+        cursors.append({"number": f"5511{70000000 + user:08d}",
+                        "messages": rng.choice(conversations), "position": 0})
+
+    schedule = []
+    while len(schedule) < total:
+        cursor = cursors[len(schedule) % users]
+        messages = cursor["messages"]
+        schedule.append((cursor["number"], messages[cursor["position"] % len(messages)], rng.choice((1, 2))))
+        cursor["position"] += 1
+    return schedule
+
+
+async def generate_load(url: str, schedule: list, rate: float) -> list:
+    """
+    Envia os eventos em malha aberta (taxa fixa, sem esperar as respostas)
+
+    Returns:
+        Lista de (instante do envio, número, latência do ack em ms, status HTTP)
+    """
+    import aiohttp
+
+    results = []
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        async def post(sequence, number, text, message_format):
+            payload = build_payload(number, text, message_format, sequence)
+            sent = time.perf_counter()
+            try:
+                async with session.post(url, json=payload, timeout=aiohttp.ClientTimeout(total=30)) as response:
+                    await response.read()
+                    status = response.status
+            except Exception:
+                status = 0
+            results.append((sent, number, (time.perf_counter() - sent) * 1000, status))
+
+        start = time.perf_counter()
+        tasks = []
+        for sequence, (number, text, message_format) in enumerate(schedule):
+            delay = start + sequence / rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(post(sequence, number, text, message_format)))
+        await asyncio.gather(*tasks)
+    return results
+
+
+def match_replies(sends: list, replies: list) -> list:
+    """Associa cada resposta recebida pela Evolution ao envio mais antigo pendente do mesmo número"""
+    pending = {}
+    for sent, number, _, status in sorted(sends):
+        if status == 200:
+            pending.setdefault(number, []).append(sent)
+    latencies = []
+    for received, number in sorted(replies):
+        queue = pending.get(number)
+        if queue and queue[0] <= received:
+            latencies.append((received - queue.pop(0)) * 1000)
+    return latencies
+
+
+def configure_environment(workdir: str, servers: FakeServers, database_url: str = None):
+    """Aponta a aplicação para os servidores falsos antes de importá-la"""
+    os.environ["DATABASE_URL"] = database_url or f"sqlite:///{os.path.join(workdir, 'loadtest.db')}"
+    os.environ["DATA_DIR"] = workdir
+    os.environ["EVOLUTION_API_URL"] = f"http://127.0.0.1:{servers.evolution_port}"
+    os.environ["EVOLUTION_API_KEY"] = "loadtest"
+    os.environ["EVOLUTION_INSTANCE_NAME"] = INSTANCE_NAME
+    os.environ["OPENAI_API_KEY"] = "loadtest"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{servers.openai_port}/v1"
+    os.environ["LLM_CASSETTE_MODE"] = ""
+    os.environ["INTENT_MODEL_PATH"] = os.path.join(workdir, "intent_model.npz")
+    os.environ["FAQ_INDEX_PATH"] = os.path.join(workdir, "faq_index.npz")
+
+
+def run(args) -> dict:
+    """Executa o teste de carga e devolve o relatório"""
+    import logging
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+    total = max(1, int(args.rate * args.duration))
+    schedule = build_schedule(corpus, total, args.users, args.seed)
+
+    servers = FakeServers(
+        LatencyModel(args.evolution_latency_ms, args.latency_sigma, args.evolution_error_rate, args.seed),
+        LatencyModel(args.openai_latency_ms, args.latency_sigma, args.openai_error_rate, args.seed + 1),
+    )
+    servers.start()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure_environment(workdir, servers, args.database_url)
+        logging.disable(logging.CRITICAL if not args.verbose else logging.NOTSET)
+
+        from config.settings import settings
+        from app.webhooks.evolution_webhook import engine, async_engine
+
+        db_monitor = DbMonitor(engine, async_engine.sync_engine)
+        app_server = AppServer(free_port())
+        app_server.start()
+        url = f"http://127.0.0.1:{app_server.port}{settings.API_WEBHOOK_PATH}"
+
+        output = sys.stdout if args.verbose else io.StringIO()
+        with contextlib.redirect_stdout(output):
+            started = time.perf_counter()
+            sends = asyncio.run(generate_load(url, schedule, args.rate))
+            send_elapsed = time.perf_counter() - started
+
+            # Espera as respostas pendentes (processamento em background)
+            acked = sum(1 for s in sends if s[3] == 200)
+            deadline = time.perf_counter() + args.drain_timeout
+            while time.perf_counter() < deadline:
+                with servers._lock:
+                    received = sum(1 for _, number in servers.replies if number != settings.ADMIN_WHATSAPP)
+                if received >= acked:
+                    break
+                time.sleep(0.1)
+            total_elapsed = time.perf_counter() - started
+
+            app_server.stop()
+            servers.stop()
+        engine.dispose()
+
+    with servers._lock:
+        replies = [r for r in servers.replies if r[1] != settings.ADMIN_WHATSAPP]
+    ack_ms = [s[2] for s in sends if s[3] == 200]
+    e2e_ms = match_replies(sends, replies)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": {
+            "rate": args.rate, "duration": args.duration, "users": args.users,
+            "openai_latency_ms": args.openai_latency_ms, "openai_error_rate": args.openai_error_rate,
+            "evolution_latency_ms": args.evolution_latency_ms, "evolution_error_rate": args.evolution_error_rate,
+            "latency_sigma": args.latency_sigma, "database": engine.url.get_backend_name(),
+        },
+        "sent": len(sends),
+        "acked": len(ack_ms),
+        "ack_errors": len(sends) - len(ack_ms),
+        "replies": len(e2e_ms),
+        "throughput": {
+            "offered_per_s": round(len(sends) / send_elapsed, 2) if send_elapsed else 0.0,
+            "acked_per_s": round(len(ack_ms) / send_elapsed, 2) if send_elapsed else 0.0,
+            "replied_per_s": round(len(e2e_ms) / total_elapsed, 2) if total_elapsed else 0.0,
+        },
+        "ack_latency_ms": distribution(ack_ms),
+        "reply_latency_ms": distribution(e2e_ms),
+        "db": {
+            "statements": len(db_monitor.execute_ms),
+            "execute_ms": distribution(db_monitor.execute_ms),
+            "write_ms": distribution(db_monitor.write_ms),
+            "locked_errors": db_monitor.locked_errors,
+        },
+        "event_loop_lag_ms": distribution(app_server.loop_lag_ms),
+        "fake_services": dict(servers.counters),
+    }
+
+
+def print_report(report: dict):
+    """Imprime o relatório no terminal"""
+    print("=" * 70)
+    print(f"📈 TESTE DE CARGA - commit {report['commit']} ({report['timestamp']})")
+    print("=" * 70)
+    config = report["config"]
+    print(f"Taxa: {config['rate']} msg/s por {config['duration']}s, {config['users']} usuários, banco {config['database']}")
+    print(f"Enviadas: {report['sent']}  Ack: {report['acked']}  Erros no ack: {report['ack_errors']}  Respostas: {report['replies']}")
+    throughput = report["throughput"]
+    print(f"Vazão: {throughput['acked_per_s']} ack/s, {throughput['replied_per_s']} respostas/s")
+    for label, key in (("Ack do webhook", "ack_latency_ms"), ("Resposta ponta a ponta", "reply_latency_ms"),
+                       ("Atraso do event loop", "event_loop_lag_ms")):
+        d = report[key]
+        print(f"{label:24s} p50 {d['p50']:9.1f} ms  p95 {d['p95']:9.1f} ms  p99 {d['p99']:9.1f} ms  máx {d['max']:9.1f} ms")
+    db = report["db"]
+    print(
+        f"{'Escritas no banco':24s} p50 {db['write_ms']['p50']:9.1f} ms  p95 {db['write_ms']['p95']:9.1f} ms  "
+        f"p99 {db['write_ms']['p99']:9.1f} ms  máx {db['write_ms']['max']:9.1f} ms"
+    )
+    print(f"Instruções SQL: {db['statements']}  Erros 'database is locked': {db['locked_errors']}")
+    print(f"Serviços falsos: {report['fake_services']}")
+    print("=" * 70)
+
+
+def compare_reports(paths: list):
+    """Mostra lado a lado as métricas principais de vários relatórios"""
+    reports = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            reports.append(json.load(f))
+
+    rows = [
+        ("commit", lambda r: r["commit"]),
+        ("ack/s", lambda r: r["throughput"]["acked_per_s"]),
+        ("respostas/s", lambda r: r["throughput"]["replied_per_s"]),
+        ("ack p95 (ms)", lambda r: r["ack_latency_ms"]["p95"]),
+        ("ack p99 (ms)", lambda r: r["ack_latency_ms"]["p99"]),
+        ("resposta p95 (ms)", lambda r: r["reply_latency_ms"]["p95"]),
+        ("resposta p99 (ms)", lambda r: r["reply_latency_ms"]["p99"]),
+        ("escrita p99 (ms)", lambda r: r["db"]["write_ms"]["p99"]),
+        ("banco travado", lambda r: r["db"]["locked_errors"]),
+        ("lag loop p99 (ms)", lambda r: r["event_loop_lag_ms"]["p99"]),
+    ]
+    for label, getter in rows:
+        print(f"{label:20s}" + "".join(f"{str(getter(r)):>16s}" for r in reports))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Teste de carga do webhook da Evolution API")
+    parser.add_argument("--rate", type=float, default=10.0, help="Mensagens por segundo")
+    parser.add_argument("--duration", type=float, default=20.0, help="Duração do envio em segundos")
+    parser.add_argument("--users", type=int, default=50, help="Conversas simultâneas (números distintos)")
+    parser.add_argument("--corpus", default=str(DEFAULT_CORPUS))
+    parser.add_argument("--openai-latency-ms", type=float, default=800.0)
+    parser.add_argument("--openai-error-rate", type=float, default=0.0)
+    parser.add_argument("--evolution-latency-ms", type=float, default=80.0)
+    parser.add_argument("--evolution-error-rate", type=float, default=0.0)
+    parser.add_argument("--latency-sigma", type=float, default=0.4,
+                        help="Dispersão log-normal das latências falsas (0 = constante)")
+    parser.add_argument("--database-url", help="Banco a usar (padrão: SQLite temporário)")
+    parser.add_argument("--drain-timeout", type=float, default=60.0,
+                        help="Tempo máximo de espera pelas respostas após o envio")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Arquivo JSON do resultado (padrão: benchmarks/results/)")
+    parser.add_argument("--verbose", action="store_true", help="Mostra logs da aplicação")
+    parser.add_argument("--compare", nargs="+", metavar="JSON", help="Compara relatórios salvos")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        compare_reports(args.compare)
+        return 0
+
+    report = run(args)
+    print_report(report)
+
+    output = args.output
+    if not output:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        output = str(RESULTS_DIR / f"loadtest-{report['commit']}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 Resultado salvo em {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
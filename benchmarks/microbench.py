@@ -0,0 +1,274 @@
+"""
+Microbenchmarks dos caminhos quentes em Python puro
+
+Mede, com entradas representativas e sem rede nem banco, as funções que
+rodam a cada mensagem ou a cada renderização do dashboard. Cada caso é
+calibrado para rodar ~0,1 s por rodada e repetido várias vezes; a mediana
+por chamada é comparada com a linha de base gravada na mesma máquina.
+
+Uso:
+    python -m benchmarks.microbench                    # executa e mostra
+    python -m benchmarks.microbench --save-baseline    # grava linha de base
+    python -m benchmarks.microbench --compare          # falha se ficar mais lento
+    python -m benchmarks.microbench -k prompt          # só casos com "prompt"
+"""
+import argparse
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+DEFAULT_BASELINE = BENCH_DIR / "microbench_baseline.json"
+
+MENU_MESSAGES = [
+    "1", "2", "oi", "Olá, bom dia!", "menu",
+    "quero fazer um seguro para o meu carro novo",
+    "bati o carro hoje cedo na marginal",
+    "gostaria de saber o valor da parcela do consórcio de imóvel",
+    "meu boleto venceu, preciso da segunda via",
+    "pode me passar para um atendente humano por favor?",
+]
+
+FIELD_INPUTS = [
+    ("529.982.247-25", "cpf"), ("11.222.333/0001-81", "cnpj"), ("529.982.247-25", "cpf_cnpj"),
+    ("ABC-1D23", "placa"), ("(11) 91234-5678", "phone"), ("01310-100", "cep"),
+    ("Carlos Pereira", "name"), ("carlos@email.com", "email"), ("sim, tenho", "yes_no"),
+    ("não", "yes_no"),
+]
+
+PROMPT_STEPS = [
+    ("menu_principal", None), ("escolher_seguro", None),
+    ("seguro_auto", ["whatsapp_contact", "cpf_cnpj"]), ("seguro_residencial", ["whatsapp_contact"]),
+    ("seguro_vida", None), ("seguro_empresarial", ["whatsapp_contact"]),
+    ("consorcio", ["whatsapp_contact"]), ("segunda_via", None), ("sinistro", ["whatsapp_contact"]),
+    ("falar_humano", None), ("outros_assuntos", None),
+]
+
+NOTIFICATION_FLOWS = [
+    "seguro_auto", "seguro_residencial", "seguro_vida", "seguro_empresarial", "consorcio",
+    "segunda_via", "sinistro", "falar_humano", "outros",
+]
+
+DATAFRAME_ROWS = 500
+
+
+def make_lead(position: int = 1):
+    """Lead transitório (fora da sessão) com os campos dos fluxos preenchidos"""
+    from app.database.models import Lead
+    return Lead(
+        id=position,
+        whatsapp_number=f"55119{position:08d}",
+        name=f"Cliente {position}",
+        email=f"cliente{position}@email.com",
+        cpf_cnpj="52998224725",
+        phone="11912345678",
+        whatsapp_contact="11912345678",
+        vehicle_plate="ABC1D23",
+        cep_pernoite="01310100",
+        profession="Engenheiro",
+        marital_status="Casado",
+        vehicle_usage="particular",
+        has_young_driver=False,
+        property_cep="04567000",
+        property_type="apartamento",
+        property_value="500 mil",
+        property_ownership="próprio",
+        consortium_type="imovel",
+        consortium_value="300 mil",
+        consortium_term="180",
+        has_previous_consortium=False,
+        status="qualificado" if position % 3 == 0 else "novo",
+        customer_type="novo",
+        status_ia=position % 2,
+        created_at=datetime(2024, 1, 1) + timedelta(minutes=position),
+    )
+
+
+def build_cases() -> dict:
+    """Monta os casos de benchmark: nome -> função sem argumentos"""
+    from app.core.flow_manager import FlowManager
+    from app.core.prompts import get_system_prompt
+    from app.services.database_service import LeadService
+    from app.services.notification_service import NotificationService
+    from dashboard.helpers import build_leads_dataframe
+
+    flow_manager = FlowManager()
+    lead = make_lead()
+    leads = [make_lead(i) for i in range(1, DATAFRAME_ROWS + 1)]
+    lead_dicts = []
+    for flow in NOTIFICATION_FLOWS:
+        data = LeadService.build_lead_dict(lead, flow, flow)
+        data["interest"] = "cotação"
+        lead_dicts.append(data)
+
+    def detect_menu_choice():
+        for message in MENU_MESSAGES:
+            flow_manager.detect_menu_choice(message)
+
+    def extract_field_from_message():
+        for message, field_type in FIELD_INPUTS:
+            flow_manager.extract_field_from_message(message, field_type)
+
+    def system_prompt():
+        for step, missing in PROMPT_STEPS:
+            get_system_prompt(step, missing)
+
+    def lead_dict():
+        LeadService.build_lead_dict(lead, "seguro_auto", "seguro_auto")
+
+    def notification_message():
+        for data in lead_dicts:
+            NotificationService.build_lead_qualified_message(data, "5511912345678")
+
+    def leads_dataframe():
+        build_leads_dataframe(leads)
+
+    return {
+        f"flow.detect_menu_choice[{len(MENU_MESSAGES)} msgs]": detect_menu_choice,
+        f"flow.extract_field_from_message[{len(FIELD_INPUTS)} campos]": extract_field_from_message,
+        f"prompts.get_system_prompt[{len(PROMPT_STEPS)} etapas]": system_prompt,
+        "webhook.build_lead_dict": lead_dict,
+        f"notification.lead_qualified_message[{len(NOTIFICATION_FLOWS)} fluxos]": notification_message,
+        f"dashboard.leads_dataframe[{DATAFRAME_ROWS} leads]": leads_dataframe,
+    }
+
+
+def run_case(func, rounds: int, target_s: float) -> dict:
+    """
+    Executa um caso: calibra o número de iterações e mede várias rodadas
+
+    Returns:
+        Estatísticas por chamada em microssegundos
+    """
+    func()  # aquecimento
+    iterations = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= target_s / 10 or iterations >= 1_000_000:
+            break
+        iterations *= 10
+    iterations = max(1, int(iterations * target_s / max(elapsed, 1e-9)))
+
+    samples = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                func()
+            samples.append((time.perf_counter() - start) / iterations * 1e6)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    return {
+        "min_us": round(min(samples), 3),
+        "median_us": round(statistics.median(samples), 3),
+        "mean_us": round(statistics.mean(samples), 3),
+        "stddev_us": round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+        "rounds": rounds,
+        "iterations": iterations,
+    }
+
+
+def run_suite(keyword: str = None, rounds: int = 7, target_s: float = 0.1) -> dict:
+    """Executa todos os casos (ou os que contêm `keyword`)"""
+    results = {}
+    for name, func in build_cases().items():
+        if keyword and keyword not in name:
+            continue
+        results[name] = run_case(func, rounds, target_s)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compara a mediana de cada caso com a linha de base
+
+    Returns:
+        Lista de (caso, mediana atual, mediana da linha de base, variação)
+    """
+    rows = []
+    for name, result in results.items():
+        reference = baseline.get("results", {}).get(name)
+        if not reference:
+            rows.append((name, result["median_us"], None, None))
+            continue
+        change = result["median_us"] / reference["median_us"] - 1
+        rows.append((name, result["median_us"], reference["median_us"], change))
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks dos caminhos quentes")
+    parser.add_argument("-k", dest="keyword", help="Executa só os casos que contêm o texto")
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--target", type=float, default=0.1, help="Segundos por rodada")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true", help="Sai com código 1 se algum caso ficar mais lento")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="Aumento relativo da mediana aceito na comparação")
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.keyword, args.rounds, args.target)
+
+    print("=" * 86)
+    print("⏱️  MICROBENCHMARKS (tempo por chamada)")
+    print("=" * 86)
+    print(f"{'caso':58s} {'mediana':>10s} {'mínimo':>8s} {'desvio':>8s}")
+    for name, result in results.items():
+        print(f"{name:58s} {result['median_us']:8.2f}µs {result['min_us']:8.2f} {result['stddev_us']:8.2f}")
+
+    if args.save_baseline:
+        data = {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+        }
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        print(f"💾 Linha de base salva em {args.baseline}")
+        return 0
+
+    if not args.compare:
+        return 0
+
+    if not Path(args.baseline).exists():
+        print(f"❌ Linha de base não encontrada: {args.baseline}")
+        return 1
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    print("-" * 86)
+    print(f"Comparação com {args.baseline} (Python {baseline.get('python')}, tolerância {args.tolerance:.0%})")
+    slower = []
+    for name, current, reference, change in compare(results, baseline, args.tolerance):
+        if reference is None:
+            print(f"   {name:58s} (novo caso)")
+            continue
+        status = "❌" if change > args.tolerance else ("✅" if change < -args.tolerance else "  ")
+        print(f"{status} {name:58s} {reference:8.2f} → {current:8.2f}µs ({change:+.1%})")
+        if change > args.tolerance:
+            slower.append(name)
+
+    if slower:
+        print(f"❌ {len(slower)} caso(s) mais lento(s) que a linha de base")
+        return 1
+    print("✅ Nenhum caso mais lento que a linha de base")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
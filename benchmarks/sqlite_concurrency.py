@@ -0,0 +1,198 @@
+"""
+Benchmark de concorrência leitura/escrita no SQLite
+
+Simula o webhook (processos escritores gravando mensagens e atualizando o
+lead) e o dashboard (processos leitores com consultas de listagem e
+contagem) no mesmo arquivo, primeiro com o SQLite padrão (rollback journal,
+sem PRAGMAs) e depois com o perfil de produção (WAL + PRAGMAs + BEGIN
+IMMEDIATE nas escritas). Mostra vazão, latências e erros "database is
+locked" de cada perfil.
+
+Uso:
+    python -m benchmarks.sqlite_concurrency --writers 4 --readers 2 --duration 5
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+PROFILES = ("off", "production")
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round((len(ordered) - 1) * pct / 100)))]
+
+
+def seed_database(database_url: str, leads: int, messages: int):
+    """Cria as tabelas e popula leads e mensagens"""
+    from app.database.connection import build_engine, get_session_factory
+    from app.database.models import Base, Lead, ChatMessage
+
+    engine = build_engine(database_url, "off")
+    Base.metadata.create_all(bind=engine)
+    db = get_session_factory(engine)()
+    try:
+        for position in range(leads):
+            db.add(Lead(whatsapp_number=f"55119{position:08d}", name=f"Cliente {position}", status="novo"))
+        db.flush()
+        for position in range(messages):
+            lead_id = position % leads + 1
+            db.add(ChatMessage(
+                lead_id=lead_id, whatsapp_number=f"55119{lead_id - 1:08d}",
+                sender="user" if position % 2 else "ai", message=f"mensagem {position}",
+                role="user" if position % 2 else "assistant"
+            ))
+        db.commit()
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def _wait_until(moment: float):
+    delay = moment - time.time()
+    if delay > 0:
+        time.sleep(delay)
+
+
+def writer(database_url: str, profile: str, start_at: float, deadline: float, leads: int, seed: int, results):
+    """Processo escritor: grava uma mensagem e atualiza o lead, como o webhook"""
+    from sqlalchemy.exc import OperationalError
+    from app.database.connection import build_engine, session_scope, write_session_scope
+    from app.database.models import Lead, ChatMessage
+
+    engine = build_engine(database_url, profile)
+    scope = write_session_scope if profile == "production" else session_scope
+    rng = random.Random(seed)
+    latencies, errors = [], 0
+    _wait_until(start_at)
+
+    while time.time() < deadline:
+        number = f"55119{rng.randrange(leads):08d}"
+        start = time.perf_counter()
+        try:
+            with scope(engine) as db:
+                lead = db.query(Lead).filter(Lead.whatsapp_number == number).first()
+                db.add(ChatMessage(lead_id=lead.id, whatsapp_number=number, sender="user",
+                                   message="oi", role="user"))
+                lead.updated_at = datetime.utcnow()
+            latencies.append((time.perf_counter() - start) * 1000)
+        except OperationalError:
+            errors += 1
+
+    engine.dispose()
+    results.put(("write", latencies, errors))
+
+
+def reader(database_url: str, profile: str, start_at: float, deadline: float, results):
+    """Processo leitor: listagem e contagens, como o dashboard"""
+    from sqlalchemy import text
+    from sqlalchemy.exc import OperationalError
+    from app.database.connection import build_engine, get_session_factory
+
+    engine = build_engine(database_url, profile)
+    factory = get_session_factory(engine)
+    latencies, errors = [], 0
+    _wait_until(start_at)
+
+    while time.time() < deadline:
+        start = time.perf_counter()
+        db = factory()
+        try:
+            db.execute(text("SELECT * FROM leads ORDER BY created_at DESC")).fetchall()
+            db.execute(text("SELECT sender, COUNT(*) FROM chat_messages GROUP BY sender")).fetchall()
+            db.execute(text("SELECT * FROM chat_messages ORDER BY id DESC LIMIT 2000")).fetchall()
+            db.commit()
+            latencies.append((time.perf_counter() - start) * 1000)
+        except OperationalError:
+            errors += 1
+            db.rollback()
+        finally:
+            db.close()
+
+    engine.dispose()
+    results.put(("read", latencies, errors))
+
+
+def run_profile(profile: str, args) -> dict:
+    """Executa escritores e leitores em paralelo num banco novo"""
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as workdir:
+        database_url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        seed_database(database_url, args.leads, args.messages)
+
+        results = context.Queue()
+        # Margem para os processos importarem a aplicação antes de começar
+        start_at = time.time() + 3
+        deadline = start_at + args.duration
+        processes = [
+            context.Process(target=writer, args=(database_url, profile, start_at, deadline, args.leads, i, results))
+            for i in range(args.writers)
+        ] + [
+            context.Process(target=reader, args=(database_url, profile, start_at, deadline, results))
+            for _ in range(args.readers)
+        ]
+        for process in processes:
+            process.start()
+        collected = [results.get(timeout=args.duration + 120) for _ in processes]
+        for process in processes:
+            process.join()
+
+    report = {"profile": profile}
+    for kind in ("write", "read"):
+        latencies = [value for k, values, _ in collected if k == kind for value in values]
+        errors = sum(e for k, _, e in collected if k == kind)
+        report[kind] = {
+            "ops": len(latencies),
+            "ops_per_s": round(len(latencies) / args.duration, 1),
+            "errors_locked": errors,
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "max_ms": round(max(latencies), 2) if latencies else 0.0,
+        }
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Concorrência leitura/escrita no SQLite por perfil")
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--duration", type=float, default=5.0, help="Segundos por perfil")
+    parser.add_argument("--leads", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--profiles", nargs="+", default=list(PROFILES), choices=PROFILES)
+    parser.add_argument("--output", help="Grava o resultado em JSON")
+    args = parser.parse_args(argv)
+
+    reports = [run_profile(profile, args) for profile in args.profiles]
+
+    print("=" * 84)
+    print(f"🗄️  CONCORRÊNCIA SQLITE - {args.writers} escritores, {args.readers} leitores, {args.duration}s por perfil")
+    print("=" * 84)
+    print(f"{'perfil':12s} {'tipo':8s} {'ops/s':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>9s} {'máx ms':>9s} {'locked':>7s}")
+    for report in reports:
+        for kind, label in (("write", "escrita"), ("read", "leitura")):
+            r = report[kind]
+            print(
+                f"{report['profile']:12s} {label:8s} {r['ops_per_s']:8.1f} {r['p50_ms']:8.2f} "
+                f"{r['p95_ms']:8.2f} {r['p99_ms']:9.2f} {r['max_ms']:9.2f} {r['errors_locked']:7d}"
+            )
+    print("=" * 84)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "results": reports}, f, ensure_ascii=False, indent=2)
+        print(f"💾 Resultado salvo em {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -26,6 +26,54 @@ class Settings:
     # Banco de Dados
     db_path = os.getenv("DB_PATH", DB_PATH_DEFAULT)
     DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{db_path}")
+    DATA_DIR = os.getenv("DATA_DIR", str(Path(db_path).parent))
+    
+    # Pool de conexões (um engine por processo, ver app/database/connection.py)
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # segundos (Postgres)
+    
+    # SQLite: perfil de PRAGMAs (production = WAL + ajustes; off = padrão do SQLite)
+    SQLITE_PRAGMA_PROFILE = os.getenv("SQLITE_PRAGMA_PROFILE", "production").lower()
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+    SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    
+    # Cache em memória do estado dos leads em conversa (número de leads; 0 desativa)
+    LEAD_CACHE_SIZE = int(os.getenv("LEAD_CACHE_SIZE", "5000"))
+    
+    # Buffer em memória das últimas mensagens por conversa (0 mensagens desativa)
+    CONVERSATION_BUFFER_MESSAGES = int(os.getenv("CONVERSATION_BUFFER_MESSAGES", "50"))
+    CONVERSATION_BUFFER_IDLE_SECONDS = float(os.getenv("CONVERSATION_BUFFER_IDLE_SECONDS", "1800"))
+    CONVERSATION_BUFFER_MAX_MB = float(os.getenv("CONVERSATION_BUFFER_MAX_MB", "32"))
+    
+    # Validade máxima do cache de estatísticas dos leads (0 desativa)
+    LEAD_STATS_CACHE_SECONDS = float(os.getenv("LEAD_STATS_CACHE_SECONDS", "30"))
+    
+    # Novas tentativas do webhook quando o lead foi alterado por outro processo durante a conversa
+    LEAD_MERGE_RETRIES = int(os.getenv("LEAD_MERGE_RETRIES", "2"))
+    
+    # Arquivamento de mensagens de leads encerrados ou inativos em segmentos gzip
+    ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", str(Path(DATA_DIR) / "archive"))
+    ARCHIVE_STATUSES = [s.strip() for s in os.getenv("ARCHIVE_STATUSES", "convertido,perdido,finalizado").split(",") if s.strip()]
+    ARCHIVE_INACTIVE_DAYS = int(os.getenv("ARCHIVE_INACTIVE_DAYS", "90"))
+    ARCHIVE_INTERVAL_HOURS = float(os.getenv("ARCHIVE_INTERVAL_HOURS", "24"))  # 0 desativa o job
+    
+    # Retenção de dados (dias; 0 mantém para sempre) e exclusão em lotes
+    RETENTION_NOTIFICATION_LOGS_DAYS = int(os.getenv("RETENTION_NOTIFICATION_LOGS_DAYS", "180"))
+    RETENTION_CHAT_MESSAGES_DAYS = int(os.getenv("RETENTION_CHAT_MESSAGES_DAYS", "0"))
+    RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+    RETENTION_BATCH_SLEEP_MS = float(os.getenv("RETENTION_BATCH_SLEEP_MS", "50"))
+    RETENTION_INTERVAL_HOURS = float(os.getenv("RETENTION_INTERVAL_HOURS", "24"))  # 0 desativa o job
+    
+    # Backup online do SQLite: snapshots comprimidos com checksum, rotação dos mais recentes
+    BACKUP_DIR = os.getenv("BACKUP_DIR", str(Path(DATA_DIR) / "backups"))
+    BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+    BACKUP_INTERVAL_HOURS = float(os.getenv("BACKUP_INTERVAL_HOURS", "24"))  # 0 desativa o job
+    BACKUP_PAGES_PER_STEP = int(os.getenv("BACKUP_PAGES_PER_STEP", "1000"))
+    BACKUP_STEP_SLEEP_MS = float(os.getenv("BACKUP_STEP_SLEEP_MS", "10"))
+    BACKUP_MAX_RESTARTS = int(os.getenv("BACKUP_MAX_RESTARTS", "3"))
     
     # Evolution API
     EVOLUTION_API_URL = os.getenv("EVOLUTION_API_URL", "https://api.evolution.br/api")
@@ -35,6 +83,24 @@ class Settings:
     # OpenAI API
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
     OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o")  # ou gpt-4o-mini, gpt-4-turbo, etc.
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None  # Servidor compatível (ex.: fake do teste de carga)
+    
+    # Classificador local de intenção (menu e tipo de seguro)
+    INTENT_MODEL_PATH = os.getenv("INTENT_MODEL_PATH", str(Path(DATA_DIR) / "intent_model.npz"))
+    INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE_THRESHOLD", "0.75"))
+    
+    # Cache semântico de perguntas frequentes (respondidas sem chamar a IA)
+    FAQ_CACHE_ENABLED = os.getenv("FAQ_CACHE_ENABLED", "true").lower() == "true"
+    FAQ_INDEX_PATH = os.getenv("FAQ_INDEX_PATH", str(Path(DATA_DIR) / "faq_index.npz"))
+    FAQ_SIMILARITY_THRESHOLD = float(os.getenv("FAQ_SIMILARITY_THRESHOLD", "0.8"))
+    
+    # Fluxos atendidos pela coleta determinística (sem IA), separados por vírgula
+    # Ex: SLOT_FILLING_FLOWS=segunda_via,falar_humano,outros_assuntos
+    SLOT_FILLING_FLOWS = [f.strip() for f in os.getenv("SLOT_FILLING_FLOWS", "").split(",") if f.strip()]
+    
+    # Cassete de chamadas à IA: "record" grava, "replay" reproduz offline, vazio desativa
+    LLM_CASSETTE_MODE = os.getenv("LLM_CASSETTE_MODE", "").lower()
+    LLM_CASSETTE_PATH = os.getenv("LLM_CASSETTE_PATH", "benchmarks/cassettes/llm_cassette.json")
     
     # Email Configuration (Agora usado para LEITURA de e-mails)
     SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
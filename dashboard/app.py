@@ -9,14 +9,15 @@ root_dir = Path(__file__).parent.parent
 sys.path.insert(0, str(root_dir))
 
 import streamlit as st
-import pandas as pd
 from datetime import datetime, timedelta
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 from config.settings import settings
-from app.database.models import Lead, ChatMessage
+from app.database.models import LEAD_ATTRIBUTES, Lead, FaqEntry
+from app.core.flow_manager import FlowManager
+from app.database.connection import get_engine, get_session_factory, write_session_scope
 from app.services.database_service import LeadService, MessageService
 from app.services.evolution_service import EvolutionService
+from app.services.faq_service import rebuild_faq_index
+from dashboard.helpers import format_phone_display, build_leads_dataframe
 import asyncio
 
 # Configuração da página
@@ -52,11 +53,9 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Inicializa banco de dados
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
-SessionLocal = sessionmaker(bind=engine)
+# Engine único do processo: o Streamlit reexecuta o script a cada interação
+engine = get_engine(settings.DATABASE_URL)
+SessionLocal = get_session_factory(engine)
 
 # State da sessão
 if "refresh_key" not in st.session_state:
@@ -81,21 +80,16 @@ def load_leads():
 def load_statistics():
     """Carrega estatísticas"""
     db = get_db()
-    
-    total = db.query(Lead).count()
-    novo = db.query(Lead).filter(Lead.status == "novo").count()
-    qualificado = db.query(Lead).filter(Lead.status == "qualificado").count()
-    em_atendimento = db.query(Lead).filter(Lead.status == "em_atendimento").count()
-    finalizado = db.query(Lead).filter(Lead.status == "finalizado").count()
-    
+    counts = LeadService.get_statistics(db)
     db.close()
     
+    by_status = counts["by_status"]
     return {
-        "total": total,
-        "novo": novo,
-        "qualificado": qualificado,
-        "em_atendimento": em_atendimento,
-        "finalizado": finalizado
+        "total": counts["total"],
+        "novo": by_status.get("novo", 0),
+        "qualificado": by_status.get("qualificado", 0),
+        "em_atendimento": by_status.get("em_atendimento", 0),
+        "finalizado": by_status.get("finalizado", 0)
     }
 
 
@@ -106,10 +100,8 @@ def load_lead_details(lead_id: int):
     lead = db.query(Lead).filter(Lead.id == lead_id).first()
     
     if lead:
-        messages = db.query(ChatMessage).filter(
-            ChatMessage.whatsapp_number == lead.whatsapp_number
-        ).order_by(ChatMessage.created_at.desc()).limit(100).all()
-        messages.reverse()
+        lead.attribute_record  # atributos de fluxo: só o detalhe do lead os carrega
+        messages = MessageService.get_recent_messages(db, lead, limit=100)
         db.close()
         return lead, messages
     
@@ -183,10 +175,12 @@ with col5:
 st.divider()
 
 # Tabs
-tab1, tab2, tab3 = st.tabs([
+tab1, tab2, tab3, tab4, tab5 = st.tabs([
     "📋 Leads Qualificados",
     "🔍 Todos os Leads",
-    "💬 Detalhes do Lead"
+    "💬 Detalhes do Lead",
+    "❓ Perguntas Frequentes",
+    "🔎 Buscar"
 ])
 
 with tab1:
@@ -207,11 +201,7 @@ with tab1:
                 
                 with col1:
                     st.markdown(f"**{lead.name or 'Sem nome'}**")
-                    # Remove o 9 inicial se houver (apenas visual)
-                    phone = lead.whatsapp_number
-                    if phone and len(phone) >= 11 and phone[2] == '9':
-                        phone = phone[:2] + phone[3:]
-                    st.caption(f"📱 {phone}")
+                    st.caption(f"📱 {format_phone_display(lead.whatsapp_number)}")
                 
                 with col2:
                     st.markdown(f"**Interesse:** {lead.interest or 'N/A'}")
@@ -226,16 +216,20 @@ with tab1:
                 
                 with col4:
                     if st.button("👤 Assumir", key=f"assume_{lead.id}"):
+                        # UPDATE condicional: só um atendente assume o mesmo lead
                         db = get_db()
-                        LeadService.update_lead(
+                        claimed = LeadService.transition(
                             db,
-                            lead,
-                            status="em_atendimento",
+                            lead.id,
+                            "claim",
                             attended_by=f"Atendente #{lead.id}"
                         )
                         db.close()
-                        st.success("✅ Lead assumido!")
-                        refresh_data()
+                        if claimed:
+                            st.success("✅ Lead assumido!")
+                            refresh_data()
+                        else:
+                            st.warning("Este lead já foi assumido ou mudou de status.")
                 
                 st.divider()
 
@@ -288,23 +282,7 @@ with tab2:
     
     # Exibição em tabela
     if all_leads:
-        df_data = []
-        for lead in all_leads:
-            df_data.append({
-                "ID": lead.id,
-                "Nome": lead.name or "—",
-                # Remove o 9 inicial se houver (apenas visual)
-                phone = lead.whatsapp_number
-                if phone and len(phone) >= 11 and phone[2] == '9':
-                    phone = phone[:2] + phone[3:]
-                "WhatsApp": phone,
-                "Status": lead.status,
-                "Tipo": lead.customer_type,
-                "IA Ativa": "✅" if lead.status_ia == 1 else "❌",
-                "Criado": lead.created_at.strftime("%d/%m %H:%M"),
-            })
-        
-        df = pd.DataFrame(df_data)
+        df = build_leads_dataframe(all_leads)
         st.dataframe(df, use_container_width=True, hide_index=True)
     else:
         st.info("Nenhum lead encontrado com os filtros selecionados.")
@@ -319,11 +297,7 @@ with tab3:
     else:
         # Selector de lead
         lead_options = {
-            # Remove o 9 inicial se houver (apenas visual)
-            phone = lead.whatsapp_number
-            if phone and len(phone) >= 11 and phone[2] == '9':
-                phone = phone[:2] + phone[3:]
-            f"{lead.name or 'Sem nome'} ({phone})": lead.id
+            f"{lead.name or 'Sem nome'} ({format_phone_display(lead.whatsapp_number)})": lead.id
             for lead in leads
         }
         
@@ -342,14 +316,12 @@ with tab3:
             with col1:
                 st.markdown("### 👤 Informações")
                 st.markdown(f"**Nome:** {lead.name or 'Não preenchido'}")
-                # Remove o 9 inicial se houver (apenas visual)
-                phone = lead.whatsapp_number
-                if phone and len(phone) >= 11 and phone[2] == '9':
-                    phone = phone[:2] + phone[3:]
-                st.markdown(f"**WhatsApp:** {phone}")
+                st.markdown(f"**WhatsApp:** {format_phone_display(lead.whatsapp_number)}")
                 st.markdown(f"**Status:** `{lead.status}`")
                 st.markdown(f"**Tipo:** {lead.customer_type}")
-            
+                if lead.linked_lead_id:
+                    st.markdown(f"**Mesmo cliente do lead:** #{lead.linked_lead_id}")
+
             with col2:
                 st.markdown("### 📊 Status da IA")
                 st.markdown(f"**IA Ativa:** {'✅ Sim' if lead.status_ia == 1 else '❌ Não'}")
@@ -378,6 +350,19 @@ with tab3:
             
             st.divider()
             
+            # Dados específicos do fluxo (auto, residencial, consórcio)
+            flow_data = {name: getattr(lead, name) for name in LEAD_ATTRIBUTES if getattr(lead, name) is not None}
+            if flow_data:
+                st.markdown("### 📋 Dados do Fluxo")
+                flow_manager = FlowManager()
+                columns = st.columns(2)
+                for position, (name, value) in enumerate(flow_data.items()):
+                    if isinstance(value, bool):
+                        value = "Sim" if value else "Não"
+                    columns[position % 2].markdown(f"**{flow_manager.get_field_label(name)}:** {value}")
+                
+                st.divider()
+            
             # Histórico de mensagens
             st.markdown("### 💬 Histórico de Chat")
             
@@ -403,7 +388,7 @@ with tab3:
             with col1:
                 if st.button("❌ Desativar IA", key=f"deactivate_{lead.id}"):
                     db = get_db()
-                    LeadService.update_lead(db, lead, status_ia=0)
+                    LeadService.transition(db, lead.id, None, status_ia=0)
                     db.close()
                     st.success("IA desativada!")
                     refresh_data()
@@ -411,19 +396,102 @@ with tab3:
             with col2:
                 if st.button("✅ Marcar como Finalizado", key=f"finish_{lead.id}"):
                     db = get_db()
-                    LeadService.update_lead(db, lead, status="finalizado")
+                    finished = LeadService.transition(db, lead.id, "finish")
                     db.close()
-                    st.success("Lead finalizado!")
-                    refresh_data()
+                    if finished:
+                        st.success("Lead finalizado!")
+                        refresh_data()
+                    else:
+                        st.warning("Este lead já foi encerrado.")
             
             with col3:
                 if st.button("🔄 Reativar IA", key=f"reactivate_{lead.id}"):
                     db = get_db()
-                    LeadService.update_lead(db, lead, status_ia=1)
+                    LeadService.transition(db, lead.id, None, status_ia=1)
                     db.close()
                     st.success("IA reativada!")
                     refresh_data()
 
+with tab4:
+    st.subheader("Respostas Aprovadas (FAQ)")
+    st.caption(
+        "Perguntas parecidas com estas são respondidas na hora, sem chamar a IA. "
+        "Use uma variação de pergunta por linha e reconstrua o índice após alterar."
+    )
+    
+    with st.form("faq_form", clear_on_submit=True):
+        faq_question = st.text_area("Pergunta(s)", placeholder="qual o horário de atendimento\nvocês abrem sábado?")
+        faq_answer = st.text_area("Resposta aprovada")
+        if st.form_submit_button("➕ Adicionar"):
+            if faq_question.strip() and faq_answer.strip():
+                with write_session_scope(engine) as db:
+                    db.add(FaqEntry(question=faq_question.strip(), answer=faq_answer.strip()))
+                st.success("Pergunta adicionada! Reconstrua o índice para ativar.")
+            else:
+                st.warning("Preencha a pergunta e a resposta.")
+    
+    if st.button("🔁 Reconstruir índice", key="rebuild_faq"):
+        db = get_db()
+        indexed = rebuild_faq_index(db)
+        db.close()
+        st.success(f"Índice reconstruído com {indexed} perguntas.")
+    
+    db = get_db()
+    faq_entries = db.query(FaqEntry).order_by(FaqEntry.id.desc()).all()
+    db.close()
+    
+    if not faq_entries:
+        st.info("Nenhuma pergunta cadastrada ainda.")
+    else:
+        for entry in faq_entries:
+            with st.container():
+                col1, col2 = st.columns([4, 1])
+                with col1:
+                    st.markdown(f"**{entry.question.splitlines()[0]}**")
+                    st.caption(entry.answer)
+                with col2:
+                    label = "⏸️ Desativar" if entry.active else "▶️ Ativar"
+                    if st.button(label, key=f"faq_toggle_{entry.id}"):
+                        with write_session_scope(engine) as db:
+                            db.query(FaqEntry).filter(FaqEntry.id == entry.id).update(
+                                {"active": not entry.active}
+                            )
+                        refresh_data()
+                st.divider()
+
+with tab5:
+    st.subheader("Buscar em Leads e Conversas")
+    search_query = st.text_input(
+        "Buscar",
+        placeholder="Ex.: placa ABC, nome do bairro, parte do nome do cliente",
+        label_visibility="collapsed"
+    )
+    
+    if search_query.strip():
+        db = get_db()
+        results = LeadService.search(db, search_query, limit=30)
+        db.close()
+        
+        if not results["leads"] and not results["messages"]:
+            st.info("Nada encontrado.")
+        
+        if results["leads"]:
+            st.markdown(f"**👤 Leads ({len(results['leads'])})**")
+            for hit in results["leads"]:
+                st.markdown(
+                    f"**{hit['name'] or 'Sem nome'}** · {format_phone_display(hit['whatsapp_number'])} · "
+                    f"`{hit['status']}`  \n{hit['snippet']}"
+                )
+        
+        if results["messages"]:
+            st.markdown(f"**💬 Mensagens ({len(results['messages'])})**")
+            for hit in results["messages"]:
+                icon = "👤" if hit["sender"] == "user" else "🤖"
+                when = hit["created_at"].strftime("%d/%m %H:%M") if hit["created_at"] else ""
+                st.markdown(
+                    f"{icon} {format_phone_display(hit['whatsapp_number'])} · {when}  \n{hit['snippet']}"
+                )
+
 # Footer
 st.divider()
 col1, col2, col3 = st.columns(3)
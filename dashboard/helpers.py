@@ -0,0 +1,36 @@
+"""
+Funções auxiliares do dashboard (sem dependência do Streamlit)
+"""
+from typing import Iterable
+import pandas as pd
+
+
+def format_phone_display(phone: str) -> str:
+    """Remove o 9 inicial se houver (apenas visual)"""
+    if phone and len(phone) >= 11 and phone[2] == '9':
+        return phone[:2] + phone[3:]
+    return phone
+
+
+def build_leads_dataframe(leads: Iterable) -> pd.DataFrame:
+    """
+    Monta a tabela de leads exibida na aba de listagem
+    
+    Args:
+        leads: Leads já filtrados e ordenados
+    
+    Returns:
+        DataFrame com as colunas exibidas no dashboard
+    """
+    df_data = []
+    for lead in leads:
+        df_data.append({
+            "ID": lead.id,
+            "Nome": lead.name or "—",
+            "WhatsApp": format_phone_display(lead.whatsapp_number),
+            "Status": lead.status,
+            "Tipo": lead.customer_type,
+            "IA Ativa": "✅" if lead.status_ia == 1 else "❌",
+            "Criado": lead.created_at.strftime("%d/%m %H:%M"),
+        })
+    return pd.DataFrame(df_data)
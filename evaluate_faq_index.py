@@ -0,0 +1,103 @@
+"""
+Avaliação offline do cache de perguntas frequentes contra conversas históricas
+
+Para cada mensagem de usuário respondida pela IA, verifica se o índice teria
+respondido do cache, compara a resposta aprovada com a resposta real da IA
+e lista as perguntas repetidas que ainda não têm resposta aprovada.
+"""
+import argparse
+import sys
+from collections import Counter
+from config.settings import settings
+from app.core.text_features import HashingVectorizer
+from app.core.utils import normalize_text
+from app.database.models import init_db, get_session, ChatMessage
+from app.services.faq_service import FaqIndex, get_faq_index
+
+
+def iter_question_answer_pairs(db, batch_size: int = 1000):
+    """Percorre pares (mensagem do usuário, resposta seguinte da IA) por número"""
+    last_id = 0
+    previous = {}
+    while True:
+        batch = db.query(
+            ChatMessage.id, ChatMessage.whatsapp_number, ChatMessage.sender, ChatMessage.message
+        ).filter(ChatMessage.id > last_id).order_by(ChatMessage.id.asc()).limit(batch_size).all()
+        if not batch:
+            break
+        for msg_id, number, sender, message in batch:
+            if sender == "user":
+                previous[number] = message
+            elif sender == "ai" and previous.get(number):
+                yield previous.pop(number), message
+            last_id = msg_id
+
+
+def evaluate(index: FaqIndex, threshold: float, top: int = 15):
+    """Executa a avaliação e imprime o relatório"""
+    engine = init_db(settings.DATABASE_URL)
+    db = get_session(engine)
+    vectorizer = HashingVectorizer(n_features=index.vectorizer.n_features)
+
+    total = 0
+    hits = 0
+    agreement_sum = 0.0
+    hits_by_entry = Counter()
+    unanswered = Counter()
+
+    try:
+        for question, ai_answer in iter_question_answer_pairs(db):
+            if len(question.strip()) < 8 or question.strip().isdigit():
+                continue  # números do menu e respostas curtas de dados
+            total += 1
+            match = index.lookup(question, threshold)
+            if match:
+                cached_answer, score, entry_id = match
+                hits += 1
+                hits_by_entry[entry_id] += 1
+                # Similaridade entre a resposta aprovada e a resposta real da IA
+                a_idx, a_val = vectorizer.transform_one(cached_answer)
+                b = vectorizer.to_dense(ai_answer)
+                agreement_sum += float(b[a_idx] @ a_val) if len(a_idx) else 0.0
+            elif "?" in question:
+                unanswered[normalize_text(question)] += 1
+    finally:
+        db.close()
+
+    print("=" * 60)
+    print("📊 AVALIAÇÃO DO CACHE DE PERGUNTAS FREQUENTES")
+    print("=" * 60)
+    print(f"Perguntas no índice: {len(index)}")
+    print(f"Limiar de similaridade: {threshold}")
+    print(f"Mensagens avaliadas: {total}")
+    if total:
+        print(f"✅ Respondidas pelo cache: {hits} ({hits / total * 100:.1f}%)")
+        print(f"💰 Chamadas à IA evitadas: {hits}")
+    if hits:
+        print(f"🎯 Concordância média com a resposta da IA: {agreement_sum / hits:.2f}")
+        print("\nEntradas mais usadas:")
+        for entry_id, count in hits_by_entry.most_common(top):
+            print(f"   #{entry_id}: {count}")
+
+    if unanswered:
+        print("\n❓ Perguntas repetidas sem resposta aprovada (candidatas a FAQ):")
+        for question, count in unanswered.most_common(top):
+            if count > 1:
+                print(f"   {count:4d}x  {question}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Avalia o cache de FAQ com o histórico")
+    parser.add_argument("--index", default=settings.FAQ_INDEX_PATH, help="Arquivo do índice")
+    parser.add_argument("--threshold", type=float, default=settings.FAQ_SIMILARITY_THRESHOLD)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    faq_index = get_faq_index(args.index)
+    if faq_index is None:
+        print(f"❌ Índice não encontrado: {args.index}")
+        print("   Cadastre perguntas no dashboard e clique em 'Reconstruir índice'")
+        sys.exit(1)
+
+    evaluate(faq_index, args.threshold, args.top)
@@ -0,0 +1,54 @@
+"""
+Script de fusão de leads duplicados (mesmo número com e sem o nono dígito)
+
+Uso:
+    python merge_duplicate_leads.py              # funde todos os duplicados
+    python merge_duplicate_leads.py --dry-run    # só lista os grupos
+    python merge_duplicate_leads.py --limit 100  # no máximo 100 grupos nesta execução
+"""
+import argparse
+import sys
+from config.settings import settings
+from app.database.models import init_db
+from app.services.lead_merge import LeadMergeService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fusão de leads duplicados pelo número canônico")
+    parser.add_argument("--dry-run", action="store_true", help="Só lista os grupos de duplicados")
+    parser.add_argument("--limit", type=int, help="Máximo de grupos nesta execução")
+    args = parser.parse_args()
+
+    try:
+        engine = init_db(settings.DATABASE_URL)
+        summary = LeadMergeService.merge_duplicates(engine, limit=args.limit, dry_run=args.dry_run)
+
+        if not summary["groups"]:
+            print("✅ Nenhum lead duplicado")
+            return
+
+        if args.dry_run:
+            print(f"🔎 {summary['groups']} grupos, {summary['merged_leads']} leads a fundir:")
+            for group in summary["reports"]:
+                kept, *merged = group["lead_ids"]
+                print(f"   {group['canonical_number']}: manter {kept}, fundir {merged}")
+            return
+
+        for report in summary["reports"]:
+            print(f"🔗 {report['canonical_number']}: {report['merged']} → {report['kept']}")
+        print(f"\n📊 Resumo:")
+        print(f"   ✅ Grupos: {summary['groups']} ({summary['skipped']} pulados)")
+        print(f"   🔗 Leads fundidos: {summary['merged_leads']}")
+        for table, count in summary["moved"].items():
+            print(f"   ↪️  {table}: {count} linhas repassadas")
+        print(f"   ⏱️  {summary['seconds']}s")
+
+    except Exception as e:
+        print(f"\n❌ Erro: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
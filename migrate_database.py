@@ -1,12 +1,48 @@
 """
 Script para migrar o banco de dados para o novo esquema de fluxos
+
+Uso:
+    python migrate_database.py                          # colunas, índices e atributos de fluxo
+    python migrate_database.py --drop-legacy-columns    # também remove de leads as colunas de fluxo antigas
 """
+import argparse
 import sys
+import time
 from sqlalchemy import create_engine, text, inspect
 from config.settings import settings
+from app.database.fulltext import ensure_search_index
+from app.database.models import (
+    Base, ensure_columns, ensure_indexes, legacy_attribute_columns, migrate_lead_attributes,
+)
+
+
+def drop_legacy_columns(engine):
+    """
+    Remove de leads as colunas de fluxo já copiadas para lead_attributes
+
+    No SQLite cada DROP COLUMN reescreve a tabela e o espaço só volta ao
+    sistema com VACUUM; rodar com a aplicação parada.
+    """
+    columns = legacy_attribute_columns(engine)
+    if not columns:
+        print("⏭️  Nenhuma coluna de fluxo antiga em leads")
+        return
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        for column_name in columns:
+            conn.execute(text(f"ALTER TABLE leads DROP COLUMN {column_name}"))
+            print(f"🗑️  Coluna '{column_name}' removida de leads")
+    if engine.dialect.name == "sqlite":
+        raw = engine.raw_connection()
+        try:
+            raw.cursor().execute("VACUUM")
+        finally:
+            raw.close()
+    print(f"✅ {len(columns)} colunas removidas em {time.perf_counter() - started:.1f}s")
+
 
-def migrate_database():
-    """Adiciona novas colunas ao banco de dados existente"""
+def migrate_database(drop_legacy: bool = False):
+    """Adiciona novas colunas ao banco de dados existente e move os atributos de fluxo para lead_attributes"""
     
     print("🔄 Iniciando migração do banco de dados...")
     
@@ -24,20 +60,6 @@ def migrate_database():
                 ("second_email", "VARCHAR(150)"),
                 ("flow_type", "VARCHAR(50)"),
                 ("flow_step", "VARCHAR(50) DEFAULT 'menu_principal'"),
-                ("vehicle_plate", "VARCHAR(10)"),
-                ("cep_pernoite", "VARCHAR(10)"),
-                ("profession", "VARCHAR(150)"),
-                ("marital_status", "VARCHAR(50)"),
-                ("vehicle_usage", "VARCHAR(50)"),
-                ("has_young_driver", "BOOLEAN"),
-                ("property_cep", "VARCHAR(10)"),
-                ("property_type", "VARCHAR(100)"),
-                ("property_value", "VARCHAR(100)"),
-                ("property_ownership", "VARCHAR(50)"),
-                ("consortium_type", "VARCHAR(50)"),
-                ("consortium_value", "VARCHAR(100)"),
-                ("consortium_term", "VARCHAR(50)"),
-                ("has_previous_consortium", "BOOLEAN"),
             ]
             
             columns_added = 0
@@ -58,10 +80,32 @@ def migrate_database():
                     except Exception as e:
                         print(f"❌ Erro ao adicionar coluna '{column_name}': {str(e)}")
             
+            # Demais colunas declaradas nos modelos (ex.: leads.version)
+            for column_name in ensure_columns(engine):
+                print(f"✅ Coluna '{column_name}' adicionada com sucesso")
+                columns_added += 1
+            
+            # Tabelas novas (ex.: lead_attributes)
+            Base.metadata.create_all(bind=engine)
+            
+            # Índices compostos declarados nos modelos
+            created_indexes = ensure_indexes(engine)
+            for index_name in created_indexes:
+                print(f"✅ Índice '{index_name}' criado com sucesso")
+            
+            # Atributos de fluxo: das colunas antigas de leads para lead_attributes
+            copied = migrate_lead_attributes(engine)
+            print(f"✅ Atributos de fluxo copiados para lead_attributes: {copied} leads")
+            ensure_search_index(engine)
+            
             print(f"\n📊 Resumo da migração:")
             print(f"   ✅ Colunas adicionadas: {columns_added}")
             print(f"   ⏭️  Colunas já existentes: {columns_skipped}")
-            print(f"\n🎉 Migração concluída com sucesso!")
+            print(f"   ✅ Índices criados: {len(created_indexes)}")
+            
+        if drop_legacy:
+            drop_legacy_columns(engine)
+        print(f"\n🎉 Migração concluída com sucesso!")
             
     except Exception as e:
         print(f"\n❌ Erro na migração: {str(e)}")
@@ -70,4 +114,8 @@ def migrate_database():
         sys.exit(1)
 
 if __name__ == "__main__":
-    migrate_database()
+    parser = argparse.ArgumentParser(description="Migração do banco de dados do CRM")
+    parser.add_argument("--drop-legacy-columns", action="store_true",
+                        help="Remove de leads as colunas de fluxo já copiadas para lead_attributes")
+    args = parser.parse_args()
+    migrate_database(drop_legacy=args.drop_legacy_columns)
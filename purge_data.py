@@ -0,0 +1,74 @@
+"""
+Script de retenção de dados e exclusão de leads (LGPD)
+
+Uso:
+    python purge_data.py                            # aplica as políticas de retenção do .env
+    python purge_data.py --dry-run                  # só conta o que seria apagado
+    python purge_data.py --forget 5511999999999     # apaga um lead e todos os seus dados
+    python purge_data.py --forget-id 42             # idem, pelo ID do lead
+    python purge_data.py --enable-incremental-vacuum  # uma vez, em bancos SQLite antigos
+"""
+import argparse
+import sys
+from config.settings import settings
+from app.database.models import init_db
+from app.services.retention import RetentionService, enable_incremental_vacuum
+
+
+def print_report(report: dict):
+    print(f"\n📊 Resumo:")
+    for table, count in report["deleted"].items():
+        print(f"   🗑️  {table}: {count}")
+    print(f"   ⏱️  {report['total_rows']} linhas em {report['seconds']}s ({report['rows_per_second']} linhas/s)")
+    if report["freed_pages"]:
+        print(f"   💾 Páginas devolvidas ao disco: {report['freed_pages']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retenção de dados e exclusão de leads")
+    parser.add_argument("--forget", metavar="NUMERO", help="Número WhatsApp do lead a esquecer")
+    parser.add_argument("--forget-id", type=int, metavar="ID", help="ID do lead a esquecer")
+    parser.add_argument("--dry-run", action="store_true", help="Só conta as linhas expiradas")
+    parser.add_argument("--enable-incremental-vacuum", action="store_true",
+                        help="Ativa auto_vacuum=INCREMENTAL (roda um VACUUM completo)")
+    args = parser.parse_args()
+
+    try:
+        engine = init_db(settings.DATABASE_URL)
+
+        if args.enable_incremental_vacuum:
+            print("🔧 Ativando auto_vacuum=INCREMENTAL (VACUUM completo, pode demorar)...")
+            changed = enable_incremental_vacuum(engine)
+            print("✅ Ativado" if changed else "⏭️  Já estava ativo (ou o banco não é SQLite)")
+            return
+
+        if args.forget or args.forget_id is not None:
+            target = args.forget or f"ID {args.forget_id}"
+            print(f"🗑️  Esquecendo lead {target}...")
+            report = RetentionService.forget_lead(engine, lead_id=args.forget_id, whatsapp_number=args.forget)
+            if report is None:
+                print(f"❌ Lead {target} não encontrado")
+                sys.exit(1)
+            print_report(report)
+            return
+
+        print("🧹 Aplicando políticas de retenção")
+        for table, days in (("notification_logs", settings.RETENTION_NOTIFICATION_LOGS_DAYS),
+                            ("chat_messages", settings.RETENTION_CHAT_MESSAGES_DAYS)):
+            print(f"   {table}: {f'{days} dias' if days else 'sem prazo'}")
+        report = RetentionService.run_policies(engine, dry_run=args.dry_run)
+        if args.dry_run:
+            for table, count in report["deleted"].items():
+                print(f"   🔎 {table}: {count} linhas expiradas")
+            return
+        print_report(report)
+
+    except Exception as e:
+        print(f"\n❌ Erro: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Testes da camada assíncrona do banco (AsyncEngine, serviços e rotas da API)
+"""
+import asyncio
+import os
+import tempfile
+import orjson
+from sqlalchemy import text
+from app.database.connection import (
+    async_database_url, build_async_engine, get_async_session_factory, get_pool_status, TimedAsyncQueuePool
+)
+from app.database.models import Base
+from app.services.async_database_service import AsyncLeadService, AsyncMessageService
+from app.services.conversation_buffer import conversation_buffer
+
+
+def test_async_database_url():
+    """Testa a troca do driver síncrono pelo assíncrono"""
+    print("\n🧪 Testando URLs assíncronas...")
+    assert async_database_url("sqlite:////app/data/crm.db") == "sqlite+aiosqlite:////app/data/crm.db"
+    assert async_database_url("sqlite://") == "sqlite+aiosqlite://"
+    assert async_database_url("postgresql://u:p@host/db") == "postgresql+asyncpg://u:p@host/db"
+    assert async_database_url("postgresql+psycopg2://u:p@host/db") == "postgresql+asyncpg://u:p@host/db"
+    assert async_database_url("sqlite+aiosqlite:///x.db") == "sqlite+aiosqlite:///x.db"
+    print("  ✅ aiosqlite e asyncpg")
+
+
+async def _services_roundtrip(url: str):
+    engine = build_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    factory = get_async_session_factory(engine)
+    async with factory() as db:
+        lead = await AsyncLeadService.create_or_get_lead(db, "5511999990010", commit=False)
+        await AsyncMessageService.save_message(db, lead.whatsapp_number, "user", "oi",
+                                               role="user", lead_id=lead.id, commit=False)
+        await AsyncLeadService.mark_qualified(db, lead, commit=False)
+        await AsyncMessageService.save_message(db, lead.whatsapp_number, "ai", "Olá!",
+                                               role="assistant", lead_id=lead.id, commit=False)
+        await db.commit()
+        # Sem expirar no commit: atributos seguem acessíveis sem I/O implícito
+        assert lead.status == "qualificado"
+
+    async with factory() as db:
+        again = await AsyncLeadService.create_or_get_lead(db, "5511999990010")
+        assert again.id == lead.id
+        assert not await AsyncLeadService.is_ia_active(db, "5511999990010")
+        history = await AsyncMessageService.get_conversation_history(db, "5511999990010")
+        assert history == [{"role": "user", "content": "oi"}, {"role": "assistant", "content": "Olá!"}]
+        messages = await AsyncMessageService.get_lead_messages(db, lead.id)
+        assert [m.sender for m in messages] == ["user", "ai"]
+        journal = (await db.execute(text("PRAGMA journal_mode"))).scalar()
+
+    pool_status = get_pool_status(engine.sync_engine)
+    await engine.dispose()
+    return journal, pool_status
+
+
+def test_async_services():
+    """Testa os serviços assíncronos em SQLite (memória e arquivo com WAL)"""
+    print("\n🧪 Testando serviços assíncronos...")
+    conversation_buffer.clear()
+    asyncio.run(_services_roundtrip("sqlite://"))
+    print("  ✅ SQLite em memória")
+    conversation_buffer.clear()  # mesmo número em outro banco
+
+    with tempfile.TemporaryDirectory() as tmp:
+        journal, pool_status = asyncio.run(_services_roundtrip(f"sqlite:///{os.path.join(tmp, 'crm.db')}"))
+        assert journal == "wal"
+        assert pool_status["pool"] == TimedAsyncQueuePool.__name__
+        assert pool_status["checkouts"] >= 3 and pool_status["checked_out"] == 0
+    print("  ✅ SQLite em arquivo com o perfil de PRAGMAs e métricas do pool")
+
+
+async def _routes_roundtrip(url: str):
+    from app.webhooks.evolution_webhook import get_leads, get_leads_stats, get_lead_messages
+
+    engine = build_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    factory = get_async_session_factory(engine)
+    async with factory() as db:
+        for position in range(3):
+            lead = await AsyncLeadService.create_or_get_lead(db, f"551199999002{position}", commit=False)
+            await AsyncMessageService.save_message(db, lead.whatsapp_number, "user", "oi",
+                                                   lead_id=lead.id, commit=False)
+        await AsyncLeadService.mark_qualified(db, lead)
+
+    async with factory() as db:
+        leads = await get_leads(status=None, limit=50, db=db)
+        qualified = await get_leads(status="qualificado", limit=50, db=db)
+        stats = await get_leads_stats(db=db)
+        messages = await get_lead_messages(lead_id=lead.id, db=db)
+
+    await engine.dispose()
+    return orjson.loads(leads.body), orjson.loads(qualified.body), stats, orjson.loads(messages.body)
+
+
+def test_async_routes():
+    """Testa as rotas /api/leads* com AsyncSession"""
+    print("\n🧪 Testando rotas da API...")
+    leads, qualified, stats, messages = asyncio.run(_routes_roundtrip("sqlite://"))
+    assert len(leads) == 3
+    assert len(qualified) == 1
+    assert stats["total_leads"] == 3 and stats["qualificados"] == 1
+    assert len(messages) == 1 and messages[0]["sender"] == "user"
+    print("  ✅ Listagem, filtro por status, estatísticas e mensagens")
+
+
+if __name__ == "__main__":
+    test_async_database_url()
+    test_async_services()
+    test_async_routes()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
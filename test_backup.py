@@ -0,0 +1,130 @@
+"""
+Testes do backup online do SQLite (snapshot, verificação, restauração e rotação)
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from app.database.models import init_db, get_session, Lead, ChatMessage
+from app.services.backup import BackupService
+from config.settings import settings
+
+
+def _populate(engine, leads: int = 200):
+    db = get_session(engine)
+    for position in range(leads):
+        lead = Lead(whatsapp_number=f"55119{position:08d}", status="novo")
+        db.add(lead)
+        db.flush()
+        db.add(ChatMessage(lead_id=lead.id, whatsapp_number=lead.whatsapp_number, sender="user",
+                           message="mensagem " * 200))
+    db.commit()
+    db.close()
+
+
+def test_snapshot_during_writes():
+    """Testa o snapshot com escritas concorrentes, a verificação e a restauração"""
+    print("\n🧪 Testando snapshot com escritas concorrentes...")
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = init_db(f"sqlite:///{os.path.join(tmp, 'crm.db')}")
+        _populate(engine)
+        backups = Path(tmp) / "backups"
+
+        stop = threading.Event()
+        written = []
+
+        def writer():
+            conn = sqlite3.connect(os.path.join(tmp, "crm.db"), timeout=10)
+            while not stop.is_set():
+                conn.execute("INSERT INTO leads (whatsapp_number, status) VALUES (?, 'novo')", (f"w{len(written)}",))
+                conn.commit()
+                written.append(1)
+                time.sleep(0.005)
+            conn.close()
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            report = BackupService.create_snapshot(engine=engine, directory=backups, keep=3, pages_per_step=5)
+        finally:
+            stop.set()
+            thread.join()
+
+        assert Path(report["file"]).exists()
+        assert report["compressed_bytes"] < report["db_bytes"]
+        assert report["write_lock"]["probes"] > 0 and report["write_lock"]["failures"] == 0
+        assert written, "o escritor deveria gravar durante o backup"
+
+        result = BackupService.verify_snapshot(Path(report["file"]))
+        assert result["ok"] and "leads" in result["tables"]
+
+        restored = Path(tmp) / "restaurado.db"
+        BackupService.restore_snapshot(Path(report["file"]), restored)
+        conn = sqlite3.connect(restored)
+        count = conn.execute("SELECT count(*) FROM leads").fetchone()[0]
+        messages = conn.execute("SELECT count(*) FROM chat_messages").fetchone()[0]
+        conn.close()
+        assert count >= 200 and messages == 200
+        engine.dispose()
+
+    print(f"  ✅ {report['steps']} passos, {report['restarts']} recomeços, {len(written)} escritas durante a cópia; "
+          f"espera máx. {report['write_lock']['wait_max_ms']} ms")
+
+
+def test_rotation_and_tampering():
+    """Testa a rotação dos snapshots e a detecção de arquivo adulterado"""
+    print("\n🧪 Testando rotação e checksum...")
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = init_db(f"sqlite:///{os.path.join(tmp, 'crm.db')}")
+        _populate(engine, leads=10)
+        backups = Path(tmp) / "backups"
+        backups.mkdir()
+        # Snapshots antigos com nomes anteriores ao atual
+        for day in range(1, 4):
+            (backups / f"crm-2020010{day}-000000.db.gz").write_bytes(b"")
+            (backups / f"crm-2020010{day}-000000.db.gz.sha256").write_text("0  x\n")
+
+        report = BackupService.create_snapshot(engine=engine, directory=backups, keep=2)
+        assert report["rotated"] == ["crm-20200101-000000.db.gz", "crm-20200102-000000.db.gz"]
+        names = [path.name for path in BackupService.list_snapshots(backups)]
+        assert names == ["crm-20200103-000000.db.gz", Path(report["file"]).name]
+        assert not (backups / "crm-20200101-000000.db.gz.sha256").exists()
+
+        snapshot = Path(report["file"])
+        data = bytearray(snapshot.read_bytes())
+        data[-10] ^= 0xFF
+        snapshot.write_bytes(bytes(data))
+        try:
+            result = BackupService.verify_snapshot(snapshot)
+        except Exception:
+            result = {"ok": False, "checksum_ok": False}
+        assert not result["ok"] and not result["checksum_ok"]
+        try:
+            BackupService.restore_snapshot(snapshot, Path(tmp) / "x.db")
+            assert False, "restauração de snapshot adulterado deveria falhar"
+        except Exception:
+            pass
+        engine.dispose()
+    print("  ✅ Mantidos os mais recentes; snapshot adulterado rejeitado")
+
+
+def test_requires_sqlite_file():
+    """Testa a recusa de bancos que não são SQLite em arquivo"""
+    print("\n🧪 Testando banco em memória...")
+    engine = init_db("sqlite://")
+    try:
+        BackupService.create_snapshot(engine=engine, directory=settings.BACKUP_DIR)
+        assert False, "banco em memória não tem backup online"
+    except ValueError:
+        pass
+    engine.dispose()
+    print("  ✅ ValueError para banco em memória")
+
+
+if __name__ == "__main__":
+    test_snapshot_during_writes()
+    test_rotation_and_tampering()
+    test_requires_sqlite_file()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
@@ -0,0 +1,115 @@
+"""
+Testes do buffer em memória do histórico de conversas
+"""
+import asyncio
+import os
+import tempfile
+import time
+from sqlalchemy import event
+from app.database.connection import build_async_engine, get_async_session_factory
+from app.database.models import init_db, get_session
+from app.services.async_database_service import AsyncLeadService, AsyncMessageService
+from app.services.conversation_buffer import ConversationBuffer, conversation_buffer
+from app.services.database_service import LeadService, MessageService
+
+
+def test_ring_and_eviction():
+    """Testa o limite por conversa, o descarte por inatividade e o orçamento de memória"""
+    print("\n🧪 Testando ring buffer e descarte...")
+    buffer = ConversationBuffer(capacity=3, idle_seconds=60, max_bytes=10_000)
+    buffer.warm("a", [("user", "1"), ("assistant", "2")])
+    for content in ("3", "4", "5"):
+        buffer.append("a", "user", content)
+    assert [m["content"] for m in buffer.get("a", 3)] == ["3", "4", "5"]
+    assert [m["content"] for m in buffer.get("a", 2)] == ["4", "5"]
+    assert buffer.get("a", 4) is None  # acima da capacidade: vai ao banco
+    buffer.append("b", "user", "ignorada")  # fora do buffer
+    assert buffer.get("b", 3) is None
+    print("  ✅ Só as últimas mensagens ficam no buffer")
+
+    buffer.warm("b", [("user", "x" * 4000)])
+    buffer.warm("c", [("user", "y" * 4000)])
+    buffer.warm("d", [("user", "z" * 4000)])
+    stats = buffer.stats()
+    assert stats["size_bytes"] <= stats["max_bytes"]
+    assert buffer.get("b", 1) is None and buffer.get("d", 1) is not None
+    print(f"  ✅ Orçamento de memória respeitado: {stats['size_bytes']} bytes")
+
+    buffer.idle_seconds = 0.01
+    time.sleep(0.02)
+    assert buffer.get("d", 1) is None
+    assert buffer.stats()["conversations"] == 0 and buffer.stats()["size_bytes"] == 0
+    print("  ✅ Conversas inativas descartadas")
+
+
+def test_commit_and_rollback():
+    """Testa que só mensagens de transações confirmadas entram no buffer"""
+    print("\n🧪 Testando commit e rollback...")
+    conversation_buffer.clear()
+    number = "5511999990050"
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = init_db(f"sqlite:///{os.path.join(tmp, 'crm.db')}")
+        db = get_session(engine)
+        lead = LeadService.create_or_get_lead(db, number)
+        assert MessageService.get_conversation_history(db, number) == []
+
+        MessageService.save_message(db, number, "user", "oi", lead_id=lead.id)
+        MessageService.save_message(db, number, "ai", "descartada", role="assistant",
+                                    lead_id=lead.id, commit=False)
+        db.rollback()
+        MessageService.save_message(db, number, "ai", "Olá!", role="assistant", lead_id=lead.id)
+
+        statements = []
+        event.listen(engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        history = MessageService.get_conversation_history(db, number)
+        assert history == [{"role": "user", "content": "oi"}, {"role": "assistant", "content": "Olá!"}]
+        assert statements == []
+        print("  ✅ Rollback descartado e histórico lido sem consultar o banco")
+
+        # Depois de reiniciar o processo, o histórico volta igual do banco
+        conversation_buffer.clear()
+        assert MessageService.get_conversation_history(db, number) == history
+        assert len([s for s in statements if s.startswith("SELECT")]) == 1
+        db.close()
+        engine.dispose()
+    print("  ✅ Buffer aquecido do banco com o mesmo histórico")
+
+
+async def _async_history(url: str, number: str):
+    engine = build_async_engine(url)
+    factory = get_async_session_factory(engine)
+    async with factory() as db:
+        lead = await AsyncLeadService.create_or_get_lead(db, number, commit=False)
+        for position in range(5):
+            await AsyncMessageService.save_message(db, number, "user", f"m{position}",
+                                                   lead_id=lead.id, commit=False)
+        await db.commit()
+    async with factory() as db:
+        warm = await AsyncMessageService.get_conversation_history(db, number, limit=3)
+        await AsyncMessageService.save_message(db, number, "ai", "resposta", role="assistant",
+                                               lead_id=lead.id)
+        hot = await AsyncMessageService.get_conversation_history(db, number, limit=3)
+    await engine.dispose()
+    return warm, hot
+
+
+def test_async_history():
+    """Testa o buffer com os serviços assíncronos"""
+    print("\n🧪 Testando histórico assíncrono...")
+    conversation_buffer.clear()
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'crm.db')}"
+        init_db(url)
+        warm, hot = asyncio.run(_async_history(url, "5511999990051"))
+    assert [m["content"] for m in warm] == ["m2", "m3", "m4"]
+    assert [m["content"] for m in hot] == ["m3", "m4", "resposta"]
+    assert conversation_buffer.stats()["hits"] == 1
+    print("  ✅ Mensagem nova visível no próximo histórico")
+
+
+if __name__ == "__main__":
+    test_ring_and_eviction()
+    test_commit_and_rollback()
+    test_async_history()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
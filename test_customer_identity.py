@@ -0,0 +1,219 @@
+"""
+Testes da identificação de clientes já conhecidos (CPF/CNPJ, e-mail e placa)
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+from app.core.utils import extract_identity_keys, normalize_cpf_cnpj, normalize_email, normalize_plate
+from app.database.models import init_db, get_session, Lead, LeadAttributes
+from app.database.connection import build_async_engine, get_async_session_factory
+from app.services.async_database_service import AsyncLeadService
+from app.services.database_service import LeadService
+from app.services.lead_cache import lead_cache
+from app.services.retention import RetentionService
+from app.webhooks import evolution_webhook
+
+
+def test_normalization():
+    """Testa as chaves normalizadas e a extração da mensagem"""
+    print("\n🧪 Testando normalização...")
+    assert normalize_cpf_cnpj("529.982.247-25") == "52998224725"
+    assert normalize_cpf_cnpj("11.222.333/0001-81") == "11222333000181"
+    assert normalize_cpf_cnpj("123.456.789-00") is None  # dígito verificador errado
+    assert normalize_email("  Ana@Exemplo.COM ") == "ana@exemplo.com"
+    assert normalize_email("ana@") is None
+    assert normalize_plate("abc-1d23") == "ABC1D23" and normalize_plate("ABC 1234") == "ABC1234"
+    assert normalize_plate("AB1234") is None
+    keys = extract_identity_keys("Oi! Meu CPF é 529.982.247-25 e a placa abc-1d23, fone 11988887777")
+    assert keys == {"cpf_cnpj": "52998224725", "vehicle_plate": "ABC1D23"}
+    assert extract_identity_keys("quero cotar um seguro") == {}
+    print("  ✅ Documento, e-mail e placa normalizados")
+
+
+def test_keys_and_lookup():
+    """Testa a manutenção das chaves e a busca do cliente por cada uma delas"""
+    print("\n🧪 Testando busca por CPF/CNPJ, e-mail e placa...")
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = init_db(f"sqlite:///{os.path.join(tmp, 'crm.db')}")
+        db = get_session(engine)
+        first = Lead(whatsapp_number="5511988880001", name="Ana", cpf_cnpj="529.982.247-25",
+                     email="Ana@Exemplo.com", vehicle_plate="abc-1d23")
+        db.add(first)
+        db.commit()
+        assert (first.cpf_cnpj_key, first.email_key) == ("52998224725", "ana@exemplo.com")
+        assert first.attribute_record.plate_key == "ABC1D23"
+        first.email = "ana.silva@exemplo.com"
+        db.commit()
+        assert first.email_key == "ana.silva@exemplo.com"
+
+        assert LeadService.find_existing_customer(db, cpf_cnpj="52998224725").id == first.id
+        assert LeadService.find_existing_customer(db, email="ANA.SILVA@exemplo.com").id == first.id
+        assert LeadService.find_existing_customer(db, vehicle_plate="ABC1D23").id == first.id
+        assert LeadService.find_existing_customer(db, email="ana@exemplo.com") is None
+        assert LeadService.find_existing_customer(db, exclude_id=first.id, cpf_cnpj="52998224725") is None
+
+        # Mesmo cliente chegando por e-mail: ligado ao lead do WhatsApp
+        other = Lead(whatsapp_number="email_0123456789abcd", email="outro@exemplo.com", cpf_cnpj="52998224725")
+        db.add(other)
+        db.flush()
+        assert LeadService.resolve_customer(db, other).id == first.id
+        db.commit()
+        assert (other.linked_lead_id, other.customer_type, other.name) == (first.id, "existente", "Ana")
+        # O primeiro lead da pessoa não é ligado a si mesmo
+        assert LeadService.resolve_customer(db, first) is None and first.linked_lead_id is None
+        db.close()
+
+        RetentionService.forget_lead(engine, lead_id=first.id)
+        db = get_session(engine)
+        assert db.get(Lead, other.id).linked_lead_id is None
+        db.close()
+        engine.dispose()
+    print("  ✅ Chaves mantidas no ORM e cliente achado pelo índice")
+
+
+def test_async_resolve():
+    """Testa o reconhecimento do cliente pela sessão assíncrona do webhook"""
+    print("\n🧪 Testando reconhecimento no webhook...")
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'crm.db')}"
+        engine = init_db(url)
+        db = get_session(engine)
+        customer = Lead(whatsapp_number="5511988880010", name="Bruno", email="bruno@exemplo.com",
+                        vehicle_plate="XYZ9A87")
+        db.add(customer)
+        db.commit()
+        customer_id = customer.id
+        db.close()
+
+        async def scenario():
+            async_engine = build_async_engine(url)
+            factory = get_async_session_factory(async_engine)
+            try:
+                async with factory() as db:
+                    lead = await AsyncLeadService.create_or_get_lead(db, "5521977770000")
+                    keys = extract_identity_keys("minha placa é XYZ-9A87")
+                    found = await AsyncLeadService.resolve_customer(db, lead, **keys)
+                    await db.commit()
+                    return found.id, lead.linked_lead_id, lead.name, lead.email
+            finally:
+                await async_engine.dispose()
+
+        assert asyncio.run(scenario()) == (customer_id, customer_id, "Bruno", "bruno@exemplo.com")
+        engine.dispose()
+    print("  ✅ Cliente reconhecido pela placa, com nome e e-mail já preenchidos")
+
+
+class LockProbeAI:
+    """IA falsa: a extração traz o CPF; a resposta verifica se o banco está livre para gravação"""
+
+    def __init__(self, path):
+        self.path = path
+        self.database_free = None
+
+    def extract_lead_data_from_conversation(self, conversation, flow_type):
+        return {"cpf_cnpj": "529.982.247-25"}
+
+    def get_response(self, **kwargs):
+        conn = sqlite3.connect(self.path, timeout=0)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.rollback()
+            self.database_free = True
+        except sqlite3.OperationalError:
+            self.database_free = False
+        finally:
+            conn.close()
+        return "Obrigado, Ana!"
+
+
+class SilentEvolution:
+    async def send_message(self, *args, **kwargs):
+        return None
+
+
+def test_webhook_lookup_outside_llm_call():
+    """Testa que o reconhecimento após a extração não deixa transação aberta durante a IA"""
+    print("\n🧪 Testando reconhecimento sem segurar o lock de escrita...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "crm.db")
+        url = f"sqlite:///{path}"
+        engine = init_db(url)
+        db = get_session(engine)
+        customer = Lead(whatsapp_number="5511988880030", name="Ana", cpf_cnpj="52998224725")
+        lead = Lead(whatsapp_number="5511988880031", flow_step="seguro_auto", flow_type="seguro_auto")
+        db.add_all([customer, lead])
+        db.commit()
+        customer_id, lead_id = customer.id, lead.id
+        db.close()
+
+        ai = LockProbeAI(path)
+        originals = {name: getattr(evolution_webhook, name)
+                     for name in ("engine", "async_engine", "get_ai_service",
+                                  "get_evolution_service", "get_qualification_engine")}
+
+        async def scenario():
+            evolution_webhook.async_engine = build_async_engine(url)
+            try:
+                await evolution_webhook.process_message("5511988880031", "pode usar o documento que mandei")
+            finally:
+                await evolution_webhook.async_engine.dispose()
+
+        evolution_webhook.engine = engine
+        evolution_webhook.get_ai_service = lambda: ai
+        evolution_webhook.get_evolution_service = SilentEvolution
+        evolution_webhook.get_qualification_engine = lambda: None
+        lead_cache.invalidate("5511988880031")
+        try:
+            asyncio.run(scenario())
+        finally:
+            for name, value in originals.items():
+                setattr(evolution_webhook, name, value)
+            lead_cache.invalidate("5511988880031")
+
+        db = get_session(engine)
+        saved = db.get(Lead, lead_id)
+        assert ai.database_free is True
+        assert (saved.linked_lead_id, saved.name) == (customer_id, "Ana")
+        db.close()
+        engine.dispose()
+    print("  ✅ Nenhuma transação aberta durante get_response; cliente ligado no commit 2")
+
+
+def test_backfill_existing_database():
+    """Testa o preenchimento das chaves em um banco anterior às colunas"""
+    print("\n🧪 Testando preenchimento das chaves...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "crm.db")
+        engine = init_db(f"sqlite:///{path}")
+        engine.dispose()
+        conn = sqlite3.connect(path)
+        conn.executemany(
+            "INSERT INTO leads (whatsapp_number, canonical_number, cpf_cnpj, email, status, version) "
+            "VALUES (?, ?, ?, ?, 'novo', 1)",
+            [("5511988880020", "5511988880020", "11.222.333/0001-81", "Loja@Exemplo.com"),
+             ("5511988880021", "5511988880021", "000", None)]
+        )
+        conn.execute("INSERT INTO lead_attributes (lead_id, data) VALUES (1, '{\"vehicle_plate\": \"def-4567\"}')")
+        conn.commit()
+        conn.close()
+
+        engine = init_db(f"sqlite:///{path}")
+        db = get_session(engine)
+        assert LeadService.find_existing_customer(db, cpf_cnpj="11222333000181").id == 1
+        assert LeadService.find_existing_customer(db, email="loja@exemplo.com").id == 1
+        assert LeadService.find_existing_customer(db, vehicle_plate="DEF4567").id == 1
+        assert db.get(Lead, 2).cpf_cnpj_key is None
+        assert db.query(LeadAttributes).one().plate_key == "DEF4567"
+        db.close()
+        engine.dispose()
+    print("  ✅ Chaves preenchidas na inicialização")
+
+
+if __name__ == "__main__":
+    test_normalization()
+    test_keys_and_lookup()
+    test_async_resolve()
+    test_webhook_lookup_outside_llm_call()
+    test_backfill_existing_database()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
@@ -0,0 +1,115 @@
+"""
+Testes do engine compartilhado, da fábrica de sessões e das métricas do pool
+"""
+import os
+import tempfile
+import threading
+from sqlalchemy import text, event
+from sqlalchemy.pool import StaticPool
+from app.database.connection import (
+    get_engine, get_session, get_session_factory, session_scope, get_pool_status, TimedQueuePool,
+    write_session_scope
+)
+from app.database.models import init_db, Lead
+
+
+def test_one_engine_per_url():
+    """Testa que o engine e a fábrica de sessões são criados uma vez só"""
+    print("\n🧪 Testando engine único por processo...")
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'crm.db')}"
+        engine = init_db(url)
+
+        assert get_engine(url) is engine
+        assert init_db(url) is engine
+        assert get_session_factory(engine) is get_session_factory(engine)
+        assert isinstance(engine.pool, TimedQueuePool)
+        engine.dispose()
+    print("  ✅ Mesmo engine e mesma fábrica de sessões")
+
+
+def test_memory_sqlite_uses_static_pool():
+    """Testa que SQLite em memória compartilha uma única conexão"""
+    engine = init_db("sqlite://")
+    assert isinstance(engine.pool, StaticPool)
+
+    db = get_session(engine)
+    db.add(Lead(whatsapp_number="5511900000001"))
+    db.commit()
+    db.close()
+
+    other = get_session(engine)
+    assert other.query(Lead).count() == 1
+    other.close()
+    print("  ✅ SQLite em memória com StaticPool")
+
+
+def test_session_scope_and_pool_metrics():
+    """Testa commit/rollback do session_scope e as métricas de checkout"""
+    print("\n🧪 Testando session_scope e métricas do pool...")
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'crm.db')}"
+        engine = init_db(url)
+
+        with session_scope(engine) as db:
+            db.add(Lead(whatsapp_number="5511900000002"))
+
+        try:
+            with session_scope(engine) as db:
+                db.add(Lead(whatsapp_number="5511900000003"))
+                db.flush()
+                raise RuntimeError("falha simulada")
+        except RuntimeError:
+            pass
+
+        with engine.connect() as conn:
+            count = conn.execute(text("SELECT COUNT(*) FROM leads")).scalar()
+        assert count == 1
+
+        status = get_pool_status(engine)
+        print(f"  📊 {status}")
+        assert status["checkouts"] >= 3
+        assert status["checked_out"] == 0
+        assert status["timeouts"] == 0
+        engine.dispose()
+    print("  ✅ Commit, rollback e métricas do pool")
+
+
+def test_sqlite_pragma_profile():
+    """Testa os PRAGMAs de produção e o BEGIN IMMEDIATE das escritas"""
+    print("\n🧪 Testando perfil de PRAGMAs do SQLite...")
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = init_db(f"sqlite:///{os.path.join(tmp, 'crm.db')}")
+        statements = []
+        event.listen(engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+
+        with engine.connect() as conn:
+            assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+            assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+            assert conn.execute(text("PRAGMA temp_store")).scalar() == 2  # MEMORY
+            assert conn.execute(text("PRAGMA busy_timeout")).scalar() > 0
+
+        def write(position):
+            with write_session_scope(engine) as db:
+                db.add(Lead(whatsapp_number=f"55119000000{position:02d}"))
+
+        threads = [threading.Thread(target=write, args=(i,)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        with session_scope(engine) as db:
+            assert db.query(Lead).count() == 10
+        assert statements.count("BEGIN IMMEDIATE") == 10
+        engine.dispose()
+    print("  ✅ WAL, synchronous=NORMAL e escritas com BEGIN IMMEDIATE")
+
+
+if __name__ == "__main__":
+    test_one_engine_per_url()
+    test_memory_sqlite_uses_static_pool()
+    test_session_scope_and_pool_metrics()
+    test_sqlite_pragma_profile()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
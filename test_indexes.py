@@ -0,0 +1,77 @@
+"""
+Testes dos índices: as consultas frequentes usam índice em vez de varredura
+"""
+from sqlalchemy import create_engine, inspect, text
+from app.database.models import Base, ensure_indexes
+
+# Consultas do webhook, da API e do dashboard (como o SQLAlchemy as gera)
+HOT_QUERIES = {
+    "histórico da conversa": (
+        "SELECT * FROM chat_messages WHERE whatsapp_number = '5511999999999' "
+        "ORDER BY created_at DESC LIMIT 50"
+    ),
+    "mensagens do lead": "SELECT * FROM chat_messages WHERE lead_id = 1 ORDER BY created_at",
+    "leads por status e data": "SELECT * FROM leads WHERE status = 'novo' ORDER BY created_at DESC",
+    "leads qualificados": "SELECT * FROM leads WHERE status = 'qualificado' ORDER BY qualified_at DESC",
+    "deduplicação por e-mail": "SELECT * FROM leads WHERE email_key = 'cliente@email.com' LIMIT 1",
+    "cliente pelo CPF/CNPJ": "SELECT * FROM leads WHERE cpf_cnpj_key = '52998224725' ORDER BY id LIMIT 1",
+    "cliente pela placa": (
+        "SELECT leads.* FROM leads JOIN lead_attributes ON lead_attributes.lead_id = leads.id "
+        "WHERE lead_attributes.plate_key = 'ABC1D23' ORDER BY leads.id LIMIT 1"
+    ),
+    "filtro por tipo de cliente": (
+        "SELECT * FROM leads WHERE customer_type IN ('novo', 'existente') ORDER BY created_at DESC"
+    ),
+}
+
+
+def _query_plan(engine, sql: str) -> str:
+    with engine.connect() as conn:
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+    return " | ".join(row[-1] for row in rows)
+
+
+def test_hot_queries_use_indexes():
+    """Testa que cada consulta frequente usa índice"""
+    print("\n🧪 Testando planos de consulta...")
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+
+    for name, sql in HOT_QUERIES.items():
+        plan = _query_plan(engine, sql)
+        # SEARCH = busca pela chave do índice; SCAN = varredura da tabela inteira
+        assert plan.startswith("SEARCH") and "INDEX" in plan, f"{name}: {plan}"
+        print(f"  ✅ {name}: {plan}")
+
+    # Com o índice composto o ORDER BY sai pronto, sem ordenação temporária
+    for name in ("histórico da conversa", "mensagens do lead", "leads qualificados"):
+        plan = _query_plan(engine, HOT_QUERIES[name])
+        assert "TEMP B-TREE" not in plan, f"{name}: {plan}"
+    print("  ✅ Histórico e listagens sem ordenação temporária")
+    engine.dispose()
+
+
+def test_ensure_indexes_on_existing_database():
+    """Testa a criação dos índices novos em um banco criado antes deles"""
+    print("\n🧪 Testando migração de índices...")
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_chat_messages_number_created_at"))
+        conn.execute(text("DROP INDEX ix_leads_email_key"))
+        conn.execute(text("CREATE INDEX ix_leads_email ON leads (email)"))  # índice antigo
+
+    created = ensure_indexes(engine)
+    assert sorted(created) == ["ix_chat_messages_number_created_at", "ix_leads_email_key"]
+    assert "ix_leads_email" not in {index["name"] for index in inspect(engine).get_indexes("leads")}
+    names = {index["name"] for index in inspect(engine).get_indexes("chat_messages")}
+    assert "ix_chat_messages_number_created_at" in names
+    assert ensure_indexes(engine) == []
+    print(f"  ✅ Índices recriados: {', '.join(created)}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    test_hot_queries_use_indexes()
+    test_ensure_indexes_on_existing_database()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
@@ -0,0 +1,143 @@
+"""
+Testes do classificador local de intenção
+"""
+import os
+import tempfile
+import time
+from app.core.intent_classifier import IntentClassifier, SEED_EXAMPLES, build_training_set
+from app.core.flow_manager import FlowManager
+from app.database.models import init_db, get_session, Lead, ChatMessage
+from config.settings import settings
+
+
+def _train_seed_model():
+    texts, labels = [], []
+    for label, examples in SEED_EXAMPLES.items():
+        texts.extend(examples)
+        labels.extend([label] * len(examples))
+    return IntentClassifier().fit(texts, labels)
+
+
+def test_predicts_free_text_intents():
+    """Testa frases livres que as palavras-chave não reconhecem"""
+    print("\n🧪 Testando classificação de texto livre...")
+    model = _train_seed_model()
+
+    tests = [
+        ("queria fazer seguro pro meu apartamento", "seguro_residencial"),
+        ("tenho interesse num consórcio de imóvel", "consorcio"),
+        ("preciso falar com alguém", "falar_humano"),
+        ("bom dia", "menu_principal"),
+    ]
+
+    for input_msg, expected in tests:
+        label, confidence = model.predict(input_msg)
+        status = "✅" if label == expected else "❌"
+        print(f"  {status} '{input_msg}' → {label} ({confidence:.2f}) (esperado: {expected})")
+        assert label == expected
+
+
+def test_allowed_labels_restrict_prediction():
+    """Testa a restrição aos tipos de seguro na etapa escolher_seguro"""
+    print("\n🧪 Testando restrição de rótulos...")
+    model = _train_seed_model()
+    allowed = ["seguro_auto", "seguro_residencial", "seguro_vida", "seguro_empresarial"]
+
+    label, confidence = model.predict("bati o carro", allowed=allowed)
+    print(f"  'bati o carro' → {label} ({confidence:.2f})")
+    assert label in allowed
+
+
+def test_out_of_domain_message_not_resolved():
+    """Testa que um sinistro na etapa escolher_seguro não vira tipo de seguro pela restrição"""
+    print("\n🧪 Testando mensagem fora dos rótulos permitidos...")
+    model = _train_seed_model()
+    allowed = ["seguro_auto", "seguro_residencial", "seguro_vida", "seguro_empresarial"]
+    overall = model.predict_proba("meu carro")
+
+    label, confidence = model.predict("meu carro", allowed=allowed)
+    assert confidence == overall[label] < overall["sinistro"]
+
+    original = settings.INTENT_MODEL_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        settings.INTENT_MODEL_PATH = os.path.join(tmp, "intent_model.npz")
+        model.save(settings.INTENT_MODEL_PATH)
+        try:
+            for message in ["meu carro", "bati o carro"]:
+                assert FlowManager().classify_intent(message, allowed=allowed, threshold=0.75) is None
+        finally:
+            settings.INTENT_MODEL_PATH = original
+    print(f"  ✅ 'meu carro' → {label} com {confidence:.2f} sobre todos os rótulos; fica para a IA")
+
+
+def test_save_and_load_roundtrip():
+    """Testa persistência do modelo"""
+    print("\n🧪 Testando salvar/carregar modelo...")
+    model = _train_seed_model()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "intent_model.npz")
+        model.save(path)
+        loaded = IntentClassifier.load(path)
+
+    original = model.predict_proba("seguro da minha casa")
+    restored = loaded.predict_proba("seguro da minha casa")
+    assert original.keys() == restored.keys()
+    for label in original:
+        assert abs(original[label] - restored[label]) < 1e-5
+    print("  ✅ Probabilidades preservadas")
+
+
+def test_inference_latency():
+    """Testa que a inferência fica abaixo de 1 ms"""
+    print("\n🧪 Testando latência de inferência...")
+    model = _train_seed_model()
+    runs = 500
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        model.predict("queria fazer seguro pro meu apartamento")
+    elapsed_ms = (time.perf_counter() - start) / runs * 1000
+
+    print(f"  ⚡ {elapsed_ms:.3f} ms por mensagem")
+    assert elapsed_ms < 1.0
+
+
+def test_training_set_skips_greetings():
+    """Testa que saudações e respostas da coleta não são rotuladas com o fluxo do lead"""
+    print("\n🧪 Testando conjunto de treino do histórico...")
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = init_db(f"sqlite:///{os.path.join(tmp, 'crm.db')}")
+        db = get_session(engine)
+        by_text = Lead(whatsapp_number="5511999990201", flow_type="seguro_residencial")
+        by_number = Lead(whatsapp_number="5511999990202", flow_type="seguro_auto")
+        db.add_all([by_text, by_number])
+        db.flush()
+        conversations = [
+            (by_text, ["oi", "Bom dia!", "quero informação", "queria proteger meu apê", "Rua A, 10"]),
+            (by_number, ["olá", "1", "Gol 2015"]),
+        ]
+        for lead, messages in conversations:
+            for message in messages:
+                db.add(ChatMessage(lead_id=lead.id, whatsapp_number=lead.whatsapp_number,
+                                   sender="user", message=message, role="user"))
+        db.commit()
+
+        texts, labels = build_training_set(db)
+        db.close()
+        engine.dispose()
+
+    seeds = sum(len(examples) for examples in SEED_EXAMPLES.values())
+    history = list(zip(texts, labels))[seeds:]
+    assert history == [("queria proteger meu apê", "seguro_residencial")]
+    print("  ✅ Só a mensagem que escolheu o fluxo entra no treino")
+
+
+if __name__ == "__main__":
+    test_predicts_free_text_intents()
+    test_allowed_labels_restrict_prediction()
+    test_out_of_domain_message_not_resolved()
+    test_save_and_load_roundtrip()
+    test_inference_latency()
+    test_training_set_skips_greetings()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
@@ -0,0 +1,199 @@
+"""
+Testes dos atributos de fluxo dos leads (tabela lead_attributes)
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+from sqlalchemy import event, inspect
+from app.database.models import init_db, get_session, Lead, LeadAttributes, coerce_attribute, legacy_attribute_columns
+from app.database.connection import build_async_engine, get_async_session_factory
+from app.services.async_database_service import AsyncLeadService
+from app.services.database_service import LeadService
+from app.services.email_reader_service import EmailReaderService
+from app.services.lead_cache import lead_cache
+from config.settings import settings
+from migrate_database import drop_legacy_columns
+
+
+def test_typed_attributes():
+    """Testa a conversão de tipos e o acesso como coluna"""
+    print("\n🧪 Testando atributos tipados...")
+    assert coerce_attribute("has_young_driver", "Sim") is True
+    assert coerce_attribute("has_previous_consortium", 0) is False
+    assert coerce_attribute("consortium_term", 60) == "60"
+    try:
+        coerce_attribute("has_young_driver", "talvez")
+        assert False, "valor inválido deveria falhar"
+    except ValueError:
+        pass
+
+    lead = Lead(whatsapp_number="5511999990110", vehicle_plate="ABC1D23", has_young_driver="não")
+    assert lead.attribute_record.data == {"vehicle_plate": "ABC1D23", "has_young_driver": False}
+    lead.vehicle_plate = None
+    assert lead.attribute_record.data == {"has_young_driver": False} and lead.profession is None
+    print("  ✅ Valores convertidos para o tipo declarado")
+
+
+def test_lazy_load_and_versioning():
+    """Testa que a listagem não lê os atributos e que alterá-los sobe a versão do lead"""
+    print("\n🧪 Testando carga sob demanda...")
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = init_db(f"sqlite:///{os.path.join(tmp, 'crm.db')}")
+        db = get_session(engine)
+        db.add_all([
+            Lead(whatsapp_number=f"55119999901{position:02d}", name=f"Lead {position}",
+                 vehicle_plate=f"ABC{position:04d}", profession="Engenheira")
+            for position in range(20)
+        ])
+        db.commit()
+        db.close()
+
+        statements = []
+        event.listen(engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        db = get_session(engine)
+        leads = db.query(Lead).order_by(Lead.id).all()
+        assert [lead.name for lead in leads][:2] == ["Lead 0", "Lead 1"]
+        assert not any("lead_attributes" in statement for statement in statements)
+
+        # Detalhe do lead: um SELECT a mais, só para ele
+        lead = leads[3]
+        assert lead.vehicle_plate == "ABC0003"
+        assert sum("lead_attributes" in statement for statement in statements) == 1
+
+        lead.profession = "Médica"
+        db.commit()
+        assert lead.version == 2
+        assert [hit["id"] for hit in LeadService.search(db, "medica")["leads"]] == [lead.id]
+        assert LeadService.search(db, "abc0003")["leads"][0]["id"] == lead.id
+        db.close()
+        engine.dispose()
+    print("  ✅ Listagem sem lead_attributes; alteração de atributo versiona o lead e reindexa a busca")
+
+
+def test_async_cache_roundtrip():
+    """Testa o webhook assíncrono: atributos carregados junto e preservados no cache"""
+    print("\n🧪 Testando atributos no cache de estado...")
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'crm.db')}"
+        engine = init_db(url)
+        lead_cache.clear()
+
+        async def scenario():
+            async_engine = build_async_engine(url)
+            factory = get_async_session_factory(async_engine)
+            try:
+                async with factory() as db:
+                    lead = await AsyncLeadService.create_or_get_lead(db, "5511999990130")
+                    lead.consortium_type = "imovel"
+                    await db.commit()
+                    lead_cache.store(lead)
+                async with factory() as db:
+                    cached = await AsyncLeadService.create_or_get_lead(db, "5511999990130")
+                    cached.consortium_value = "300000"
+                    await db.commit()
+                    lead_cache.store(cached)
+                    first = AsyncLeadService.build_lead_dict(cached)
+                lead_cache.clear()
+                async with factory() as db:
+                    loaded = await AsyncLeadService.create_or_get_lead(db, "5511999990130")
+                    second = AsyncLeadService.build_lead_dict(loaded)
+                return first, second, lead_cache.lookup("5511999990130")
+            finally:
+                await async_engine.dispose()
+
+        first, second, state = asyncio.run(scenario())
+        assert first == second
+        assert (second["consortium_type"], second["consortium_value"]) == ("imovel", "300000")
+        assert state is None  # cache limpo antes da última leitura
+        engine.dispose()
+    print("  ✅ Lead do cache e lead do banco trazem os mesmos atributos")
+
+
+def test_legacy_columns_migration():
+    """Testa a cópia das colunas antigas de leads para lead_attributes e a remoção delas"""
+    print("\n🧪 Testando migração das colunas de fluxo...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "crm.db")
+        engine = init_db(f"sqlite:///{path}")
+        engine.dispose()
+        conn = sqlite3.connect(path)
+        # Banco anterior: atributos como colunas de leads
+        for column, kind in (("vehicle_plate", "VARCHAR(10)"), ("has_young_driver", "BOOLEAN"),
+                             ("consortium_type", "VARCHAR(50)")):
+            conn.execute(f"ALTER TABLE leads ADD COLUMN {column} {kind}")
+        conn.executemany(
+            "INSERT INTO leads (whatsapp_number, name, status, vehicle_plate, has_young_driver, consortium_type, version) "
+            "VALUES (?, ?, 'novo', ?, ?, ?, 1)",
+            [("5511999990140", "Gabriel", "XYZ9A87", 1, None),
+             ("5511999990141", "Helena", None, None, "servico"),
+             ("5511999990142", "Igor", None, None, None)]
+        )
+        conn.commit()
+        conn.close()
+
+        engine = init_db(f"sqlite:///{path}")
+        db = get_session(engine)
+        assert db.query(LeadAttributes).count() == 2
+        gabriel = LeadService.get_lead_by_number(db, "5511999990140")
+        assert (gabriel.vehicle_plate, gabriel.has_young_driver) == ("XYZ9A87", True)
+        assert LeadService.get_lead_by_number(db, "5511999990142").attribute_record is None
+        assert [hit["id"] for hit in LeadService.search(db, "xyz9")["leads"]] == [gabriel.id]
+        db.close()
+
+        init_db(f"sqlite:///{path}")  # nova inicialização não copia de novo
+        drop_legacy_columns(engine)
+        assert legacy_attribute_columns(engine) == []
+        assert "vehicle_plate" not in {column["name"] for column in inspect(engine).get_columns("leads")}
+        db = get_session(engine)
+        assert db.query(LeadAttributes).count() == 2
+        assert LeadService.get_lead_by_number(db, "5511999990141").consortium_type == "servico"
+        assert [hit["id"] for hit in LeadService.search(db, "xyz9")["leads"]] == [gabriel.id]
+        db.close()
+        engine.dispose()
+    print("  ✅ Atributos copiados uma vez, busca reindexada e colunas antigas removidas")
+
+
+class ExtractingAI:
+    """IA falsa da leitura de e-mails: devolve um booleano inválido junto com campos válidos"""
+
+    def extract_lead_data_from_conversation(self, conversation, flow_type):
+        return {"vehicle_plate": "ABC1D23", "has_young_driver": "não informado", "cpf_cnpj": "null"}
+
+
+def test_email_reader_skips_invalid_attribute():
+    """Testa que um atributo inválido extraído do e-mail é ignorado sem perder o lead"""
+    print("\n🧪 Testando atributo inválido na leitura de e-mails...")
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = init_db(f"sqlite:///{os.path.join(tmp, 'crm.db')}")
+        db = get_session(engine)
+        reader = EmailReaderService.__new__(EmailReaderService)
+        reader.db = db
+        reader.ai_service = ExtractingAI()
+        admin = settings.ADMIN_WHATSAPP
+        settings.ADMIN_WHATSAPP = ""
+        try:
+            processed = asyncio.run(reader.process_insurance_email(
+                "Paula", "paula@exemplo.com", "Cotação", "Quero cotar o seguro do meu carro"
+            ))
+        finally:
+            settings.ADMIN_WHATSAPP = admin
+        db.close()
+
+        db = get_session(engine)
+        lead = db.query(Lead).one()
+        assert processed is True
+        assert (lead.email, lead.vehicle_plate, lead.has_young_driver) == ("paula@exemplo.com", "ABC1D23", None)
+        db.close()
+        engine.dispose()
+    print("  ✅ Lead criado com os campos válidos; booleano inválido ignorado")
+
+
+if __name__ == "__main__":
+    test_typed_attributes()
+    test_lazy_load_and_versioning()
+    test_async_cache_roundtrip()
+    test_legacy_columns_migration()
+    test_email_reader_skips_invalid_attribute()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
@@ -0,0 +1,120 @@
+"""
+Testes do cache de estado dos leads (LRU, write-through e versão)
+"""
+import asyncio
+import os
+import tempfile
+from sqlalchemy import event
+from app.database.connection import build_async_engine, get_async_session_factory
+from app.database.models import init_db, get_session, ensure_columns, Lead
+from app.services.async_database_service import AsyncLeadService, AsyncMessageService
+from app.services.database_service import LeadService
+from app.services.lead_cache import LeadStateCache, LeadState, lead_cache
+
+
+def test_lru_bounds():
+    """Testa o limite de entradas e a ordem de descarte"""
+    print("\n🧪 Testando LRU...")
+    cache = LeadStateCache(max_entries=2)
+    for position in range(3):
+        cache.store(Lead(id=position + 1, whatsapp_number=f"551190000000{position}", version=1))
+    assert cache.lookup("5511900000000") is None
+    assert cache.lookup("5511900000002") is not None
+    assert cache.stats()["entries"] == 2
+    try:
+        cache.lookup("5511900000002").status = "x"
+        assert False, "LeadState deveria ser somente leitura"
+    except AttributeError:
+        pass
+    assert not hasattr(LeadState.from_lead(Lead(id=1, whatsapp_number="1")), "__dict__")
+    print("  ✅ Limite respeitado, entradas imutáveis e sem __dict__")
+
+
+async def _conversation(url: str, statements: list):
+    engine = build_async_engine(url)
+    event.listen(engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+    factory = get_async_session_factory(engine)
+    number = "5511999990030"
+
+    async with factory() as db:
+        lead = await AsyncLeadService.create_or_get_lead(db, number, commit=False)
+        await AsyncLeadService.update_lead(db, lead, commit=False, flow_step="seguro_auto")
+        await db.commit()
+        lead_cache.store(lead)
+
+    # Segunda mensagem: só a versão é lida do banco
+    statements.clear()
+    async with factory() as db:
+        lead = await AsyncLeadService.create_or_get_lead(db, number, commit=False)
+        assert lead.flow_step == "seguro_auto"
+        await AsyncMessageService.save_message(db, number, "user", "oi", lead_id=lead.id, commit=False)
+        await AsyncLeadService.update_lead(db, lead, commit=False, name="Maria")
+        await db.commit()
+        lead_cache.store(lead)
+    selects = [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+    hot_selects = list(selects)
+
+    # Outro processo (dashboard) grava direto no banco: a versão muda
+    db = get_session(init_db(url.replace("+aiosqlite", "")))
+    other = db.query(Lead).filter(Lead.whatsapp_number == number).first()
+    other.status = "em_atendimento"
+    db.commit()
+    db.close()
+
+    async with factory() as db:
+        lead = await AsyncLeadService.create_or_get_lead(db, number, commit=False)
+        status, name, version = lead.status, lead.name, lead.version
+
+    await engine.dispose()
+    return hot_selects, status, name, version
+
+
+def test_write_through_and_version():
+    """Testa o acerto no cache e a invalidação por escrita de outro processo"""
+    print("\n🧪 Testando cache write-through com versão...")
+    lead_cache.clear()
+    statements = []
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'crm.db')}"
+        init_db(url)
+        hot_selects, status, name, version = asyncio.run(_conversation(url, statements))
+
+    assert len(hot_selects) == 1 and "version" in hot_selects[0] and "flow_step" not in hot_selects[0]
+    print(f"  ✅ Lead em cache: só a versão é lida ({hot_selects[0].split()[1]})")
+    assert status == "em_atendimento" and name == "Maria"
+    assert version == 4
+    stats = lead_cache.stats()
+    assert stats["hits"] == 1 and stats["stale"] == 1
+    print(f"  ✅ Escrita externa detectada pela versão: {stats}")
+
+
+def test_ensure_columns_adds_version():
+    """Testa a inclusão da coluna version em banco criado antes dela"""
+    print("\n🧪 Testando migração da coluna version...")
+    import sqlite3
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "old.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE leads (id INTEGER PRIMARY KEY, whatsapp_number VARCHAR(20))")
+        conn.execute("INSERT INTO leads (whatsapp_number) VALUES ('5511999990040')")
+        conn.commit()
+        conn.close()
+
+        engine = init_db(f"sqlite:///{path}")
+        assert "leads.version" not in ensure_columns(engine)  # já adicionada pelo init_db
+        db = get_session(engine)
+        lead = db.query(Lead).first()
+        assert lead.version == 1
+        LeadService.update_lead(db, lead, name="João")
+        assert lead.version == 2
+        db.close()
+        engine.dispose()
+    print("  ✅ Coluna adicionada com valor padrão e incrementada no UPDATE")
+
+
+if __name__ == "__main__":
+    test_lru_bounds()
+    test_write_through_and_version()
+    test_ensure_columns_adds_version()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
@@ -0,0 +1,149 @@
+"""
+Testes do controle de concorrência otimista dos leads
+"""
+import asyncio
+import os
+import tempfile
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm.exc import StaleDataError
+from app.database.models import init_db, get_session, Lead, ChatMessage
+from app.database.connection import build_async_engine, get_async_session_factory
+from app.services.async_database_service import AsyncLeadService, AsyncMessageService
+from app.services.database_service import LeadService, merge_lead_changes
+from app.services.lead_cache import lead_cache
+from app.webhooks import evolution_webhook
+
+
+class JsonRequest:
+    """Corpo JSON de uma requisição (o que as rotas leem de Request)"""
+
+    def __init__(self, data):
+        self.data = data
+
+    async def json(self):
+        return self.data
+
+
+def test_version_check_and_transitions():
+    """Testa o StaleDataError e as transições condicionais"""
+    print("\n🧪 Testando versão e transições...")
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = init_db(f"sqlite:///{os.path.join(tmp, 'crm.db')}")
+        db = get_session(engine)
+        lead = Lead(whatsapp_number="5511999990100", status="qualificado")
+        db.add(lead)
+        db.commit()
+        assert lead.version == 1
+
+        other = get_session(engine)
+        same = other.get(Lead, lead.id)
+        same.name = "Carla"
+        other.commit()
+        assert same.version == 2
+
+        lead.profession = "Engenheira"
+        try:
+            db.commit()
+            assert False, "a gravação sobre versão antiga deveria falhar"
+        except StaleDataError:
+            db.rollback()
+
+        # Dois atendentes clicam em "Assumir": só um consegue
+        first = LeadService.transition(db, lead.id, "claim", attended_by="Atendente A")
+        second = LeadService.transition(other, lead.id, "claim", attended_by="Atendente B")
+        assert first == {"whatsapp_number": "5511999990100", "status": "em_atendimento"}
+        assert second is None
+        assert LeadService.transition(db, lead.id, "finish")["status"] == "finalizado"
+        assert LeadService.transition(db, lead.id, "lose") is None
+        assert LeadService.transition(db, 999, None, status_ia=0) is None
+
+        db.expire_all()
+        fresh = db.get(Lead, lead.id)
+        assert (fresh.status, fresh.attended_by, fresh.version) == ("finalizado", "Atendente A", 4)
+        db.close()
+        other.close()
+        engine.dispose()
+    print("  ✅ Gravação sobre versão antiga recusada; um só atendente assume")
+
+
+def test_merge_keeps_attendant_decision():
+    """Testa a fusão: campos do webhook seguem, a qualificação não sobrescreve o atendente"""
+    print("\n🧪 Testando fusão de alterações...")
+    lead = Lead(status="em_atendimento", attended_by="Atendente A", name=None)
+    applied = merge_lead_changes(lead, {
+        "name": "Daniel", "status": "qualificado", "status_ia": 0, "attended_by": "IA", "qualification_score": 100
+    })
+    assert applied == {"name": "Daniel"}
+    assert (lead.name, lead.status, lead.attended_by) == ("Daniel", "em_atendimento", "Atendente A")
+
+    lead = Lead(status="novo")
+    applied = merge_lead_changes(lead, {"status": "qualificado", "attended_by": "IA"})
+    assert applied == {"status": "qualificado", "attended_by": "IA"} and lead.status == "qualificado"
+    print("  ✅ Status só muda se a transição ainda vale")
+
+
+def test_webhook_retry_and_routes():
+    """Testa o commit com nova tentativa do webhook e as rotas com UPDATE condicional"""
+    print("\n🧪 Testando nova tentativa do webhook...")
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'crm.db')}"
+        engine = init_db(url)
+        lead_cache.clear()
+
+        async def scenario():
+            async_engine = build_async_engine(url)
+            factory = get_async_session_factory(async_engine)
+            try:
+                async with factory() as db:
+                    lead = await AsyncLeadService.create_or_get_lead(db, "5511999990101")
+                    lead_id = lead.id
+
+                    # Resposta lenta da IA: o webhook altera o lead em memória...
+                    lead.name = "Eduarda"
+                    await AsyncLeadService.mark_qualified(db, lead, commit=False)
+
+                    # ...enquanto um atendente assume pelo dashboard
+                    sync_db = get_session(engine)
+                    assert LeadService.transition(sync_db, lead_id, "qualify") is not None
+                    assert LeadService.transition(sync_db, lead_id, "claim", attended_by="Atendente B")
+                    sync_db.close()
+
+                    attempts = []
+
+                    async def add_message():
+                        attempts.append(1)
+                        await AsyncMessageService.save_message(
+                            db, "5511999990101", "ai", "Obrigado!", role="assistant", lead_id=lead_id, commit=False
+                        )
+
+                    lead = await evolution_webhook.commit_with_merge(db, lead, add_message)
+                    result = (lead.name, lead.status, lead.attended_by, len(attempts))
+
+                async with factory() as db:
+                    closed = await evolution_webhook.close_conversation(lead_id, JsonRequest({"success": True}), db=db)
+                async with factory() as db:
+                    try:
+                        await evolution_webhook.close_conversation(lead_id, JsonRequest({"success": False}), db=db)
+                        conflict = None
+                    except HTTPException as e:
+                        conflict = e.status_code
+                async with factory() as db:
+                    messages = (await db.execute(select(ChatMessage).where(ChatMessage.lead_id == lead_id))).scalars().all()
+                return result, closed, conflict, len(messages)
+            finally:
+                await async_engine.dispose()
+
+        (name, status, attended_by, attempts), closed, conflict, saved = asyncio.run(scenario())
+        assert (name, status, attended_by) == ("Eduarda", "em_atendimento", "Atendente B")
+        assert attempts == 2 and saved == 1
+        assert closed["message"].endswith("convertido") and conflict == 409
+        engine.dispose()
+    print("  ✅ Nova tentativa reaplicou o nome sem desfazer o atendente; encerrar duas vezes → 409")
+
+
+if __name__ == "__main__":
+    test_version_check_and_transitions()
+    test_merge_keeps_attendant_decision()
+    test_webhook_retry_and_routes()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
@@ -0,0 +1,112 @@
+"""
+Testes do registro de eventos dos leads (lead_events)
+"""
+import asyncio
+import os
+import tempfile
+from app.database.models import init_db, get_session, Lead, LeadEvent
+from app.database.connection import build_async_engine, get_async_session_factory
+from app.services.async_database_service import AsyncLeadService
+from app.services.database_service import LeadService
+from app.services.lead_events import LeadEventService
+from app.services.lead_merge import LeadMergeService
+
+
+def _kinds(page: dict) -> list:
+    return [(event["event_type"], event["from_value"], event["to_value"]) for event in page["events"]]
+
+
+def test_events_follow_transitions():
+    """Testa os eventos de criação, etapa, qualificação, atendimento e encerramento"""
+    print("\n🧪 Testando eventos das transições...")
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = init_db(f"sqlite:///{os.path.join(tmp, 'crm.db')}")
+        db = get_session(engine)
+        lead = LeadService.create_or_get_lead(db, "5511988886001")
+        LeadService.update_lead(db, lead, flow_step="seguro_auto", flow_type="seguro_auto")
+        LeadService.update_lead(db, lead, name="Carla")  # sem mudança de estado: sem evento
+        LeadService.mark_qualified(db, lead)
+        LeadService.transition(db, lead.id, "claim", attended_by="Atendente A")
+        assert LeadService.transition(db, lead.id, "claim", attended_by="Atendente B") is None
+        LeadService.transition(db, lead.id, "finish")
+
+        page = LeadEventService.events_since(db)
+        assert _kinds(page) == [
+            ("created", None, "novo"),
+            ("flow_step", "menu_principal", "seguro_auto"),
+            ("status", "novo", "qualificado"),
+            ("status", None, "em_atendimento"),
+            ("status", None, "finalizado"),
+        ]
+        assert page["events"][3]["data"] == {"transition": "claim", "attended_by": "Atendente A"}
+        ids = [event["id"] for event in page["events"]]
+        assert ids == sorted(ids) and page["last_seq"] == ids[-1]
+
+        # Consumidor incremental: só o que veio depois do último lido
+        assert LeadEventService.events_since(db, since=page["last_seq"]) == {"events": [], "last_seq": ids[-1]}
+        second = LeadEventService.events_since(db, since=ids[1], limit=2)
+        assert [event["id"] for event in second["events"]] == ids[2:4] and second["last_seq"] == ids[3]
+        assert len(LeadEventService.events_since(db, event_types=["status"])["events"]) == 3
+        db.close()
+        engine.dispose()
+    print("  ✅ Um evento por transição, em ordem de sequência")
+
+
+def test_events_rollback_and_sequence():
+    """Testa que o evento some com a transação desfeita e que a sequência não volta"""
+    print("\n🧪 Testando atomicidade e sequência...")
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = init_db(f"sqlite:///{os.path.join(tmp, 'crm.db')}")
+        db = get_session(engine)
+        lead = LeadService.create_or_get_lead(db, "5511988886002")
+        lead.status = "qualificado"
+        db.flush()
+        db.rollback()
+        assert [event.event_type for event in db.query(LeadEvent)] == ["created"]
+
+        last = db.query(LeadEvent).one().id
+        db.query(LeadEvent).delete()
+        db.commit()
+        LeadService.update_lead(db, lead, flow_step="consorcio")
+        assert db.query(LeadEvent).one().id > last  # AUTOINCREMENT: id não reaproveitado
+        db.close()
+        engine.dispose()
+    print("  ✅ Evento gravado junto com a mudança e sequência sempre crescente")
+
+
+def test_merge_and_async_reader():
+    """Testa os eventos da fusão de duplicados e a leitura pela sessão assíncrona"""
+    print("\n🧪 Testando eventos da fusão e leitura assíncrona...")
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'crm.db')}"
+        engine = init_db(url)
+        db = get_session(engine)
+        db.add_all([Lead(whatsapp_number="551188886003"), Lead(whatsapp_number="5511988886003")])
+        db.commit()
+        since = LeadEventService.events_since(db)["last_seq"]
+        db.close()
+
+        report = LeadMergeService.merge_group("5511988886003", engine)
+
+        async def read():
+            async_engine = build_async_engine(url)
+            factory = get_async_session_factory(async_engine)
+            try:
+                async with factory() as session:
+                    return await AsyncLeadService.get_events(session, since=since)
+            finally:
+                await async_engine.dispose()
+
+        page = asyncio.run(read())
+        assert sorted(event["event_type"] for event in page["events"]) == ["deleted", "merged"]
+        merged = next(event for event in page["events"] if event["event_type"] == "merged")
+        assert merged["lead_id"] == report["kept"] and merged["data"] == {"merged": report["merged"]}
+        engine.dispose()
+    print("  ✅ Fusão registrada e lida de forma incremental")
+
+
+if __name__ == "__main__":
+    test_events_follow_transitions()
+    test_events_rollback_and_sequence()
+    test_merge_and_async_reader()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
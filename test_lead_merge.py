@@ -0,0 +1,149 @@
+"""
+Testes do número canônico dos leads e da fusão de duplicados
+"""
+import os
+import sqlite3
+import tempfile
+from app.core.utils import canonical_whatsapp_number
+from app.database.models import init_db, get_session, ChatMessage, Lead, LeadAttributes, QualificationField
+from app.services.database_service import LeadService, MessageService
+from app.services.lead_cache import lead_cache
+from app.services.lead_merge import LeadMergeService
+from app.services.retention import RetentionService
+
+
+def test_canonical_number():
+    """Testa a forma canônica: código do país, DDD e nono dígito"""
+    print("\n🧪 Testando número canônico...")
+    assert canonical_whatsapp_number("5511988887777") == "5511988887777"
+    assert canonical_whatsapp_number("551188887777") == "5511988887777"
+    assert canonical_whatsapp_number("+55 (11) 8888-7777") == "5511988887777"
+    assert canonical_whatsapp_number("551133334444") == "551133334444"  # fixo: sem nono dígito
+    assert canonical_whatsapp_number("14155552671") == "14155552671"  # outro país
+    # JIDs de outros países com o tamanho de DDD + número brasileiro não ganham o 55
+    assert canonical_whatsapp_number("49912345678") == "49912345678"
+    assert canonical_whatsapp_number("4930123456") == "4930123456"
+    assert canonical_whatsapp_number("email_ana@exemplo.com") == "email_ana@exemplo.com"
+    print("  ✅ Variações do mesmo celular viram o mesmo número")
+
+
+def test_lookup_with_and_without_ninth_digit():
+    """Testa que o número com e sem o nono dígito acha o mesmo lead (banco e cache)"""
+    print("\n🧪 Testando busca pelo número canônico...")
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = init_db(f"sqlite:///{os.path.join(tmp, 'crm.db')}")
+        db = get_session(engine)
+        lead = LeadService.create_or_get_lead(db, "5511988887001")
+        assert lead.canonical_number == "5511988887001"
+        same = LeadService.create_or_get_lead(db, "551188887001")
+        assert same.id == lead.id and db.query(Lead).count() == 1
+        MessageService.save_message(db, "551188887001", "user", "Oi")
+        assert db.query(ChatMessage).one().lead_id == lead.id
+
+        lead_cache.clear()
+        lead_cache.store(lead)
+        assert lead_cache.lookup("551188887001").id == lead.id
+        lead_cache.clear()
+        db.close()
+        engine.dispose()
+    print("  ✅ Um lead só, mensagens e cache no mesmo registro")
+
+
+def test_backfill_and_merge():
+    """Testa o preenchimento em banco antigo e a fusão dos duplicados"""
+    print("\n🧪 Testando fusão de duplicados...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "crm.db")
+        engine = init_db(f"sqlite:///{path}")
+        engine.dispose()
+        # Banco anterior à coluna: o mesmo cliente em dois leads
+        conn = sqlite3.connect(path)
+        conn.executemany(
+            "INSERT INTO leads (whatsapp_number, name, email, status, created_at, updated_at, version) "
+            "VALUES (?, ?, ?, 'novo', ?, ?, 1)",
+            [("551188887002", "Ana", "ana@exemplo.com", "2024-01-01 10:00:00", "2024-01-02 10:00:00"),
+             ("5511988887002", None, None, "2024-03-01 10:00:00", "2024-03-05 10:00:00"),
+             ("5511988887003", "Bruno", None, "2024-03-01 10:00:00", "2024-03-01 10:00:00")]
+        )
+        conn.executemany(
+            "INSERT INTO chat_messages (lead_id, whatsapp_number, sender, message, role, created_at) "
+            "VALUES (?, ?, 'user', ?, 'user', '2024-01-01 10:00:00')",
+            [(1, "551188887002", "mensagem antiga"), (2, "5511988887002", "mensagem nova"),
+             (3, "5511988887003", "outro cliente")]
+        )
+        conn.execute("UPDATE leads SET canonical_number = NULL")
+        conn.commit()
+        conn.close()
+
+        engine = init_db(f"sqlite:///{path}")
+        db = get_session(engine)
+        older = db.get(Lead, 1)
+        older.vehicle_plate = "ABC1D23"
+        db.commit()
+        assert [lead.canonical_number for lead in db.query(Lead).order_by(Lead.id)] == \
+            ["5511988887002", "5511988887002", "5511988887003"]
+        db.close()
+
+        preview = LeadMergeService.merge_duplicates(engine, dry_run=True)
+        assert preview["groups"] == 1 and preview["merged_leads"] == 1
+
+        summary = LeadMergeService.merge_duplicates(engine)
+        assert summary["merged_leads"] == 1
+        assert summary["moved"]["chat_messages"] == 1
+
+        db = get_session(engine)
+        kept = db.query(Lead).filter(Lead.canonical_number == "5511988887002").one()
+        assert kept.id == 1  # alterado por último (atributo gravado depois da migração)
+        assert (kept.name, kept.email, kept.vehicle_plate) == ("Ana", "ana@exemplo.com", "ABC1D23")
+        assert str(kept.created_at).startswith("2024-01-01")
+        messages = db.query(ChatMessage).filter(ChatMessage.lead_id == kept.id).order_by(ChatMessage.id).all()
+        assert [m.message for m in messages] == ["mensagem antiga", "mensagem nova"]
+        assert {m.whatsapp_number for m in messages} == {kept.whatsapp_number}
+        assert db.query(Lead).count() == 2 and db.query(LeadAttributes).count() == 1
+        assert db.query(QualificationField).count() == 0
+        db.close()
+
+        assert LeadMergeService.merge_duplicates(engine)["groups"] == 0
+        report = RetentionService.forget_lead(engine, whatsapp_number="551188887003")
+        assert report["deleted"]["leads"] == 1 and report["deleted"]["chat_messages"] == 1
+        engine.dispose()
+    print("  ✅ Duplicados fundidos no lead mais recente, com histórico e campos preservados")
+
+
+def test_foreign_numbers_not_merged():
+    """Testa que um número de outro país canonizado pela regra antiga é corrigido e não é fundido"""
+    print("\n🧪 Testando números de outros países...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "crm.db")
+        engine = init_db(f"sqlite:///{path}")
+        engine.dispose()
+        # Alemanha (49 + 9 dígitos) recebeu o 55 e colidiu com um celular do DDD 49
+        conn = sqlite3.connect(path)
+        conn.executemany(
+            "INSERT INTO leads (whatsapp_number, canonical_number, name, status, version) VALUES (?, ?, ?, 'novo', 1)",
+            [("49912345678", "5549912345678", "Hans"), ("5549912345678", "5549912345678", "Carla")]
+        )
+        conn.commit()
+        conn.close()
+
+        engine = init_db(f"sqlite:///{path}")
+        db = get_session(engine)
+        assert [lead.canonical_number for lead in db.query(Lead).order_by(Lead.id)] == \
+            ["49912345678", "5549912345678"]
+        assert LeadService.get_lead_by_number(db, "49912345678").name == "Hans"
+        db.close()
+
+        assert LeadMergeService.merge_duplicates(engine)["groups"] == 0
+        db = get_session(engine)
+        assert db.query(Lead).count() == 2
+        db.close()
+        engine.dispose()
+    print("  ✅ Número estrangeiro mantém o próprio lead")
+
+
+if __name__ == "__main__":
+    test_canonical_number()
+    test_lookup_with_and_without_ninth_digit()
+    test_backfill_and_merge()
+    test_foreign_numbers_not_merged()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
@@ -0,0 +1,86 @@
+"""
+Testes das estatísticas agregadas de leads (GROUP BY e cache)
+"""
+import os
+import tempfile
+from datetime import datetime, timedelta
+from sqlalchemy import event, text
+from sqlalchemy.dialects import sqlite
+from app.database.models import init_db, get_session, Lead
+from app.services.database_service import LeadService
+from app.services.lead_stats import lead_stats_cache, status_counts_query
+
+
+def _select_count(statements):
+    return len([s for s in statements if s.startswith("SELECT")])
+
+
+def test_statistics_and_cache():
+    """Testa a contagem por status, os criados hoje e a invalidação do cache"""
+    print("\n🧪 Testando estatísticas de leads...")
+    lead_stats_cache.clear()
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = init_db(f"sqlite:///{os.path.join(tmp, 'crm.db')}")
+        db = get_session(engine)
+        yesterday = datetime.now() - timedelta(days=1)
+        for position, status in enumerate(["novo", "novo", "qualificado", "finalizado", "qualificado"]):
+            lead = Lead(whatsapp_number=f"551199999006{position}", status=status)
+            if position == 0:
+                lead.created_at = yesterday
+            else:
+                lead.created_at = datetime.now()
+            db.add(lead)
+        db.commit()
+
+        statements = []
+        event.listen(engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+
+        stats = LeadService.get_statistics(db)
+        assert stats["total"] == 5 and stats["created_today"] == 4
+        assert stats["by_status"] == {"novo": 2, "qualificado": 2, "finalizado": 1}
+        assert _select_count(statements) == 1 and "GROUP BY" in statements[-1]
+        print(f"  ✅ Uma consulta: {stats['by_status']}, {stats['created_today']} hoje")
+
+        # Alteração que não muda contagens mantém o cache
+        lead = LeadService.get_lead_by_number(db, "5511999990060")
+        LeadService.update_lead(db, lead, name="Ana")
+        statements.clear()
+        assert LeadService.get_statistics(db) == stats
+        assert _select_count(statements) == 0
+        print("  ✅ Servido do cache sem consultar o banco")
+
+        # Mudança de status desfeita não invalida; confirmada, invalida
+        lead.status = "em_atendimento"
+        db.flush()
+        db.rollback()
+        statements.clear()
+        assert LeadService.get_statistics(db) == stats and _select_count(statements) == 0
+        lead = LeadService.get_lead_by_number(db, "5511999990060")
+        LeadService.update_lead(db, lead, status="em_atendimento")
+        statements.clear()
+        updated = LeadService.get_statistics(db)
+        assert updated["by_status"]["em_atendimento"] == 1 and updated["by_status"]["novo"] == 1
+        assert _select_count(statements) == 1
+        print("  ✅ Cache invalidado só no commit da mudança de status")
+        db.close()
+        engine.dispose()
+
+
+def test_stats_query_uses_covering_index():
+    """Testa que a contagem não lê a tabela leads, só o índice (status, created_at)"""
+    print("\n🧪 Testando plano da consulta...")
+    engine = init_db("sqlite://")
+    query = status_counts_query(datetime.now().date())
+    compiled = query.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True})
+    with engine.connect() as conn:
+        plan = " ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}")))
+    engine.dispose()
+    assert "COVERING INDEX ix_leads_status_created_at" in plan, plan
+    print(f"  ✅ {plan}")
+
+
+if __name__ == "__main__":
+    test_statistics_and_cache()
+    test_stats_query_uses_covering_index()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
@@ -0,0 +1,68 @@
+"""
+Testes do cassete da OpenAI e do harness de custo por conversa
+"""
+import os
+import subprocess
+import sys
+import tempfile
+from types import SimpleNamespace
+from app.services.llm_cassette import CassetteClient, CassetteMissError
+
+
+class FakeOpenAI:
+    """Cliente mínimo com a interface chat.completions.create"""
+
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls += 1
+        usage = SimpleNamespace(prompt_tokens=42, completion_tokens=7)
+        message = SimpleNamespace(content=f"resposta {kwargs['messages'][-1]['content']}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+def test_record_then_replay():
+    """Testa que o replay devolve a resposta gravada sem chamar a API"""
+    print("\n🧪 Testando gravação e reprodução...")
+    request = {"model": "gpt-4o", "messages": [{"role": "user", "content": "oi"}]}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "cassette.json")
+        inner = FakeOpenAI()
+        recorder = CassetteClient(inner, path, mode="record")
+        recorded = recorder.chat.completions.create(**request)
+
+        player = CassetteClient(None, path, mode="replay")
+        replayed = player.chat.completions.create(**request)
+
+        assert inner.calls == 1
+        assert replayed.choices[0].message.content == recorded.choices[0].message.content
+        assert player.stats.calls == 1
+        assert player.stats.input_tokens == 42 and player.stats.output_tokens == 7
+        print("  ✅ Resposta reproduzida sem rede")
+
+        try:
+            player.chat.completions.create(model="gpt-4o", messages=[{"role": "user", "content": "tchau"}])
+            assert False, "deveria falhar sem gravação"
+        except CassetteMissError:
+            print("  ✅ Requisição não gravada gera CassetteMissError")
+
+
+def test_harness_has_no_regressions():
+    """Executa o corpus de conversas e compara com a linha de base"""
+    print("\n🧪 Executando harness de custo por conversa...")
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.llm_harness", "--check"],
+        capture_output=True, text=True, timeout=300,
+        cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    print(result.stdout[-1500:])
+    assert result.returncode == 0, result.stdout[-3000:] + result.stderr[-3000:]
+
+
+if __name__ == "__main__":
+    test_record_then_replay()
+    test_harness_has_no_regressions()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
@@ -0,0 +1,61 @@
+"""
+Teste rápido do gerador de carga (servidores falsos + webhook real)
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from benchmarks.loadtest import build_payload, percentile
+
+
+def test_payload_formats():
+    """Testa os dois formatos de messages.upsert aceitos pelo webhook"""
+    print("\n🧪 Testando formatos de payload...")
+    format1 = build_payload("5511999990000", "oi", 1, 1)
+    format2 = build_payload("5511999990000", "oi", 2, 1)
+
+    assert format1["data"]["message"]["key"]["remoteJid"].startswith("5511999990000")
+    assert format2["data"]["key"]["remoteJid"].startswith("5511999990000")
+    assert format2["data"]["message"]["conversation"] == "oi"
+    print("  ✅ Formato 1 (data.message.key) e formato 2 (data.key)")
+
+
+def test_percentile():
+    """Testa o cálculo de percentis"""
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50.5
+    assert percentile([], 99) == 0.0
+    print("  ✅ Percentis")
+
+
+def test_short_load_run():
+    """Executa uma carga curta e confere que todas as mensagens foram respondidas"""
+    print("\n🧪 Executando carga curta...")
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "loadtest.json")
+        result = subprocess.run(
+            [sys.executable, "-m", "benchmarks.loadtest", "--rate", "5", "--duration", "2",
+             "--users", "5", "--openai-latency-ms", "20", "--evolution-latency-ms", "5",
+             "--drain-timeout", "60", "--output", output],
+            capture_output=True, text=True, timeout=180,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+        print(result.stdout[-1500:])
+        assert result.returncode == 0, result.stderr[-3000:]
+
+        with open(output, "r", encoding="utf-8") as f:
+            report = json.load(f)
+
+    assert report["sent"] == 10
+    assert report["acked"] == 10
+    assert report["replies"] == 10
+    assert report["ack_latency_ms"]["p50"] > 0
+    print(f"  ✅ {report['replies']} respostas, ack p95 {report['ack_latency_ms']['p95']} ms")
+
+
+if __name__ == "__main__":
+    test_payload_formats()
+    test_percentile()
+    test_short_load_run()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
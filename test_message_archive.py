@@ -0,0 +1,155 @@
+"""
+Testes do arquivamento de mensagens em segmentos comprimidos
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from app.database.connection import build_async_engine, get_async_session_factory
+from app.database.models import init_db, get_session, Lead, ChatMessage, MessageArchiveSegment
+from app.services.async_database_service import AsyncMessageService
+from app.services.database_service import MessageService
+from app.services import message_archive
+from app.services.message_archive import MessageArchiveService, write_member, read_member
+from config.settings import settings
+
+
+def _seed(db):
+    now = datetime.utcnow()
+    closed = Lead(whatsapp_number="5511999990070", status="convertido", updated_at=now)
+    idle = Lead(whatsapp_number="5511999990071", status="novo", updated_at=now - timedelta(days=200))
+    active = Lead(whatsapp_number="5511999990072", status="novo", updated_at=now)
+    db.add_all([closed, idle, active])
+    db.flush()
+    moments = [datetime(2024, 4, 30, 23, 59), datetime(2024, 5, 1, 8, 0), datetime(2024, 5, 1, 8, 0)]
+    for lead in (closed, idle, active):
+        for position, moment in enumerate(moments):
+            db.add(ChatMessage(lead_id=lead.id, whatsapp_number=lead.whatsapp_number, sender="user",
+                               message=f"{lead.id}-{position}", role="user", created_at=moment))
+    db.commit()
+    return closed.id, idle.id, active.id
+
+
+def test_member_roundtrip():
+    """Testa os trechos gzip acrescentados ao mesmo arquivo"""
+    print("\n🧪 Testando trechos gzip...")
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        first = [{"id": 1, "message": "oi", "created_at": "2024-05-01T08:00:00"}]
+        second = [{"id": 2, "message": "olá", "created_at": "2024-05-01T09:00:00"}]
+        offset_a, length_a = write_member(directory, "2024-05.jsonl.gz", first)
+        offset_b, length_b = write_member(directory, "2024-05.jsonl.gz", second)
+        assert offset_a == 0 and offset_b == length_a
+        assert read_member(directory, "2024-05.jsonl.gz", offset_b, length_b)[0]["message"] == "olá"
+    print("  ✅ Cada trecho é lido sozinho pela posição")
+
+
+async def _page_walk(url: str, lead_id: int):
+    engine = build_async_engine(url)
+    messages, cursor = [], None
+    async with get_async_session_factory(engine)() as db:
+        while True:
+            page, cursor = await AsyncMessageService.get_lead_messages_page(db, lead_id, limit=2, cursor=cursor)
+            messages.extend(page)
+            if not cursor:
+                break
+    await engine.dispose()
+    return messages
+
+
+def test_archive_and_read_back():
+    """Testa o arquivamento de leads encerrados e inativos e a leitura transparente"""
+    print("\n🧪 Testando arquivamento...")
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'crm.db')}"
+        directory = Path(tmp) / "archive"
+        original_dir, settings.ARCHIVE_DIR = settings.ARCHIVE_DIR, str(directory)
+        try:
+            engine = init_db(url)
+            db = get_session(engine)
+            closed_id, idle_id, active_id = _seed(db)
+            before = {m.id: m.message for m in db.query(ChatMessage).filter(ChatMessage.lead_id == closed_id)}
+            db.rollback()  # encerra a leitura antes do arquivamento
+
+            assert MessageArchiveService.archive_messages(engine=engine, dry_run=True)["eligible_leads"] == 2
+            stats = MessageArchiveService.archive_messages(engine=engine)
+            assert stats == {"leads": 2, "messages": 6, "eligible_leads": 2}
+            assert sorted(os.listdir(directory)) == ["2024-04.jsonl.gz", "2024-05.jsonl.gz"]
+            hot = db.query(ChatMessage.lead_id).distinct().all()
+            assert hot == [(active_id,)]
+            assert db.query(MessageArchiveSegment).count() == 4
+            print(f"  ✅ {stats['messages']} mensagens de {stats['leads']} leads em 2 segmentos mensais")
+
+            # Nova mensagem do lead depois do arquivamento fica na tabela
+            db.add(ChatMessage(lead_id=closed_id, whatsapp_number="5511999990070", sender="human",
+                               message="novo contato", role="assistant", created_at=datetime(2024, 6, 1)))
+            db.commit()
+
+            archived = MessageArchiveService.get_archived_messages(db, closed_id)
+            assert {m["id"]: m["message"] for m in archived} == before
+            lead = db.get(Lead, closed_id)
+            recent = MessageService.get_recent_messages(db, lead, limit=3)
+            assert [m.message for m in recent] == [f"{closed_id}-1", f"{closed_id}-2", "novo contato"]
+            print("  ✅ Dashboard lê as arquivadas junto com as da tabela")
+
+            walked = asyncio.run(_page_walk(url, closed_id))
+            assert [m["message"] for m in walked] == [before[i] for i in sorted(before)] + ["novo contato"]
+            print("  ✅ API pagina por cursor atravessando segmentos e tabela")
+
+            db.rollback()
+            assert MessageArchiveService.archive_messages(engine=engine)["messages"] == 1
+            assert [m["message"] for m in MessageArchiveService.get_archived_messages(db, closed_id)][-1] == "novo contato"
+            db.close()
+            engine.dispose()
+        finally:
+            settings.ARCHIVE_DIR = original_dir
+    print("  ✅ Segunda execução acrescenta só o que é novo")
+
+
+def test_segment_written_outside_write_transaction():
+    """Testa que a compressão e o fsync do trecho não seguram o lock de escrita do SQLite"""
+    print("\n🧪 Testando gravação do trecho fora da transação...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "crm.db")
+        engine = init_db(f"sqlite:///{path}")
+        db = get_session(engine)
+        closed_id, _, _ = _seed(db)
+        db.close()
+
+        database_free = []
+
+        def probing_write_member(directory, segment, records):
+            conn = sqlite3.connect(path, timeout=0)
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.rollback()
+                database_free.append(True)
+            except sqlite3.OperationalError:
+                database_free.append(False)
+            finally:
+                conn.close()
+            return write_member(directory, segment, records)
+
+        original_dir, settings.ARCHIVE_DIR = settings.ARCHIVE_DIR, os.path.join(tmp, "archive")
+        message_archive.write_member = probing_write_member
+        try:
+            archived = MessageArchiveService.archive_lead(closed_id, engine=engine)
+            db = get_session(engine)
+            assert archived == 3 and database_free == [True, True]
+            assert db.query(ChatMessage).filter(ChatMessage.lead_id == closed_id).count() == 0
+            assert len(MessageArchiveService.get_archived_messages(db, closed_id)) == 3
+            db.close()
+        finally:
+            message_archive.write_member = write_member
+            settings.ARCHIVE_DIR = original_dir
+            engine.dispose()
+    print("  ✅ Banco livre para outros escritores durante a gravação do trecho")
+
+
+if __name__ == "__main__":
+    test_member_roundtrip()
+    test_archive_and_read_back()
+    test_segment_written_outside_write_transaction()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
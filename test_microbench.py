@@ -0,0 +1,57 @@
+"""
+Testes da suíte de microbenchmarks e das funções extraídas para ela
+"""
+from benchmarks.microbench import run_suite, make_lead, build_cases
+from app.services.database_service import LeadService, LEAD_FLOW_FIELDS
+from app.services.notification_service import NotificationService
+from dashboard.helpers import build_leads_dataframe, format_phone_display
+
+
+def test_build_lead_dict():
+    """Testa o dicionário de dados do lead usado pelos fluxos"""
+    print("\n🧪 Testando build_lead_dict...")
+    lead_dict = LeadService.build_lead_dict(make_lead(), "seguro_auto", "seguro_auto")
+
+    assert set(lead_dict) == set(LEAD_FLOW_FIELDS) | {"flow_type", "flow_step"}
+    assert lead_dict["vehicle_plate"] == "ABC1D23"
+    assert lead_dict["flow_type"] == "seguro_auto"
+    print("  ✅ Campos do lead, flow_type e flow_step")
+
+
+def test_lead_qualified_message():
+    """Testa a mensagem de lead qualificado enviada ao admin"""
+    print("\n🧪 Testando mensagem de lead qualificado...")
+    data = LeadService.build_lead_dict(make_lead(), "sinistro", "sinistro")
+    message = NotificationService.build_lead_qualified_message(data, "5511912345678")
+
+    assert message.startswith("🔔 *URGENTE - SINISTRO*")
+    assert "🚙 Placa do Veículo: ABC1D23" in message
+    print("  ✅ Mensagem de sinistro montada")
+
+
+def test_leads_dataframe():
+    """Testa a tabela de leads do dashboard"""
+    df = build_leads_dataframe([make_lead(1), make_lead(2)])
+    assert list(df.columns) == ["ID", "Nome", "WhatsApp", "Status", "Tipo", "IA Ativa", "Criado"]
+    assert len(df) == 2
+    assert format_phone_display("11912345678") == "1112345678"
+    print("  ✅ DataFrame com 2 leads")
+
+
+def test_suite_runs_every_case():
+    """Executa a suíte em modo rápido"""
+    print("\n🧪 Executando microbenchmarks (rápido)...")
+    results = run_suite(rounds=2, target_s=0.005)
+
+    assert set(results) == set(build_cases())
+    for name, result in results.items():
+        assert result["median_us"] > 0
+        print(f"  ⏱️ {name}: {result['median_us']:.2f}µs")
+
+
+if __name__ == "__main__":
+    test_build_lead_dict()
+    test_lead_qualified_message()
+    test_leads_dataframe()
+    test_suite_runs_every_case()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
@@ -0,0 +1,124 @@
+"""
+Testes da paginação por cursor de /api/leads e das mensagens do lead
+"""
+import asyncio
+from datetime import datetime, timedelta
+import orjson
+from fastapi import HTTPException
+from sqlalchemy import event, select, text
+from sqlalchemy.dialects import sqlite
+from app.database.connection import build_async_engine, get_async_session_factory
+from app.database.models import Base, Lead, ChatMessage, init_db
+from app.services.pagination import encode_cursor, decode_cursor, keyset_page
+
+
+def test_cursor_roundtrip():
+    """Testa a codificação do cursor"""
+    print("\n🧪 Testando cursor...")
+    moment = datetime(2024, 5, 1, 10, 30, 0, 123456)
+    assert decode_cursor(encode_cursor(moment, 42)) == (moment, 42)
+    print("  ✅ Cursor opaco volta para (created_at, id)")
+
+
+async def _walk(url: str):
+    from app.webhooks.evolution_webhook import get_leads, get_lead_messages
+
+    engine = build_async_engine(url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    # Vários leads no mesmo instante: o id desempata
+    base = datetime(2024, 5, 1, 10, 0, 0)
+    factory = get_async_session_factory(engine)
+    async with factory() as db:
+        for position in range(7):
+            db.add(Lead(whatsapp_number=f"55119999900{position:02d}", status="novo",
+                        created_at=base + timedelta(minutes=position // 2)))
+        lead = Lead(whatsapp_number="5511999990099", status="novo", created_at=base)
+        db.add(lead)
+        await db.flush()
+        for position in range(5):
+            db.add(ChatMessage(lead_id=lead.id, whatsapp_number=lead.whatsapp_number, sender="user",
+                               message=f"m{position}", role="user", created_at=base))
+        await db.commit()
+
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+
+    pages, cursor = [], None
+    async with factory() as db:
+        while True:
+            response = await get_leads(status=None, limit=3, cursor=cursor, fields="id,status", db=db)
+            pages.append(orjson.loads(response.body))
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+
+        messages, cursor = [], None
+        while True:
+            response = await get_lead_messages(lead_id=lead.id, limit=2, cursor=cursor, db=db)
+            messages.extend(orjson.loads(response.body))
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                break
+
+        errors = []
+        for kwargs in ({"cursor": "não-é-cursor"}, {"fields": "id,senha"}):
+            try:
+                await get_leads(status=None, limit=3, db=db, **{"cursor": None, "fields": None, **kwargs})
+            except HTTPException as e:
+                errors.append(e.status_code)
+
+    await engine.dispose()
+    return pages, messages, errors, statements
+
+
+def test_keyset_walk():
+    """Testa percorrer todas as páginas sem repetir nem pular linhas"""
+    print("\n🧪 Testando paginação de leads e mensagens...")
+    pages, messages, errors, statements = asyncio.run(_walk("sqlite://"))
+
+    assert [len(page) for page in pages] == [3, 3, 2]
+    ids = [item["id"] for page in pages for item in page]
+    assert len(set(ids)) == 8
+    assert all(set(item) == {"id", "status"} for page in pages for item in page)
+    lead_selects = [s for s in statements if "FROM leads" in s]
+    assert all("leads.name" not in s and "leads.cpf_cnpj" not in s for s in lead_selects)
+    print(f"  ✅ {len(ids)} leads em {len(pages)} páginas, só as colunas pedidas")
+
+    assert [m["message"] for m in messages] == [f"m{position}" for position in range(5)]
+    print("  ✅ Mensagens em ordem cronológica, páginas de 2")
+
+    assert errors == [400, 400]
+    print("  ✅ Cursor e campos inválidos retornam 400")
+
+
+def test_keyset_uses_index():
+    """Testa que a continuação da página é resolvida pelo índice, sem ordenar"""
+    print("\n🧪 Testando plano da paginação...")
+    engine = init_db("sqlite://")
+    cursor = encode_cursor(datetime(2024, 5, 1), 10)
+    columns = Lead.__table__.c
+    queries = {
+        "leads": keyset_page(select(columns.id), columns.created_at, columns.id, cursor, 50),
+        "leads por status": keyset_page(select(columns.id).where(columns.status == "novo"),
+                                        columns.created_at, columns.id, cursor, 50),
+        "mensagens": keyset_page(select(ChatMessage.__table__.c.id).where(ChatMessage.__table__.c.lead_id == 1),
+                                 ChatMessage.__table__.c.created_at, ChatMessage.__table__.c.id,
+                                 cursor, 50, descending=False),
+    }
+    with engine.connect() as conn:
+        for name, query in queries.items():
+            sql = query.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True})
+            plan = " ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+            assert plan.startswith("SEARCH") and "TEMP B-TREE" not in plan, f"{name}: {plan}"
+            print(f"  ✅ {name}: {plan}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    test_cursor_roundtrip()
+    test_keyset_walk()
+    test_keyset_uses_index()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
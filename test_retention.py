@@ -0,0 +1,135 @@
+"""
+Testes da retenção de dados e da exclusão de leads (LGPD)
+"""
+import gzip
+import os
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+from sqlalchemy import event
+from app.database.models import (
+    init_db, get_session, Lead, ChatMessage, QualificationField, NotificationLog, MessageArchiveSegment
+)
+from app.services.message_archive import MessageArchiveService
+from app.services.retention import RetentionPolicy, RetentionService, delete_in_batches
+from config.settings import settings
+
+
+def test_batched_policy():
+    """Testa a expiração em lotes curtos e o relatório de vazão"""
+    print("\n🧪 Testando política de retenção em lotes...")
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = init_db(f"sqlite:///{os.path.join(tmp, 'crm.db')}")
+        db = get_session(engine)
+        old = datetime.utcnow() - timedelta(days=400)
+        db.add_all([
+            NotificationLog(whatsapp_number="5511", status="enviado", created_at=old if position % 2 else datetime.utcnow(),
+                            error_message="x" * 2000)
+            for position in range(1050)
+        ])
+        db.commit()
+        db.close()
+
+        begins = []
+        event.listen(engine, "begin", lambda conn: begins.append(conn))
+        policy = RetentionPolicy("notification_logs", NotificationLog.__table__, "created_at", 180)
+        dry = RetentionService.run_policies(engine, policies=[policy], dry_run=True)
+        assert dry["deleted"] == {"notification_logs": 525}
+
+        settings_batch, settings.RETENTION_BATCH_SIZE = settings.RETENTION_BATCH_SIZE, 100
+        try:
+            begins.clear()
+            report = RetentionService.run_policies(engine, policies=[policy])
+        finally:
+            settings.RETENTION_BATCH_SIZE = settings_batch
+        assert report["deleted"] == {"notification_logs": 525}
+        assert len(begins) >= 6  # 525 linhas em lotes de até 100
+        assert report["rows_per_second"] > 0 and report["freed_pages"] > 0
+        db = get_session(engine)
+        assert db.query(NotificationLog).count() == 525
+        db.close()
+        engine.dispose()
+    print(f"  ✅ {report['total_rows']} linhas em {len(begins)} transações, "
+          f"{report['rows_per_second']} linhas/s, {report['freed_pages']} páginas devolvidas")
+
+
+def test_delete_in_batches_sparse_ids():
+    """Testa faixas de id com buracos e linhas que não atendem a condição"""
+    print("\n🧪 Testando lotes com ids esparsos...")
+    engine = init_db("sqlite://")
+    db = get_session(engine)
+    for position in range(1, 40):
+        db.add(ChatMessage(id=position * 7, whatsapp_number="a" if position % 3 else "b", message="m"))
+    db.commit()
+    table = ChatMessage.__table__
+    deleted = delete_in_batches(table, table.c.whatsapp_number == "a", engine=engine, batch_size=5, sleep_seconds=0)
+    assert deleted == 26
+    assert {m.whatsapp_number for m in db.query(ChatMessage)} == {"b"}
+    db.close()
+    engine.dispose()
+    print("  ✅ Só as linhas da condição, sem pular nenhuma")
+
+
+def test_forget_lead():
+    """Testa a exclusão em cascata de um lead, inclusive das mensagens arquivadas"""
+    print("\n🧪 Testando exclusão de lead...")
+    with tempfile.TemporaryDirectory() as tmp:
+        original_dir, settings.ARCHIVE_DIR = settings.ARCHIVE_DIR, str(Path(tmp) / "archive")
+        try:
+            engine = init_db(f"sqlite:///{os.path.join(tmp, 'crm.db')}")
+            db = get_session(engine)
+            target = Lead(whatsapp_number="5511999990080", status="convertido", vehicle_plate="ABC1D23")
+            other = Lead(whatsapp_number="5511999990081", status="convertido")
+            db.add_all([target, other])
+            db.flush()
+            moment = datetime(2024, 5, 2)
+            for lead in (target, other):
+                for position in range(3):
+                    db.add(ChatMessage(lead_id=lead.id, whatsapp_number=lead.whatsapp_number, sender="user",
+                                       message=f"{lead.whatsapp_number}-{position}", created_at=moment))
+            target_id, other_id = target.id, other.id
+            db.commit()
+            MessageArchiveService.archive_messages(engine=engine)
+
+            # Dados que ficaram na tabela depois do arquivamento
+            db.add_all([
+                ChatMessage(lead_id=None, whatsapp_number="5511999990080", sender="user", message="antes do lead"),
+                ChatMessage(lead_id=target_id, whatsapp_number="5511999990080", sender="user", message="de novo"),
+                QualificationField(lead_id=target_id, whatsapp_number="5511999990080"),
+                NotificationLog(lead_id=target_id, whatsapp_number="5511999990080", status="enviado"),
+                NotificationLog(lead_id=other_id, whatsapp_number="5511999990081", status="enviado"),
+            ])
+            db.commit()
+            db.close()
+
+            report = RetentionService.forget_lead(engine, whatsapp_number="5511999990080")
+            assert report["deleted"] == {
+                "chat_messages": 2, "qualification_fields": 1, "notification_logs": 1,
+                "lead_attributes": 1, "lead_events": 1, "message_archive": 3, "leads": 1,
+            }
+            assert RetentionService.forget_lead(engine, whatsapp_number="5511999990080") is None
+
+            db = get_session(engine)
+            assert db.query(Lead).filter(Lead.id == target_id).count() == 0
+            for model in (ChatMessage, QualificationField, NotificationLog):
+                assert db.query(model).filter(model.whatsapp_number == "5511999990080").count() == 0
+            assert db.query(MessageArchiveSegment).filter(MessageArchiveSegment.lead_id == target_id).count() == 0
+            remaining = MessageArchiveService.get_archived_messages(db, other_id)
+            assert [m["message"] for m in remaining] == [f"5511999990081-{p}" for p in range(3)]
+            files = b"".join(path.read_bytes() for path in Path(settings.ARCHIVE_DIR).iterdir())
+            assert len(os.listdir(settings.ARCHIVE_DIR)) == 1
+            db.close()
+            engine.dispose()
+        finally:
+            settings.ARCHIVE_DIR = original_dir
+
+    assert b"5511999990080" not in gzip.decompress(files)
+    print(f"  ✅ {report['total_rows']} linhas apagadas ({report['rows_per_second']} linhas/s); "
+          "segmento reescrito sem o lead")
+
+
+if __name__ == "__main__":
+    test_batched_policy()
+    test_delete_in_batches_sparse_ids()
+    test_forget_lead()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
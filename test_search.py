@@ -0,0 +1,119 @@
+"""
+Testes da busca textual em leads e conversas
+"""
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+import orjson
+from app.database.models import init_db, get_session, Lead, ChatMessage
+from app.database.connection import build_async_engine, get_async_session_factory
+from app.services.database_service import LeadService, MessageService
+from app.services.search import search_terms, match_expression
+from app.webhooks import evolution_webhook
+
+
+def test_search_terms():
+    """Testa a normalização do texto digitado"""
+    print("\n🧪 Testando termos de busca...")
+    assert search_terms("Placa ABC-1234, São  João!") == ["placa", "abc", "1234", "sao", "joao"]
+    assert search_terms('  "*" ') == []
+    assert match_expression(["placa", "abc"], "sqlite") == '"placa"* "abc"*'
+    assert match_expression(["placa", "abc"], "postgresql") == "placa:* & abc:*"
+    print("  ✅ Sem acentos, minúsculas, sem operadores do usuário")
+
+
+def test_search_sync_and_async():
+    """Testa busca sem acento, por prefixo, reindexação e a rota /api/search"""
+    print("\n🧪 Testando busca em leads e mensagens...")
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'crm.db')}"
+        engine = init_db(url)
+        db = get_session(engine)
+        ana = Lead(whatsapp_number="5511999990090", name="Ana Conceição", vehicle_plate="ABC1D23", status="novo")
+        bruno = Lead(whatsapp_number="5511999990091", name="Bruno Lima", status="qualificado")
+        db.add_all([ana, bruno])
+        db.commit()
+        MessageService.save_message(db, ana.whatsapp_number, "user", "Moro no Jardim São Luís, placa ABC1D23", lead_id=ana.id)
+        MessageService.save_message(db, bruno.whatsapp_number, "user", "Quero cotar seguro residencial em Pinheiros", lead_id=bruno.id)
+        MessageService.save_message(db, bruno.whatsapp_number, "ai", "Claro! Qual o CEP do imóvel em Pinheiros? Pinheiros é ótimo", lead_id=bruno.id)
+
+        results = LeadService.search(db, "jardim sao luis")
+        assert [hit["whatsapp_number"] for hit in results["messages"]] == [ana.whatsapp_number]
+        assert "[Jardim]" in results["messages"][0]["snippet"]
+        assert results["messages"][0]["created_at"].year >= 2024
+
+        results = LeadService.search(db, "placa abc")
+        assert [hit["id"] for hit in results["leads"]] == []  # "placa" não está nos campos do lead
+        assert len(results["messages"]) == 1
+        assert [hit["id"] for hit in LeadService.search(db, "abc1")["leads"]] == [ana.id]
+        assert [hit["id"] for hit in LeadService.search(db, "conceicao")["leads"]] == [ana.id]
+
+        # Mais ocorrências do termo ficam antes
+        pinheiros = LeadService.search(db, "pinheiros")["messages"]
+        assert len(pinheiros) == 2 and pinheiros[0]["sender"] == "ai"
+        assert pinheiros[0]["score"] >= pinheiros[1]["score"]
+
+        # Atualização e exclusão mantêm o índice em dia
+        LeadService.update_lead(db, bruno, name="Bruno Souza")
+        assert LeadService.search(db, "lima")["leads"] == []
+        assert [hit["id"] for hit in LeadService.search(db, "souza")["leads"]] == [bruno.id]
+        db.query(ChatMessage).filter(ChatMessage.whatsapp_number == ana.whatsapp_number).delete()
+        db.commit()
+        assert LeadService.search(db, "jardim")["messages"] == []
+        assert LeadService.search(db, "   ") == {"leads": [], "messages": []}
+
+        async def run_route():
+            async_engine = build_async_engine(url)
+            try:
+                async with get_async_session_factory(async_engine)() as session:
+                    return await evolution_webhook.search(q="pinheiros", limit=1, db=session)
+            finally:
+                await async_engine.dispose()
+
+        response = asyncio.run(run_route())
+        body = orjson.loads(response.body)
+        assert len(body["messages"]) == 1 and body["leads"] == []
+        db.close()
+        engine.dispose()
+    print("  ✅ Sem acento, por prefixo, ordenada por relevância e reindexada em UPDATE/DELETE")
+
+
+def test_backfill_existing_database():
+    """Testa a indexação de um banco que já tinha mensagens antes da busca"""
+    print("\n🧪 Testando indexação de banco existente...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "crm.db")
+        engine = init_db(f"sqlite:///{path}")
+        engine.dispose()
+        conn = sqlite3.connect(path)
+        # Banco anterior à busca: sem as tabelas FTS e sem os triggers
+        for name in ("chat_messages_fts", "leads_fts"):
+            for suffix in ("ai", "ad", "au"):
+                conn.execute(f"DROP TRIGGER {name}_{suffix}")
+            conn.execute(f"DROP TABLE {name}")
+        conn.executemany(
+            "INSERT INTO chat_messages (whatsapp_number, sender, message) VALUES (?, 'user', ?)",
+            [(f"55{position}", f"mensagem {position} sobre consórcio de imóvel") for position in range(20000)]
+        )
+        conn.commit()
+        conn.close()
+
+        engine = init_db(f"sqlite:///{path}")
+        db = get_session(engine)
+        started = time.perf_counter()
+        results = LeadService.search(db, "consorcio imovel 1999", limit=5)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        numbers = [hit["whatsapp_number"] for hit in results["messages"]]
+        assert len(numbers) == 5 and all(number.startswith("551999") for number in numbers)
+        db.close()
+        engine.dispose()
+    print(f"  ✅ 20000 mensagens indexadas na inicialização; busca em {elapsed_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    test_search_terms()
+    test_search_sync_and_async()
+    test_backfill_existing_database()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
@@ -0,0 +1,82 @@
+"""
+Testes da unidade de trabalho por mensagem (commits e round-trips)
+"""
+from sqlalchemy import event
+from app.database.connection import build_engine, get_session_factory
+from app.database.models import Base
+from app.services.database_service import LeadService, MessageService
+
+
+def _counting_engine():
+    engine = build_engine("sqlite:///:memory:")
+    Base.metadata.create_all(bind=engine)
+    counters = {"commits": 0, "statements": []}
+
+    @event.listens_for(engine, "commit")
+    def _on_commit(conn):
+        counters["commits"] += 1
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _on_execute(conn, cursor, statement, parameters, context, executemany):
+        counters["statements"].append(statement.split()[0].upper())
+
+    return engine, counters
+
+
+def test_single_transaction():
+    """Testa lead, mensagens e qualificação gravados num único commit"""
+    print("\n🧪 Testando unidade de trabalho...")
+    engine, counters = _counting_engine()
+    db = get_session_factory(engine)()
+    try:
+        lead = LeadService.create_or_get_lead(db, "5511999990001", "novo", commit=False)
+        assert lead.id is not None
+        MessageService.save_message(db, lead.whatsapp_number, "user", "oi", role="user",
+                                    lead_id=lead.id, commit=False)
+        LeadService.update_lead(db, lead, commit=False, flow_step="seguro_auto", flow_type="seguro_auto")
+        LeadService.mark_qualified(db, lead, commit=False)
+        MessageService.save_message(db, lead.whatsapp_number, "ai", "Obrigado!", role="assistant",
+                                    lead_id=lead.id, commit=False)
+        assert counters["commits"] == 0
+        db.commit()
+        assert counters["commits"] == 1
+        print("  ✅ Um commit para lead, mensagens e qualificação")
+
+        # Sem expirar no commit, ler o lead não gera SELECT de recarga
+        counters["statements"].clear()
+        assert lead.status == "qualificado" and lead.flow_type == "seguro_auto"
+        assert counters["statements"] == []
+        print("  ✅ Lead utilizável após o commit sem refresh")
+    finally:
+        db.close()
+
+    db = get_session_factory(engine)()
+    try:
+        assert len(MessageService.get_conversation_history(db, "5511999990001")) == 2
+        assert LeadService.get_lead_by_number(db, "5511999990001").status_ia == 0
+        print("  ✅ Dados persistidos")
+    finally:
+        db.close()
+        engine.dispose()
+
+
+def test_default_still_commits():
+    """Testa que as chamadas sem commit=False continuam gravando sozinhas"""
+    print("\n🧪 Testando commit padrão dos serviços...")
+    engine, counters = _counting_engine()
+    db = get_session_factory(engine)()
+    try:
+        lead = LeadService.create_or_get_lead(db, "5511999990002")
+        LeadService.update_lead(db, lead, name="Maria")
+        assert counters["commits"] == 2
+        assert "SELECT" not in counters["statements"][-1]
+        print("  ✅ create_or_get_lead e update_lead fazem commit sem refresh")
+    finally:
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    test_single_transaction()
+    test_default_still_commits()
+    print("\n✅ TODOS OS TESTES CONCLUÍDOS!")
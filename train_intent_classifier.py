@@ -0,0 +1,79 @@
+"""
+Script para treinar o classificador local de intenção (menu e tipo de seguro)
+
+Usa a mensagem de chat_messages que escolheu o fluxo de cada lead, rotulada pelo flow_type final,
+mais os exemplos iniciais do módulo, e salva o modelo em INTENT_MODEL_PATH.
+"""
+import argparse
+import random
+import sys
+import time
+from config.settings import settings
+from app.database.models import init_db, get_session
+from app.core.intent_classifier import IntentClassifier, build_training_set
+
+
+def train_intent_classifier(output_path: str, holdout: float = 0.2, seed: int = 42):
+    """Treina, avalia e salva o classificador"""
+
+    print("🔄 Carregando mensagens rotuladas do banco de dados...")
+    engine = init_db(settings.DATABASE_URL)
+    db = get_session(engine)
+    try:
+        texts, labels = build_training_set(db)
+    finally:
+        db.close()
+
+    print(f"✅ {len(texts)} exemplos carregados")
+    for label in sorted(set(labels)):
+        print(f"   - {label}: {labels.count(label)}")
+
+    # Avaliação em holdout antes do treino final
+    samples = list(zip(texts, labels))
+    random.Random(seed).shuffle(samples)
+    split = int(len(samples) * (1 - holdout))
+    train, test = samples[:split], samples[split:]
+
+    if test and len(set(label for _, label in train)) > 1:
+        model = IntentClassifier().fit([t for t, _ in train], [l for _, l in train])
+        hits = sum(1 for text, label in test if model.predict(text)[0] == label)
+        confident = [
+            (text, label) for text, label in test
+            if model.predict(text)[1] >= settings.INTENT_CONFIDENCE_THRESHOLD
+        ]
+        confident_hits = sum(1 for text, label in confident if model.predict(text)[0] == label)
+        print(f"\n📊 Avaliação (holdout de {len(test)} exemplos):")
+        print(f"   Acurácia geral: {hits / len(test) * 100:.1f}%")
+        print(f"   Cobertura acima do limiar ({settings.INTENT_CONFIDENCE_THRESHOLD}): "
+              f"{len(confident) / len(test) * 100:.1f}%")
+        if confident:
+            print(f"   Acurácia acima do limiar: {confident_hits / len(confident) * 100:.1f}%")
+
+    print("\n🔄 Treinando modelo final com todos os exemplos...")
+    model = IntentClassifier().fit(texts, labels)
+    model.save(output_path)
+
+    # Mede latência de inferência
+    start = time.perf_counter()
+    runs = 1000
+    for i in range(runs):
+        model.predict(texts[i % len(texts)])
+    elapsed_ms = (time.perf_counter() - start) / runs * 1000
+
+    print(f"✅ Modelo salvo em: {output_path}")
+    print(f"⚡ Latência média de inferência: {elapsed_ms:.3f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Treina o classificador local de intenção")
+    parser.add_argument("--output", default=settings.INTENT_MODEL_PATH, help="Arquivo .npz de saída")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fração usada para avaliação")
+    args = parser.parse_args()
+
+    try:
+        train_intent_classifier(args.output, args.holdout)
+    except Exception as e:
+        print(f"\n❌ Erro no treinamento: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)